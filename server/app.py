@@ -1,809 +1,257 @@
-from flask import Flask, request, jsonify
-from flask import session
-from flask import Flask, request, jsonify, session, redirect, url_for
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+"""Application factory.
+
+Nothing is built at import time: servers import wsgi.py, `flask` finds
+create_app() itself, and scripts call create_app() when they need an app.
+Routes live in one blueprint module per subsystem (BLUEPRINTS) and the
+Flask-RESTful resources of the cross-cutting subsystems are added by their
+initialize_*_routes functions.
+
+Blueprints can be scaled apart. APP_BLUEPRINTS mounts only some of them, so
+e.g. job browsing and application submission can run as separate
+processes behind the proxy:
+
+    APP_BLUEPRINTS=employments,categories gunicorn -w 8 wsgi:app
+    APP_BLUEPRINTS=applications,fundings gunicorn -w 2 wsgi:app
+
+Within one process WORKER_POOLS gives blueprints, or single endpoints, a
+pool of worker slots of their own (see ratelimit.py):
+
+    WORKER_POOLS=fundings=4,profiles=2,fundingtotalsresource=2
+
+create_app() starts no threads: `flask db upgrade`, `flask export` and
+seed.py build an app too. The background workers (payments, revocation
+sync, deletions, WAL shipping, ...) are started by start_workers(), which
+wsgi.py and `python app.py` call; `flask run` serves without them.
+"""
+import os
+
+import click
+from flask import Flask, jsonify
 from flask_restful import Api
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from models import db, User, Employment, Category, Application, SocialIntegration, Funding, FundingApplication, Donation, DonationType, PaymentMethod, datetime
-from auth import initialize_auth_routes
+from flask_login import LoginManager
 from flask_cors import CORS
+from models import db, User
+from auth import initialize_auth_routes
+from changes import init_change_capture, initialize_change_routes
+from webhooks import init_webhooks
+from tokens import init_tokens, initialize_token_routes
+from ratelimit import init_rate_limiting
+from facets import init_facets, initialize_facet_routes
+from geo import init_geocoding, initialize_geo_routes
+from money import initialize_money_routes
+from archive import init_archival, initialize_archive_routes
+from deletion import init_deletions, initialize_deletion_routes
+from backup import init_backups, initialize_backup_routes
+from export import init_exports, initialize_export_routes
+from batch import initialize_batch_routes
+from idempotency import init_idempotency
+from payments import init_payments, initialize_payment_routes
+from leaderboards import init_leaderboards, initialize_leaderboard_routes
+from review import init_review, initialize_review_routes
+from logs import init_logging
+from profiling import init_profiling, initialize_profiling_routes
+from tracing import span
+import users
+import categories
+import employments
+import social_integrations
+import applications
+import fundings
+import donations
+import profiles
+
+BLUEPRINTS = (users, categories, employments, social_integrations, applications, fundings, donations, profiles)
+
+
+def _pools(value):
+    # "fundings=4,profiles=2" -> {'fundings': 4, 'profiles': 2}
+    pools = {}
+    for item in filter(None, value.split(',')):
+        name, _, slots = item.partition('=')
+        pools[name.strip()] = int(slots)
+    return pools
+
+def _log_levels(value):
+    # "payments=DEBUG,werkzeug=WARNING" -> {'payments': 'DEBUG', 'werkzeug': 'WARNING'}
+    levels = {}
+    for item in filter(None, value.split(',')):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+def _log_rates(value):
+    # "/is_logged_in=0.01" -> {'/is_logged_in': 0.01}
+    rates = {}
+    for item in filter(None, value.split(',')):
+        rule, _, rate = item.partition('=')
+        rates[rule.strip()] = float(rate)
+    return rates
+
+
+class MigrateCommands(click.Group):
+    """`flask db`, importing Flask-Migrate (and with it alembic) on first use.
+
+    Alembic is the slowest import the app has and only migrations need it.
+    """
+
+    def __init__(self, app):
+        super().__init__('db', help='Perform database migrations.')
+        self.app = app
+
+    def _commands(self):
+        if 'migrate' not in self.app.extensions:
+            from flask_migrate import Migrate
+            Migrate(self.app, db)
+        from flask_migrate.cli import db as commands
+        return commands
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # Click runs whatever command the context names, so Flask-Migrate's
+        # group, options and subcommands take over from here
+        return self._commands().make_context(info_name, args, parent=parent, **extra)
+
 
 def create_app():
     app = Flask(__name__)
     CORS(app, supports_credentials=True)  
 
     # Configure your database URI here
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///poverty.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///poverty.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.secret_key = 'go high'  # Set your secret key
-
-    # Initialize the database and Flask-Migrate
+    # Signs sessions and access tokens; every process of a deployment needs the same one
+    app.secret_key = os.environ.get('SECRET_KEY')
+
+    # Partner endpoints receiving change log batches, comma separated
+    app.config['WEBHOOK_ENDPOINTS'] = [url for url in os.environ.get('WEBHOOK_ENDPOINTS', '').split(',') if url]
+    app.config['WEBHOOK_SECRET'] = os.environ.get('WEBHOOK_SECRET')
+
+    # Token buckets per caller; set RATELIMIT_STORE to a sqlite file shared by all workers
+    app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+    app.config['RATELIMIT_STORE'] = os.environ.get('RATELIMIT_STORE')
+
+    # Blueprints this process serves (all when empty) and their own worker pools
+    app.config['APP_BLUEPRINTS'] = [name for name in os.environ.get('APP_BLUEPRINTS', '').split(',') if name]
+    app.config['WORKER_POOLS'] = _pools(os.environ.get('WORKER_POOLS', ''))
+
+    # Cold tier for deleted rows and funding applications decided ARCHIVE_AFTER_DAYS ago
+    # (see archive.py); ARCHIVE_INTERVAL in seconds runs the archival job in the
+    # background, 0 leaves it to `flask archive`
+    app.config['ARCHIVE_DATABASE'] = os.environ.get('ARCHIVE_DATABASE') or os.path.join(app.instance_path, 'archive.db')
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+    app.config['ARCHIVE_INTERVAL'] = float(os.environ.get('ARCHIVE_INTERVAL', 0))
+
+    # Snapshots and shipped WAL segments (see backup.py); BACKUP_WAL_INTERVAL
+    # in seconds turns on WAL shipping for point-in-time restore
+    app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR') or os.path.join(app.instance_path, 'backups')
+    app.config['BACKUP_WAL_INTERVAL'] = float(os.environ.get('BACKUP_WAL_INTERVAL', 0))
+    app.config['BACKUP_PAGES_PER_STEP'] = int(os.environ.get('BACKUP_PAGES_PER_STEP', 256))
+
+    # Parquet/Arrow files for offline reporting, written by `flask export` (see export.py)
+    app.config['EXPORT_DIR'] = os.environ.get('EXPORT_DIR') or os.path.join(app.instance_path, 'exports')
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 50000))
+
+    # Responses to POSTs carrying an Idempotency-Key are replayed for this many seconds
+    app.config['IDEMPOTENCY_TTL'] = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+
+    # Donations are charged by PAYMENT_WORKERS background threads per process (0 leaves it to
+    # other processes), through the gateway set for every payment method, e.g.
+    # "MPESA=mpesa,CREDIT_CARD=stripe,PAYPAL=paypal" (see payments.py). PAYMENT_MOCK_ENABLED=1
+    # lets the simulated gateway stand in for the rest; never in production
+    app.config['PAYMENT_GATEWAYS'] = dict(item.split('=', 1) for item in os.environ.get('PAYMENT_GATEWAYS', '').split(',') if item)
+    app.config['PAYMENT_WORKERS'] = int(os.environ.get('PAYMENT_WORKERS', 4))
+    app.config['PAYMENT_MOCK_ENABLED'] = os.environ.get('PAYMENT_MOCK_ENABLED', '0') == '1'
+    app.config['PAYMENT_MOCK_SECRET'] = os.environ.get('PAYMENT_MOCK_SECRET')
+    app.config['PAYMENT_MOCK_CALLBACK_URL'] = os.environ.get('PAYMENT_MOCK_CALLBACK_URL')
+
+    # JSON log lines on stdout, written by a background thread (see logs.py). LOG_LEVELS sets
+    # levels per logger, e.g. "payments=DEBUG,werkzeug=WARNING"; LOG_SAMPLE keeps that fraction
+    # of the requests to a route, e.g. "/is_logged_in=0.01"
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    app.config['LOG_LEVELS'] = _log_levels(os.environ.get('LOG_LEVELS', ''))
+    app.config['LOG_SAMPLE'] = _log_rates(os.environ.get('LOG_SAMPLE', '/is_logged_in=0.01,/check-session=0.01'))
+    app.config['LOG_ACCESS'] = os.environ.get('LOG_ACCESS', '1') == '1'
+
+    # A TRACE_SAMPLE share of requests is traced to TRACE_EXPORT, a JSON lines file or an
+    # http(s) collector; admins trace or profile single requests with X-Trace: 1 or X-Profile: 1
+    # (see profiling.py). PROFILING_ENABLED=0 takes the hooks out altogether
+    app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '1') == '1'
+    app.config['TRACE_SAMPLE'] = float(os.environ.get('TRACE_SAMPLE', 0))
+    if os.environ.get('TRACE_EXPORT'):
+        app.config['TRACE_EXPORT'] = os.environ['TRACE_EXPORT']
+
+    # User ids allowed on the /admin endpoints, comma separated
+    app.config['ADMIN_USER_IDS'] = {int(user_id) for user_id in os.environ.get('ADMIN_USER_IDS', '').split(',') if user_id}
+
+    # User ids allowed to work the funding application review queue (see review.py)
+    app.config['REVIEWER_USER_IDS'] = {int(user_id) for user_id in os.environ.get('REVIEWER_USER_IDS', '').split(',') if user_id}
+    app.config['REVIEW_LEASE_SECONDS'] = int(os.environ.get('REVIEW_LEASE_SECONDS', 15 * 60))
+
+    # Initialize the database; Flask-Migrate is loaded by `flask db` itself
     db.init_app(app)
-    migrate = Migrate(app, db)
-    
+    app.cli.add_command(MigrateCommands(app))
+
     login_manager = LoginManager()
     login_manager.init_app(app)
-    login_manager.login_view = 'login'
+
+    @login_manager.unauthorized_handler
+    def unauthorized():
+        # An API: no login page to redirect to, for sessions and bearer tokens alike
+        return jsonify({'message': 'Not logged in'}), 401
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        with span('auth.load_user'):
+            return User.query.get(int(user_id))
+
+    mounted = app.config['APP_BLUEPRINTS'] or [module.bp.name for module in BLUEPRINTS]
+    unknown = set(mounted) - {module.bp.name for module in BLUEPRINTS}
+    if unknown:
+        raise ValueError(f"Unknown blueprints in APP_BLUEPRINTS: {', '.join(sorted(unknown))}")
+    for module in BLUEPRINTS:
+        if module.bp.name in mounted:
+            app.register_blueprint(module.bp)
 
     api = Api(app)
     initialize_auth_routes(api)  # Initialize authentication routes
-
+    initialize_change_routes(api)
+    initialize_token_routes(api)
+    initialize_facet_routes(api)
+    initialize_geo_routes(api)
+    initialize_money_routes(api)
+    initialize_archive_routes(api)
+    initialize_deletion_routes(api)
+    initialize_backup_routes(api)
+    initialize_export_routes(api)
+    initialize_batch_routes(api)
+    initialize_payment_routes(api)
+    initialize_leaderboard_routes(api)
+    initialize_review_routes(api)
+    initialize_profiling_routes(api)
+
+    init_logging(app)  # first, so every request has its id before anything else runs
+    init_profiling(app)
+    init_tokens(app, login_manager)
+    init_rate_limiting(app)
+    init_change_capture()
+    init_geocoding()
+    init_webhooks(app)
+    init_archival(app)
+    init_deletions(app)
+    init_backups(app)
+    init_exports(app)
+    init_idempotency(app)
+    init_payments(app)
+    init_leaderboards(app)
+    init_facets(app)
+    init_review(app)
 
     return app
 
-app = create_app()
-
-# Session management functions
-def get_employment_id_for_user(user_id):
-    return session.get(f'employment_id_{user_id}')
-
-def get_funding_id_for_user(user_id):
-    return session.get(f'funding_id_{user_id}')
-
-def set_employment_id_for_user(user_id, employment_id):
-    session[f'employment_id_{user_id}'] = employment_id
-
-def set_funding_id_for_user(user_id, funding_id):
-    session[f'funding_id_{user_id}'] = funding_id
-
-# User routes
-@app.route('/users', methods=['POST'])
-def create_user():
-    data = request.get_json()
-    if not data or not all(key in data for key in ['username', 'email', 'password']):
-        return jsonify({'message': 'Missing required fields!'}), 400
-
-    new_user = User(
-        username=data['username'],
-        email=data['email'],
-        password=generate_password_hash(data['password']),
-        first_name=data.get('first_name'),
-        last_name=data.get('last_name'),
-        profile_picture=data.get('profile_picture')
-    )
-    db.session.add(new_user)
-    db.session.commit()
-    return jsonify({'message': 'User created successfully!', 'user_id': new_user.id}), 201
-
-@app.route('/users', methods=['GET'])
-@login_required
-def get_users():
-    users = User.query.all()
-    return jsonify([
-        {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'profile_picture': user.profile_picture
-        } for user in users
-    ]), 200
-
-@app.route('/users/<int:user_id>', methods=['GET'])
-@login_required
-def get_user(user_id):
-    user = User.query.get(user_id)
-    if user:
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'profile_picture': user.profile_picture
-        }), 200
-    return jsonify({'message': 'User not found!'}), 404 
-
-@app.route('/users/<int:user_id>', methods=['PUT'])
-def update_user(user_id):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found!'}), 404
-
-    data = request.get_json()
-    if 'username' in data:
-        user.username = data['username']
-    if 'email' in data:
-        user.email = data['email']
-    if 'password' in data:
-        user.password = generate_password_hash(data['password'])
-    if 'first_name' in data:
-        user.first_name = data['first_name']
-    if 'last_name' in data:
-        user.last_name = data['last_name']
-    if 'profile_picture' in data:
-        user.profile_picture = data['profile_picture']
-
-    db.session.commit()
-    return jsonify({'message': 'User updated successfully!'}), 200
-
-@app.route('/users/<int:user_id>', methods=['DELETE'])
-def delete_user(user_id):
-    user = User.query.get(user_id)
-    if user:
-        db.session.delete(user)
-        db.session.commit()
-        return jsonify({'message': 'User deleted successfully!'}), 200
-    return jsonify({'message': 'User not found!'}), 404
-
-# Category routes
-@app.route('/categories/<int:id>', methods=['GET'])
-def get_category(id):
-    category = Category.query.get(id)
-    if category:
-        return jsonify({
-            'id': category.id,
-            'name': category.name,
-            'description': category.description,
-        }), 200
-    return jsonify({'message': 'Category not found'}), 404
-
-@app.route('/categories', methods=['GET'])
-def get_categories():
-    categories = Category.query.all()
-    return jsonify([
-        {
-            'id': category.id,
-            'name': category.name,
-            'description': category.description,
-        } for category in categories
-    ]), 200
-
-@app.route('/categories', methods=['POST'])
-def create_category():
-    data = request.get_json()
-    if not data or not all(key in data for key in ['name']):
-        return jsonify({'message': 'Missing required fields!'}), 400
-
-    new_category = Category(
-        name=data['name'],
-        description=data.get('description'),
-        user_id=data.get('user_id')
-    )
-    db.session.add(new_category)
-    db.session.commit()
-    return jsonify({'message': 'Category created successfully!', 'category_id': new_category.id}), 201
-
-@app.route('/categories/<int:id>', methods=['PUT'])
-def update_category(id):
-    category = Category.query.get(id)
-    if not category:
-        return jsonify({'message': 'Category not found!'}), 404
-
-    data = request.get_json()
-    if 'name' in data:
-        category.name = data['name']
-    if 'description' in data:
-        category.description = data['description']
-
-    db.session.commit()
-    return jsonify({'message': 'Category updated successfully!'}), 200
-
-@app.route('/categories/<int:id>', methods=['DELETE'])
-def delete_category(id):
-    category = Category.query.get(id)
-    if category:
-        db.session.delete(category)
-        db.session.commit()
-        return jsonify({'message': 'Category deleted successfully!'}), 200
-    return jsonify({'message': 'Category not found!'}), 404
-
-# Employment routes
-@app.route('/employments', methods=['POST'])
-def create_employment():
-    data = request.get_json()
-    if not data or not all(key in data for key in ['user_id', 'category_id', 'title', 'description']):
-        return jsonify({'message': 'Missing required fields!'}), 400
-
-    employment = Employment(
-        user_id=data['user_id'],
-        category_id=data['category_id'],
-        title=data['title'],
-        description=data['description'],
-        requirements=data.get('requirements'),
-        location=data.get('location'),
-        salary_range=data.get('salary_range')
-    )
-    db.session.add(employment)
-    db.session.commit()
-    return jsonify({'message': 'Employment created successfully!', 'employment_id': employment.id}), 201
-
-@app.route('/employments', methods=['GET'])
-def get_employments():
-    employments = Employment.query.all()
-    return jsonify([
-        {
-            'id': employment.id,
-            'user_id': employment.user_id,
-            'category_id': employment.category_id,
-            'title': employment.title,
-            'description': employment.description,
-            'requirements': employment.requirements,
-            'location': employment.location,
-            'salary_range': employment.salary_range
-        } for employment in employments
-    ]), 200
-
-@app.route('/employments/<int:id>', methods=['GET'])
-def get_employment(id):
-    employment = Employment.query.get(id)
-    if employment:
-        return jsonify({
-            'id': employment.id,
-            'user_id': employment.user_id,
-            'category_id': employment.category_id,
-            'title': employment.title,
-            'description': employment.description,
-            'requirements': employment.requirements,
-            'location': employment.location,
-            'salary_range': employment.salary_range
-        }), 200
-    return jsonify({'message': 'Employment not found!'}), 404
-
-@app.route('/employments/<int:id>', methods=['PUT'])
-def update_employment(id):
-    employment = Employment.query.get(id)
-    if not employment:
-        return jsonify({'message': 'Employment not found!'}), 404
-
-    data = request.get_json()
-    if 'title' in data:
-        employment.title = data['title']
-    if 'description' in data:
-        employment.description = data['description']
-    if 'requirements' in data:
-        employment.requirements = data['requirements']
-    if 'location' in data:
-        employment.location = data['location']
-    if 'salary_range' in data:
-        employment.salary_range = data['salary_range']
-
-    db.session.commit()
-    return jsonify({'message': 'Employment updated successfully!'}), 200
-
-@app.route('/employments/<int:id>', methods=['DELETE'])
-def delete_employment(id):
-    employment = Employment.query.get(id)
-    if employment:
-        db.session.delete(employment)
-        db.session.commit()
-        return jsonify({'message': 'Employment deleted successfully!'}), 200
-    return jsonify({'message': 'Employment not found!'}), 404
-
-from flask import Flask, request, jsonify
-from models import db, SocialIntegration, User, Category  # Assuming these models are in a 'models' module
-
-# Create a Social Integration
-@app.route('/social_integrations', methods=['POST'])
-def create_social_integration():
-    data = request.get_json()
-    if not data or not all(key in data for key in ['user_id', 'category_id', 'association_name', 'description']):
-        return jsonify({'message': 'Missing required fields!'}), 400
-
-    new_social_integration = SocialIntegration(
-        user_id=data['user_id'],
-        category_id=data['category_id'],
-        association_name=data['association_name'],
-        description=data['description']
-    )
-    db.session.add(new_social_integration)
-    db.session.commit()
-    return jsonify({'message': 'Social Integration created successfully!', 'id': new_social_integration.id}), 201
-
-# Get All Social Integrations
-@app.route('/social_integrations', methods=['GET'])
-def get_social_integrations():
-    social_integrations = SocialIntegration.query.all()
-    return jsonify([
-        {
-            'id': social_integration.id,
-            'user_id': social_integration.user_id,
-            'category_id': social_integration.category_id,
-            'association_name': social_integration.association_name,
-            'description': social_integration.description
-        } for social_integration in social_integrations
-    ]), 200
-
-# Get a Single Social Integration by ID
-@app.route('/social_integrations/<int:id>', methods=['GET'])
-def get_social_integration(id):
-    social_integration = SocialIntegration.query.get(id)
-    if social_integration:
-        return jsonify({
-            'id': social_integration.id,
-            'user_id': social_integration.user_id,
-            'category_id': social_integration.category_id,
-            'association_name': social_integration.association_name,
-            'description': social_integration.description
-        }), 200
-    return jsonify({'message': 'Social Integration not found!'}), 404
-
-# Update a Social Integration
-@app.route('/social_integrations/<int:id>', methods=['PUT'])
-def update_social_integration(id):
-    social_integration = SocialIntegration.query.get(id)
-    if not social_integration:
-        return jsonify({'message': 'Social Integration not found!'}), 404
-
-    data = request.get_json()
-    if 'user_id' in data:
-        social_integration.user_id = data['user_id']
-    if 'category_id' in data:
-        social_integration.category_id = data['category_id']
-    if 'association_name' in data:
-        social_integration.association_name = data['association_name']
-    if 'description' in data:
-        social_integration.description = data['description']
-    if 'interested' in data:
-        social_integration.interested = data['interested']
-    if 'saved' in data:
-        social_integration.saved = data['saved']
-
-    db.session.commit()
-    return jsonify({'message': 'Social Integration updated successfully!'}), 200
-
-
-# Delete a Social Integration
-@app.route('/social_integrations/<int:id>', methods=['DELETE'])
-def delete_social_integration(id):
-    social_integration = SocialIntegration.query.get(id)
-    if social_integration:
-        db.session.delete(social_integration)
-        db.session.commit()
-        return jsonify({'message': 'Social Integration deleted successfully!'}), 200
-    return jsonify({'message': 'Social Integration not found!'}), 404
-
-# Application routes
-@app.route('/applications', methods=['POST'])
-def create_application():
-    data = request.get_json()
-    required_fields = ['name', 'phone_number', 'email', 'cover_letter', 'resume', 'linkedin', 'portfolio']
-    
-    if not data or not all(key in data for key in required_fields):
-        return jsonify({'message': 'Missing required fields!'}), 400
-    
-    # Retrieve `user_id` from session
-    user_id = session.get('user_id')  # Retrieve user ID from session
-    if not user_id:
-        return jsonify({'message': 'User not logged in!'}), 401
-
-    # Retrieveing `employment_id` from data based on the user's context
-    employment_id = get_employment_id_for_user(user_id)  # function to fetch employment ID
-    if not employment_id:
-        return jsonify({'message': 'Employment ID not found in session!'}), 400
-    
-    new_application = Application(
-        user_id=data['user_id'],
-        employment_id=data['employment_id'],
-        name=data['name'],
-        phone_number=data['phone_number'],
-        email=data['email'],
-        cover_letter=data['cover_letter'],
-        resume=data['resume'],
-        linkedin=data.get('linkedin'),
-        portfolio=data.get('portfolio')
-    )
-    db.session.add(new_application)
-    db.session.commit()
-    return jsonify({'message': 'Application created successfully!', 'application_id': new_application.id}), 201
-
-@app.route('/applications/<int:application_id>', methods=['GET'])
-def get_application(application_id):
-    application = Application.query.get(application_id)
-    if application:
-        return jsonify({
-            'id': application.id,
-            'user_id': application.user_id,
-            'employment_id': application.employment_id,
-            'name': application.name,
-            'phone_number': application.phone_number,
-            'email': application.email,
-            'cover_letter': application.cover_letter,
-            'resume': application.resume,
-            'linkedin': application.linkedin,
-            'portfolio': application.portfolio
-        }), 200
-    return jsonify({'message': 'Application not found!'}), 404
-
-@app.route('/applications', methods=['GET'])
-def get_all_applications():
-    applications = Application.query.all()
-    return jsonify([
-        {
-            'id': app.id,
-            'user_id': app.user_id,
-            'employment_id': app.employment_id,
-            'name': app.name,
-            'phone_number': app.phone_number,
-            'email': app.email,
-            'cover_letter': app.cover_letter,
-            'resume': app.resume,
-            'linkedin': app.linkedin,
-            'portfolio': app.portfolio
-        } for app in applications
-    ]), 200
-
-@app.route('/applications/<int:application_id>', methods=['PUT'])
-def update_application(application_id):
-    application = Application.query.get(application_id)
-    if not application:
-        return jsonify({'message': 'Application not found!'}), 404
-    
-    data = request.get_json()
-    
-    if 'user_id' in data:
-        application.user_id = data['user_id']
-    if 'employment_id' in data:
-        application.employment_id = data['employment_id']
-    if 'name' in data:
-        application.name = data['name']
-    if 'phone_number' in data:
-        application.phone_number = data['phone_number']
-    if 'email' in data:
-        application.email = data['email']
-    if 'cover_letter' in data:
-        application.cover_letter = data['cover_letter']
-    if 'resume' in data:
-        application.resume = data['resume']
-    if 'linkedin' in data:
-        application.linkedin = data['linkedin']
-    if 'portfolio' in data:
-        application.portfolio = data['portfolio']
-
-    db.session.commit()
-    return jsonify({'message': 'Application updated successfully!'}), 200
-
-@app.route('/applications/<int:application_id>', methods=['DELETE'])
-def delete_application(application_id):
-    application = Application.query.get(application_id)
-    if application:
-        db.session.delete(application)
-        db.session.commit()
-        return jsonify({'message': 'Application deleted successfully!'}), 200
-    return jsonify({'message': 'Application not found!'}), 404
-
-# Funding routes
-@app.route('/fundings', methods=['POST'])
-def create_funding():
-    data = request.get_json()
-    if not data or not all(key in data for key in ['category_id', 'grant_name', 'grant_type', 'amount']):
-        return jsonify({'message': 'Missing required fields!'}), 400
-
-    new_funding = Funding(
-        category_id=data['category_id'],
-        grant_name=data['grant_name'],
-        grant_type=data['grant_type'],
-        amount=data['amount'],
-        description=data.get('description'),
-        eligibility_criteria=data.get('eligibility_criteria')
-    )
-    db.session.add(new_funding)
-    db.session.commit()
-    return jsonify({'message': 'Funding created successfully!', 'funding_id': new_funding.id}), 201
-
-@app.route('/fundings', methods=['GET'])
-def get_fundings():
-    fundings = Funding.query.all()
-    return jsonify([
-        {
-            'id': funding.id,
-            'category_id': funding.category_id,
-            'grant_name': funding.grant_name,
-            'grant_type': funding.grant_type.value,
-            'amount': funding.amount,
-            'description': funding.description,
-            'eligibility_criteria': funding.eligibility_criteria
-        } for funding in fundings
-    ]), 200
-
-@app.route('/fundings/<int:id>', methods=['GET'])
-def get_funding(id):
-    funding = Funding.query.get(id)
-    if funding:
-        return jsonify({
-            'id': funding.id,
-            'category_id': funding.category_id,
-            'grant_name': funding.grant_name,
-            'grant_type': funding.grant_type.value,
-            'amount': funding.amount,
-            'description': funding.description,
-            'eligibility_criteria': funding.eligibility_criteria
-        }), 200
-    return jsonify({'message': 'Funding not found!'}), 404
-
-@app.route('/fundings/<int:id>', methods=['PUT'])
-def update_funding(id):
-    funding = Funding.query.get(id)
-    if not funding:
-        return jsonify({'message': 'Funding not found!'}), 404
-
-    data = request.get_json()
-    if 'category_id' in data:
-        funding.category_id = data['category_id']
-    if 'grant_name' in data:
-        funding.grant_name = data['grant_name']
-    if 'grant_type' in data:
-        funding.grant_type = data['grant_type']
-    if 'amount' in data:
-        funding.amount = data['amount']
-    if 'description' in data:
-        funding.description = data['description']
-    if 'eligibility_criteria' in data:
-        funding.eligibility_criteria = data['eligibility_criteria']
-
-    db.session.commit()
-    return jsonify({'message': 'Funding updated successfully!'}), 200
-
-@app.route('/fundings/<int:id>', methods=['DELETE'])
-def delete_funding(id):
-    funding = Funding.query.get(id)
-    if funding:
-        db.session.delete(funding)
-        db.session.commit()
-        return jsonify({'message': 'Funding deleted successfully!'}), 200
-    return jsonify({'message': 'Funding not found!'}), 404
-
-# FundingApplication routes
-@app.route('/funding_applications', methods=['POST'])
-def create_funding_application():
-    data = request.get_json()
-    if not data or not all(key in data for key in ['status', 'application_type']):
-        return jsonify({'message': 'Missing required fields!'}), 400
-    
-    # Retrieve `user_id` from session
-    user_id = session.get('user_id')  # Example: Retrieve user ID from session
-    if not user_id:
-        return jsonify({'message': 'User not logged in!'}), 401
-
-    # Retrieveing `funding_id` from data based on the user's context
-    funding_id = get_funding_id_for_user(user_id)  # function to fetch funding ID
-    if not funding_id:
-        return jsonify({'message': 'Funding ID not found in session!'}), 400
-    
-    new_funding_application = FundingApplication(
-        user_id=data['user_id'],
-        funding_id=data['funding_id'],
-        status=data['status'],
-        application_type=data['application_type'],
-        supporting_documents=data.get('supporting_documents'),
-        household_income=data.get('household_income'),
-        number_of_dependents=data.get('number_of_dependents'),
-        reason_for_aid=data.get('reason_for_aid'),
-        concept_note=data.get('concept_note'),
-        business_profile=data.get('business_profile')
-    )
-    db.session.add(new_funding_application)
-    db.session.commit()
-    return jsonify({'message': 'Funding application created successfully!', 'funding_application_id': new_funding_application.id}), 201
-
-@app.route('/funding_applications', methods=['GET'])
-def get_funding_applications():
-    funding_applications = FundingApplication.query.all()
-    return jsonify([
-        {
-            'id': funding_app.id,
-            'user_id': funding_app.user_id,
-            'funding_id': funding_app.funding_id,
-            'status': funding_app.status.value,
-            'application_type': funding_app.application_type.value,
-            'supporting_documents': funding_app.supporting_documents,
-            'household_income': funding_app.household_income,
-            'number_of_dependents': funding_app.number_of_dependents,
-            'reason_for_aid': funding_app.reason_for_aid,
-            'concept_note': funding_app.concept_note,
-            'business_profile': funding_app.business_profile
-        } for funding_app in funding_applications
-    ]), 200
-
-@app.route('/funding_applications/<int:id>', methods=['GET'])
-def get_funding_application(id):
-    funding_application = FundingApplication.query.get(id)
-    if funding_application:
-        return jsonify({
-            'id': funding_application.id,
-            'user_id': funding_application.user_id,
-            'funding_id': funding_application.funding_id,
-            'status': funding_application.status.value,
-            'application_type': funding_application.application_type.value,
-            'supporting_documents': funding_application.supporting_documents,
-            'household_income': funding_application.household_income,
-            'number_of_dependents': funding_application.number_of_dependents,
-            'reason_for_aid': funding_application.reason_for_aid,
-            'concept_note': funding_application.concept_note,
-            'business_profile': funding_application.business_profile
-        }), 200
-    return jsonify({'message': 'Funding application not found!'}), 404
-
-@app.route('/funding_applications/<int:id>', methods=['PUT'])
-def update_funding_application(id):
-    funding_application = FundingApplication.query.get(id)
-    if not funding_application:
-        return jsonify({'message': 'Funding application not found!'}), 404
-
-    data = request.get_json()
-    if 'status' in data:
-        funding_application.status = data['status']
-    if 'application_type' in data:
-        funding_application.application_type = data['application_type']
-    if 'supporting_documents' in data:
-        funding_application.supporting_documents = data['supporting_documents']
-    if 'household_income' in data:
-        funding_application.household_income = data['household_income']
-    if 'number_of_dependents' in data:
-        funding_application.number_of_dependents = data['number_of_dependents']
-    if 'reason_for_aid' in data:
-        funding_application.reason_for_aid = data['reason_for_aid']
-    if 'concept_note' in data:
-        funding_application.concept_note = data['concept_note']
-    if 'business_profile' in data:
-        funding_application.business_profile = data['business_profile']
-
-    db.session.commit()
-    return jsonify({'message': 'Funding application updated successfully!'}), 200
-
-@app.route('/funding_applications/<int:id>', methods=['DELETE'])
-def delete_funding_application(id):
-    funding_application = FundingApplication.query.get(id)
-    if funding_application:
-        db.session.delete(funding_application)
-        db.session.commit()
-        return jsonify({'message': 'Funding application deleted successfully!'}), 200
-    return jsonify({'message': 'Funding application not found!'}), 404
-
-#Donations routes
-@app.route('/donations', methods=['POST'])
-def create_donation():
-    data = request.json
-
-    donation = Donation(
-        user_id=data.get('user_id'),
-        donation_type=DonationType(data['donation_type']),
-        name=data.get('name'),
-        organisation_name=data.get('organisation_name'),
-        amount=data['amount'],
-        payment_method=PaymentMethod(data['payment_method']),
-        donation_date=datetime.utcnow()
-    )
-
-    db.session.add(donation)
-    db.session.commit()
-
-    return jsonify({"message": "Donation added successfully!", "donation_id": donation.donation_id}), 201
-
-@app.route('/donations', methods=['GET'])
-def get_donations():
-    donations = Donation.query.all()
-    return jsonify([
-        {
-            'donation_id': donation.donation_id,
-            'user_id': donation.user_id,
-            'donation_type': donation.donation_type.value,
-            'name': donation.name,
-            'organisation_name': donation.organisation_name,
-            'amount': donation.amount,
-            'payment_method': donation.payment_method.value,
-            'donation_date': donation.donation_date
-        } for donation in donations
-    ]), 200
-
-@app.route('/donations/<int:donation_id>', methods=['GET'])
-def get_donation(donation_id):
-    donation = Donation.query.get_or_404(donation_id)
-    return jsonify(
-        {
-            'donation_id': donation.donation_id,
-            'user_id': donation.user_id,
-            'donation_type': donation.donation_type.value,
-            'name': donation.name,
-            'organisation_name': donation.organisation_name,
-            'amount': donation.amount,
-            'payment_method': donation.payment_method.value,
-            'donation_date': donation.donation_date
-        }
-    ), 200
-
-@app.route('/donations/<int:donation_id>', methods=['PUT'])
-def update_donation(donation_id):
-    donation = Donation.query.get_or_404(donation_id)
-    data = request.json
-
-    donation.donation_type = DonationType(data['donation_type'])
-    donation.name = data.get('name', donation.name)
-    donation.organisation_name = data.get('organisation_name', donation.organisation_name)
-    donation.amount = data['amount']
-    donation.payment_method = PaymentMethod(data['payment_method'])
-    donation.donation_date = datetime.utcnow()
-
-    db.session.commit()
-
-    return jsonify({"message": "Donation updated successfully!"}), 200
-
-@app.route('/donations/<int:donation_id>', methods=['DELETE'])
-def delete_donation(donation_id):
-    donation = Donation.query.get_or_404(donation_id)
-    db.session.delete(donation)
-    db.session.commit()
-    return jsonify({"message": "Donation deleted successfully!"}), 200
-
-@app.route('/profile/<int:user_id>', methods=['GET'])
-def get_user_profile(user_id):
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-
-    user_profile = {
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'profile_picture': user.profile_picture,
-        'employments': [
-            {
-                'id': emp.id,
-                'title': emp.title,
-                'description': emp.description,
-                'location': emp.location,
-                'salary_range': emp.salary_range,
-            } for emp in user.employments
-        ] or "N/A",
-        'applications': [
-            {
-                'id': app.id,
-                'employment_id': app.employment_id,
-                'status': app.status.value,
-                'name': app.name,
-                'phone_number': app.phone_number,
-                'email': app.email,
-                'cover_letter': app.cover_letter,
-                'resume': app.resume,
-                'linkedin': app.linkedin,
-                'portfolio': app.portfolio,
-            } for app in user.applications
-        ] or "N/A",
-        'social_integrations': [
-            {
-                'id': si.id,
-                'association_name': si.association_name,
-                'description': si.description,
-            } for si in user.social_integrations
-        ] or "N/A",
-        'funding_applications': [
-            {
-                'id': fa.id,
-                'funding_id': fa.funding_id,
-                'status': fa.status.value,
-                'application_type': fa.application_type.value,
-                'supporting_documents': fa.supporting_documents,
-                'household_income': fa.household_income,
-                'number_of_dependents': fa.number_of_dependents,
-                'reason_for_aid': fa.reason_for_aid,
-                'concept_note': fa.concept_note,
-                'business_profile': fa.business_profile,
-            } for fa in user.funding_applications
-        ] or "N/A",
-        'donations': [
-            {
-                'donation_id': don.donation_id,
-                'donation_type': don.donation_type.value,
-                'name': don.name,
-                'organisation_name': don.organisation_name,
-                'amount': don.amount,
-                'payment_method': don.payment_method.value,
-                'donation_date': don.donation_date.strftime('%Y-%m-%d %H:%M:%S'),
-            } for don in user.donations
-        ] or "N/A"
-    }
-
-    return jsonify(user_profile)
+def start_workers(app):
+    """Start the background threads the subsystems registered, in the process that serves requests."""
+    for worker in app.extensions.get('workers', []):
+        worker.start()
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    start_workers(create_app()).run(debug=True)
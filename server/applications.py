@@ -0,0 +1,126 @@
+"""Job applications."""
+from flask import Blueprint, request, jsonify, session
+from sqlalchemy.orm import selectinload
+from models import db, Application
+from conditional import not_modified, with_validators, filter_updated_since, conditional_update, failed_update, with_etag
+from filters import FilterError, filter_ids, parse_expand, expand
+from batch import register_loader
+from idempotency import idempotent
+from validation import Schema, String, Integer, URL_LENGTH, TEXT_LENGTH, EMAIL, validated
+import users
+import employments
+
+bp = Blueprint('applications', __name__)
+
+def serialize_application(application):
+    return {
+        'id': application.id,
+        'user_id': application.user_id,
+        'employment_id': application.employment_id,
+        'name': application.name,
+        'phone_number': application.phone_number,
+        'email': application.email,
+        'cover_letter': application.cover_letter,
+        'resume': application.resume,
+        'linkedin': application.linkedin,
+        'portfolio': application.portfolio,
+        'updated_at': application.updated_at.isoformat()
+    }
+
+# Related rows ?expand= can embed in the listing
+EXPANSIONS = {
+    'employment': (Application.employment_id, employments.COMPACT_COLUMNS, employments.compact_employment),
+    'user': (Application.user_id, users.COMPACT_COLUMNS, users.compact_user),
+}
+
+# Session management functions
+def get_employment_id_for_user(user_id):
+    return session.get(f'employment_id_{user_id}')
+
+def set_employment_id_for_user(user_id, employment_id):
+    session[f'employment_id_{user_id}'] = employment_id
+
+APPLICATION = Schema(
+    user_id=Integer(required=True, min=1),
+    employment_id=Integer(required=True, min=1),
+    name=String(required=True, min_length=1),
+    phone_number=String(required=True, min_length=1, max_length=32),
+    email=String(required=True, pattern=EMAIL),
+    cover_letter=String(required=True, max_length=TEXT_LENGTH),
+    resume=String(required=True, max_length=URL_LENGTH),
+    linkedin=String(required=True, max_length=URL_LENGTH),
+    portfolio=String(required=True, max_length=URL_LENGTH),
+)
+APPLICATION_UPDATE = APPLICATION.partial()
+
+@bp.route('/applications', methods=['POST'])
+@validated(APPLICATION)
+@idempotent
+def create_application(data):
+    # Retrieve `user_id` from session
+    user_id = session.get('user_id')  # Retrieve user ID from session
+    if not user_id:
+        return jsonify({'message': 'User not logged in!'}), 401
+
+    # Retrieveing `employment_id` from data based on the user's context
+    employment_id = get_employment_id_for_user(user_id)  # function to fetch employment ID
+    if not employment_id:
+        return jsonify({'message': 'Employment ID not found in session!'}), 400
+    
+    new_application = Application(
+        user_id=data['user_id'],
+        employment_id=data['employment_id'],
+        name=data['name'],
+        phone_number=data['phone_number'],
+        email=data['email'],
+        cover_letter=data['cover_letter'],
+        resume=data['resume'],
+        linkedin=data.get('linkedin'),
+        portfolio=data.get('portfolio')
+    )
+    db.session.add(new_application)
+    db.session.commit()
+    return jsonify({'message': 'Application created successfully!', 'application_id': new_application.id}), 201
+
+@bp.route('/applications/<int:application_id>', methods=['GET'])
+def get_application(application_id):
+    application = Application.query.get(application_id)
+    if application:
+        cached = not_modified(application)
+        if cached:
+            return cached
+        return with_validators(jsonify(serialize_application(application)), application), 200
+    return jsonify({'message': 'Application not found!'}), 404
+
+register_loader('applications.get_application', Application, serialize_application, 'Application not found!',
+                options=(selectinload(Application.text),))
+
+@bp.route('/applications', methods=['GET'])
+def get_all_applications():
+    try:
+        expansions = parse_expand(request.args, EXPANSIONS)
+        query = filter_updated_since(Application.query.options(selectinload(Application.text)), Application)
+        applications = filter_ids(query, Application, request.args).all()
+    except FilterError as e:
+        return jsonify({'message': str(e)}), 400
+    except ValueError:
+        return jsonify({'message': 'updated_since must be an ISO 8601 timestamp!'}), 400
+    serialized = [serialize_application(application) for application in applications]
+    return jsonify(expand(applications, serialized, expansions, EXPANSIONS)), 200
+
+@bp.route('/applications/<int:application_id>', methods=['PUT'])
+@validated(APPLICATION_UPDATE)
+def update_application(application_id, data):
+    etag = conditional_update(Application, application_id, data)
+    if not etag:
+        return failed_update(Application, application_id, 'Application not found!')
+    return with_etag(jsonify({'message': 'Application updated successfully!'}), etag), 200
+
+@bp.route('/applications/<int:application_id>', methods=['DELETE'])
+def delete_application(application_id):
+    application = Application.query.get(application_id)
+    if application:
+        application.soft_delete()  # moved to the archive later, see archive.py
+        db.session.commit()
+        return jsonify({'message': 'Application deleted successfully!'}), 200
+    return jsonify({'message': 'Application not found!'}), 404
@@ -0,0 +1,308 @@
+"""Cold tier for postings and applications nobody works on any more.
+
+Deleting an employment, application or funding application only flags it
+(see SoftDeleteMixin). The archival job then moves cold rows out of the hot
+tables into a separate SQLite file, together with their side table text:
+
+- employments deleted, along with every application to them. A posting
+  has no closed or filled state besides that, so one that is still live
+  stays in the hot table however long ago it was edited: it is open, and
+  its applications are waiting for an answer
+- applications deleted
+- funding applications deleted, or APPROVED/DENIED and not updated for
+  ARCHIVE_AFTER_DAYS
+
+The archive file is only attached to a connection while the job or an
+/archive endpoint uses it, so hot queries never pay for it:
+
+    GET /archive/employments?user_id=7
+    GET /archive/employments/<id>
+    GET /archive/applications?employment_id=12
+    GET /archive/funding_applications?user_id=7&funding_id=3
+
+Run the job with `flask archive`, or set ARCHIVE_INTERVAL to have every
+worker run it in the background. Rows are moved in batches, each in its
+own transaction, with INSERT OR REPLACE into the archive before the
+DELETE from the hot table, so a run interrupted halfway is finished by the
+next one. Rows that were still live get a delete entry in the change log
+when they leave, so partners and the facet index drop them too.
+"""
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request
+from flask_restful import Resource
+from sqlalchemy import MetaData, Table, Column, Index, DateTime, select, insert, delete, literal, or_, and_
+from models import (db, location_name, ChangeLog, Employment, EmploymentText, Application, ApplicationText,
+                    FundingApplication, FundingApplicationText, ApplicationStatus)
+from money import to_json
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = 'archive'
+DEFAULT_AFTER_DAYS = 180
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+TERMINAL_STATUSES = (ApplicationStatus.APPROVED, ApplicationStatus.DENIED)
+
+# Columns the /archive endpoints filter on
+_INDEXED = ('user_id', 'employment_id', 'funding_id')
+
+archive_metadata = MetaData(schema=SCHEMA)
+
+def _archive_table(table):
+    """Same columns as table, without constraints, plus archived_at."""
+    columns = [Column(column.name, column.type, primary_key=column.primary_key) for column in table.columns]
+    archived = Table(table.name, archive_metadata, *columns, Column('archived_at', DateTime, nullable=False))
+    for name in _INDEXED:
+        if name in archived.c and not archived.c[name].primary_key:
+            Index(f'ix_{table.name}_{name}', archived.c[name])
+    return archived
+
+ARCHIVE_TABLES = {
+    model.__table__.name: _archive_table(model.__table__)
+    for model in (Employment, EmploymentText, Application, ApplicationText, FundingApplication, FundingApplicationText)
+}
+
+# Hot model, its text side table and the side table's key column
+_OWNERS = {
+    'employment': (Employment, EmploymentText, 'employment_id'),
+    'application': (Application, ApplicationText, 'application_id'),
+    'funding_application': (FundingApplication, FundingApplicationText, 'funding_application_id'),
+}
+
+_created = set()
+
+@contextmanager
+def attached_archive(path=None):
+    """A connection with the archive file attached as schema "archive"."""
+    path = path or current_app.config['ARCHIVE_DATABASE']
+    with db.engine.connect() as connection:
+        # ATTACH is refused inside a transaction; pysqlite has not begun one
+        # yet because nothing has been written.
+        connection.exec_driver_sql(f'ATTACH DATABASE ? AS {SCHEMA}', (path,))
+        connection.commit()
+        try:
+            if path not in _created:
+                archive_metadata.create_all(connection)
+                connection.commit()
+                _created.add(path)
+            yield connection
+        finally:
+            connection.rollback()
+            connection.exec_driver_sql(f'DETACH DATABASE {SCHEMA}')
+            connection.commit()
+
+
+# Moving rows
+
+def _move(connection, hot, key, ids, archived_at):
+    cold = ARCHIVE_TABLES[hot.name]
+    names = [column.name for column in hot.columns]
+    connection.execute(
+        insert(cold).prefix_with('OR REPLACE').from_select(
+            names + ['archived_at'], select(*hot.columns, literal(archived_at, DateTime)).where(hot.c[key].in_(ids))
+        )
+    )
+    connection.execute(delete(hot).where(hot.c[key].in_(ids)))
+
+def _move_owners(connection, table_name, ids, archived_at):
+    """Move owner rows and their text; returns the ids that were still live."""
+    model, side_model, side_key = _OWNERS[table_name]
+    table = model.__table__
+    live = connection.execute(select(table.c.id).where(table.c.id.in_(ids), table.c.deleted_at.is_(None))).scalars().all()
+    _move(connection, side_model.__table__, side_key, ids, archived_at)
+    _move(connection, table, 'id', ids, archived_at)
+    if live:
+        # Soft deletes were already published when they happened
+        connection.execute(ChangeLog.__table__.insert(), [{
+            'table_name': table_name,
+            'row_id': row_id,
+            'operation': 'delete',
+            'changes': json.dumps({'fields': [], 'values': {}, 'archived': True}),
+            'created_at': archived_at,
+        } for row_id in live])
+    return live
+
+def _cold_ids(connection, table, condition, batch_size):
+    return connection.execute(select(table.c.id).where(condition).order_by(table.c.id).limit(batch_size)).scalars().all()
+
+def run_archival(after_days=None, batch_size=None, path=None):
+    """Move every cold row to the archive; returns the number moved per table."""
+    config = current_app.config
+    if after_days is None:
+        after_days = config.get('ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS)
+    batch_size = batch_size or config.get('ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    employment = Employment.__table__
+    application = Application.__table__
+    funding_application = FundingApplication.__table__
+    moved = {'employment': 0, 'application': 0, 'funding_application': 0}
+
+    with attached_archive(path) as connection:
+        # Applications follow their employment, so neither tier has
+        # applications to a posting it does not hold.
+        cold_employments = employment.c.deleted_at.is_not(None)
+        while True:
+            with connection.begin():
+                now = datetime.utcnow()
+                ids = _cold_ids(connection, employment, cold_employments, batch_size)
+                if not ids:
+                    break
+                application_ids = connection.execute(
+                    select(application.c.id).where(application.c.employment_id.in_(ids))
+                ).scalars().all()
+                if application_ids:
+                    _move_owners(connection, 'application', application_ids, now)
+                _move_owners(connection, 'employment', ids, now)
+            moved['employment'] += len(ids)
+            moved['application'] += len(application_ids)
+
+        batches = (
+            ('application', application, application.c.deleted_at.is_not(None)),
+            ('funding_application', funding_application, or_(
+                funding_application.c.deleted_at.is_not(None),
+                and_(funding_application.c.status.in_(TERMINAL_STATUSES), funding_application.c.updated_at < cutoff),
+            )),
+        )
+        for table_name, table, condition in batches:
+            while True:
+                with connection.begin():
+                    ids = _cold_ids(connection, table, condition, batch_size)
+                    if not ids:
+                        break
+                    _move_owners(connection, table_name, ids, datetime.utcnow())
+                moved[table_name] += len(ids)
+
+    if any(moved.values()):
+        logger.info('Archived %s', ', '.join(f'{count} {table}' for table, count in moved.items() if count))
+    return moved
+
+
+class Archiver:
+    """Runs the archival job every interval seconds in a daemon thread."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='archiver', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    run_archival()
+                except Exception:
+                    logger.exception('Archival run failed')
+
+
+# Reading the archive
+
+def _limit_offset():
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        raise ValueError('limit and offset must be numbers!')
+    return limit, offset
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return getattr(value, 'value', value)  # enums
+
+def _serialize(row):
+    result = {}
+    for key, value in row._mapping.items():
+        if key == 'location_id':
+            result['location'] = location_name(value)
+        elif key == 'salary_minor':
+            result['salary_range'] = to_json(value, row.salary_currency)
+        elif key not in ('version', 'latitude', 'longitude', 'geohash'):
+            result[key] = _plain(value)
+    return result
+
+class ArchivedResource(Resource):
+    table_name = None
+    filters = ()
+    not_found = 'Not found in the archive!'
+
+    def _query(self):
+        model, side_model, side_key = _OWNERS[self.table_name]
+        table, side = ARCHIVE_TABLES[self.table_name], ARCHIVE_TABLES[side_model.__table__.name]
+        text_columns = [side.c[name] for name in model.TEXT_FIELDS]
+        return table, select(table, *text_columns).outerjoin(side, side.c[side_key] == table.c.id)
+
+    def get(self, id=None):
+        table, query = self._query()
+        if id is not None:
+            with attached_archive() as connection:
+                row = connection.execute(query.where(table.c.id == id)).first()
+            if row is None:
+                return {'message': self.not_found}, 404
+            return _serialize(row), 200
+
+        try:
+            limit, offset = _limit_offset()
+            for name in self.filters:
+                if name in request.args:
+                    query = query.where(table.c[name] == int(request.args[name]))
+        except ValueError:
+            return {'message': f"limit, offset and {', '.join(self.filters)} must be numbers!"}, 400
+        with attached_archive() as connection:
+            rows = connection.execute(query.order_by(table.c.id.desc()).limit(limit).offset(offset)).all()
+        return [_serialize(row) for row in rows], 200
+
+class ArchivedEmploymentsResource(ArchivedResource):
+    table_name = 'employment'
+    filters = ('user_id', 'category_id')
+    not_found = 'Employment not found in the archive!'
+
+class ArchivedApplicationsResource(ArchivedResource):
+    table_name = 'application'
+    filters = ('user_id', 'employment_id')
+    not_found = 'Application not found in the archive!'
+
+class ArchivedFundingApplicationsResource(ArchivedResource):
+    table_name = 'funding_application'
+    filters = ('user_id', 'funding_id')
+    not_found = 'Funding application not found in the archive!'
+
+
+def init_archival(app):
+    @app.cli.command('archive')
+    @click.option('--after-days', type=int, default=None, help='Age at which decided funding applications count as cold.')
+    def archive_command(after_days):
+        """Move deleted and cold rows to the archive database."""
+        moved = run_archival(after_days=after_days)
+        click.echo(', '.join(f'{count} {table}' for table, count in moved.items()))
+
+    interval = app.config.get('ARCHIVE_INTERVAL')
+    if interval:
+        archiver = Archiver(app, interval)
+        app.extensions['archiver'] = archiver
+        app.extensions.setdefault('workers', []).append(archiver)
+        return archiver
+    return None
+
+def initialize_archive_routes(api):
+    api.add_resource(ArchivedEmploymentsResource, '/archive/employments', '/archive/employments/<int:id>')
+    api.add_resource(ArchivedApplicationsResource, '/archive/applications', '/archive/applications/<int:id>')
+    api.add_resource(ArchivedFundingApplicationsResource, '/archive/funding_applications', '/archive/funding_applications/<int:id>')
@@ -1,12 +1,42 @@
-from flask import request, jsonify, Blueprint, session
+import logging
+from functools import wraps
+
+from flask import request, jsonify, Blueprint, session, current_app
 from flask_restful import Resource
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import db
 from models import User
+from tokens import TOKENS_UNAVAILABLE, issue_tokens, tokens_available, revoke_family, revoke_refresh_token, current_token_claims
 
 auth = Blueprint('auth', __name__)
 
+logger = logging.getLogger(__name__)
+
+def admin_required(f):
+    # Admins are listed by user id in ADMIN_USER_IDS; works for session and
+    # bearer token logins alike.
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return {'message': 'Not logged in'}, 401
+        if int(current_user.id) not in current_app.config.get('ADMIN_USER_IDS', ()):
+            return {'message': 'Admins only'}, 403
+        return f(*args, **kwargs)
+    return decorated
+
+def reviewer_required(f):
+    # Reviewers are listed in REVIEWER_USER_IDS; admins may review too
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return {'message': 'Not logged in'}, 401
+        reviewers = current_app.config.get('REVIEWER_USER_IDS', set()) | current_app.config.get('ADMIN_USER_IDS', set())
+        if int(current_user.id) not in reviewers:
+            return {'message': 'Reviewers only'}, 403
+        return f(*args, **kwargs)
+    return decorated
+
 class LoginResource(Resource):
     def post(self):
         try:
@@ -15,34 +45,40 @@ class LoginResource(Resource):
             password = data.get('password')
            
             user = User.query.filter_by(email=email).first()
-            print(f"Attempting to log in user: {email}")
+            # No emails in the logs; the request id ties these to the access record
             if not user:
-                print("User not found")
+                logger.info('Login failed', extra={'reason': 'unknown_email'})
                 return {'message': 'Invalid email or password'}, 401
            
             if not check_password_hash(user.password, password):
-                print("Password does not match")
+                logger.info('Login failed', extra={'reason': 'bad_password', 'user_id': user.id})
                 return {'message': 'Invalid email or password'}, 401
-           
+
+            if data.get('issue_tokens') and not tokens_available():
+                return {'message': TOKENS_UNAVAILABLE}, 503
+
             login_user(user)
-            print("User logged in successfully")
+            logger.info('Login succeeded', extra={'user_id': user.id})
             user_id = session.get('user_id')
-            return {
+            response = {
                 'message': 'Logged in successfully',
                 'profile_picture': user.profile_picture  # Include profile picture if exists
-            }, 200
+            }
+            if data.get('issue_tokens'):
+                response.update(issue_tokens(user.id))  # For clients that want bearer tokens too
+            return response, 200
         except Exception as e:
-            print(f"Exception occurred: {str(e)}")
+            logger.exception('Login raised')
             return {'message': str(e)}, 500
         
 
 class SessionCheckResource(Resource):
     def get(self):
         if current_user.is_authenticated:
-            print(f"User is authenticated: {current_user.id}")
+            logger.debug('Session check', extra={'user_id': current_user.id})
             return jsonify(is_logged_in=True)
         else:
-            print("No authenticated user.")
+            logger.debug('Session check without a user')
             return jsonify(is_logged_in=False)
 
 class SessionUserResource(Resource):
@@ -91,9 +127,19 @@ class SignupResource(Resource):
             return {'message': str(e)}, 500
 
 class LogoutResource(Resource):
-    @login_required
     def post(self):
         try:
+            claims = current_token_claims()
+            if claims is None and not current_user.is_authenticated:
+                return {'message': 'Not logged in'}, 401
+
+            # Revoke the token login used for this request and, if the client
+            # sends it along, the one behind its refresh token.
+            if claims:
+                revoke_family(claims['fam'])
+            data = request.get_json(silent=True) or {}
+            if data.get('refresh_token'):
+                revoke_refresh_token(data['refresh_token'])
             logout_user()
             return {'message': 'Logged out successfully'}, 200
         except Exception as e:
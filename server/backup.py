@@ -0,0 +1,517 @@
+"""Online backups of the SQLite database, with point-in-time restore.
+
+Snapshots are taken with the SQLite backup API a few pages at a time, so
+writers are only held up between steps. In WAL mode the copy reads one
+pinned snapshot of the database, so concurrent writes never force it to
+start over. Each snapshot is gzipped and its checksums written to a JSON
+manifest next to it:
+
+    BACKUP_DIR/snapshots/20261019T120000Z.db.gz
+    BACKUP_DIR/snapshots/20261019T120000Z.json
+
+Between snapshots the shipper copies new WAL frames into numbered,
+compressed segments (BACKUP_DIR/wal/), every BACKUP_WAL_INTERVAL seconds.
+The app's own connections stop checkpointing so that frames cannot reach
+the database file before they are shipped. The shipper then checkpoints
+while holding the write lock. A WAL reset starts a new generation of
+segments. If a reset happens that the shipper did not cause, frames may
+have been missed, so a fresh snapshot is taken. Restoring to a point in
+time replays the segments shipped up to then on top of the latest
+snapshot before it, so the resolution is the shipping interval.
+
+    flask backup snapshot
+    flask backup ship
+    flask backup restore ./restored [--at 2026-10-19T12:30:00]
+    flask backup verify [--at ...]
+    flask backup list
+
+GET /admin/backups lists snapshots and shipping state; POST starts a
+snapshot in the background.
+"""
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask_restful import Resource
+from sqlalchemy import event
+from models import db
+from auth import admin_required
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_PAUSE = 0.005
+CHUNK = 1 << 20
+WAL_HEADER = 32
+FRAME_HEADER = 24
+# Tables whose row counts verify reports
+VERIFY_TABLES = ('user', 'employment', 'application', 'funding', 'funding_application', 'donation', 'change_log')
+
+
+def database_path():
+    return db.engine.url.database
+
+def _backup_dir():
+    return current_app.config['BACKUP_DIR']
+
+def _snapshot_dir():
+    return os.path.join(_backup_dir(), 'snapshots')
+
+def _wal_dir():
+    return os.path.join(_backup_dir(), 'wal')
+
+def _stamp(moment):
+    return moment.strftime('%Y%m%dT%H%M%S%fZ')
+
+def _write_json(path, data):
+    # Written beside the target and renamed over it, so readers never see half a file
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def _compress(source, target):
+    """gzip source into target; returns the sha256 of source and of target."""
+    raw, packed = hashlib.sha256(), hashlib.sha256()
+
+    class _Hashing:
+        def __init__(self, f):
+            self.f = f
+
+        def write(self, data):
+            packed.update(data)
+            return self.f.write(data)
+
+        def flush(self):
+            self.f.flush()
+
+    with open(source, 'rb') as src, open(target + '.tmp', 'wb') as out:
+        with gzip.GzipFile(fileobj=_Hashing(out), mode='wb', mtime=0) as gz:
+            for chunk in iter(lambda: src.read(CHUNK), b''):
+                raw.update(chunk)
+                gz.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(target + '.tmp', target)
+    return raw.hexdigest(), packed.hexdigest()
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Snapshots
+
+_snapshot_lock = threading.Lock()
+
+def take_snapshot():
+    """Copy the live database into a compressed snapshot; returns its manifest."""
+    if not _snapshot_lock.acquire(blocking=False):
+        raise RuntimeError('A snapshot is already being taken')
+    try:
+        return _take_snapshot()
+    finally:
+        _snapshot_lock.release()
+
+def _take_snapshot():
+    config = current_app.config
+    pages = config.get('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP)
+    pause = config.get('BACKUP_STEP_PAUSE', DEFAULT_STEP_PAUSE)
+    os.makedirs(_snapshot_dir(), exist_ok=True)
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        time.sleep(pause)  # let writers in between steps
+
+    with tempfile.TemporaryDirectory(dir=_snapshot_dir()) as tmp:
+        copy_path = os.path.join(tmp, 'copy.db')
+        source = sqlite3.connect(database_path(), timeout=30, isolation_level=None)
+        target = sqlite3.connect(copy_path)
+        try:
+            def pin():
+                # One read snapshot for the whole copy, so commits by others
+                # neither restart it nor wait for it.
+                source.execute('BEGIN')
+                source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+
+            wal_state = None
+            if config.get('BACKUP_WAL_INTERVAL'):
+                # Pinned right after shipping, under the same write lock: the
+                # snapshot holds exactly the frames shipped so far.
+                wal_state = ship_wal(pin=pin)
+            elif source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+                pin()
+            started = datetime.utcnow()
+            source.backup(target, pages=pages, progress=progress)
+            if source.in_transaction:
+                source.execute('ROLLBACK')
+            page_count = target.execute('PRAGMA page_count').fetchone()[0]
+            page_size = target.execute('PRAGMA page_size').fetchone()[0]
+            # A self-contained file, whatever the live journal mode
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+            source.close()
+        name = _stamp(started)
+        raw_sha256, sha256 = _compress(copy_path, os.path.join(_snapshot_dir(), f'{name}.db.gz'))
+
+    manifest = {
+        'name': name,
+        'file': f'{name}.db.gz',
+        'created_at': started.isoformat(),
+        'finished_at': datetime.utcnow().isoformat(),
+        'sha256': sha256,
+        'raw_sha256': raw_sha256,
+        'page_size': page_size,
+        'page_count': page_count,
+        'steps': steps,
+        'wal_generation': wal_state['generation'] if wal_state else None,
+        'wal_seq': wal_state['seq'] if wal_state else None,
+    }
+    _write_json(os.path.join(_snapshot_dir(), f'{name}.json'), manifest)
+    logger.info('Snapshot %s written, %s pages in %s steps', name, page_count, steps)
+    return manifest
+
+def list_snapshots():
+    directory = _snapshot_dir()
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith('.json'):
+            with open(os.path.join(directory, entry)) as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+# WAL shipping
+
+def _read_state():
+    path = os.path.join(_wal_dir(), 'state.json')
+    if not os.path.exists(path):
+        return {'generation': 0, 'salt': None, 'offset': 0, 'seq': 0, 'clean': True}
+    with open(path) as f:
+        return json.load(f)
+
+def _complete_frames(wal, offset, salt):
+    """End of the last commit frame at or after offset that belongs to salt."""
+    page_size = struct.unpack('>I', wal[8:12])[0]
+    frame_size = FRAME_HEADER + page_size
+    position, end = offset, offset
+    while position + frame_size <= len(wal):
+        header = wal[position:position + FRAME_HEADER]
+        if header[8:16] != salt:
+            break  # left over from before the last reset
+        position += frame_size
+        if struct.unpack('>I', header[4:8])[0]:  # database size, only set on commit frames
+            end = position
+    return end
+
+def _append_segment(state, data, start):
+    state['seq'] += 1
+    directory = os.path.join(_wal_dir(), f"{state['generation']:08d}")
+    os.makedirs(directory, exist_ok=True)
+    name = f"{state['seq']:010d}.wal.gz"
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as raw:
+        raw.write(data)
+    try:
+        _, sha256 = _compress(raw.name, os.path.join(directory, name))
+    finally:
+        os.unlink(raw.name)
+    entry = {
+        'seq': state['seq'],
+        'generation': state['generation'],
+        'file': os.path.join(f"{state['generation']:08d}", name),
+        'start': start,
+        'end': start + len(data),
+        'sha256': sha256,
+        'shipped_at': datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(_wal_dir(), 'segments.jsonl'), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    return entry
+
+def ship_wal(pin=None):
+    """Copy WAL frames committed since the last call into a segment.
+
+    Holds the database write lock while copying and checkpointing, and a
+    file lock so only one process ships at a time. pin, if given, is called
+    before the write lock is released. Returns the new state.
+    """
+    os.makedirs(_wal_dir(), exist_ok=True)
+    with open(os.path.join(_wal_dir(), '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        path = database_path()
+        writer = sqlite3.connect(path, timeout=30, isolation_level=None)
+        checkpointer = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            writer.execute('BEGIN IMMEDIATE')
+            state = _read_state()
+            try:
+                with open(path + '-wal', 'rb') as f:
+                    wal = f.read()
+            except FileNotFoundError:
+                wal = b''
+
+            salt = wal[16:24].hex() if len(wal) >= WAL_HEADER else None
+            if salt != state['salt']:
+                if not state['clean'] and state['salt'] is not None:
+                    # Checkpointed by someone else before the rest was shipped
+                    state['gap'] = True
+                state.update(generation=state['generation'] + 1, salt=salt, offset=0)
+            if salt is not None:
+                end = _complete_frames(wal, max(state['offset'], WAL_HEADER), bytes.fromhex(salt))
+                start = state['offset']
+                if end > max(start, WAL_HEADER):
+                    _append_segment(state, wal[start:end], start)
+                    state['offset'] = end
+
+            # Every frame is shipped and no one can add more: safe to backfill
+            busy, log, checkpointed = checkpointer.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            state['clean'] = not busy and log == checkpointed
+            _write_json(os.path.join(_wal_dir(), 'state.json'), state)
+            if pin is not None:
+                pin()
+            writer.execute('ROLLBACK')
+        finally:
+            checkpointer.close()
+            writer.close()
+    if state.pop('gap', False):
+        _write_json(os.path.join(_wal_dir(), 'state.json'), state)
+        if pin is None:  # otherwise a snapshot is being taken already
+            logger.warning('WAL frames were checkpointed before shipping; taking a new snapshot')
+            take_snapshot()
+    return state
+
+def list_segments():
+    path = os.path.join(_wal_dir(), 'segments.jsonl')
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _disable_autocheckpoint(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA wal_autocheckpoint=0')
+
+class WalShipper:
+    """Ships WAL segments every interval seconds in a daemon thread."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='wal-shipper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    ship_wal()
+                except Exception:
+                    logger.exception('WAL shipping failed')
+
+
+# Restoring
+
+def _unpack(source, target, expected_sha256):
+    if _sha256(source) != expected_sha256:
+        raise ValueError(f'Checksum mismatch for {source}')
+    with gzip.open(source, 'rb') as src, open(target, 'wb') as out:
+        shutil.copyfileobj(src, out, CHUNK)
+
+def restore(directory, at=None):
+    """Rebuild the database as of at (default: latest) into directory.
+
+    Returns (path, snapshot manifest, segments replayed).
+    """
+    snapshots = [s for s in list_snapshots() if at is None or datetime.fromisoformat(s['created_at']) <= at]
+    if not snapshots:
+        raise ValueError('No snapshot old enough to restore from')
+    snapshot = snapshots[-1]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, os.path.basename(database_path()))
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    _unpack(os.path.join(_snapshot_dir(), snapshot['file']), path, snapshot['sha256'])
+
+    replayed = []
+    generation = snapshot.get('wal_generation')
+    if generation is not None:
+        # The snapshot's own generation is replayed from its start: frames
+        # already in the snapshot just rewrite the pages it has.
+        segments = [s for s in list_segments() if s['generation'] >= generation
+                    and (at is None or datetime.fromisoformat(s['shipped_at']) <= at)]
+        generations = sorted({s['generation'] for s in segments})
+        for number in generations:
+            _replay(path, [s for s in segments if s['generation'] == number])
+            replayed.extend(s['seq'] for s in segments if s['generation'] == number)
+
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=DELETE')
+    connection.close()
+    return path, snapshot, replayed
+
+def _replay(path, segments):
+    # Segments of one generation laid end to end are a prefix of that WAL
+    # file. SQLite recovers it on open, stopping at the last valid commit.
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.close()
+    with open(path + '-wal', 'wb') as wal:
+        expected = 0
+        for segment in segments:
+            if segment['start'] != expected:
+                raise ValueError(f"WAL segment {segment['seq']} does not follow the previous one")
+            with tempfile.NamedTemporaryFile() as raw:
+                _unpack(os.path.join(_wal_dir(), segment['file']), raw.name, segment['sha256'])
+                with open(raw.name, 'rb') as f:
+                    shutil.copyfileobj(f, wal, CHUNK)
+            expected = segment['end']
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    connection.close()
+
+def verify(at=None):
+    """Restore into a scratch directory and check the result; returns a report."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path, snapshot, replayed = restore(tmp, at)
+        connection = sqlite3.connect(path)
+        try:
+            integrity = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+            foreign_keys = connection.execute('PRAGMA foreign_key_check').fetchall()
+            tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            counts = {table: connection.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+                      for table in VERIFY_TABLES if table in tables}
+            version = connection.execute('SELECT version_num FROM alembic_version').fetchone() if 'alembic_version' in tables else None
+        finally:
+            connection.close()
+    return {
+        'snapshot': snapshot['name'],
+        'wal_segments': len(replayed),
+        'ok': integrity == ['ok'],
+        'integrity_check': integrity,
+        'foreign_key_violations': len(foreign_keys),
+        'schema_version': version[0] if version else None,
+        'row_counts': counts,
+    }
+
+
+# CLI and admin endpoint
+
+backup_cli = AppGroup('backup', help='Snapshot, ship, restore and verify database backups.')
+
+def _parse_at(value):
+    return datetime.fromisoformat(value) if value else None
+
+@backup_cli.command('snapshot')
+def snapshot_command():
+    """Take a compressed online snapshot."""
+    manifest = take_snapshot()
+    click.echo(f"{manifest['file']} sha256={manifest['sha256']}")
+
+@backup_cli.command('ship')
+def ship_command():
+    """Ship WAL frames committed since the last run."""
+    state = ship_wal()
+    click.echo(f"generation {state['generation']}, segment {state['seq']}, offset {state['offset']}")
+
+@backup_cli.command('restore')
+@click.argument('directory')
+@click.option('--at', default=None, help='UTC ISO 8601 time to restore to; latest when omitted.')
+def restore_command(directory, at):
+    """Restore the database into DIRECTORY."""
+    path, snapshot, replayed = restore(directory, _parse_at(at))
+    click.echo(f"{path} from {snapshot['name']} and {len(replayed)} WAL segments")
+
+@backup_cli.command('verify')
+@click.option('--at', default=None, help='UTC ISO 8601 time to restore to; latest when omitted.')
+def verify_command(at):
+    """Restore into a scratch directory and run integrity checks."""
+    report = verify(_parse_at(at))
+    click.echo(json.dumps(report, indent=2))
+    if not report['ok']:
+        raise SystemExit(1)
+
+@backup_cli.command('list')
+def list_command():
+    """List snapshots."""
+    for manifest in list_snapshots():
+        click.echo(f"{manifest['name']}  {manifest['page_count'] * manifest['page_size']:>12} bytes  {manifest['sha256']}")
+
+
+class BackupsResource(Resource):
+    method_decorators = [admin_required]
+
+    def get(self):
+        return {'snapshots': list_snapshots(), 'wal': _read_state(), 'running': _snapshot_lock.locked()}, 200
+
+    def post(self):
+        if _snapshot_lock.locked():
+            return {'message': 'A snapshot is already being taken'}, 409
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    take_snapshot()
+                except Exception:
+                    logger.exception('Snapshot failed')
+
+        threading.Thread(target=run, name='snapshot', daemon=True).start()
+        return {'message': 'Snapshot started'}, 202
+
+
+def init_backups(app):
+    app.cli.add_command(backup_cli)
+    interval = app.config.get('BACKUP_WAL_INTERVAL')
+    if not interval:
+        return None
+    with app.app_context():
+        engine = db.engine
+        if engine.url.get_backend_name() != 'sqlite' or not engine.url.database:
+            return None
+        with engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA journal_mode=WAL')
+        # Only the shipper may move frames into the database file
+        event.listen(engine, 'connect', _disable_autocheckpoint)
+        engine.dispose()
+    shipper = WalShipper(app, interval)
+    app.extensions['wal_shipper'] = shipper
+    app.extensions.setdefault('workers', []).append(shipper)
+    return shipper
+
+def initialize_backup_routes(api):
+    api.add_resource(BackupsResource, '/admin/backups')
@@ -0,0 +1,106 @@
+"""Many lookups in one round trip.
+
+A page listing employments needs the category, poster and funding behind
+every row. Instead of one request each, send their paths together:
+
+    POST /batch
+    {"requests": ["/categories/3", "/users/7", "/fundings/2", "/categories/5"]}
+
+    {"responses": [{"path": "/categories/3", "status": 200, "body": {...}}, ...]}
+
+Responses come back in request order with the body and status the single
+row endpoint would have answered. Lookups are coalesced like a dataloader:
+all ids asked for one model are fetched with a single
+SELECT ... WHERE id IN (...), however many rows and duplicates the batch
+holds. Only single row GETs of endpoints that registered a loader can be
+batched; whole lists are filtered with ?ids=1,2,3 instead (see filters.py).
+"""
+from flask import current_app, request, jsonify
+from flask_login import current_user
+from flask_restful import Resource
+from werkzeug.exceptions import HTTPException
+
+MAX_REQUESTS = 200
+CHUNK = 500  # ids per IN (...), well under SQLite's bound parameter limit
+
+# Endpoint name -> Loader
+LOADERS = {}
+
+
+class Loader:
+    """How the batch answers one single row endpoint.
+
+    serialize turns a row into the body the endpoint returns; options are
+    loader options applied to the coalesced query (e.g. the text side table).
+    """
+
+    def __init__(self, model, serialize, not_found, options=(), login=False):
+        self.model = model
+        self.serialize = serialize
+        self.not_found = not_found
+        self.options = options
+        self.login = login
+
+def register_loader(endpoint, model, serialize, not_found, options=(), login=False):
+    LOADERS[endpoint] = Loader(model, serialize, not_found, options, login)
+
+def load_many(model, ids, options=()):
+    """Rows of model by primary key, one query per CHUNK ids; returns {id: row}."""
+    key = model.__mapper__.primary_key[0]
+    rows = {}
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), CHUNK):
+        query = model.query.options(*options).filter(key.in_(ids[start:start + CHUNK]))
+        rows.update((getattr(row, key.key), row) for row in query)
+    return rows
+
+
+def _resolve(adapter, path):
+    """(loader, row id) for path, or (None, (status, message)) when it cannot be batched."""
+    if not path.startswith('/') or '?' in path:
+        return None, (400, 'Each request must be a path like /users/7')
+    try:
+        endpoint, args = adapter.match(path, method='GET')
+    except HTTPException as e:
+        return None, (e.code, e.description)
+    loader = LOADERS.get(endpoint)
+    if loader is None or len(args) != 1:
+        return None, (400, f'{path} cannot be batched')
+    return loader, next(iter(args.values()))
+
+class BatchResource(Resource):
+    def post(self):
+        data = request.get_json(silent=True)
+        paths = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(paths, list) or not paths or not all(isinstance(path, str) for path in paths):
+            return {'message': 'requests must be a non-empty list of paths!'}, 400
+        if len(paths) > MAX_REQUESTS:
+            return {'message': f'At most {MAX_REQUESTS} requests per batch!'}, 400
+
+        adapter = current_app.url_map.bind('')
+        resolved = [_resolve(adapter, path) for path in paths]
+
+        # One query per model for every id the batch mentions
+        wanted = {}
+        for loader, row_id in resolved:
+            if loader is not None and (current_user.is_authenticated or not loader.login):
+                wanted.setdefault(loader, set()).add(row_id)
+        rows = {loader: load_many(loader.model, ids, loader.options) for loader, ids in wanted.items()}
+
+        responses = []
+        for path, (loader, row_id) in zip(paths, resolved):
+            if loader is None:
+                status, body = row_id[0], {'message': row_id[1]}
+            elif loader.login and not current_user.is_authenticated:
+                status, body = 401, {'message': 'Not logged in'}
+            elif row_id not in rows[loader]:
+                status, body = 404, {'message': loader.not_found}
+            else:
+                status, body = 200, loader.serialize(rows[loader][row_id])
+            responses.append({'path': path, 'status': status, 'body': body})
+        # jsonify, like the blueprint routes, so bodies match theirs exactly
+        return jsonify({'responses': responses})
+
+
+def initialize_batch_routes(api):
+    api.add_resource(BatchResource, '/batch')
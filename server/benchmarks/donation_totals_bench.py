@@ -0,0 +1,105 @@
+"""Donation totals: SQL aggregation against summing hydrated ORM rows.
+
+    python benchmarks/donation_totals_bench.py [--rows 2000000]
+
+Fills a throwaway database at head with donations in a few currencies,
+then times the query behind /donations/totals (grouped by payment method,
+and filtered to one month) against loading every Donation and adding up
+amounts in Python, the way a float column used to be totalled. Both must
+agree to the minor unit.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+CURRENCIES = ['KES'] * 8 + ['UGX', 'USD']
+METHODS = ['MPESA', 'CREDIT_CARD', 'PAYPAL']
+
+
+def fill(path, rows):
+    random.seed(1)
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO user (id, username, email, password, updated_at, version) VALUES (1, 'bench', 'bench@example.com', 'x', '2026-01-01 00:00:00', 1)")
+    connection.executemany(
+        'INSERT INTO donation (user_id, donation_type, name, amount_minor, currency, payment_method, donation_date, updated_at, version) '
+        "VALUES (1, 'INDIVIDUAL', 'Bench', ?, ?, ?, ?, '2026-01-01 00:00:00', 1)",
+        ((random.randint(1000, 500000), random.choice(CURRENCIES), random.choice(METHODS),
+          f'2026-{random.randint(1, 12):02d}-{random.randint(1, 28):02d} 12:00:00.000000') for _ in range(rows)))
+    connection.commit()
+    connection.close()
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return result, timings[len(timings) // 2]
+
+
+def main(rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'totals.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        os.environ['RATELIMIT_ENABLED'] = '0'
+        os.environ['PAYMENT_MOCK_ENABLED'] = '1'
+        from flask_migrate import Migrate, upgrade
+        from app import create_app
+        from models import db, Donation, PaymentStatus
+        from money import aggregate
+        app = create_app()
+        Migrate(app, db)
+        with app.app_context():
+            upgrade(directory=os.path.join(SERVER_DIR, 'migrations'))
+        fill(path, rows)
+
+        with app.app_context():
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+            settled = [Donation.payment_status == PaymentStatus.SETTLED]  # fill() leaves the migration's default
+
+            def sql_totals():
+                return aggregate(Donation.amount_minor, Donation.currency, [Donation.payment_method], settled)
+
+            def orm_totals():
+                totals = defaultdict(float)
+                for donation in db.session.scalars(db.select(Donation)):
+                    totals[donation.currency, donation.payment_method.value] += donation.amount_minor / 100
+                db.session.expunge_all()
+                return totals
+
+            june = [Donation.payment_status == PaymentStatus.SETTLED, Donation.currency == 'KES', Donation.donation_date >= datetime(2026, 6, 1), Donation.donation_date < datetime(2026, 7, 1)]
+
+            def sql_month():
+                return aggregate(Donation.amount_minor, Donation.currency, [], june)
+
+            sql, sql_time = timed(sql_totals, repeat)
+            orm, orm_time = timed(orm_totals, max(1, repeat // 5))
+            _, month_time = timed(sql_month, repeat)
+
+        for row in sql:
+            exact = row['total_minor'] / 100
+            drift = orm[row['currency'], row['payment_method']] - exact
+            print(f"{row['currency']} {row['payment_method']:14} {row['count']:>9} {row['total']:>16} float drift {drift:+.6f}")
+        print(f'sql aggregate, grouped    {sql_time * 1000:9.1f} ms')
+        print(f'sql aggregate, one month  {month_time * 1000:9.1f} ms')
+        print(f'orm hydrate and sum       {orm_time * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time donation totals.')
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
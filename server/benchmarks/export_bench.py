@@ -0,0 +1,91 @@
+"""Columnar export speed and memory on a large table.
+
+    python benchmarks/export_bench.py [--rows 2000000] [--batch-size 50000]
+
+Fills the donation table of a throwaway database at head with that many
+rows, then exports it with export_table() to Parquet and to Arrow, and
+reports rows per second, file size and how much the process grew. Peak
+memory should track the batch size, not the row count: run it with
+--rows 200000 and --rows 2000000 to compare. Also prints the plan of a
+keyset batch, which should walk the updated_at index.
+"""
+import argparse
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def fill(path, rows):
+    random.seed(1)
+    start = datetime(2025, 1, 1)
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO user (id, username, email, password, updated_at, version) VALUES (1, 'bench', 'bench@example.com', 'x', '2026-01-01 00:00:00', 1)")
+    connection.executemany(
+        'INSERT INTO donation (user_id, donation_type, name, amount_minor, currency, payment_method, donation_date, '
+        'payment_status, updated_at, version) VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, 1)',
+        ((random.choice(['INDIVIDUAL', 'ORGANISATION']), f'donor {i % 5000}', random.randrange(100, 10_000_000),
+          random.choice(['KES', 'KES', 'USD']), random.choice(['CREDIT_CARD', 'PAYPAL', 'MPESA']),
+          (start + timedelta(seconds=i * 7)).strftime('%Y-%m-%d %H:%M:%S.%f'),
+          random.choice(['PENDING', 'SETTLED', 'SETTLED', 'FAILED']),
+          (start + timedelta(seconds=i * 7 + random.random())).strftime('%Y-%m-%d %H:%M:%S.%f'))
+         for i in range(rows)))
+    connection.commit()
+    connection.close()
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def main(rows, batch_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        os.environ['EXPORT_DIR'] = os.path.join(tmp, 'exports')
+        os.environ['RATELIMIT_ENABLED'] = '0'
+        os.environ['PAYMENT_MOCK_ENABLED'] = '1'
+        os.environ['PAYMENT_WORKERS'] = '0'
+        from flask_migrate import Migrate, upgrade
+        from app import create_app
+        from models import db
+        from export import EXPORTS, export_table
+        import pyarrow  # imported up front, so the growth below is the export's
+        import pyarrow.parquet
+        app = create_app()
+        Migrate(app, db)
+        with app.app_context():
+            upgrade(directory=os.path.join(SERVER_DIR, 'migrations'))
+        fill(path, rows)
+        database_mb = os.path.getsize(path) / 1e6
+
+        print(f'{rows} donations, {database_mb:.0f} MB of SQLite, batches of {batch_size}')
+        with app.app_context():
+            export = EXPORTS['donation']
+            query = (db.select(*export.columns).select_from(export.source).where(export.updated_at > datetime(2025, 6, 1))
+                     .order_by(export.updated_at, export.key).limit(batch_size))
+            compiled = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+            plan = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+            print('batch plan:', '; '.join(row[-1] for row in plan))
+            for format in ('parquet', 'arrow'):
+                before = peak_mb()
+                started = time.perf_counter()
+                written, exported = export_table('donation', format, full=True, batch_size=batch_size)
+                elapsed = time.perf_counter() - started
+                print(f'{format:8} {exported} rows in {elapsed:.1f} s ({exported / elapsed:,.0f} rows/s), '
+                      f'{os.path.getsize(written) / 1e6:.0f} MB, peak memory {before:.0f} -> {peak_mb():.0f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the columnar export of a large table.')
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+    main(args.rows, args.batch_size)
@@ -0,0 +1,68 @@
+"""Facet query latency on a synthetic job board.
+
+    python benchmarks/facets_bench.py [--rows 1000000]
+
+Fills the in-memory facet index directly (no database) with rows shaped
+like seed.py's employments and times typical facet queries. The target is
+under 30 ms per query at a million employments.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from facets import FacetIndex
+
+WORDS = ['senior', 'junior', 'nurse', 'engineer', 'teacher', 'manager', 'analyst', 'developer',
+         'accountant', 'driver', 'officer', 'assistant', 'designer', 'consultant', 'technician']
+
+QUERIES = {
+    'no filter': dict(),
+    'one category': dict(selected={'category': [7]}),
+    'three categories + bucket': dict(selected={'category': [1, 2, 3], 'salary': [2]}),
+    'q=nurse': dict(q='nurse'),
+    'q=senior engineer + category': dict(q='senior engineer', selected={'category': [12]}),
+    'one location': dict(selected={'location': [5]}),
+}
+
+
+def main(rows, repeat):
+    random.seed(1)
+    index = FacetIndex()
+    locations = [f'City {i}' for i in range(5000)]
+    started = time.perf_counter()
+    for row_id in range(1, rows + 1):
+        index.apply(
+            row_id,
+            category_id=random.randint(1, 130),
+            location=locations[int(random.paretovariate(1.2)) % len(locations)],
+            salary=random.randint(20000, 130000),
+            title=' '.join(random.sample(WORDS, 2)),
+        )
+    print(f'built index over {rows} rows in {time.perf_counter() - started:.1f} s')
+
+    for label, query in QUERIES.items():
+        index.facets(**query)  # warm the bitmap cache
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            total, _ = index.facets(**query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f'{label:32} total {total:8}  median {timings[len(timings) // 2] * 1000:6.1f} ms  max {timings[-1] * 1000:6.1f} ms')
+
+    started = time.perf_counter()
+    index.apply(17, category_id=7, location='City 1', salary=55000, title='senior nurse')
+    index.facets(selected={'category': [7]})
+    print(f'write + requery of the touched category: {(time.perf_counter() - started) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time facet queries on a synthetic index.')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,93 @@
+"""Radius search latency on a synthetic job board.
+
+    python benchmarks/nearby_bench.py [--rows 1000000]
+
+Builds a throwaway SQLite database of employments geocoded the way the app
+does it and times /employments/nearby style queries through geo.nearby().
+Two layouts are measured: postings placed on gazetteer cities (what
+geocoding produces, few distinct points) and the same postings scattered
+up to ~30 km around those cities (one distinct point per posting, the
+worst case for the distinct-point walk). The target is under 50 ms per
+query at a million employments.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = {
+    'Nairobi, 10 km': (-1.2864, 36.8172, 10),
+    'Nairobi, 50 km': (-1.2864, 36.8172, 50),
+    'Nairobi, 200 km': (-1.2864, 36.8172, 200),
+    'Lamu, 25 km': (-2.2717, 40.9020, 25),
+    'Lake Turkana, 100 km (sparse)': (3.5, 36.0, 100),
+    'Oslo, 500 km': (59.9139, 10.7522, 500),
+}
+
+
+def fill(db, Employment, rows, scatter):
+    from geo import gazetteer, geohash_encode
+    random.seed(1)
+    # Kenyan towns first, so a Pareto pick puts most postings around Nairobi
+    places = list(gazetteer().values())
+    table = Employment.__table__
+    batch = []
+    for row_id in range(1, rows + 1):
+        _, latitude, longitude = places[(int(random.paretovariate(1.2)) - 1) % len(places)]
+        if scatter:
+            latitude += random.uniform(-0.27, 0.27)
+            longitude += random.uniform(-0.27, 0.27)
+        batch.append({
+            'id': row_id, 'user_id': 1, 'category_id': 1, 'title': f'Job {row_id}',
+            'salary_minor': 5000000, 'salary_currency': 'KES', 'latitude': latitude, 'longitude': longitude,
+            'geohash': geohash_encode(latitude, longitude), 'version': 1,
+        })
+        if len(batch) == 50000:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+    db.session.commit()
+
+
+def main(rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        for scatter in (False, True):
+            os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, f'nearby{int(scatter)}.db')}"
+            os.environ['RATELIMIT_ENABLED'] = '0'
+            os.environ['PAYMENT_MOCK_ENABLED'] = '1'
+            from app import create_app
+            from models import db, Employment
+            from geo import nearby
+
+            app = create_app()
+            with app.app_context():
+                db.create_all()
+                started = time.perf_counter()
+                db.session.execute(db.text("PRAGMA synchronous=OFF"))
+                fill(db, Employment, rows, scatter)
+                print(f"\n{'scattered' if scatter else 'city centroids'}: {rows} rows loaded in {time.perf_counter() - started:.1f} s")
+
+                for label, (latitude, longitude, radius) in QUERIES.items():
+                    nearby(latitude, longitude, radius)  # warm the page cache
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        results = nearby(latitude, longitude, radius)
+                        timings.append(time.perf_counter() - started)
+                    timings.sort()
+                    print(f'{label:30} {len(results):3} results  median {timings[len(timings) // 2] * 1000:6.1f} ms'
+                          f'  max {timings[-1] * 1000:6.1f} ms')
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time radius searches on a synthetic database.')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
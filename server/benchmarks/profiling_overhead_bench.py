@@ -0,0 +1,75 @@
+"""What the profiling and tracing hooks cost requests that are not traced.
+
+    python benchmarks/profiling_overhead_bench.py [--requests 3000] [--rounds 5]
+
+Times the same GET requests through the test client in fresh processes
+with PROFILING_ENABLED=0 and =1 (TRACE_SAMPLE=0, so nothing is traced),
+alternating, and reports the best round of each. Then times the same
+requests with every one traced (TRACE_SAMPLE=1).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+PATHS = ['/categories', '/fundings', '/employments']
+
+
+def child(requests):
+    """Runs in the subprocess: ms per request, printed as JSON."""
+    from flask_migrate import Migrate, upgrade
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        Migrate(app, db)
+        upgrade()
+    client = app.test_client()
+    for path in PATHS:  # warm up
+        client.get(path)
+    started = time.perf_counter()
+    for i in range(requests):
+        client.get(PATHS[i % len(PATHS)])
+    print(json.dumps((time.perf_counter() - started) / requests * 1000))
+
+
+def run(requests, tmp, **env):
+    environment = dict(os.environ, RATELIMIT_ENABLED='0', PAYMENT_WORKERS='0', PAYMENT_MOCK_ENABLED='1', LOG_ACCESS='0', LOG_LEVEL='WARNING',
+                       DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'overhead.db')}",
+                       TRACE_EXPORT=os.path.join(tmp, 'traces.jsonl'), **env)
+    output = subprocess.run([sys.executable, __file__, '--child', str(requests)], env=environment, cwd=SERVER_DIR,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(requests, rounds):
+    with tempfile.TemporaryDirectory() as tmp:
+        off, idle = [], []
+        for _ in range(rounds):
+            off.append(run(requests, tmp, PROFILING_ENABLED='0'))
+            idle.append(run(requests, tmp, PROFILING_ENABLED='1', TRACE_SAMPLE='0'))
+        traced = run(requests, tmp, PROFILING_ENABLED='1', TRACE_SAMPLE='1')
+        best_off, best_idle = min(off), min(idle)
+        print(f'ms per request, best of {rounds} rounds of {requests}')
+        print(f'hooks out (PROFILING_ENABLED=0)   {best_off:7.3f}')
+        print(f'hooks in, nothing traced          {best_idle:7.3f}  {(best_idle / best_off - 1) * 100:+5.1f}%')
+        print(f'every request traced              {traced:7.3f}  {(traced / best_off - 1) * 100:+5.1f}%')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the idle cost of the profiling hooks.')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+    else:
+        main(args.requests, args.rounds)
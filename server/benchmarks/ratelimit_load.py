@@ -0,0 +1,142 @@
+"""Load test: does one scraper still hurt everybody else?
+
+    python benchmarks/ratelimit_load.py [--seconds 10] [--rows 5000]
+
+Seeds a throwaway database, starts the API twice in a child process (rate
+limiting off, then on) and runs the same traffic against both: scraper
+threads hammer the full /employments listing from one address while a few
+logged-in clients fetch single employments. Prints latency percentiles of
+the well-behaved clients and what the scraper got back.
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+SERVE = """
+import sys
+from werkzeug.serving import run_simple
+from app import create_app
+run_simple('127.0.0.1', int(sys.argv[1]), create_app(), threaded=True)
+"""
+
+
+def seed(database_url, rows, clients):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RATELIMIT_ENABLED'] = '0'
+    os.environ['PAYMENT_MOCK_ENABLED'] = '1'
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models import db, User, Category, Employment
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f'client{i}', email=f'client{i}@example.com',
+                      password=generate_password_hash('secret')) for i in range(clients)]
+        db.session.add_all(users)
+        db.session.flush()
+        category = Category(name='Benchmarks', user_id=users[0].id)
+        db.session.add(category)
+        db.session.flush()
+        db.session.add_all([
+            Employment(user_id=users[0].id, category_id=category.id, title=f'Job {i}',
+                       description='x' * 400, requirements='y' * 200, location='Nairobi',
+                       salary_minor=random.randint(30000, 120000) * 100)
+            for i in range(rows)
+        ])
+        db.session.commit()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_until_up(base):
+    for _ in range(100):
+        try:
+            requests.get(base + '/categories/1', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p / 100), len(samples) - 1)] * 1000 if samples else float('nan')
+
+
+def run(limited, args, database_url):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, RATELIMIT_ENABLED='1' if limited else '0')
+    server = subprocess.Popen([sys.executable, '-c', SERVE, str(port)], cwd=SERVER_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base)
+        tokens = [requests.post(base + '/token', json={'email': f'client{i}@example.com', 'password': 'secret'}).json()['access_token']
+                  for i in range(args.clients)]
+
+        stop = time.monotonic() + args.seconds
+        latencies, client_codes, scraper_codes = [], Counter(), Counter()
+        lock = threading.Lock()
+
+        def scraper():
+            with requests.Session() as http:
+                while time.monotonic() < stop:
+                    code = http.get(base + '/employments').status_code
+                    with lock:
+                        scraper_codes[code] += 1
+
+        def client(token):
+            with requests.Session() as http:
+                http.headers['Authorization'] = 'Bearer ' + token
+                while time.monotonic() < stop:
+                    started = time.perf_counter()
+                    code = http.get(f'{base}/employments/{random.randint(1, args.rows)}').status_code
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        client_codes[code] += 1
+                        if code == 200:
+                            latencies.append(elapsed)
+                    time.sleep(0.05)
+
+        threads = [threading.Thread(target=scraper) for _ in range(args.scrapers)]
+        threads += [threading.Thread(target=client, args=(token,)) for token in tokens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    label = 'on ' if limited else 'off'
+    print(f'limiting {label} | client p50 {percentile(latencies, 50):7.1f} ms  p99 {percentile(latencies, 99):7.1f} ms'
+          f'  codes {dict(client_codes)} | scraper codes {dict(scraper_codes)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--scrapers', type=int, default=16)
+    parser.add_argument('--clients', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'loadtest.db')}"
+        seed(database_url, args.rows, args.clients)
+        run(False, args, database_url)
+        run(True, args, database_url)
@@ -0,0 +1,126 @@
+"""Review queue throughput with many reviewers at once.
+
+    python benchmarks/review_queue_bench.py [--applications 20000] [--reviewers 100]
+
+Fills a throwaway database at head, in WAL mode, with open funding
+applications, then lets that many reviewer threads lease the next one and
+approve or deny it until the queue is empty. Reports decisions per second
+and lease latency, and checks that every application was leased and
+decided exactly once.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def fill(path, applications):
+    random.seed(1)
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute("INSERT INTO user (id, username, email, password, updated_at, version) VALUES (1, 'bench', 'bench@example.com', 'x', '2026-01-01 00:00:00', 1)")
+    connection.execute("INSERT INTO category (id, name, updated_at, version) VALUES (1, 'Bench', '2026-01-01 00:00:00', 1)")
+    connection.execute("INSERT INTO funding (id, category_id, grant_name, grant_type, amount_minor, currency, updated_at, version) "
+                       "VALUES (1, 1, 'Bench grant', 'SOCIAL_AID', 1000000, 'KES', '2026-01-01 00:00:00', 1)")
+    connection.executemany(
+        'INSERT INTO funding_application (user_id, funding_id, status, application_type, updated_at, version) '
+        "VALUES (1, 1, ?, 'SOCIAL_AID', '2026-01-01 00:00:00', 1)",
+        ((random.choice(['APPLIED', 'APPLIED', 'IN_REVIEW']),) for _ in range(applications)))
+    # Decided applications the queue has to skip over
+    connection.executemany(
+        'INSERT INTO funding_application (user_id, funding_id, status, application_type, updated_at, version) '
+        "VALUES (1, 1, ?, 'SOCIAL_AID', '2026-01-01 00:00:00', 1)",
+        ((random.choice(['APPROVED', 'DENIED']),) for _ in range(applications * 4)))
+    connection.commit()
+    connection.close()
+
+
+def main(applications, reviewers):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'review.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        os.environ['RATELIMIT_ENABLED'] = '0'
+        os.environ['PAYMENT_MOCK_ENABLED'] = '1'
+        os.environ['PAYMENT_WORKERS'] = '0'
+        from flask_migrate import Migrate, upgrade
+        from app import create_app
+        from models import db, ApplicationStatus, ReviewEvent
+        from review import lease_next, transition, _NEXT
+        app = create_app()
+        Migrate(app, db)
+        with app.app_context():
+            upgrade(directory=os.path.join(SERVER_DIR, 'migrations'))
+        fill(path, applications)
+
+        lease_timings = []
+        errors = []
+        timings_lock = threading.Lock()
+        start = threading.Barrier(reviewers + 1)
+
+        def review(reviewer_id):
+            with app.app_context():
+                start.wait()
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        leased = lease_next(reviewer_id)
+                        elapsed = time.perf_counter() - started
+                        if leased is None:
+                            return
+                        with timings_lock:
+                            lease_timings.append(elapsed)
+                        decision = ApplicationStatus.APPROVED if leased[0] % 3 else ApplicationStatus.DENIED
+                        transition([leased[0]], decision, reviewer_id)
+                except Exception as e:
+                    errors.append(repr(e))
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=review, args=(reviewer_id,)) for reviewer_id in range(1, reviewers + 1)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            actions = db.session.execute(
+                db.select(ReviewEvent.funding_application_id, ReviewEvent.action)
+            ).all()
+            still_open = db.session.execute(db.text(
+                "SELECT count(*) FROM funding_application WHERE status IN ('APPLIED', 'IN_REVIEW')"
+            )).scalar()
+            plan = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {_NEXT}'), {'now': '2026-01-01'}).all()
+
+    leases = Counter(application_id for application_id, action in actions if action == 'lease')
+    decisions = Counter(application_id for application_id, action in actions if action == 'transition')
+    lease_timings.sort()
+    print(f'{reviewers} reviewers decided {len(decisions)} of {applications} applications in {elapsed:.1f} s '
+          f'({len(decisions) / elapsed:.0f} per second)')
+    if lease_timings:
+        print(f'lease median {lease_timings[len(lease_timings) // 2] * 1000:.1f} ms  '
+              f'p99 {lease_timings[int(len(lease_timings) * 0.99)] * 1000:.1f} ms  max {lease_timings[-1] * 1000:.1f} ms')
+    print('queue plan:', '; '.join(row[-1] for row in plan))
+    print(f'leased twice: {sum(1 for count in leases.values() if count > 1)}  '
+          f'decided twice: {sum(1 for count in decisions.values() if count > 1)}  '
+          f'left open: {still_open}  errors: {len(errors)}')
+    for error in sorted(set(errors))[:5]:
+        print('  ', error)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the review queue under concurrent reviewers.')
+    parser.add_argument('--applications', type=int, default=20000)
+    parser.add_argument('--reviewers', type=int, default=100)
+    args = parser.parse_args()
+    main(args.applications, args.reviewers)
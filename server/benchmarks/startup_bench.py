@@ -0,0 +1,93 @@
+"""Cold start: how long until a worker can serve its first request?
+
+    python benchmarks/startup_bench.py [--runs 7] [--target-ms 150]
+
+Imports app in fresh interpreters under `python -X importtime` and prints
+the median import time with the slowest packages it pulled in. Then times,
+in fresh interpreters again, the frameworks every worker needs anyway
+(Flask, SQLAlchemy and the Flask extensions), importing app on top of them
+and create_app(). The target is for the app's own share, importing app plus
+create_app(), so it holds on fast and slow machines alike. Exits non-zero
+when the median share exceeds the target, or when starting up loads
+modules only some commands need (alembic, requests, faker).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only `flask db`, webhook delivery and seed.py need these
+LAZY_MODULES = ('alembic', 'flask_migrate', 'requests', 'faker')
+
+CHILD = """
+import sys, time
+started = time.perf_counter()
+import flask, flask_sqlalchemy, flask_restful, flask_login, flask_cors
+frameworks = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print((frameworks - started) * 1000, (imported - frameworks) * 1000, (created - imported) * 1000,
+      ','.join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def importtime(env):
+    """Per package cumulative import time in ms, for one cold import of app."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=SERVER_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        top = name.strip().split('.')[0]
+        packages[top] = max(packages.get(top, 0), int(cumulative) / 1000)
+    return packages
+
+def run_child(env):
+    result = subprocess.run([sys.executable, '-c', CHILD.format(lazy=LAZY_MODULES)], cwd=SERVER_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    *times, loaded = result.stdout.split(' ')
+    return [float(ms) for ms in times], [m for m in loaded.strip().split(',') if m]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--target-ms', type=float, default=150)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # No background workers, no database writes outside the scratch directory
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}", RATELIMIT_ENABLED='0',
+                   PAYMENT_MOCK_ENABLED='1', ARCHIVE_INTERVAL='0', BACKUP_WAL_INTERVAL='0', WEBHOOK_ENDPOINTS='')
+
+        samples = [importtime(env) for _ in range(args.runs)]
+        median = {name: statistics.median(sample.get(name, 0) for sample in samples) for name in samples[0]}
+        print(f"import app   median {median['app']:7.1f} ms   slowest packages:")
+        for name, ms in sorted(median.items(), key=lambda item: -item[1])[1:11]:
+            print(f'    {name:<24} {ms:7.1f} ms')
+
+        runs = [run_child(env) for _ in range(args.runs)]
+        frameworks, imported, created = (statistics.median(run[0][i] for run in runs) for i in range(3))
+        own = statistics.median(run[0][1] + run[0][2] for run in runs)
+        loaded = sorted({module for run in runs for module in run[1]})
+        print(f'frameworks {frameworks:7.1f} ms, then import app {imported:6.1f} ms + create_app {created:6.1f} ms')
+        print(f'app share  {own:7.1f} ms (target {args.target_ms:.0f} ms)')
+
+    failed = False
+    if own > args.target_ms:
+        print('FAIL: startup is over target')
+        failed = True
+    if loaded:
+        print(f"FAIL: startup loaded {', '.join(loaded)}, which should only load on demand")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,124 @@
+"""Table size and scan latency before and after the text split migration.
+
+    python benchmarks/text_split_bench.py [--rows 200000]
+
+Migrates a throwaway database to the revision before 2c6f8e0b5a17, fills
+employments, applications and funding applications with text of realistic
+length, then measures per-table size and the latency of scans that only
+read the short columns. The database is then upgraded to head, vacuumed
+and measured again.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+BEFORE = '9d41b7e2a6f3'
+WORDS = ('the applicant has experience in community work and will support families across the county '
+         'with training mentoring and access to markets for small businesses run by women and youth').split()
+
+# Scans that list rows without their text, written against columns present in both schemas
+SCANS = {
+    'employment': "SELECT id, user_id, category_id, title FROM employment WHERE title LIKE '%nurse%'",
+    'application': "SELECT id, employment_id, name, email FROM application WHERE name LIKE '%ann%'",
+    'funding_application': 'SELECT id, status, household_income FROM funding_application WHERE household_income > 90000',
+}
+
+
+_CORPUS = None
+
+def text(length):
+    # Slices of one long random passage; generating words per row is too slow
+    global _CORPUS
+    if _CORPUS is None:
+        _CORPUS = ' '.join(random.choice(WORDS) for _ in range(20000))
+    start = random.randrange(len(_CORPUS) - length)
+    return _CORPUS[start:start + length]
+
+def fill(path, rows):
+    random.seed(1)
+    from geo import place_names
+    places = place_names()
+    now = '2026-01-01 00:00:00'
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO user (id, username, email, password, updated_at, version) VALUES (1, 'bench', 'bench@example.com', 'x', ?, 1)", (now,))
+    connection.execute("INSERT INTO category (id, name, user_id, updated_at, version) VALUES (1, 'Bench', 1, ?, 1)", (now,))
+    connection.execute("INSERT INTO funding (id, category_id, grant_name, grant_type, amount, updated_at, version) VALUES (1, 1, 'Bench', 'BUSINESS', 1000, ?, 1)", (now,))
+    connection.executemany(
+        'INSERT INTO employment (id, user_id, category_id, title, description, requirements, location, salary_range, updated_at, version) '
+        'VALUES (?, 1, 1, ?, ?, ?, ?, ?, ?, 1)',
+        ((i, random.choice(['Nurse', 'Teacher', 'Driver', 'Accountant']) + f' {i}', text(random.randint(800, 3000)),
+          text(random.randint(200, 800)), random.choice(places), random.randint(20000, 120000), now) for i in range(1, rows + 1)))
+    connection.executemany(
+        'INSERT INTO application (id, user_id, employment_id, name, phone_number, email, cover_letter, updated_at, version) '
+        'VALUES (?, 1, ?, ?, ?, ?, ?, ?, 1)',
+        ((i, random.randint(1, rows), random.choice(['Anne', 'Brian', 'Joanna', 'Otieno']), '0700000000',
+          f'applicant{i}@example.com', text(random.randint(1000, 4000)), now) for i in range(1, rows + 1)))
+    connection.executemany(
+        'INSERT INTO funding_application (id, user_id, funding_id, status, application_type, household_income, reason_for_aid, business_profile, updated_at, version) '
+        'VALUES (?, 1, 1, ?, ?, ?, ?, ?, ?, 1)',
+        ((i, 'APPLIED', 'SOCIAL_AID' if i % 2 else 'BUSINESS', random.randint(0, 100000),
+          text(random.randint(500, 2000)) if i % 2 else None, None if i % 2 else text(random.randint(500, 2000)), now)
+         for i in range(1, rows + 1)))
+    connection.commit()
+    connection.close()
+
+def measure(path, repeat):
+    connection = sqlite3.connect(path)
+    connection.execute('VACUUM')
+    sizes = dict(connection.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').fetchall())
+    results = {}
+    for table, sql in SCANS.items():
+        connection.execute(sql).fetchall()  # warm the page cache
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            connection.execute(sql).fetchall()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        results[table] = (sizes.get(table, 0), timings[len(timings) // 2])
+    results['(whole file)'] = (os.path.getsize(path), None)
+    connection.close()
+    return results
+
+
+def main(rows, repeat):
+    from flask_migrate import upgrade
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'split.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        os.environ['RATELIMIT_ENABLED'] = '0'
+        os.environ['PAYMENT_MOCK_ENABLED'] = '1'
+        from app import create_app
+        app = create_app()
+        directory = os.path.join(SERVER_DIR, 'migrations')
+        with app.app_context():
+            upgrade(directory=directory, revision=BEFORE)
+        fill(path, rows)
+        before = measure(path, repeat)
+        with app.app_context():
+            started = time.perf_counter()
+            upgrade(directory=directory)
+            print(f'migrated {rows} rows per table in {time.perf_counter() - started:.1f} s')
+        after = measure(path, repeat)
+
+    print(f"{'table':22} {'size before':>12} {'size after':>12} {'scan before':>12} {'scan after':>12}")
+    for table in before:
+        size_before, scan_before = before[table]
+        size_after, scan_after = after[table]
+        scans = f'{scan_before * 1000:9.1f} ms {scan_after * 1000:9.1f} ms' if scan_before is not None else ''
+        print(f'{table:22} {size_before / 2**20:9.1f} MB {size_after / 2**20:9.1f} MB {scans}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the text split migration.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,106 @@
+"""Cost of validating request bodies, and of rejecting bad ones.
+
+    python benchmarks/validation_bench.py [--repeat 100000]
+
+Times the compiled schemas of the create endpoints on valid and invalid
+bodies, against the key presence check the handlers used to do, then
+times whole POST /donations requests through the test client: a valid
+body, and bad bodies that used to reach DonationType(...) or the commit
+and are now answered before any database work.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+BODIES = {
+    'donations': {'donation_type': 'Individual', 'name': 'Wanjiru', 'amount': '1500.50', 'currency': 'KES',
+                  'payment_method': 'MPESA', 'user_id': 7},
+    'funding_applications': {'user_id': 7, 'funding_id': 3, 'status': 'Applied', 'application_type': 'SocialAid',
+                             'household_income': 12000, 'number_of_dependents': 4,
+                             'reason_for_aid': 'School fees for the coming term.' * 10},
+    'applications': {'user_id': 7, 'employment_id': 3, 'name': 'Wanjiru', 'phone_number': '+254700000000',
+                     'email': 'wanjiru@example.com', 'cover_letter': 'Dear hiring manager, ' * 50,
+                     'resume': 'https://example.com/cv.pdf', 'linkedin': 'https://linkedin.com/in/w',
+                     'portfolio': 'https://example.com'},
+}
+REQUIRED = {
+    'donations': ['donation_type', 'amount', 'payment_method'],
+    'funding_applications': ['status', 'application_type'],
+    'applications': ['name', 'phone_number', 'email', 'cover_letter', 'resume', 'linkedin', 'portfolio'],
+}
+BAD_DONATIONS = {
+    'unknown payment method': dict(BODIES['donations'], payment_method='Cheque'),
+    'amount is a list': dict(BODIES['donations'], amount=[1, 2]),
+    'everything missing': {},
+}
+
+
+def per_call(function, argument, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(argument)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main(repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'validation.db')}"
+        os.environ['RATELIMIT_ENABLED'] = '0'
+        os.environ['PAYMENT_MOCK_ENABLED'] = '1'
+        os.environ['PAYMENT_WORKERS'] = '0'
+        os.environ['LOG_ACCESS'] = '0'
+        from app import create_app
+        from models import db
+        from validation import ValidationError
+        import applications
+        import donations
+        import fundings
+        schemas = {
+            'donations': donations.DONATION,
+            'funding_applications': fundings.FUNDING_APPLICATION,
+            'applications': applications.APPLICATION,
+        }
+
+        print('per body, microseconds')
+        for name, schema in schemas.items():
+            body = BODIES[name]
+            required = REQUIRED[name]
+            presence = per_call(lambda data: all(key in data for key in required), body, repeat)
+            valid = per_call(schema.validate, body, repeat)
+
+            def reject(data):
+                try:
+                    schema.validate(data)
+                except ValidationError:
+                    pass
+            rejected = per_call(reject, {key: [] for key in body}, repeat)
+            print(f'{name:22} presence check {presence:6.2f}  schema, valid {valid:6.2f}  schema, all fields bad {rejected:6.2f}')
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+        requests = max(1, repeat // 100)
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.post('/donations', json=BODIES['donations'])
+        print(f"\nPOST /donations, valid        {response.status_code}  "
+              f'{(time.perf_counter() - started) / requests * 1000:6.2f} ms per request')
+        for label, body in BAD_DONATIONS.items():
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = client.post('/donations', json=body)
+            print(f'POST /donations, {label:22} {response.status_code}  '
+                  f'{(time.perf_counter() - started) / requests * 1000:6.2f} ms per request  {response.json["errors"]}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time request body validation.')
+    parser.add_argument('--repeat', type=int, default=100000)
+    args = parser.parse_args()
+    main(args.repeat)
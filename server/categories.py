@@ -0,0 +1,81 @@
+"""Categories postings, fundings and social integrations are filed under."""
+from flask import Blueprint, request, jsonify
+from models import db, Category
+from deletion import start_deletion, deletion_response
+from filters import FilterError, filter_ids
+from batch import register_loader
+from idempotency import idempotent
+from validation import Schema, String, Integer, TEXT_LENGTH, validated
+
+bp = Blueprint('categories', __name__)
+
+def serialize_category(category):
+    return {
+        'id': category.id,
+        'name': category.name,
+        'description': category.description,
+    }
+
+COMPACT_COLUMNS = (Category.id, Category.name)
+
+def compact_category(category):
+    return {'id': category.id, 'name': category.name}
+
+@bp.route('/categories/<int:id>', methods=['GET'])
+def get_category(id):
+    category = Category.query.get(id)
+    if category:
+        return jsonify(serialize_category(category)), 200
+    return jsonify({'message': 'Category not found'}), 404
+
+register_loader('categories.get_category', Category, serialize_category, 'Category not found')
+
+@bp.route('/categories', methods=['GET'])
+def get_categories():
+    try:
+        categories = filter_ids(Category.query, Category, request.args).all()
+    except FilterError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify([serialize_category(category) for category in categories]), 200
+
+CATEGORY = Schema(
+    name=String(required=True, min_length=1),
+    description=String(max_length=TEXT_LENGTH),
+    user_id=Integer(min=1),
+)
+CATEGORY_UPDATE = CATEGORY.partial('name', 'description')
+
+@bp.route('/categories', methods=['POST'])
+@validated(CATEGORY)
+@idempotent
+def create_category(data):
+    new_category = Category(
+        name=data['name'],
+        description=data.get('description'),
+        user_id=data.get('user_id')
+    )
+    db.session.add(new_category)
+    db.session.commit()
+    return jsonify({'message': 'Category created successfully!', 'category_id': new_category.id}), 201
+
+@bp.route('/categories/<int:id>', methods=['PUT'])
+@validated(CATEGORY_UPDATE)
+def update_category(id, data):
+    category = Category.query.get(id)
+    if not category:
+        return jsonify({'message': 'Category not found!'}), 404
+
+    if 'name' in data:
+        category.name = data['name']
+    if 'description' in data:
+        category.description = data['description']
+
+    db.session.commit()
+    return jsonify({'message': 'Category updated successfully!'}), 200
+
+@bp.route('/categories/<int:id>', methods=['DELETE'])
+def delete_category(id):
+    category = Category.query.get(id)
+    if category:
+        return deletion_response(start_deletion('category', id), 'Category deleted successfully!')
+    return jsonify({'message': 'Category not found!'}), 404
@@ -0,0 +1,297 @@
+import json
+import threading
+import time
+from datetime import datetime, date
+from enum import Enum as PyEnum
+
+from flask import request, Response, stream_with_context
+from flask_restful import Resource
+from sqlalchemy import event, inspect, select
+from money import to_json
+from models import db, location_name, SoftDeleteMixin, ChangeLog, User, Category, Employment, SocialIntegration, Application, Funding, FundingApplication, Donation
+
+# Models whose writes end up in the change log. The change log itself and
+# bookkeeping tables (webhook cursors etc.) are deliberately left out.
+TRACKED_MODELS = (User, Category, Employment, SocialIntegration, Application, Funding, FundingApplication, Donation)
+
+# Column values that are safe to publish to partners. Every other changed
+# column is only reported by name, so passwords, emails and free text never
+# leave the database through the feed.
+PUBLISHED_FIELDS = {
+    'user': (),
+    'category': ('name',),
+    'employment': ('user_id', 'category_id', 'title', 'location', 'salary_range', 'salary_currency'),
+    'socialintegration': ('user_id', 'category_id'),
+    'application': ('user_id', 'employment_id'),
+    'funding': ('category_id', 'grant_name', 'grant_type', 'amount', 'currency'),
+    'funding_application': ('user_id', 'funding_id', 'status', 'application_type'),
+    'donation': ('user_id', 'donation_type', 'amount', 'currency', 'payment_method', 'payment_status'),
+}
+
+# Bookkeeping columns bumped on every write, and review leases; not worth
+# reporting. Setting deleted_at is reported as a delete instead (see _soft_deleted).
+IGNORED_FIELDS = ('updated_at', 'version', 'deleted_at', 'reviewer_id', 'lease_expires_at')
+
+# Lookup ids published under their readable name, so the feed keeps the
+# shape it had before the values were interned.
+LOOKUP_FIELDS = {'location_id': ('location', location_name)}
+
+# Minor unit columns published under their API name, in major units of the
+# currency column next to them, as they were before money was stored in
+# minor units.
+MONEY_FIELDS = {'amount_minor': ('amount', 'currency'), 'salary_minor': ('salary_range', 'salary_currency')}
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_WAIT = 30
+POLL_INTERVAL = 1.0
+
+# Wakes long-polling and streaming readers in this process as soon as a
+# tracked write commits. Readers still poll the table every POLL_INTERVAL so
+# they also see commits made by other workers.
+_new_changes = threading.Condition()
+
+
+def _jsonable(value):
+    if isinstance(value, PyEnum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _public(key, value, currency=None):
+    """Public name and value of a column; money needs the row's currency."""
+    if key in LOOKUP_FIELDS:
+        name, resolve = LOOKUP_FIELDS[key]
+        return name, resolve(value)
+    if key in MONEY_FIELDS:
+        return MONEY_FIELDS[key][0], None if currency is None else to_json(value, currency)
+    return key, value
+
+def _currency_of(state, key, previous=False):
+    # Current or, for the previous amount, pre-update currency of a money column
+    if key not in MONEY_FIELDS:
+        return None
+    currency_key = MONEY_FIELDS[key][1]
+    history = state.attrs[currency_key].history
+    if previous and history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), currency_key)
+
+def _changed_text_fields(obj, operation):
+    # Columns kept in a side table (see TextSideTable) count as the owner's
+    state = inspect(obj)
+    names = getattr(obj, 'TEXT_FIELDS', ())
+    if operation != 'update' or not names:
+        return list(names)
+    if 'text' in state.unloaded or obj.text is None:
+        return []
+    text_state = inspect(obj.text)
+    if text_state.pending:
+        return list(names)
+    return [name for name in names if text_state.attrs[name].history.has_changes()]
+
+def _soft_deleted(obj):
+    # To readers of the feed a flagged row is gone, like a deleted one
+    if not isinstance(obj, SoftDeleteMixin) or obj.deleted_at is None:
+        return False
+    return inspect(obj).attrs.deleted_at.history.has_changes()
+
+def _row_id(obj):
+    mapper = inspect(obj).mapper
+    return getattr(obj, mapper.primary_key[0].key)
+
+def _describe(obj, operation):
+    state = inspect(obj)
+    table_name = state.mapper.local_table.name
+    published = PUBLISHED_FIELDS.get(table_name, ())
+    fields, values, previous = [], {}, {}
+
+    for attr in state.mapper.column_attrs:
+        if attr.columns[0].primary_key or attr.key in IGNORED_FIELDS:
+            continue
+        key, value = _public(attr.key, getattr(obj, attr.key), _currency_of(state, attr.key))
+        if operation == 'update':
+            history = state.attrs[attr.key].history
+            if not history.has_changes():
+                continue
+            if key in published and history.deleted:
+                previous[key] = _jsonable(_public(attr.key, history.deleted[0], _currency_of(state, attr.key, previous=True))[1])
+        fields.append(key)
+        if key in published:
+            values[key] = _jsonable(value)
+    fields.extend(_changed_text_fields(obj, operation))
+
+    if operation == 'update' and not fields:
+        return None
+
+    payload = {'fields': fields, 'values': values}
+    if previous:
+        payload['previous'] = previous
+    return {
+        'table_name': table_name,
+        'row_id': _row_id(obj),
+        'operation': operation,
+        'changes': json.dumps(payload),
+        'created_at': datetime.utcnow(),
+    }
+
+def _as_enum(model, key, value):
+    # Core statements accept enum names as plain strings; publish the value
+    # like the flush path does.
+    column = model.__table__.c.get(key)  # None for side table text
+    enum_class = getattr(column.type, 'enum_class', None) if column is not None else None
+    if enum_class and isinstance(value, str) and value in enum_class.__members__:
+        return enum_class[value]
+    return value
+
+def record_update(session, model, row_id, values):
+    """Log an UPDATE issued as a single Core statement, bypassing the flush.
+
+    Previous values are not available without an extra SELECT, so entries
+    written here only carry the new values of published fields. An amount
+    is only published when its currency is written with it.
+    """
+    table_name = model.__table__.name
+    published = PUBLISHED_FIELDS.get(table_name, ())
+    public, unpriced = {}, set()
+    for key, value in values.items():
+        if key in IGNORED_FIELDS:
+            continue
+        currency = None
+        if key in MONEY_FIELDS:
+            currency = values.get(MONEY_FIELDS[key][1])
+            if currency is None:
+                unpriced.add(MONEY_FIELDS[key][0])
+        name, value = _public(key, _as_enum(model, key, value), currency)
+        public[name] = value
+    if not public:
+        return
+    payload = {
+        'fields': list(public),
+        'values': {key: _jsonable(value) for key, value in public.items() if key in published and key not in unpriced},
+    }
+    session.connection().execute(ChangeLog.__table__.insert(), {
+        'table_name': table_name,
+        'row_id': row_id,
+        'operation': 'update',
+        'changes': json.dumps(payload),
+        'created_at': datetime.utcnow(),
+    })
+    session.info['has_new_changes'] = True
+
+def _capture_changes(session, flush_context):
+    rows = []
+    for operation, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            if not isinstance(obj, TRACKED_MODELS):
+                continue
+            row = _describe(obj, 'delete' if operation == 'update' and _soft_deleted(obj) else operation)
+            if row:
+                rows.append(row)
+    if rows:
+        session.connection().execute(ChangeLog.__table__.insert(), rows)
+        session.info['has_new_changes'] = True
+
+def _notify_readers(session):
+    if session.info.pop('has_new_changes', False):
+        with _new_changes:
+            _new_changes.notify_all()
+
+def _forget_changes(session):
+    session.info.pop('has_new_changes', None)
+
+def init_change_capture():
+    # Append to the change log in the same transaction as the write itself.
+    if not event.contains(db.session, 'after_flush', _capture_changes):
+        event.listen(db.session, 'after_flush', _capture_changes)
+        event.listen(db.session, 'after_commit', _notify_readers)
+        event.listen(db.session, 'after_rollback', _forget_changes)
+
+
+def serialize_change(row):
+    return {
+        'seq': row.seq,
+        'table': row.table_name,
+        'id': row.row_id,
+        'operation': row.operation,
+        'changes': json.loads(row.changes) if row.changes else None,
+        'created_at': row.created_at.isoformat(),
+    }
+
+def fetch_changes(since, limit=DEFAULT_LIMIT, tables=None):
+    query = select(ChangeLog.__table__).where(ChangeLog.seq > since)
+    if tables:
+        query = query.where(ChangeLog.table_name.in_(tables))
+    query = query.order_by(ChangeLog.seq).limit(limit)
+    # A short-lived connection per poll, so every call sees the latest
+    # committed rows instead of the snapshot of a long-lived session.
+    with db.engine.connect() as connection:
+        return [serialize_change(row) for row in connection.execute(query)]
+
+def wait_for_changes(since, limit, tables, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        changes = fetch_changes(since, limit, tables)
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes
+        with _new_changes:
+            _new_changes.wait(min(remaining, POLL_INTERVAL))
+
+
+def _parse_args():
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        wait = min(float(request.args.get('wait', 0)), MAX_WAIT)
+    except ValueError:
+        return None
+    tables = [t for t in request.args.get('tables', '').split(',') if t]
+    return since, max(limit, 1), max(wait, 0), tables
+
+class ChangesResource(Resource):
+    def get(self):
+        args = _parse_args()
+        if args is None:
+            return {'message': 'since, limit and wait must be numbers'}, 400
+        since, limit, wait, tables = args
+
+        changes = wait_for_changes(since, limit, tables, wait)
+        return {
+            'changes': changes,
+            'last_seq': changes[-1]['seq'] if changes else since,
+        }, 200
+
+class ChangeStreamResource(Resource):
+    def get(self):
+        args = _parse_args()
+        if args is None:
+            return {'message': 'since, limit and wait must be numbers'}, 400
+        since, limit, _, tables = args
+        # Reconnecting EventSource clients resume from the last id they saw.
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        if last_event_id.isdigit():
+            since = int(last_event_id)
+
+        @stream_with_context
+        def stream():
+            last_seq = since
+            while True:
+                changes = wait_for_changes(last_seq, limit, tables, MAX_WAIT)
+                if not changes:
+                    yield ': keep-alive\n\n'
+                    continue
+                for change in changes:
+                    last_seq = change['seq']
+                    yield f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+
+        return Response(stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+
+
+def initialize_change_routes(api):
+    api.add_resource(ChangesResource, '/changes')
+    api.add_resource(ChangeStreamResource, '/changes/stream')
@@ -0,0 +1,131 @@
+from datetime import datetime, timezone
+
+from flask import request, make_response, jsonify
+from sqlalchemy import inspect, select, update, insert
+from models import db
+from changes import record_update
+
+
+def make_etag(model, row_id, version):
+    # The row version changes on every update, so table/id/version is enough
+    # to identify a representation without serializing the body.
+    return f'{model.__table__.name}-{row_id}-{version}'
+
+def etag_for(obj):
+    mapper = inspect(obj).mapper
+    return make_etag(mapper.class_, getattr(obj, mapper.primary_key[0].key), obj.version)
+
+def last_modified_for(obj):
+    # HTTP dates have second precision
+    return obj.updated_at.replace(microsecond=0, tzinfo=timezone.utc)
+
+def not_modified(obj):
+    """Return a 304 response if the client's cached copy of obj is current."""
+    etag = etag_for(obj)
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since:
+        fresh = last_modified_for(obj) <= request.if_modified_since
+    else:
+        fresh = False
+
+    if not fresh:
+        return None
+    response = make_response('', 304)
+    return with_validators(response, obj)
+
+def with_validators(response, obj):
+    response.set_etag(etag_for(obj))
+    response.last_modified = last_modified_for(obj)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def parse_updated_since():
+    """Parse ?updated_since= as a naive UTC datetime; raises ValueError."""
+    value = request.args.get('updated_since')
+    if not value:
+        return None
+    since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+def filter_updated_since(query, model):
+    since = parse_updated_since()
+    if since is None:
+        return query
+    # >= rather than > so rows written in the same instant as the client's
+    # watermark are not skipped; clients de-duplicate by id.
+    return query.filter(model.updated_at >= since).order_by(model.updated_at)
+
+
+def _expected_versions(model, row_id):
+    """Versions allowed by If-Match: None for any, an empty list for none."""
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    prefix = make_etag(model, row_id, '')
+    versions = []
+    for etag in request.if_match.as_set():
+        if etag.startswith(prefix) and etag[len(prefix):].isdigit():
+            versions.append(int(etag[len(prefix):]))
+    return versions
+
+def conditional_update(model, row_id, values):
+    """Apply values with one UPDATE ... WHERE id=? [AND version=?] statement.
+
+    The If-Match header, when sent, is folded into the WHERE clause, so the
+    row is never loaded first. Soft deleted rows never match. Columns kept in a side table (TEXT_FIELDS)
+    are written there in the same transaction. Commits and returns the new
+    ETag, or returns None when no row matched (see failed_update).
+    """
+    table = model.__table__
+    pk = inspect(model).primary_key[0]
+    expected = _expected_versions(model, row_id)
+    if expected == []:
+        return None
+
+    text_fields = getattr(model, 'TEXT_FIELDS', ())
+    row_values = {key: value for key, value in values.items() if key not in text_fields}
+    text_values = {key: value for key, value in values.items() if key in text_fields}
+
+    statement = update(table).where(pk == row_id)
+    if 'deleted_at' in table.c:
+        statement = statement.where(table.c.deleted_at.is_(None))
+    if expected is not None:
+        statement = statement.where(table.c.version.in_(expected))
+    statement = statement.values(version=table.c.version + 1, **row_values).returning(table.c.version)
+
+    new_version = db.session.execute(statement).scalar()
+    if new_version is None:
+        db.session.rollback()
+        return None
+    if text_values:
+        _update_text(model, row_id, text_values)
+    record_update(db.session, model, row_id, values)
+    db.session.commit()
+    return make_etag(model, row_id, new_version)
+
+def _update_text(model, row_id, values):
+    # The owner row is already updated, so this transaction holds the write
+    # lock and the side row cannot appear in between.
+    text_table = inspect(model).relationships['text'].mapper.local_table
+    key = text_table.primary_key.columns[0]
+    if not db.session.execute(update(text_table).where(key == row_id).values(**values)).rowcount:
+        db.session.execute(insert(text_table).values({key.name: row_id, **values}))
+
+def failed_update(model, row_id, not_found_message):
+    # Only reached on the slow path; tells a missing row from a stale ETag.
+    pk = inspect(model).primary_key[0]
+    query = select(pk).where(pk == row_id)
+    if 'deleted_at' in model.__table__.c:
+        query = query.where(model.__table__.c.deleted_at.is_(None))
+    exists = db.session.execute(query).first()
+    if not exists:
+        return jsonify({'message': not_found_message}), 404
+    return jsonify({'message': 'Resource was modified by someone else, reload and retry!'}), 412
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,395 @@
+"""Deleting users and categories together with everything that hangs off them.
+
+The rows depending on a user or category are described as SQL predicates
+on their tables (see _plan), so the whole dependency closure is counted and
+deleted with set-based statements and never loaded into the session.
+Children go before their parents, so no step leaves an orphan behind:
+
+- a user takes their employments, applications (theirs and those to their
+  employments), social integrations, funding applications and refresh
+  tokens with them; their donations and categories stay, unattributed
+- a category takes its employments with their applications, its social
+  integrations, and its fundings with their funding applications
+
+Rows are deleted in batches of DELETION_BATCH_SIZE, each in its own short
+transaction, so other writers get the SQLite write lock in between. When
+the closure is small the request does the work itself; otherwise it only
+records a deletion_job and answers 202, and a background worker in one of
+the processes runs the job, saving its progress with every batch:
+
+    DELETE /users/7            -> 202, Location: /deletions/12
+    GET /deletions/12          -> {"status": "running", "progress": 0.4, ...}
+
+A job whose worker died is picked up again by another one; every batch is
+idempotent. Matching rows in the archive (see archive.py) are removed
+first, while their hot parents still identify them.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, url_for, jsonify
+from flask_restful import Resource
+from sqlalchemy import select, delete, update, insert, func, or_, literal
+from models import (db, ChangeLog, DeletionJob, User, Category, Employment, EmploymentText, Application, ApplicationText,
+                    SocialIntegration, Funding, FundingApplication, FundingApplicationText, Donation, RefreshToken, RevokedToken)
+from changes import TRACKED_MODELS
+from archive import ARCHIVE_TABLES, attached_archive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+# Closures up to this many rows are deleted within the request
+DEFAULT_INLINE_LIMIT = 2000
+# A running job not heard from for this long is taken over by another worker
+STALE_AFTER = timedelta(seconds=60)
+
+_TABLES = {model.__table__.name: model.__table__ for model in (
+    User, Category, Employment, EmploymentText, Application, ApplicationText, SocialIntegration,
+    Funding, FundingApplication, FundingApplicationText, Donation, RefreshToken,
+)}
+# Deletions of these are published to the change log
+_TRACKED = {model.__table__.name for model in TRACKED_MODELS}
+
+
+class Step:
+    """Rows of one table in the closure, and what happens to them.
+
+    where(tables) builds the predicate from a name -> Table mapping, so the
+    same plan runs against the hot tables and the archive. A step with a
+    detach column clears that column instead of deleting the row.
+    """
+
+    def __init__(self, table_name, where, detach=None):
+        self.table_name = table_name
+        self.where = where
+        self.detach = detach
+
+class _ArchiveTables(dict):
+    """Archived tables where there are any, hot ones for the rest."""
+
+    def __missing__(self, name):
+        return _TABLES[name]
+
+def _ids(tables, table_name, condition):
+    table = tables[table_name]
+    query = select(table.c.id).where(condition(table))
+    hot = _TABLES[table_name]
+    if table is not hot:
+        # An archived application may belong to an employment that is still hot
+        query = query.union(select(hot.c.id).where(condition(hot)))
+    return query
+
+def _plan(root, row_id):
+    """Steps for deleting one user or category, children first, root last."""
+    if root == 'user':
+        employments = lambda t: _ids(t, 'employment', lambda e: e.c.user_id == row_id)
+        applications = lambda t: _ids(t, 'application', lambda a: or_(a.c.user_id == row_id, a.c.employment_id.in_(employments(t))))
+        funding_applications = lambda t: _ids(t, 'funding_application', lambda f: f.c.user_id == row_id)
+        return [
+            Step('application_text', lambda t: t['application_text'].c.application_id.in_(applications(t))),
+            Step('application', lambda t: t['application'].c.id.in_(applications(t))),
+            Step('employment_text', lambda t: t['employment_text'].c.employment_id.in_(employments(t))),
+            Step('employment', lambda t: t['employment'].c.user_id == row_id),
+            Step('socialintegration', lambda t: t['socialintegration'].c.user_id == row_id),
+            Step('funding_application_text', lambda t: t['funding_application_text'].c.funding_application_id.in_(funding_applications(t))),
+            Step('funding_application', lambda t: t['funding_application'].c.user_id == row_id),
+            Step('refresh_token', lambda t: t['refresh_token'].c.user_id == row_id),
+            # Money received and categories others post under outlive the account
+            Step('donation', lambda t: t['donation'].c.user_id == row_id, detach='user_id'),
+            Step('category', lambda t: t['category'].c.user_id == row_id, detach='user_id'),
+            Step('user', lambda t: t['user'].c.id == row_id),
+        ]
+    employments = lambda t: _ids(t, 'employment', lambda e: e.c.category_id == row_id)
+    applications = lambda t: _ids(t, 'application', lambda a: a.c.employment_id.in_(employments(t)))
+    fundings = lambda t: _ids(t, 'funding', lambda f: f.c.category_id == row_id)
+    funding_applications = lambda t: _ids(t, 'funding_application', lambda f: f.c.funding_id.in_(fundings(t)))
+    return [
+        Step('application_text', lambda t: t['application_text'].c.application_id.in_(applications(t))),
+        Step('application', lambda t: t['application'].c.employment_id.in_(employments(t))),
+        Step('employment_text', lambda t: t['employment_text'].c.employment_id.in_(employments(t))),
+        Step('employment', lambda t: t['employment'].c.category_id == row_id),
+        Step('socialintegration', lambda t: t['socialintegration'].c.category_id == row_id),
+        Step('funding_application_text', lambda t: t['funding_application_text'].c.funding_application_id.in_(funding_applications(t))),
+        Step('funding_application', lambda t: t['funding_application'].c.funding_id.in_(fundings(t))),
+        Step('funding', lambda t: t['funding'].c.category_id == row_id),
+        Step('category', lambda t: t['category'].c.id == row_id),
+    ]
+
+def _archive_plan(root, row_id):
+    """(archived table, predicate) for the steps that have rows in the archive."""
+    tables = _ArchiveTables(ARCHIVE_TABLES)
+    return [(tables[step.table_name], step.where(tables)) for step in _plan(root, row_id) if step.table_name in ARCHIVE_TABLES]
+
+
+def count_closure(root, row_id, connection):
+    """Rows each step would touch, by table name."""
+    counts = {}
+    for step in _plan(root, row_id)[:-1]:
+        table = _TABLES[step.table_name]
+        counts[step.table_name] = connection.execute(select(func.count()).select_from(table).where(step.where(_TABLES))).scalar()
+    return counts
+
+
+# Running a deletion
+
+def _key(table):
+    return table.primary_key.columns[0]
+
+def _log(connection, table_name, rows, operation, values=None):
+    if not rows:
+        return
+    connection.execute(ChangeLog.__table__.insert(), [{
+        'table_name': table_name,
+        'row_id': row_id,
+        'operation': operation,
+        'changes': json.dumps({'fields': list(values or ()), 'values': values or {}}),
+        'created_at': datetime.utcnow(),
+    } for row_id in rows])
+
+def _run_step(connection, step, batch_size=None):
+    """Delete or detach one batch (all rows when batch_size is None); returns the row count."""
+    table = _TABLES[step.table_name]
+    key = _key(table)
+    targets = select(key).where(step.where(_TABLES))
+    if batch_size:
+        targets = targets.limit(batch_size)
+    if step.detach:
+        statement = (update(table).where(key.in_(targets))
+                     .values({step.detach: None, 'version': table.c.version + 1, 'updated_at': datetime.utcnow()})
+                     .returning(key))
+        rows = connection.execute(statement).scalars().all()
+        if rows and step.table_name in _TRACKED:
+            _log(connection, step.table_name, rows, 'update', {step.detach: None})
+        return len(rows)
+    # Rows soft deleted earlier were already published as deleted
+    deleted_at = table.c.deleted_at if 'deleted_at' in table.c else literal(None)
+    rows = connection.execute(delete(table).where(key.in_(targets)).returning(key, deleted_at)).all()
+    if rows and step.table_name in _TRACKED:
+        _log(connection, step.table_name, [row[0] for row in rows if row[1] is None], 'delete')
+    return len(rows)
+
+def _revoke_logins(connection, user_id):
+    # Access tokens are checked without touching the database; revoking
+    # their families is what stops them working before they expire.
+    refresh = RefreshToken.__table__
+    expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['ACCESS_TOKEN_TTL'])
+    families = connection.execute(
+        select(refresh.c.family_id).where(refresh.c.user_id == user_id, refresh.c.revoked_at.is_(None)).distinct()
+    ).scalars().all()
+    if families:
+        connection.execute(insert(RevokedToken.__table__), [{'family_id': family, 'expires_at': expires_at} for family in families])
+    return families
+
+def _save_progress(connection, job_id, deleted):
+    table = DeletionJob.__table__
+    connection.execute(update(table).where(table.c.id == job_id).values(deleted=json.dumps(deleted), updated_at=datetime.utcnow()))
+
+def run_deletion(job_id):
+    """Carry out a claimed deletion job from wherever it stopped."""
+    config = current_app.config
+    batch_size = config.get('DELETION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    pause = config.get('DELETION_PAUSE', 0.01)
+    job = DeletionJob.__table__
+
+    with db.engine.connect() as connection:
+        row = connection.execute(select(job).where(job.c.id == job_id)).one()
+    root, row_id = row.table_name, row.row_id
+    deleted = json.loads(row.deleted or '{}')
+    steps = _plan(root, row_id)
+
+    if root == 'user':
+        with db.engine.begin() as connection:
+            families = _revoke_logins(connection, row_id)
+        for family in families:
+            current_app.extensions['token_revocations'].add(family, datetime.utcnow() + timedelta(seconds=config['ACCESS_TOKEN_TTL']))
+
+    with attached_archive() as connection:
+        for table, condition in _archive_plan(root, row_id):
+            key = _key(table)
+            while True:
+                with connection.begin():
+                    removed = connection.execute(delete(table).where(key.in_(select(key).where(condition).limit(batch_size)))).rowcount
+                if removed < batch_size:
+                    break
+
+    with db.engine.connect() as connection:
+        for step in steps[:-1]:
+            while True:
+                with connection.begin():
+                    count = _run_step(connection, step, batch_size)
+                    if count:
+                        deleted[step.table_name] = deleted.get(step.table_name, 0) + count
+                    _save_progress(connection, job_id, deleted)
+                if count < batch_size:
+                    break
+                time.sleep(pause)
+
+        # Rows added while the batches ran are swept up together with the root
+        with connection.begin():
+            for step in steps:
+                count = _run_step(connection, step)
+                if count:
+                    deleted[step.table_name] = deleted.get(step.table_name, 0) + count
+            connection.execute(update(job).where(job.c.id == job_id).values(
+                status='done', deleted=json.dumps(deleted), updated_at=datetime.utcnow(), finished_at=datetime.utcnow()
+            ))
+    return deleted
+
+def _fail(job_id, error):
+    job = DeletionJob.__table__
+    with db.engine.begin() as connection:
+        connection.execute(update(job).where(job.c.id == job_id).values(
+            status='failed', error=error, updated_at=datetime.utcnow(), finished_at=datetime.utcnow()
+        ))
+
+def claim(job_id):
+    """Take a pending job, or one whose worker went quiet; False if someone else has it."""
+    job = DeletionJob.__table__
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        return bool(connection.execute(update(job).where(
+            job.c.id == job_id,
+            or_(job.c.status == 'pending', (job.c.status == 'running') & (job.c.updated_at < now - STALE_AFTER)),
+        ).values(status='running', updated_at=now)).rowcount)
+
+def start_deletion(root, row_id):
+    """Delete a user or category with its closure.
+
+    Returns (job, finished): small closures are deleted before returning,
+    larger ones are left to the background worker.
+    """
+    job = DeletionJob.__table__
+    with db.engine.begin() as connection:
+        existing = connection.execute(select(job).where(
+            job.c.table_name == root, job.c.row_id == row_id, job.c.status.in_(('pending', 'running'))
+        )).first()
+        if existing:
+            return existing, False
+        planned = count_closure(root, row_id, connection)
+        inline = sum(planned.values()) <= current_app.config.get('DELETION_INLINE_LIMIT', DEFAULT_INLINE_LIMIT)
+        now = datetime.utcnow()
+        job_id = connection.execute(insert(job).values(
+            table_name=root, row_id=row_id, status='running' if inline else 'pending',
+            planned=json.dumps(planned), deleted='{}', created_at=now, updated_at=now,
+        )).inserted_primary_key[0]
+
+    if inline:
+        try:
+            run_deletion(job_id)
+        except Exception as e:
+            _fail(job_id, str(e))
+            raise
+    else:
+        current_app.extensions['deletion_worker'].wake()
+    with db.engine.connect() as connection:
+        return connection.execute(select(job).where(job.c.id == job_id)).one(), inline
+
+
+class DeletionWorker:
+    """Runs deletion jobs one at a time in a daemon thread.
+
+    Polls for jobs left by other processes every poll_interval seconds and
+    is woken straight away for jobs started in this one.
+    """
+
+    def __init__(self, app, poll_interval=5.0):
+        self.app = app
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='deletion-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _pending(self):
+        job = DeletionJob.__table__
+        with db.engine.connect() as connection:
+            return connection.execute(select(job.c.id).where(
+                or_(job.c.status == 'pending',
+                    (job.c.status == 'running') & (job.c.updated_at < datetime.utcnow() - STALE_AFTER))
+            ).order_by(job.c.id)).scalars().all()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    for job_id in self._pending():
+                        if not claim(job_id):
+                            continue
+                        try:
+                            run_deletion(job_id)
+                        except Exception as e:
+                            logger.exception('Deletion job %s failed', job_id)
+                            _fail(job_id, str(e))
+                except Exception:
+                    logger.exception('Deletion worker poll failed')
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+def serialize_job(row):
+    planned = json.loads(row.planned or '{}')
+    deleted = json.loads(row.deleted or '{}')
+    total = sum(planned.values())
+    done = sum(count for table, count in deleted.items() if table in planned)
+    return {
+        'id': row.id,
+        'table': row.table_name,
+        'row_id': row.row_id,
+        'status': row.status,
+        'planned': planned,
+        'deleted': deleted,
+        'progress': 1.0 if row.status == 'done' else (round(min(done / total, 1.0), 3) if total else 0.0),
+        'error': row.error,
+        'created_at': row.created_at.isoformat(),
+        'finished_at': row.finished_at.isoformat() if row.finished_at else None,
+    }
+
+def job_url(row):
+    return url_for('deletionjobresource', id=row.id)
+
+def deletion_response(started, message):
+    # Large deletions continue in the background; the job reports progress
+    job, finished = started
+    if finished:
+        return jsonify({'message': message, 'deleted': serialize_job(job)['deleted']}), 200
+    response = jsonify({'message': 'Deletion started', 'job': serialize_job(job)})
+    response.headers['Location'] = job_url(job)
+    return response, 202
+
+class DeletionJobResource(Resource):
+    def get(self, id):
+        job = DeletionJob.__table__
+        with db.engine.connect() as connection:
+            row = connection.execute(select(job).where(job.c.id == id)).first()
+        if row is None:
+            return {'message': 'Deletion job not found!'}, 404
+        return serialize_job(row), 200
+
+
+def init_deletions(app):
+    app.config.setdefault('DELETION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    app.config.setdefault('DELETION_INLINE_LIMIT', DEFAULT_INLINE_LIMIT)
+    worker = DeletionWorker(app, app.config.get('DELETION_POLL_INTERVAL', 5.0))
+    app.extensions['deletion_worker'] = worker
+    app.extensions.setdefault('workers', []).append(worker)
+    return worker
+
+def initialize_deletion_routes(api):
+    api.add_resource(DeletionJobResource, '/deletions/<int:id>')
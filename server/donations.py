@@ -0,0 +1,125 @@
+"""Donations."""
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+from models import db, Donation, DonationType, PaymentMethod, PaymentStatus, PaymentJob
+from filters import apply_filters
+from money import MoneyError, parse_money, to_json
+from conditional import not_modified, with_validators, conditional_update, failed_update, with_etag
+from batch import register_loader
+from idempotency import idempotent
+from validation import Schema, String, Integer, Amount, Enum, validated
+from payments import UNFINISHED, PaymentUnavailable, start_payment, wake_dispatcher
+
+bp = Blueprint('donations', __name__)
+
+def serialize_donation(donation):
+    return {
+        'donation_id': donation.donation_id,
+        'user_id': donation.user_id,
+        'donation_type': donation.donation_type.value,
+        'name': donation.name,
+        'organisation_name': donation.organisation_name,
+        'amount': to_json(donation.amount_minor, donation.currency),
+        'currency': donation.currency,
+        'payment_method': donation.payment_method.value,
+        'donation_date': donation.donation_date,
+        'payment_status': donation.payment_status.value,
+        'payment_reference': donation.payment_reference,
+        'updated_at': donation.updated_at.isoformat()
+    }
+
+DONATION = Schema(
+    user_id=Integer(min=1),
+    donation_type=Enum(DonationType, required=True),
+    name=String(),
+    organisation_name=String(),
+    amount=Amount(required=True),
+    currency=String(max_length=3),
+    payment_method=Enum(PaymentMethod, required=True),
+)
+DONATION_UPDATE = DONATION.partial('donation_type', 'name', 'organisation_name', 'amount', 'currency', 'payment_method')
+# What the payment job charges; fixed once there is one
+CHARGED = ('amount', 'currency', 'payment_method')
+
+@bp.route('/donations', methods=['POST'])
+@validated(DONATION)
+@idempotent
+def create_donation(data):
+    try:
+        amount_minor, currency = parse_money(data, 'amount')
+    except MoneyError as e:
+        return jsonify({'message': str(e)}), 400
+
+    donation = Donation(
+        user_id=data.get('user_id'),
+        donation_type=data['donation_type'],
+        name=data.get('name'),
+        organisation_name=data.get('organisation_name'),
+        amount_minor=amount_minor,
+        currency=currency,
+        payment_method=data['payment_method'],
+        donation_date=datetime.utcnow(),
+        payment_status=PaymentStatus.PENDING
+    )
+
+    db.session.add(donation)
+    # Charged in the background (see payments.py); poll the donation for payment_status
+    try:
+        start_payment(donation)
+    except PaymentUnavailable as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 503
+    db.session.commit()
+    wake_dispatcher()
+
+    return jsonify({"message": "Donation added successfully!", "donation_id": donation.donation_id,
+                    "payment_status": donation.payment_status.value}), 201
+
+@bp.route('/donations', methods=['GET'])
+def get_donations():
+    try:
+        donations = apply_filters(Donation.query, Donation, request.args).all()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify([serialize_donation(donation) for donation in donations]), 200
+
+@bp.route('/donations/<int:donation_id>', methods=['GET'])
+def get_donation(donation_id):
+    donation = Donation.query.get_or_404(donation_id)
+    cached = not_modified(donation)
+    if cached:
+        return cached
+    return with_validators(jsonify(serialize_donation(donation)), donation), 200
+
+register_loader('donations.get_donation', Donation, serialize_donation, 'Donation not found!')
+
+@bp.route('/donations/<int:donation_id>', methods=['PUT'])
+@validated(DONATION_UPDATE)
+def update_donation(donation_id, data):
+    charged = [key for key in CHARGED if key in data]
+    if charged and PaymentJob.query.filter_by(donation_id=donation_id).first():
+        return jsonify({'message': f"{', '.join(charged)} cannot change once the donation is being charged"}), 409
+    values = {key: data[key] for key in ['donation_type', 'name', 'organisation_name', 'payment_method'] if key in data}
+    if 'amount' in data:
+        try:
+            values['amount_minor'], values['currency'] = parse_money(data, 'amount')
+        except MoneyError as e:
+            return jsonify({'message': str(e)}), 400
+
+    etag = conditional_update(Donation, donation_id, values)
+    if not etag:
+        return failed_update(Donation, donation_id, 'Donation not found!')
+    return with_etag(jsonify({"message": "Donation updated successfully!"}), etag), 200
+
+@bp.route('/donations/<int:donation_id>', methods=['DELETE'])
+def delete_donation(donation_id):
+    donation = Donation.query.get_or_404(donation_id)
+    job = PaymentJob.query.filter_by(donation_id=donation_id).first()
+    if job is not None:
+        if job.status in UNFINISHED:
+            return jsonify({'message': 'The donation is being charged; delete it once its payment settles'}), 409
+        db.session.delete(job)
+    db.session.delete(donation)
+    db.session.commit()
+    return jsonify({"message": "Donation deleted successfully!"}), 200
@@ -0,0 +1,126 @@
+"""Job postings."""
+from flask import Blueprint, request, jsonify
+from sqlalchemy.orm import selectinload
+from models import db, intern_location, location_name, Employment
+from filters import apply_filters, parse_expand, expand
+from geo import location_columns
+from money import MoneyError, parse_money, to_json
+from conditional import not_modified, with_validators, conditional_update, failed_update, with_etag
+from batch import register_loader
+from idempotency import idempotent
+from validation import Schema, String, Integer, Amount, TEXT_LENGTH, validated
+import users
+import categories
+
+bp = Blueprint('employments', __name__)
+
+def serialize_employment(employment):
+    return {
+        'id': employment.id,
+        'user_id': employment.user_id,
+        'category_id': employment.category_id,
+        'title': employment.title,
+        'description': employment.description,
+        'requirements': employment.requirements,
+        'location': employment.location,
+        'salary_range': to_json(employment.salary_minor, employment.salary_currency),
+        'salary_currency': employment.salary_currency,
+        'updated_at': employment.updated_at.isoformat()
+    }
+
+COMPACT_COLUMNS = (Employment.id, Employment.title, Employment.location_id)
+
+def compact_employment(employment):
+    return {'id': employment.id, 'title': employment.title, 'location': location_name(employment.location_id)}
+
+# Related rows ?expand= can embed in the listing
+EXPANSIONS = {
+    'category': (Employment.category_id, categories.COMPACT_COLUMNS, categories.compact_category),
+    'user': (Employment.user_id, users.COMPACT_COLUMNS, users.compact_user),
+}
+
+EMPLOYMENT = Schema(
+    user_id=Integer(required=True, min=1),
+    category_id=Integer(required=True, min=1),
+    title=String(required=True, min_length=1),
+    description=String(required=True, max_length=TEXT_LENGTH),
+    requirements=String(max_length=TEXT_LENGTH),
+    location=String(),
+    salary_range=Amount(),
+    salary_currency=String(max_length=3),
+)
+EMPLOYMENT_UPDATE = EMPLOYMENT.partial('title', 'description', 'requirements', 'location', 'salary_range', 'salary_currency')
+
+@bp.route('/employments', methods=['POST'])
+@validated(EMPLOYMENT)
+@idempotent
+def create_employment(data):
+    try:
+        salary_minor, salary_currency = parse_money(data, 'salary_range', 'salary_currency')
+    except MoneyError as e:
+        return jsonify({'message': str(e)}), 400
+
+    employment = Employment(
+        user_id=data['user_id'],
+        category_id=data['category_id'],
+        title=data['title'],
+        description=data['description'],
+        requirements=data.get('requirements'),
+        location=data.get('location'),
+        salary_minor=salary_minor,
+        salary_currency=salary_currency
+    )
+    db.session.add(employment)
+    db.session.commit()
+    return jsonify({'message': 'Employment created successfully!', 'employment_id': employment.id}), 201
+
+@bp.route('/employments', methods=['GET'])
+def get_employments():
+    try:
+        expansions = parse_expand(request.args, EXPANSIONS)
+        employments = apply_filters(Employment.query.options(selectinload(Employment.text)), Employment, request.args).all()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    serialized = [serialize_employment(employment) for employment in employments]
+    return jsonify(expand(employments, serialized, expansions, EXPANSIONS)), 200
+
+@bp.route('/employments/<int:id>', methods=['GET'])
+def get_employment(id):
+    employment = Employment.query.get(id)
+    if employment:
+        cached = not_modified(employment)
+        if cached:
+            return cached
+        return with_validators(jsonify(serialize_employment(employment)), employment), 200
+    return jsonify({'message': 'Employment not found!'}), 404
+
+register_loader('employments.get_employment', Employment, serialize_employment, 'Employment not found!',
+                options=(selectinload(Employment.text),))
+
+@bp.route('/employments/<int:id>', methods=['PUT'])
+@validated(EMPLOYMENT_UPDATE)
+def update_employment(id, data):
+    values = {key: data[key] for key in ['title', 'description', 'requirements', 'location'] if key in data}
+    if 'salary_range' in data:
+        try:
+            values['salary_minor'], values['salary_currency'] = parse_money(data, 'salary_range', 'salary_currency')
+        except MoneyError as e:
+            return jsonify({'message': str(e)}), 400
+    if 'location' in values:
+        location = values.pop('location')
+        values['location_id'] = intern_location(location)
+        values.update(location_columns(location))
+
+    etag = conditional_update(Employment, id, values)
+    if not etag:
+        return failed_update(Employment, id, 'Employment not found!')
+    return with_etag(jsonify({'message': 'Employment updated successfully!'}), etag), 200
+
+@bp.route('/employments/<int:id>', methods=['DELETE'])
+def delete_employment(id):
+    employment = Employment.query.get(id)
+    if employment:
+        employment.soft_delete()  # moved to the archive later, see archive.py
+        db.session.commit()
+        return jsonify({'message': 'Employment deleted successfully!'}), 200
+    return jsonify({'message': 'Employment not found!'}), 404
@@ -0,0 +1,387 @@
+"""Columnar exports of the tables for offline reporting, as Parquet or Arrow.
+
+    flask export                                      # every table, from where the last run stopped
+    flask export donation funding_application --format arrow
+    flask export employment --full                    # from the first row again
+
+Each run adds one file per table that has new rows, under EXPORT_DIR:
+
+    EXPORT_DIR/donation/000001.parquet
+    EXPORT_DIR/donation/000002.parquet
+    EXPORT_DIR/state.json
+
+and a directory of them reads as one dataset (pyarrow.dataset, pandas,
+DuckDB's read_parquet('donation/*.parquet')). Tables with an updated_at
+column are exported incrementally by it: a run takes the rows updated
+since the last one, so a row changed in between appears again in a later
+file and the newest copy of each id wins. Tables without one (location)
+only grow, and are exported by primary key. Rows updated in the last
+SETTLE_SECONDS are left for the next run, because updated_at is stamped
+before the commit and a slow transaction could otherwise land behind the
+cursor. Soft-deleted rows are exported with their deleted_at; rows moved
+to the archive (see archive.py) stop appearing.
+
+Admins can fetch the same data over HTTP, which is what the JSON API was
+being paged for:
+
+    GET /admin/exports                                          -> tables and the CLI's cursors
+    GET /admin/exports/donation?format=parquet&after=2026-10-18T00:00:00
+    GET /admin/exports/location?format=arrow&after_id=1200
+
+The file is streamed as it is written. Its X-Export-Until (or
+X-Export-Until-Id) header is the after to pass next time.
+
+Rows are read in keyset batches of EXPORT_BATCH_SIZE, each in its own
+short read, and every batch becomes one Arrow record batch (one Parquet
+row group), so memory stays flat however large the table is. Enums are
+dictionary encoded with the same dictionary in every batch. Text side
+tables are joined onto their owners, and passwords are never exported.
+
+pyarrow is only needed here; without it the command and endpoints say so
+and the rest of the app runs as before.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request, Response, stream_with_context
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import Enum, Integer, Float, DateTime, Boolean, Text, String, select, func, type_coerce, or_, and_
+from models import (db, User, Category, Location, SocialIntegration, Employment, EmploymentText, Application,
+                    ApplicationText, Funding, FundingApplication, FundingApplicationText, Donation)
+from auth import admin_required
+
+DEFAULT_BATCH_SIZE = 50000
+SETTLE_SECONDS = 60
+FORMATS = ('parquet', 'arrow')
+MEDIA_TYPES = {'parquet': 'application/vnd.apache.parquet', 'arrow': 'application/vnd.apache.arrow.stream'}
+
+
+class ExportUnavailable(RuntimeError):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ExportUnavailable('Columnar exports need pyarrow (pip install pyarrow)')
+    return pyarrow
+
+
+class TableExport:
+    """One model's table, with its text side table joined on, as Arrow record batches."""
+
+    def __init__(self, model, text_model=None, exclude=()):
+        table = model.__table__
+        self.name = table.name
+        self.key = table.primary_key.columns.values()[0]
+        self.updated_at = table.columns.get('updated_at')
+        self.columns = [column for column in table.columns if column.name not in exclude]
+        self.source = table
+        if text_model is not None:
+            text = text_model.__table__
+            owner = text.primary_key.columns.values()[0]
+            self.source = table.outerjoin(text, owner == self.key)
+            self.columns += [column for column in text.columns if column is not owner]
+        # Owners without a text row read as nulls, whatever the text columns say
+        self._nullable = {column.name for column in self.columns if column.nullable or column.table is not table}
+        # Enums and times are read as the text SQLite stores; Arrow converts
+        # them a batch at a time instead of SQLAlchemy a value at a time
+        self._selected = [type_coerce(column, String) if isinstance(column.type, (Enum, DateTime)) else column
+                          for column in self.columns]
+        self._cursor_index = self.columns.index(self.updated_at) if self.updated_at is not None else None
+        self._updated_at_text = self._selected[self._cursor_index] if self.updated_at is not None else None
+        self._key_index = self.columns.index(self.key)
+        self._arrow = None
+
+    def _compile(self):
+        """The Arrow schema and a converter per column, built on first use."""
+        if self._arrow is None:
+            pa = _pyarrow()
+            fields, converters = [], []
+            for column in self.columns:
+                kind, convert = _arrow_type(pa, column.type)
+                fields.append(pa.field(column.name, kind, nullable=column.name in self._nullable))
+                converters.append(convert)
+            self._arrow = pa.schema(fields), converters
+        return self._arrow
+
+    @property
+    def schema(self):
+        return self._compile()[0]
+
+    def until(self, connection):
+        """Where an export that starts now stops: a settled updated_at, or the largest key."""
+        if self.updated_at is not None:
+            return datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+        return connection.execute(select(func.max(self.key))).scalar()
+
+    def batches(self, after=None, after_id=None, until=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Record batches of the rows after the cursor and up to until, in cursor order."""
+        pa = _pyarrow()
+        schema, converters = self._compile()
+        if until is None:
+            with db.engine.connect() as connection:
+                until = self.until(connection)
+            if until is None:  # an empty table without updated_at
+                return
+        # Without a time to start from, every settled row is wanted: reading
+        # them in key order scans the table, instead of following the
+        # updated_at index all over it
+        by_key = self.updated_at is None or after is None
+        while True:
+            query = select(*self._selected).select_from(self.source).limit(batch_size)
+            if by_key:
+                bound = self.key <= until if self.updated_at is None else self.updated_at <= until
+                query = query.where(bound).order_by(self.key)
+                if after_id is not None:
+                    query = query.where(self.key > after_id)
+            else:
+                query = query.where(self.updated_at <= until).order_by(self.updated_at, self.key)
+                # Past the first batch the cursor is the stored text itself, compared
+                # as text the way ORDER BY sorts it (not all rows carry microseconds)
+                updated_at = self._updated_at_text if isinstance(after, str) else self.updated_at
+                later = updated_at > after
+                if after_id is not None:
+                    later = or_(later, and_(updated_at == after, self.key > after_id))
+                query = query.where(later)
+            with db.engine.connect() as connection:
+                rows = connection.execute(query).all()
+            if not rows:
+                return
+            values = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays([convert(column) for convert, column in zip(converters, values)],
+                                             schema=schema)
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]
+            after_id = last[self._key_index]
+            if not by_key:
+                after = last[self._cursor_index]
+
+
+def _arrow_type(pa, kind):
+    """The Arrow type of a column type, and the function making an array of a batch of its values."""
+    if isinstance(kind, Enum):  # an Enum is a String too, so first
+        members = list(kind.enum_class)
+        indices = {member.name: index for index, member in enumerate(members)}
+        dictionary = pa.array([member.value for member in members], pa.string())
+        index_type = pa.int8() if len(members) <= 127 else pa.int32()
+
+        def convert(values):
+            return pa.DictionaryArray.from_arrays(
+                pa.array([None if value is None else indices[value] for value in values], index_type), dictionary)
+        return pa.dictionary(index_type, pa.string()), convert
+    if isinstance(kind, DateTime):
+        return pa.timestamp('us'), lambda values: pa.array(values, pa.string()).cast(pa.timestamp('us'))
+    if isinstance(kind, Integer):
+        arrow = pa.int64()
+    elif isinstance(kind, Float):
+        arrow = pa.float64()
+    elif isinstance(kind, Boolean):
+        arrow = pa.bool_()
+    elif isinstance(kind, Text):  # cover letters and such; a batch of them can pass 2 GB of offsets
+        arrow = pa.large_string()
+    else:
+        arrow = pa.string()
+    return arrow, lambda values: pa.array(values, arrow)
+
+
+EXPORTS = {export.name: export for export in (
+    TableExport(User, exclude=('password',)),
+    TableExport(Category),
+    TableExport(Location),
+    TableExport(SocialIntegration),
+    TableExport(Employment, EmploymentText),
+    TableExport(Application, ApplicationText),
+    TableExport(Funding),
+    TableExport(FundingApplication, FundingApplicationText),
+    TableExport(Donation),
+)}
+
+
+def _writer(sink, schema, format, stream=False):
+    pa = _pyarrow()
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(sink, schema, compression='zstd')
+    return pa.ipc.new_stream(sink, schema) if stream else pa.ipc.new_file(sink, schema)
+
+def _cursor_value(until):
+    return until.isoformat() if isinstance(until, datetime) else until
+
+
+# Files under EXPORT_DIR
+
+def _export_dir():
+    return current_app.config['EXPORT_DIR']
+
+def _state_path():
+    return os.path.join(_export_dir(), 'state.json')
+
+def read_state():
+    try:
+        with open(_state_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _write_state(state):
+    # Written beside the file and renamed over it, so a crash never leaves half of it
+    path = _state_path()
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def export_table(name, format='parquet', full=False, batch_size=None):
+    """Write the table's rows since the last run to a new file; returns (path, rows), path None if none."""
+    export = EXPORTS[name]
+    batch_size = batch_size or current_app.config.get('EXPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    state = read_state()
+    cursor = {} if full else state.get(name, {})
+    after = datetime.fromisoformat(cursor['updated_at']) if cursor.get('updated_at') else None
+    with db.engine.connect() as connection:
+        until = export.until(connection)
+    if until is None:
+        return None, 0
+
+    directory = os.path.join(_export_dir(), name)
+    os.makedirs(directory, exist_ok=True)
+    files = state.get(name, {}).get('files', 0)
+    path = os.path.join(directory, f'{files + 1:06d}.{format}')
+    writer = None
+    rows = 0
+    try:
+        for batch in export.batches(after, cursor.get('key'), until, batch_size):
+            if writer is None:  # no file for a run without new rows
+                writer = _writer(path + '.tmp', export.schema, format)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(path + '.tmp')
+        raise
+    if writer is not None:
+        writer.close()
+        os.replace(path + '.tmp', path)
+        files += 1
+
+    entry = {'files': files, 'exported_at': datetime.utcnow().isoformat()}
+    entry['updated_at' if export.updated_at is not None else 'key'] = _cursor_value(until)
+    state[name] = entry
+    _write_state(state)
+    return (path if writer is not None else None), rows
+
+
+@click.command('export')
+@click.argument('tables', nargs=-1)
+@click.option('--format', 'format', type=click.Choice(FORMATS), default='parquet', show_default=True)
+@click.option('--full', is_flag=True, help='Export every row again, into a new file, instead of those since the last run.')
+@click.option('--batch-size', type=int, default=None, help='Rows per record batch.')
+@with_appcontext
+def export_command(tables, format, full, batch_size):
+    """Export TABLES (default: all) to EXPORT_DIR for offline reporting."""
+    unknown = [name for name in tables if name not in EXPORTS]
+    if unknown:
+        raise click.BadParameter(f"{', '.join(unknown)}; choose from {', '.join(EXPORTS)}", param_hint='TABLES')
+    try:
+        _pyarrow()
+    except ExportUnavailable as e:
+        raise click.ClickException(str(e))
+    for name in tables or EXPORTS:
+        path, rows = export_table(name, format, full, batch_size)
+        click.echo(f'{name}: {rows} rows' + (f' -> {path}' if path else ''))
+
+
+# Over HTTP
+
+class _Chunks:
+    """A write-only file for the writers that hands back what was written since the last take()."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class ExportsResource(Resource):
+    method_decorators = [admin_required]
+
+    def get(self):
+        state = read_state()
+        return {'tables': [{
+            'name': name,
+            'incremental_by': 'updated_at' if export.updated_at is not None else export.key.name,
+            'cli_cursor': state.get(name),
+        } for name, export in EXPORTS.items()]}, 200
+
+class ExportResource(Resource):
+    method_decorators = [admin_required]
+
+    def get(self, table):
+        export = EXPORTS.get(table)
+        if export is None:
+            return {'message': f"No export for {table}; choose from {', '.join(EXPORTS)}"}, 404
+        format = request.args.get('format', 'parquet')
+        if format not in FORMATS:
+            return {'message': f"format must be one of {', '.join(FORMATS)}"}, 400
+        try:
+            after = datetime.fromisoformat(request.args['after']) if request.args.get('after') else None
+            after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+        except ValueError:
+            return {'message': 'after must be an ISO 8601 time and after_id a number'}, 400
+        try:
+            schema = export.schema
+        except ExportUnavailable as e:
+            return {'message': str(e)}, 501
+        with db.engine.connect() as connection:
+            until = export.until(connection)
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+        @stream_with_context
+        def stream():
+            sink = _Chunks()
+            writer = _writer(sink, schema, format, stream=True)
+            if until is not None:
+                for batch in export.batches(after, after_id, until, batch_size):
+                    writer.write_batch(batch)
+                    yield sink.take()
+            writer.close()
+            yield sink.take()
+
+        header = 'X-Export-Until' if export.updated_at is not None else 'X-Export-Until-Id'
+        headers = {'Content-Disposition': f'attachment; filename={table}.{format}'}
+        if until is not None:
+            headers[header] = str(_cursor_value(until))
+        return Response(stream(), mimetype=MEDIA_TYPES[format], headers=headers)
+
+
+def init_exports(app):
+    app.cli.add_command(export_command)
+
+def initialize_export_routes(api):
+    api.add_resource(ExportsResource, '/admin/exports')
+    api.add_resource(ExportResource, '/admin/exports/<string:table>')
@@ -0,0 +1,348 @@
+"""Faceted counts for the job board, served from memory.
+
+GET /employments/facets?q=nurse&category_id=3,7&location=Nairobi&salary_bucket=50000-74999
+
+The index keeps a posting set of employment ids per category, location,
+salary bucket and title word. Dense postings are also cached as int bitmaps
+so a facet count is an AND plus a popcount. Narrow result sets are counted
+by walking their ids instead.
+
+Facets are disjunctive: the counts for one dimension ignore that
+dimension's own selection, so a UI can offer the other values of a
+multi-select next to the current results. The index catches up with
+employment writes from any worker by reading the change log; soft deleted
+and archived postings drop out of it the same way. It is built in the
+background when the server starts (see init_facets), so the first request
+does not wait for the full load.
+"""
+import logging
+import re
+import threading
+from array import array
+from collections import Counter
+
+from flask import request
+from flask_restful import Resource
+from sqlalchemy import select, func
+from models import db, Employment, Category, ChangeLog, Location
+from money import from_minor
+
+logger = logging.getLogger(__name__)
+
+SALARY_BUCKETS = [(0, 29999), (30000, 49999), (50000, 74999), (75000, 99999), (100000, None)]
+DIMENSIONS = ('category', 'location', 'salary')
+
+# Result sets up to this size are counted by walking their ids
+ENUMERATE_LIMIT = 20000
+# For broad result sets, location counts are limited to the most common ones
+TRACKED_LOCATIONS = 64
+FACET_LIMIT = 20
+# Past this many pending changes a full reload is cheaper
+MAX_INCREMENTAL = 50000
+
+_WORD = re.compile(r'\w+')
+_NONZERO = re.compile(rb'[^\x00]')
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def _salary(row):
+    # Buckets are in major units
+    return None if row.salary_minor is None else from_minor(row.salary_minor, row.salary_currency)
+
+def salary_bucket(salary):
+    if salary is None:
+        return None
+    for index, (low, high) in enumerate(SALARY_BUCKETS):
+        if salary >= low and (high is None or salary <= high):
+            return index
+    return None
+
+def bucket_label(index):
+    low, high = SALARY_BUCKETS[index]
+    return f'{low}-{high}' if high is not None else f'{low}+'
+
+def tokenize(text):
+    return {word.lower() for word in _WORD.findall(text or '')}
+
+def to_bitmap(ids):
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+def bitmap_ids(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    # Let the regex engine skip the empty stretches of a sparse bitmap
+    for match in _NONZERO.finditer(data):
+        offset = match.start()
+        base = offset * 8
+        for bit in _BYTE_BITS[data[offset]]:
+            yield base + bit
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.last_seq = 0
+        self._reset()
+
+    def _reset(self):
+        self.postings = {dimension: {} for dimension in DIMENSIONS + ('word',)}
+        self._bitmaps = {}
+        # Per-id columns, used to undo a row's postings and to count narrow sets
+        self.category_of = array('l')
+        self.bucket_of = array('b')
+        self.location_of = array('l')
+        self.words_of = []
+        self.locations = []  # interned location names
+        self._location_ids = {}
+        self.live = set()
+        self._tracked_locations = None
+
+    def _grow(self, row_id):
+        missing = row_id + 1 - len(self.category_of)
+        if missing > 0:
+            self.category_of.extend([-1] * missing)
+            self.bucket_of.extend([-1] * missing)
+            self.location_of.extend([-1] * missing)
+            self.words_of.extend([()] * missing)
+
+    def _intern(self, location):
+        if location not in self._location_ids:
+            self._location_ids[location] = len(self.locations)
+            self.locations.append(location)
+        return self._location_ids[location]
+
+    def _post(self, dimension, value, row_id, add):
+        postings = self.postings[dimension]
+        ids = postings.get(value)
+        if add:
+            if ids is None:
+                ids = postings[value] = set()
+                if dimension == 'location':
+                    self._tracked_locations = None
+            ids.add(row_id)
+        elif ids is not None:
+            ids.discard(row_id)
+            if not ids:
+                del postings[value]
+                if dimension == 'location':
+                    self._tracked_locations = None
+        self._bitmaps.pop((dimension, value), None)
+
+    def _unindex(self, row_id):
+        if row_id not in self.live:
+            return
+        self.live.discard(row_id)
+        self._post('category', self.category_of[row_id], row_id, False)
+        if self.location_of[row_id] >= 0:
+            self._post('location', self.location_of[row_id], row_id, False)
+        if self.bucket_of[row_id] >= 0:
+            self._post('salary', self.bucket_of[row_id], row_id, False)
+        for word in self.words_of[row_id]:
+            self._post('word', word, row_id, False)
+        self.words_of[row_id] = ()
+
+    def apply(self, row_id, category_id=None, location=None, salary=None, title=None, live=True):
+        """Index the current state of one employment, or drop it when not live."""
+        with self._lock:
+            self._grow(row_id)
+            self._unindex(row_id)
+            if not live:
+                return
+            self.live.add(row_id)
+            self.category_of[row_id] = category_id
+            self._post('category', category_id, row_id, True)
+            location_id = self._intern(location) if location else -1
+            self.location_of[row_id] = location_id
+            if location_id >= 0:
+                self._post('location', location_id, row_id, True)
+            bucket = salary_bucket(salary)
+            self.bucket_of[row_id] = -1 if bucket is None else bucket
+            if bucket is not None:
+                self._post('salary', bucket, row_id, True)
+            words = tuple(tokenize(title))
+            self.words_of[row_id] = words
+            for word in words:
+                self._post('word', word, row_id, True)
+
+    def _bitmap(self, dimension, value):
+        key = (dimension, value)
+        if key not in self._bitmaps:
+            self._bitmaps[key] = to_bitmap(self.postings[dimension].get(value, ()))
+        return self._bitmaps[key]
+
+    def _select(self, dimension, values):
+        """Bitmap of rows matching any of values in one dimension."""
+        bitmap = 0
+        for value in values:
+            bitmap |= self._bitmap(dimension, value)
+        return bitmap
+
+    def _common_locations(self):
+        if self._tracked_locations is None:
+            postings = self.postings['location']
+            self._tracked_locations = sorted(postings, key=lambda value: len(postings[value]), reverse=True)[:TRACKED_LOCATIONS]
+        return self._tracked_locations
+
+    def _count(self, dimension, bitmap):
+        if bitmap is None:
+            counts = {value: len(ids) for value, ids in self.postings[dimension].items()}
+        elif bitmap.bit_count() <= ENUMERATE_LIMIT:
+            column = {'category': self.category_of, 'location': self.location_of, 'salary': self.bucket_of}[dimension]
+            counts = Counter(map(column.__getitem__, bitmap_ids(bitmap)))
+            counts.pop(-1, None)
+        else:
+            values = self.postings[dimension]
+            if dimension == 'location':
+                values = self._common_locations()
+            counts = {value: (self._bitmap(dimension, value) & bitmap).bit_count() for value in values}
+        return Counter({value: count for value, count in counts.items() if count})
+
+    def facets(self, q=None, selected=None):
+        """Counts per dimension for the rows matching q and the other selections.
+
+        selected maps a dimension to the values chosen in it (ids, interned
+        location ids or bucket indexes).
+        """
+        selected = {dimension: values for dimension, values in (selected or {}).items() if values}
+        with self._lock:
+            base = None
+            words = tokenize(q)
+            for word in words:
+                bitmap = self._bitmap('word', word)
+                base = bitmap if base is None else base & bitmap
+
+            masks = {dimension: self._select(dimension, values) for dimension, values in selected.items()}
+
+            def combined(excluding=None):
+                bitmap = base
+                for dimension, mask in masks.items():
+                    if dimension != excluding:
+                        bitmap = mask if bitmap is None else bitmap & mask
+                return bitmap
+
+            everything = combined()
+            total = len(self.live) if everything is None else everything.bit_count()
+            counts = {dimension: self._count(dimension, combined(excluding=dimension)) for dimension in DIMENSIONS}
+            return total, counts
+
+    def location_id(self, name):
+        return self._location_ids.get(name)
+
+    # Loading and catching up from the database
+
+    def rebuild(self):
+        table = Employment.__table__
+        with self._lock:
+            with db.engine.connect() as connection:
+                last_seq = connection.execute(select(func.max(ChangeLog.seq))).scalar() or 0
+                rows = _postings(connection, table.c.deleted_at.is_(None))
+            self._reset()
+            for row in rows:
+                self.apply(row.id, row.category_id, row.location, _salary(row), row.title)
+            self.last_seq = last_seq
+            self.loaded = True
+
+    def refresh(self):
+        with self._lock:
+            if not self.loaded:
+                return self.rebuild()
+            with db.engine.connect() as connection:
+                changes = connection.execute(
+                    select(ChangeLog.seq, ChangeLog.row_id)
+                    .where(ChangeLog.seq > self.last_seq, ChangeLog.table_name == 'employment')
+                    .order_by(ChangeLog.seq)
+                    .limit(MAX_INCREMENTAL + 1)
+                ).all()
+                if not changes:
+                    return
+                if len(changes) > MAX_INCREMENTAL:
+                    return self.rebuild()
+                changed = {change.row_id for change in changes}
+                table = Employment.__table__
+                current = {row.id: row for row in _postings(connection, table.c.id.in_(changed), table.c.deleted_at.is_(None))}
+            for row_id in changed:
+                row = current.get(row_id)
+                if row is None:
+                    self.apply(row_id, live=False)
+                else:
+                    self.apply(row_id, row.category_id, row.location, _salary(row), row.title)
+            self.last_seq = changes[-1].seq
+
+
+def _postings(connection, *where):
+    """The indexed columns of the matching postings, fetched in full.
+
+    Location names come from a join rather than location_name(), which
+    would open a session of its own while the rows are still being read
+    and keep SQLite's read lock against the writers.
+    """
+    table = Employment.__table__
+    return connection.execute(
+        select(table.c.id, table.c.category_id, Location.name.label('location'), table.c.salary_minor,
+               table.c.salary_currency, table.c.title)
+        .join_from(table, Location, table.c.location_id == Location.id, isouter=True)
+        .where(*where)
+    ).all()
+
+
+facet_index = FacetIndex()
+
+
+def _multi(name):
+    return [value for value in request.args.get(name, '').split(',') if value]
+
+class EmploymentFacetsResource(Resource):
+    def get(self):
+        try:
+            category_ids = [int(value) for value in _multi('category_id')]
+        except ValueError:
+            return {'message': 'category_id must be a comma separated list of ids'}, 400
+        labels = {bucket_label(index): index for index in range(len(SALARY_BUCKETS))}
+        if any(label not in labels for label in _multi('salary_bucket')):
+            return {'message': f"salary_bucket must be one of {', '.join(labels)}"}, 400
+
+        facet_index.refresh()
+        location_ids = [facet_index.location_id(name) for name in _multi('location')]
+        selected = {
+            'category': category_ids,
+            # An unknown location selects nothing rather than everything
+            'location': [value if value is not None else -1 for value in location_ids],
+            'salary': [labels[label] for label in _multi('salary_bucket')],
+        }
+        total, counts = facet_index.facets(q=request.args.get('q'), selected=selected)
+
+        top_categories = counts['category'].most_common(FACET_LIMIT)
+        names = dict(db.session.execute(
+            select(Category.id, Category.name).where(Category.id.in_([value for value, _ in top_categories]))
+        ).all())
+        return {
+            'total': total,
+            'facets': {
+                'category': [{'id': value, 'name': names.get(value), 'count': count} for value, count in top_categories],
+                'location': [{'value': facet_index.locations[value], 'count': count}
+                             for value, count in counts['location'].most_common(FACET_LIMIT)],
+                'salary': [{'bucket': bucket_label(value), 'count': counts['salary'][value]}
+                           for value in range(len(SALARY_BUCKETS)) if counts['salary'][value]],
+            },
+        }, 200
+
+
+def init_facets(app):
+    """Build the index in the background, so the first facet request does not wait for it."""
+    def warm():
+        with app.app_context():
+            try:
+                facet_index.refresh()
+            except Exception:
+                logger.exception('Building the facet index failed')
+
+    if app.config.get('FACETS_WARM', True):
+        app.extensions.setdefault('workers', []).append(threading.Thread(target=warm, name='facets-warm', daemon=True))
+
+def initialize_facet_routes(api):
+    api.add_resource(EmploymentFacetsResource, '/employments/facets')
@@ -0,0 +1,196 @@
+"""Query-string filters and ordering for list endpoints.
+
+    /donations?payment_method=MPESA&amount__gte=100&order=-donation_date&limit=50
+    /users?ids=3,7,12
+    /employments?expand=category,user
+
+Every key is a whitelisted, indexed column of the model, optionally followed
+by an operator suffix. Values are coerced to the column type, so enums can
+be given by name (IN_REVIEW) or value (In Review). Money is filtered by its
+public name (amount, salary_range) in major units of the currency given as
+?currency= or ?salary_currency= (KES when missing), and only matches rows
+in that currency. Operators that cannot use
+an index (substring matches, negation) are refused instead of silently
+turning into a table scan. Page through large results with a range filter
+on the order column rather than an offset. ?ids= picks rows by primary key,
+in one WHERE id IN (...), on every list endpoint. ?expand= embeds related
+rows in their compact form. Each expansion is one more query, for just the
+compact columns of the distinct rows the page refers to, so a page of 3000
+applications to 3000 postings loads 3000 short rows, not 3000 entities.
+"""
+from datetime import datetime
+
+from sqlalchemy import Integer, Float, DateTime, Enum, select
+from models import db, Employment, FundingApplication, Donation
+from conditional import filter_updated_since
+from money import MoneyError, parse_currency, to_minor
+
+# Fields clients may filter and sort on. Each one is backed by an index
+# (see the add_filter_indexes migration), money fields by the index on their
+# minor unit column; keep the two in step.
+FILTERABLE = {
+    Employment: ('user_id', 'category_id', 'location', 'salary_range', 'updated_at'),
+    FundingApplication: ('user_id', 'funding_id', 'status', 'application_type', 'updated_at'),
+    Donation: ('user_id', 'donation_type', 'payment_method', 'amount', 'currency', 'donation_date', 'updated_at'),
+}
+
+# Public money field -> (minor unit column, currency column)
+MONEY_FIELDS = {
+    Employment: {'salary_range': (Employment.salary_minor, Employment.salary_currency)},
+    Donation: {'amount': (Donation.amount_minor, Donation.currency)},
+}
+
+OPERATORS = {
+    'eq': lambda column, value: column == value,
+    'in': lambda column, values: column.in_(values),
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+}
+
+# Known operators that would force a scan of the whole table
+SCANNING_OPERATORS = ('ne', 'contains', 'icontains', 'startswith', 'endswith', 'like')
+
+RESERVED = ('order', 'limit', 'updated_since', 'ids', 'expand')
+MAX_IN_VALUES = 100
+MAX_IDS = 500
+EXPAND_CHUNK = 500  # ids per IN (...) when loading expansions
+MAX_LIMIT = 1000
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _coerce(column, raw):
+    column_type = column.type
+    try:
+        if isinstance(column_type, Enum) and column_type.enum_class:
+            enum_class = column_type.enum_class
+            if raw in enum_class.__members__:
+                return enum_class[raw]
+            return enum_class(raw)
+        if isinstance(column_type, Integer):
+            return int(raw)
+        if isinstance(column_type, Float):
+            return float(raw)
+        if isinstance(column_type, DateTime):
+            return datetime.fromisoformat(raw)
+    except ValueError:
+        raise FilterError(f'Invalid value {raw!r} for {column.key}!')
+    return raw
+
+def _column(model, name):
+    if name not in FILTERABLE[model]:
+        allowed = ', '.join(FILTERABLE[model])
+        raise FilterError(f'Cannot filter or sort on {name!r}; allowed fields are {allowed}.')
+    money = MONEY_FIELDS.get(model, {}).get(name)
+    return money[0] if money else getattr(model, name)
+
+def _money_filter(model, name, args):
+    """The currency a money filter is in, and a coercion of major units to its minor units."""
+    currency_column = MONEY_FIELDS[model][name][1]
+    try:
+        currency = parse_currency(args.get(currency_column.key))
+    except MoneyError as e:
+        raise FilterError(str(e))
+
+    def coerce(column, raw):
+        try:
+            return to_minor(raw, currency)
+        except MoneyError as e:
+            raise FilterError(f'Invalid value {raw!r} for {name}: {e}')
+    return currency_column == currency, coerce
+
+def _parse_filter(model, key, raw, args):
+    name, _, operator = key.partition('__')
+    operator = operator or 'eq'
+    if operator in SCANNING_OPERATORS:
+        raise FilterError(f'Operator {operator!r} cannot use an index and is not supported.')
+    if operator not in OPERATORS:
+        raise FilterError(f'Unknown operator {operator!r}.')
+    column = _column(model, name)
+    coerce, in_currency = _coerce, None
+    if name in MONEY_FIELDS.get(model, {}):
+        in_currency, coerce = _money_filter(model, name, args)
+
+    if operator == 'in':
+        values = [value for value in raw.split(',') if value]
+        if not values or len(values) > MAX_IN_VALUES:
+            raise FilterError(f'{key} takes between 1 and {MAX_IN_VALUES} comma separated values.')
+        clause = OPERATORS['in'](column, [coerce(column, value) for value in values])
+    else:
+        clause = OPERATORS[operator](column, coerce(column, raw))
+    return clause if in_currency is None else in_currency & clause
+
+def _parse_order(model, raw):
+    clauses = []
+    for name in raw.split(','):
+        descending = name.startswith('-')
+        column = _column(model, name.lstrip('-'))
+        clauses.append(column.desc() if descending else column.asc())
+    return clauses
+
+def filter_ids(query, model, args):
+    """Restrict query to the primary keys in ?ids=, when given."""
+    if 'ids' not in args:
+        return query
+    try:
+        ids = {int(value) for value in args['ids'].split(',') if value}
+    except ValueError:
+        raise FilterError('ids must be comma separated numbers!')
+    if not ids or len(ids) > MAX_IDS:
+        raise FilterError(f'ids takes between 1 and {MAX_IDS} comma separated values.')
+    return query.filter(model.__mapper__.primary_key[0].in_(sorted(ids)))
+
+def parse_expand(args, expansions):
+    """Names in ?expand=, checked against expansions.
+
+    expansions maps a name to (foreign key column, compact columns, compact
+    serializer); the first compact column is the related primary key.
+    """
+    names = [name for name in args.get('expand', '').split(',') if name]
+    for name in names:
+        if name not in expansions:
+            raise FilterError(f"Cannot expand {name!r}; allowed are {', '.join(expansions)}.")
+    return names
+
+def expand(rows, serialized, names, expansions):
+    """Embed each expansion in the serialized rows; returns serialized."""
+    for name in names:
+        foreign_key, columns, compact = expansions[name]
+        ids = sorted({getattr(row, foreign_key.key) for row in rows} - {None})
+        related = {}
+        for start in range(0, len(ids), EXPAND_CHUNK):
+            query = select(*columns).where(columns[0].in_(ids[start:start + EXPAND_CHUNK]))
+            related.update((row[0], compact(row)) for row in db.session.execute(query))
+        for row, data in zip(rows, serialized):
+            data[name] = related.get(getattr(row, foreign_key.key))
+    return serialized
+
+def apply_filters(query, model, args):
+    """Apply ?updated_since=, ?ids=, filters, ?order= and ?limit= from args to query."""
+    try:
+        query = filter_updated_since(query, model)
+    except ValueError:
+        raise FilterError('updated_since must be an ISO 8601 timestamp!')
+    query = filter_ids(query, model, args)
+    # Currencies of money filters that are not filters themselves
+    currencies = {currency.key for _, currency in MONEY_FIELDS.get(model, {}).values()} - set(FILTERABLE[model])
+
+    for key, raw in args.items(multi=True):
+        if key in RESERVED or key in currencies or key.startswith('_'):
+            continue
+        query = query.filter(_parse_filter(model, key, raw, args))
+
+    if args.get('order'):
+        query = query.order_by(None).order_by(*_parse_order(model, args['order']))
+
+    if args.get('limit'):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise FilterError('limit must be a number!')
+        query = query.limit(min(max(limit, 1), MAX_LIMIT))
+    return query
@@ -0,0 +1,231 @@
+"""Grants and the applications for them."""
+from flask import Blueprint, request, jsonify, session
+from sqlalchemy.orm import selectinload
+from models import db, Funding, FundingApplication, GrantType, ApplicationStatus, ApplicationType
+from filters import FilterError, apply_filters, filter_ids
+from money import MoneyError, parse_money, to_json
+from conditional import not_modified, with_validators, filter_updated_since, conditional_update, failed_update, with_etag
+from batch import register_loader
+from idempotency import idempotent
+from validation import Schema, String, Integer, Amount, Enum, URL_LENGTH, TEXT_LENGTH, ValidationError, invalid, validated
+
+bp = Blueprint('fundings', __name__)
+
+# Session management functions
+def get_funding_id_for_user(user_id):
+    return session.get(f'funding_id_{user_id}')
+
+def set_funding_id_for_user(user_id, funding_id):
+    session[f'funding_id_{user_id}'] = funding_id
+
+def serialize_funding(funding):
+    return {
+        'id': funding.id,
+        'category_id': funding.category_id,
+        'grant_name': funding.grant_name,
+        'grant_type': funding.grant_type.value,
+        'amount': to_json(funding.amount_minor, funding.currency),
+        'currency': funding.currency,
+        'description': funding.description,
+        'eligibility_criteria': funding.eligibility_criteria,
+        'updated_at': funding.updated_at.isoformat()
+    }
+
+def serialize_funding_application(funding_application):
+    return {
+        'id': funding_application.id,
+        'user_id': funding_application.user_id,
+        'funding_id': funding_application.funding_id,
+        'status': funding_application.status.value,
+        'application_type': funding_application.application_type.value,
+        'supporting_documents': funding_application.supporting_documents,
+        'household_income': funding_application.household_income,
+        'number_of_dependents': funding_application.number_of_dependents,
+        'reason_for_aid': funding_application.reason_for_aid,
+        'concept_note': funding_application.concept_note,
+        'business_profile': funding_application.business_profile,
+        'updated_at': funding_application.updated_at.isoformat()
+    }
+
+FUNDING = Schema(
+    category_id=Integer(required=True, min=1),
+    grant_name=String(required=True, min_length=1, max_length=120),
+    grant_type=Enum(GrantType, required=True),
+    amount=Amount(required=True),
+    currency=String(max_length=3),
+    description=String(max_length=TEXT_LENGTH),
+    eligibility_criteria=String(max_length=TEXT_LENGTH),
+)
+FUNDING_UPDATE = FUNDING.partial()
+
+FUNDING_APPLICATION = Schema(
+    user_id=Integer(required=True, min=1),
+    funding_id=Integer(required=True, min=1),
+    application_type=Enum(ApplicationType, required=True),
+    supporting_documents=String(max_length=URL_LENGTH),
+    household_income=Integer(min=0),
+    number_of_dependents=Integer(min=0, max=100),
+    reason_for_aid=String(max_length=TEXT_LENGTH),
+    concept_note=String(max_length=URL_LENGTH),
+    business_profile=String(max_length=TEXT_LENGTH),
+)
+# status is not in either: applications start as Applied and only move through
+# the review queue, which checks the allowed transitions and leases and records
+# each one (see review.py)
+FUNDING_APPLICATION_UPDATE = FUNDING_APPLICATION.partial(
+    'application_type', 'supporting_documents', 'household_income', 'number_of_dependents',
+    'reason_for_aid', 'concept_note', 'business_profile')
+
+@bp.route('/fundings', methods=['POST'])
+@validated(FUNDING)
+@idempotent
+def create_funding(data):
+    try:
+        amount_minor, currency = parse_money(data, 'amount')
+    except MoneyError as e:
+        return jsonify({'message': str(e)}), 400
+
+    new_funding = Funding(
+        category_id=data['category_id'],
+        grant_name=data['grant_name'],
+        grant_type=data['grant_type'],
+        amount_minor=amount_minor,
+        currency=currency,
+        description=data.get('description'),
+        eligibility_criteria=data.get('eligibility_criteria')
+    )
+    db.session.add(new_funding)
+    db.session.commit()
+    return jsonify({'message': 'Funding created successfully!', 'funding_id': new_funding.id}), 201
+
+@bp.route('/fundings', methods=['GET'])
+def get_fundings():
+    try:
+        fundings = filter_ids(filter_updated_since(Funding.query, Funding), Funding, request.args).all()
+    except FilterError as e:
+        return jsonify({'message': str(e)}), 400
+    except ValueError:
+        return jsonify({'message': 'updated_since must be an ISO 8601 timestamp!'}), 400
+    return jsonify([serialize_funding(funding) for funding in fundings]), 200
+
+@bp.route('/fundings/<int:id>', methods=['GET'])
+def get_funding(id):
+    funding = Funding.query.get(id)
+    if funding:
+        cached = not_modified(funding)
+        if cached:
+            return cached
+        return with_validators(jsonify(serialize_funding(funding)), funding), 200
+    return jsonify({'message': 'Funding not found!'}), 404
+
+register_loader('fundings.get_funding', Funding, serialize_funding, 'Funding not found!')
+
+@bp.route('/fundings/<int:id>', methods=['PUT'])
+@validated(FUNDING_UPDATE)
+def update_funding(id, data):
+    funding = Funding.query.get(id)
+    if not funding:
+        return jsonify({'message': 'Funding not found!'}), 404
+
+    if 'category_id' in data:
+        funding.category_id = data['category_id']
+    if 'grant_name' in data:
+        funding.grant_name = data['grant_name']
+    if 'grant_type' in data:
+        funding.grant_type = data['grant_type']
+    if 'amount' in data:
+        try:
+            funding.amount_minor, funding.currency = parse_money(data, 'amount')
+        except MoneyError as e:
+            return jsonify({'message': str(e)}), 400
+    if 'description' in data:
+        funding.description = data['description']
+    if 'eligibility_criteria' in data:
+        funding.eligibility_criteria = data['eligibility_criteria']
+
+    db.session.commit()
+    return jsonify({'message': 'Funding updated successfully!'}), 200
+
+@bp.route('/fundings/<int:id>', methods=['DELETE'])
+def delete_funding(id):
+    funding = Funding.query.get(id)
+    if funding:
+        db.session.delete(funding)
+        db.session.commit()
+        return jsonify({'message': 'Funding deleted successfully!'}), 200
+    return jsonify({'message': 'Funding not found!'}), 404
+
+# FundingApplication routes
+@bp.route('/funding_applications', methods=['POST'])
+@validated(FUNDING_APPLICATION)
+@idempotent
+def create_funding_application(data):
+    # Clients sent "status": "Applied" while it was required; anything else is refused
+    status = (request.get_json(silent=True) or {}).get('status')
+    if status not in (None, ApplicationStatus.APPLIED.name, ApplicationStatus.APPLIED.value):
+        return invalid(ValidationError({'status': 'is changed through POST /review/transitions'}))
+    # Retrieve `user_id` from session
+    user_id = session.get('user_id')  # Example: Retrieve user ID from session
+    if not user_id:
+        return jsonify({'message': 'User not logged in!'}), 401
+
+    # Retrieveing `funding_id` from data based on the user's context
+    funding_id = get_funding_id_for_user(user_id)  # function to fetch funding ID
+    if not funding_id:
+        return jsonify({'message': 'Funding ID not found in session!'}), 400
+    
+    new_funding_application = FundingApplication(
+        user_id=data['user_id'],
+        funding_id=data['funding_id'],
+        status=ApplicationStatus.APPLIED,
+        application_type=data['application_type'],
+        supporting_documents=data.get('supporting_documents'),
+        household_income=data.get('household_income'),
+        number_of_dependents=data.get('number_of_dependents'),
+        reason_for_aid=data.get('reason_for_aid'),
+        concept_note=data.get('concept_note'),
+        business_profile=data.get('business_profile')
+    )
+    db.session.add(new_funding_application)
+    db.session.commit()
+    return jsonify({'message': 'Funding application created successfully!', 'funding_application_id': new_funding_application.id}), 201
+
+@bp.route('/funding_applications', methods=['GET'])
+def get_funding_applications():
+    try:
+        funding_applications = apply_filters(FundingApplication.query.options(selectinload(FundingApplication.text)), FundingApplication, request.args).all()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify([serialize_funding_application(funding_application) for funding_application in funding_applications]), 200
+
+@bp.route('/funding_applications/<int:id>', methods=['GET'])
+def get_funding_application(id):
+    funding_application = FundingApplication.query.get(id)
+    if funding_application:
+        cached = not_modified(funding_application)
+        if cached:
+            return cached
+        return with_validators(jsonify(serialize_funding_application(funding_application)), funding_application), 200
+    return jsonify({'message': 'Funding application not found!'}), 404
+
+register_loader('fundings.get_funding_application', FundingApplication, serialize_funding_application,
+                'Funding application not found!', options=(selectinload(FundingApplication.text),))
+
+@bp.route('/funding_applications/<int:id>', methods=['PUT'])
+@validated(FUNDING_APPLICATION_UPDATE)
+def update_funding_application(id, data):
+    if 'status' in (request.get_json(silent=True) or {}):
+        return invalid(ValidationError({'status': 'is changed through POST /review/transitions'}))
+    etag = conditional_update(FundingApplication, id, data)
+    if not etag:
+        return failed_update(FundingApplication, id, 'Funding application not found!')
+    return with_etag(jsonify({'message': 'Funding application updated successfully!'}), etag), 200
+
+@bp.route('/funding_applications/<int:id>', methods=['DELETE'])
+def delete_funding_application(id):
+    funding_application = FundingApplication.query.get(id)
+    if funding_application:
+        funding_application.soft_delete()  # moved to the archive later, see archive.py
+        db.session.commit()
+        return jsonify({'message': 'Funding application deleted successfully!'}), 200
+    return jsonify({'message': 'Funding application not found!'}), 404
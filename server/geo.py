@@ -0,0 +1,287 @@
+"""Jobs near a point.
+
+GET /employments/nearby?lat=-1.29&lon=36.82&radius_km=25&limit=50
+
+Employment locations are geocoded on write against a gazetteer bundled in
+data/gazetteer.csv, so nothing goes over the network. Each posting stores its
+coordinates and a geohash; the geohash column is indexed, and a geohash
+prefix is a rectangle, so a radius search becomes a handful of index range
+scans over the cell around the point and its eight neighbours. Rows found
+that way are then filtered and sorted by great-circle distance.
+
+The search starts with a tiny block of cells and widens it only until a
+page of postings is certainly the nearest, so busy areas are answered from
+a few hundred index entries. Many postings share a point (every job in one
+city does), so each block is read as its distinct geohashes, skipping from
+one to the next through the index, and rows are then read nearest point
+first until the page is full.
+"""
+import csv
+import math
+import os
+from functools import lru_cache
+
+from flask import request
+from flask_restful import Resource
+from sqlalchemy import bindparam, event, inspect, select, func
+from models import db, location_name, Employment, EmploymentText
+from money import to_json
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+
+GEOHASH_PRECISION = 9  # about 5 m, plenty for a city centroid
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+# Smallest ring searched; cells of 7 characters are about 150 m across
+FIRST_RING_PRECISION = 7
+# Distinct points per cell looked up one by one before switching to a scan
+MAX_SEEKS = 64
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+# Sorts after every geohash character, closing a prefix range
+_PREFIX_END = chr(ord(_BASE32[-1]) + 1)
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    """Lower-cased place name -> (name, latitude, longitude)."""
+    places = {}
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            places[row['name'].lower()] = (row['name'], float(row['latitude']), float(row['longitude']))
+    return places
+
+def place_names():
+    return [name for name, _, _ in gazetteer().values()]
+
+def geocode(location):
+    """Return (latitude, longitude) for a place name, or None if unknown.
+
+    "Nairobi" and "Nairobi, Kenya" both resolve; matching ignores case.
+    """
+    if not location:
+        return None
+    places = gazetteer()
+    key = location.strip().lower()
+    place = places.get(key) or places.get(key.split(',')[0].strip())
+    return place[1:] if place else None
+
+
+# Geohash
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+def geohash_bounds(geohash):
+    """Return (south, west, north, east) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+@lru_cache(maxsize=65536)
+def geohash_decode(geohash):
+    south, west, north, east = geohash_bounds(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+def cell_size_degrees(precision):
+    """Height and width of a geohash cell of this length, in degrees."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+def neighbourhood(latitude, longitude, precision):
+    """The cell containing the point and the (up to) eight cells around it."""
+    height, width = cell_size_degrees(precision)
+    cells = set()
+    for dlat in (-height, 0, height):
+        cell_lat = latitude + dlat
+        if not -90 <= cell_lat <= 90:
+            continue
+        for dlon in (-width, 0, width):
+            cell_lon = (longitude + dlon + 180) % 360 - 180
+            cells.add(geohash_encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+def covered_km(latitude, precision):
+    """Radius around a point that its 3x3 block of cells is sure to cover."""
+    height, width = cell_size_degrees(precision)
+    # Cells are narrowest on the side of the block furthest from the equator
+    widest_lat = min(abs(latitude) + height, 89.9)
+    return min(height * KM_PER_DEGREE, width * KM_PER_DEGREE * math.cos(math.radians(widest_lat)))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+# Keeping employment coordinates in step with location
+
+def location_columns(location):
+    """Values for the coordinate columns of a posting at location."""
+    point = geocode(location)
+    if point is None:
+        return {'latitude': None, 'longitude': None, 'geohash': None}
+    latitude, longitude = point
+    return {'latitude': latitude, 'longitude': longitude, 'geohash': geohash_encode(latitude, longitude)}
+
+def _geocode_employment(mapper, connection, target):
+    for key, value in location_columns(target.location).items():
+        setattr(target, key, value)
+
+def _geocode_changed_location(mapper, connection, target):
+    if inspect(target).attrs.location_id.history.has_changes():
+        _geocode_employment(mapper, connection, target)
+
+def init_geocoding():
+    # ORM writes are covered here; Core updates call location_columns() themselves.
+    if not event.contains(Employment, 'before_insert', _geocode_employment):
+        event.listen(Employment, 'before_insert', _geocode_employment)
+        event.listen(Employment, 'before_update', _geocode_changed_location)
+
+
+# Searching
+
+# Built once: these run hundreds of times per search
+_geohash = Employment.__table__.c.geohash
+_FIRST_POINT = select(func.min(_geohash)).where(_geohash >= bindparam('low'), _geohash < bindparam('high'))
+_NEXT_POINT = select(func.min(_geohash)).where(_geohash > bindparam('low'), _geohash < bindparam('high'))
+_REMAINING_POINTS = select(_geohash).where(_geohash > bindparam('low'), _geohash < bindparam('high')).distinct()
+_ROWS_AT_POINT = (select(Employment.__table__, EmploymentText.description, EmploymentText.requirements)
+                  .outerjoin(EmploymentText.__table__)
+                  .where(_geohash == bindparam('geohash'), Employment.__table__.c.deleted_at.is_(None))
+                  .order_by(Employment.__table__.c.id.desc()).limit(bindparam('limit')))
+
+def _points_in(connection, cell):
+    """Distinct geohashes under a prefix, one index seek per distinct value.
+
+    Seeking pays off while points are few and postings per point many. Past
+    MAX_SEEKS points the rest of the range is read in one ordered scan.
+    """
+    high = cell + _PREFIX_END
+    current = connection.execute(_FIRST_POINT, {'low': cell, 'high': high}).scalar()
+    seeks = 0
+    while current is not None:
+        yield current
+        seeks += 1
+        if seeks == MAX_SEEKS:
+            yield from connection.execute(_REMAINING_POINTS, {'low': current, 'high': high}).scalars()
+            return
+        current = connection.execute(_NEXT_POINT, {'low': current, 'high': high}).scalar()
+
+def _nearest_rows(connection, latitude, longitude, points, radius_km, limit):
+    results = []
+    for _, geohash in points:
+        rows = connection.execute(_ROWS_AT_POINT, {'geohash': geohash, 'limit': limit - len(results)}).all()
+        for row in rows:
+            distance = haversine_km(latitude, longitude, row.latitude, row.longitude)
+            if distance <= radius_km:
+                results.append((distance, row))
+        if len(results) >= limit:
+            break
+    results.sort(key=lambda result: result[0])
+    return results
+
+def nearby(latitude, longitude, radius_km, limit=DEFAULT_LIMIT):
+    """Return [(distance_km, row)] of postings within radius_km, nearest first.
+
+    Searches rings of growing size: each one is the 3x3 block of cells one
+    geohash character shorter than the last, and is complete up to the
+    radius that block covers. The search stops at the first ring that holds
+    limit postings within that radius, so dense areas never read much more
+    than a page, and only sparse ones widen to radius_km.
+    """
+    results = []
+    with db.engine.connect() as connection:
+        for precision in range(FIRST_RING_PRECISION, -1, -1):
+            covered = min(covered_km(latitude, precision), radius_km) if precision else radius_km
+            cells = neighbourhood(latitude, longitude, precision) if precision else ['']
+            points = []
+            for cell in cells:
+                for geohash in _points_in(connection, cell):
+                    point_lat, point_lon = geohash_decode(geohash)
+                    distance = haversine_km(latitude, longitude, point_lat, point_lon)
+                    if distance <= covered:
+                        points.append((distance, geohash))
+            points.sort()
+            results = _nearest_rows(connection, latitude, longitude, points, covered, limit)
+            if len(results) >= limit or covered >= radius_km:
+                break
+    return results
+
+
+def _float_arg(name, low, high, default=None):
+    raw = request.args.get(name)
+    if raw is None:
+        if default is None:
+            raise ValueError(f'{name} is required!')
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be a number!')
+    if not low <= value <= high:
+        raise ValueError(f'{name} must be between {low} and {high}!')
+    return value
+
+class NearbyEmploymentsResource(Resource):
+    def get(self):
+        try:
+            latitude = _float_arg('lat', -90, 90)
+            longitude = _float_arg('lon', -180, 180)
+            radius_km = _float_arg('radius_km', 0, MAX_RADIUS_KM, DEFAULT_RADIUS_KM)
+            limit = int(_float_arg('limit', 1, MAX_LIMIT, DEFAULT_LIMIT))
+        except ValueError as e:
+            return {'message': str(e)}, 400
+
+        return [{
+            'id': row.id,
+            'user_id': row.user_id,
+            'category_id': row.category_id,
+            'title': row.title,
+            'description': row.description,
+            'requirements': row.requirements,
+            'location': location_name(row.location_id),
+            'salary_range': to_json(row.salary_minor, row.salary_currency),
+            'salary_currency': row.salary_currency,
+            'latitude': row.latitude,
+            'longitude': row.longitude,
+            'distance_km': round(distance, 3),
+            'updated_at': row.updated_at.isoformat()
+        } for distance, row in nearby(latitude, longitude, radius_km, limit)], 200
+
+
+def initialize_geo_routes(api):
+    api.add_resource(NearbyEmploymentsResource, '/employments/nearby')
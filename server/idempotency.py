@@ -0,0 +1,225 @@
+"""Idempotency-Key support for the create endpoints.
+
+Clients on flaky networks retry POSTs whose response they never saw. A
+client that sends the same Idempotency-Key header with every retry of one
+request gets the row created once:
+
+    POST /donations            Idempotency-Key: 4f1c...   -> 201, runs the handler
+    POST /donations            Idempotency-Key: 4f1c...   -> 201, Idempotent-Replayed: true
+
+Keys are scoped to the caller and endpoint and live in the idempotency_key
+table with the status and JSON body of the first response, for
+IDEMPOTENCY_TTL seconds. Retries are answered from a primary key lookup.
+A first request claims its key without committing, so the claim is
+committed together with the rows the handler creates and costs no extra
+write. A duplicate arriving meanwhile, in any process, blocks on the
+SQLite write lock until then, and then waits for the stored response (up
+to IDEMPOTENCY_WAIT seconds) instead of running the handler again. A claim
+whose holder has not finished within IDEMPOTENCY_LOCK_TIMEOUT is assumed
+dead and taken over. Reusing a key with a different body is refused with
+422. Server errors are not stored, so the retry runs again.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, request, jsonify, make_response
+from sqlalchemy import select, delete, or_, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from models import db, IdempotencyKey
+from tokens import caller_identity
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+PURGE_BATCH_SIZE = 1000
+
+_table = IdempotencyKey.__table__
+# Built once, so a lookup costs the query and not the statement building
+_REUSABLE = or_(
+    _table.c.expires_at <= bindparam('now'),
+    _table.c.status.is_(None) & (_table.c.created_at <= bindparam('abandoned')),
+)
+_HELD = select(_table.c.key).where(_table.c.key == bindparam('key'), ~_REUSABLE)
+_CLAIM = insert(_table)
+_CLAIM = _CLAIM.on_conflict_do_update(
+    index_elements=[_table.c.key],
+    set_={name: _CLAIM.excluded[name] for name in ('request_hash', 'status', 'body', 'created_at', 'expires_at')},
+    where=_REUSABLE,
+)
+
+# Claims held by requests in this process; retries wait on the event
+# instead of polling the table.
+_running = {}
+_running_lock = threading.Lock()
+
+
+def _scope(key):
+    return hashlib.sha256(f'{caller_identity()}\0{request.endpoint}\0{key}'.encode()).hexdigest()
+
+def _claim(scope, request_hash):
+    """Insert the key as running, or take it over if expired or abandoned; True if we hold it.
+
+    Left uncommitted: the handler's own commit makes the claim visible.
+    """
+    # The session's connection, but not the ORM: no loader criteria to apply
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    window = {'now': now, 'abandoned': now - timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_TIMEOUT'])}
+    if connection.execute(_HELD, dict(window, key=scope)).first():
+        return False  # a retry; no need to take the write lock
+    claimed = connection.execute(_CLAIM, dict(
+        window,
+        key=scope,
+        request_hash=request_hash,
+        status=None,
+        body=None,
+        created_at=now,
+        expires_at=now + timedelta(seconds=current_app.config['IDEMPOTENCY_TTL']),
+    )).rowcount
+    if claimed == 1:
+        return True
+    db.session.rollback()
+    return False
+
+def _finish(scope, response):
+    if response.status_code >= 500:
+        # Nothing was created, most likely; let the retry run the handler
+        db.session.execute(delete(_table).where(_table.c.key == scope))
+    else:
+        db.session.execute(
+            _table.update().where(_table.c.key == scope)
+            .values(status=response.status_code, body=response.get_data(as_text=True))
+        )
+    db.session.commit()
+
+def _release(scope):
+    with _running_lock:
+        event = _running.pop(scope, None)
+    if event is not None:
+        event.set()
+
+def _stored(scope):
+    row = db.session.execute(
+        select(_table.c.request_hash, _table.c.status, _table.c.body).where(_table.c.key == scope)
+    ).first()
+    # End the read so the next poll sees what other processes committed
+    db.session.rollback()
+    return row
+
+def _wait(scope, request_hash):
+    """The stored response for scope, or None once it stops running without one."""
+    deadline = time.monotonic() + current_app.config['IDEMPOTENCY_WAIT']
+    delay = 0.005
+    while True:
+        row = _stored(scope)
+        if row is None or row.status is not None or row.request_hash != request_hash:
+            return row
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return row
+        event = _running.get(scope)
+        if event is not None:
+            event.wait(remaining)
+        else:
+            # Held by another process
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.2)
+
+def _replay(row):
+    response = current_app.response_class(row.body, status=row.status, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def idempotent(f):
+    """Run a create handler at most once per Idempotency-Key."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return f(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'message': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters!'}), 400
+
+        scope = _scope(key)
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        while not _claim(scope, request_hash):
+            row = _wait(scope, request_hash)
+            if row is None:
+                continue  # the holder failed and gave the key up; claim it ourselves
+            if row.request_hash != request_hash:
+                return jsonify({'message': f'{HEADER} was already used for a different request!'}), 422
+            if row.status is None:
+                response = jsonify({'message': 'A request with this Idempotency-Key is still in progress!'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            return _replay(row)
+
+        with _running_lock:
+            _running[scope] = threading.Event()
+        try:
+            response = make_response(f(*args, **kwargs))
+            _finish(scope, response)
+        except Exception:
+            db.session.rollback()
+            db.session.execute(delete(_table).where(_table.c.key == scope))
+            db.session.commit()
+            raise
+        finally:
+            _release(scope)
+        return response
+    return decorated
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE):
+    """Delete expired keys in batches; returns how many went."""
+    purged = 0
+    while True:
+        expired = select(_table.c.key).where(_table.c.expires_at <= datetime.utcnow()).limit(batch_size)
+        with db.engine.begin() as connection:
+            deleted = connection.execute(delete(_table).where(_table.c.key.in_(expired.scalar_subquery()))).rowcount
+        purged += deleted
+        if deleted < batch_size:
+            return purged
+
+
+class KeyPurger:
+    """Evicts expired idempotency keys every interval seconds in a daemon thread."""
+
+    def __init__(self, app, interval=300.0):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='idempotency-purge', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    purge_expired()
+                except Exception:
+                    logger.exception('Purging idempotency keys failed')
+
+
+def init_idempotency(app):
+    app.config.setdefault('IDEMPOTENCY_TTL', 24 * 3600)
+    app.config.setdefault('IDEMPOTENCY_WAIT', 10.0)
+    app.config.setdefault('IDEMPOTENCY_LOCK_TIMEOUT', 60.0)
+    app.config.setdefault('IDEMPOTENCY_PURGE_INTERVAL', 300.0)
+    purger = KeyPurger(app, app.config['IDEMPOTENCY_PURGE_INTERVAL'])
+    app.extensions['idempotency_purger'] = purger
+    if app.config['IDEMPOTENCY_PURGE_INTERVAL'] > 0:
+        app.extensions.setdefault('workers', []).append(purger)
+    return purger
@@ -0,0 +1,315 @@
+"""Homepage leaderboards, served from memory.
+
+    GET /leaderboards/donors?window=month&currency=KES&limit=10
+    GET /leaderboards/jobs?limit=10
+
+Top donors rank users, or organisations when no user gave, by the settled
+amount of their donations this calendar month (window=month) or ever
+(window=all), per currency. Most applied-to jobs rank live postings by
+their live applications.
+
+The totals are counters per donor and per posting, built once from SQL
+and then moved by the delta of every row the change log reports: the log
+entry is written in the same transaction as create_donation,
+create_application, a settled payment or any other write, so writes from
+every worker are seen and none twice. Each board also keeps its top
+MAX_LIMIT in order: a total that grows is moved up in place, and the list
+is only rebuilt from the counters when a total inside it shrinks. A page
+view is then a slice plus one query for the names.
+"""
+import bisect
+import heapq
+import logging
+import threading
+from array import array
+from datetime import datetime
+
+from flask import request
+from flask_restful import Resource
+from sqlalchemy import select, func
+from models import db, ChangeLog, Donation, PaymentStatus, Application, Employment, User
+from money import DEFAULT_CURRENCY, CURRENCY_EXPONENTS, to_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+WINDOWS = ('month', 'all')
+# Past this many pending changes a full reload is cheaper
+MAX_INCREMENTAL = 50000
+CHUNK = 500  # ids per IN (...)
+
+
+class TopK:
+    """Totals per key, with the MAX_LIMIT largest kept sorted."""
+
+    def __init__(self):
+        self.totals = {}
+        self._top = None  # [(-total, key)] ascending, or None until needed again
+
+    def add(self, key, delta):
+        old = self.totals.get(key, 0)
+        total = old + delta
+        if total:
+            self.totals[key] = total
+        else:
+            self.totals.pop(key, None)
+        if self._top is None or not delta:
+            return
+        if delta < 0:
+            # Something below the list may now belong in it
+            if old and (-old, key) in self._top:
+                self._top = None
+            return
+        # Keys outside the list were never above its last entry, so a
+        # growing total is all that can change it.
+        if old:
+            index = bisect.bisect_left(self._top, (-old, key))
+            if index < len(self._top) and self._top[index] == (-old, key):
+                del self._top[index]
+        if len(self._top) < MAX_LIMIT or (-total, key) < self._top[-1]:
+            bisect.insort(self._top, (-total, key))
+            del self._top[MAX_LIMIT:]
+
+    def top(self, limit):
+        if self._top is None:
+            self._top = heapq.nsmallest(MAX_LIMIT, ((-total, key) for key, total in self.totals.items()))
+        return [(key, -total) for total, key in self._top[:limit]]
+
+
+class Leaderboards:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.last_seq = 0
+        self._reset()
+
+    def _reset(self):
+        self.donors = []  # interned ('user', id) or ('organisation', name)
+        self._donor_ids = {}
+        self.boards = {}  # (period, currency) -> TopK of donor index -> amount_minor
+        # What each counted donation added, to take it back when it changes
+        self.donor_of = array('l')
+        self.amount_of = array('q')
+        self.month_of = {}  # donation id -> (period, currency)
+        self.jobs = TopK()  # employment id -> live applications
+        self.employment_of = array('l')  # per application id, -1 when not counted
+        self.closed = set()  # deleted or archived employment ids
+
+    def _donor(self, user_id, organisation_name):
+        donor = ('user', user_id) if user_id else ('organisation', organisation_name) if organisation_name else None
+        if donor is None:
+            return -1  # anonymous, never ranked
+        if donor not in self._donor_ids:
+            self._donor_ids[donor] = len(self.donors)
+            self.donors.append(donor)
+        return self._donor_ids[donor]
+
+    def _board(self, period, currency):
+        if (period, currency) not in self.boards:
+            self.boards[(period, currency)] = TopK()
+        return self.boards[(period, currency)]
+
+    @staticmethod
+    def _grow(column, row_id, fill):
+        missing = row_id + 1 - len(column)
+        if missing > 0:
+            column.extend([fill] * missing)
+
+    def apply_donation(self, donation_id, row=None):
+        """Count the current state of a donation (None when gone) instead of what was counted before."""
+        with self._lock:
+            self._grow(self.donor_of, donation_id, -1)
+            self._grow(self.amount_of, donation_id, 0)
+            if self.donor_of[donation_id] >= 0:
+                donor, amount = self.donor_of[donation_id], self.amount_of[donation_id]
+                period, currency = self.month_of.pop(donation_id)
+                self._board(period, currency).add(donor, -amount)
+                self._board('all', currency).add(donor, -amount)
+                self.donor_of[donation_id] = -1
+            if row is None or row.payment_status != PaymentStatus.SETTLED:
+                return
+            donor = self._donor(row.user_id, row.organisation_name)
+            if donor < 0:
+                return
+            period = (row.donation_date or datetime.utcnow()).strftime('%Y-%m')
+            self._board(period, row.currency).add(donor, row.amount_minor)
+            self._board('all', row.currency).add(donor, row.amount_minor)
+            self.donor_of[donation_id] = donor
+            self.amount_of[donation_id] = row.amount_minor
+            self.month_of[donation_id] = (period, row.currency)
+
+    def apply_application(self, application_id, employment_id=None):
+        """Count a live application to employment_id (None when gone) instead of what was counted before."""
+        with self._lock:
+            self._grow(self.employment_of, application_id, -1)
+            counted = self.employment_of[application_id]
+            if counted >= 0 and counted not in self.closed:
+                self.jobs.add(counted, -1)
+            self.employment_of[application_id] = -1
+            if employment_id is not None and employment_id not in self.closed:
+                self.jobs.add(employment_id, 1)
+                self.employment_of[application_id] = employment_id
+
+    def close_employment(self, employment_id):
+        with self._lock:
+            if employment_id not in self.closed:
+                self.closed.add(employment_id)
+                self.jobs.add(employment_id, -self.jobs.totals.get(employment_id, 0))
+
+    def top_donors(self, window, currency, limit):
+        period = datetime.utcnow().strftime('%Y-%m') if window == 'month' else 'all'
+        with self._lock:
+            board = self.boards.get((period, currency))
+            leaders = board.top(limit) if board else []
+            return period, [(self.donors[donor], total) for donor, total in leaders]
+
+    def top_jobs(self, limit):
+        with self._lock:
+            return self.jobs.top(limit)
+
+    # Loading and catching up from the database
+
+    def _load_donations(self, connection, where):
+        table = Donation.__table__
+        return connection.execute(select(
+            table.c.donation_id, table.c.user_id, table.c.organisation_name, table.c.amount_minor, table.c.currency,
+            table.c.donation_date, table.c.payment_status
+        ).where(where))
+
+    def _load_applications(self, connection, *where):
+        table = Application.__table__
+        return connection.execute(select(table.c.id, table.c.employment_id).where(table.c.deleted_at.is_(None), *where))
+
+    def rebuild(self):
+        donation = Donation.__table__
+        employment = Employment.__table__
+        with self._lock:
+            with db.engine.connect() as connection:
+                last_seq = connection.execute(select(func.max(ChangeLog.seq))).scalar() or 0
+                self._reset()
+                self.closed.update(connection.execute(
+                    select(employment.c.id).where(employment.c.deleted_at.is_not(None))
+                ).scalars())
+                for row in self._load_donations(connection, donation.c.payment_status == PaymentStatus.SETTLED):
+                    self.apply_donation(row.donation_id, row)
+                for row in self._load_applications(connection):
+                    self.apply_application(row.id, row.employment_id)
+            self.last_seq = last_seq
+            self.loaded = True
+
+    def refresh(self):
+        with self._lock:
+            if not self.loaded:
+                return self.rebuild()
+            with db.engine.connect() as connection:
+                changes = connection.execute(
+                    select(ChangeLog.seq, ChangeLog.table_name, ChangeLog.row_id, ChangeLog.operation)
+                    .where(ChangeLog.seq > self.last_seq,
+                           ChangeLog.table_name.in_(('donation', 'application', 'employment')))
+                    .order_by(ChangeLog.seq)
+                    .limit(MAX_INCREMENTAL + 1)
+                ).all()
+                if not changes:
+                    return
+                if len(changes) > MAX_INCREMENTAL:
+                    return self.rebuild()
+                changed = {'donation': set(), 'application': set()}
+                for change in changes:
+                    if change.table_name == 'employment':
+                        if change.operation == 'delete':
+                            self.close_employment(change.row_id)
+                    else:
+                        changed[change.table_name].add(change.row_id)
+
+                donations = sorted(changed['donation'])
+                applications = sorted(changed['application'])
+                current_donations, current_applications = {}, {}
+                for start in range(0, len(donations), CHUNK):
+                    ids = donations[start:start + CHUNK]
+                    current_donations.update((row.donation_id, row) for row in
+                                             self._load_donations(connection, Donation.__table__.c.donation_id.in_(ids)))
+                for start in range(0, len(applications), CHUNK):
+                    ids = applications[start:start + CHUNK]
+                    current_applications.update((row.id, row.employment_id) for row in
+                                                self._load_applications(connection, Application.__table__.c.id.in_(ids)))
+            for donation_id in donations:
+                self.apply_donation(donation_id, current_donations.get(donation_id))
+            for application_id in applications:
+                self.apply_application(application_id, current_applications.get(application_id))
+            self.last_seq = changes[-1].seq
+
+
+leaderboards = Leaderboards()
+
+
+def _limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT)
+    if not str(limit).isdigit() or not 1 <= int(limit) <= MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+    return int(limit)
+
+class TopDonorsResource(Resource):
+    def get(self):
+        window = request.args.get('window', 'month')
+        currency = request.args.get('currency', DEFAULT_CURRENCY).upper()
+        if window not in WINDOWS:
+            return {'message': f"window must be one of {', '.join(WINDOWS)}"}, 400
+        if currency not in CURRENCY_EXPONENTS:
+            return {'message': f'Unsupported currency: {currency}'}, 400
+        try:
+            limit = _limit()
+        except ValueError as e:
+            return {'message': str(e)}, 400
+
+        leaderboards.refresh()
+        period, leaders = leaderboards.top_donors(window, currency, limit)
+        user_ids = [value for kind, value in (donor for donor, _ in leaders) if kind == 'user']
+        names = {row.id: row for row in db.session.execute(
+            select(User.id, User.username, User.first_name, User.last_name).where(User.id.in_(user_ids))
+        )}
+        ranked = []
+        for (kind, value), total in leaders:
+            if kind == 'user':
+                user = names.get(value)
+                entry = {'user_id': value, 'username': user.username if user else None,
+                         'name': ' '.join(filter(None, (user.first_name, user.last_name))) if user else None}
+            else:
+                entry = {'organisation_name': value}
+            entry['total'] = to_json(total, currency)
+            ranked.append(entry)
+        return {'window': window, 'period': period, 'currency': currency, 'leaders': ranked}, 200
+
+class TopJobsResource(Resource):
+    def get(self):
+        try:
+            limit = _limit()
+        except ValueError as e:
+            return {'message': str(e)}, 400
+
+        leaderboards.refresh()
+        leaders = leaderboards.top_jobs(limit)
+        titles = dict(db.session.execute(
+            select(Employment.id, Employment.title).where(Employment.id.in_([employment_id for employment_id, _ in leaders]))
+        ).all())
+        return {'leaders': [
+            {'employment_id': employment_id, 'title': titles.get(employment_id), 'applications': count}
+            for employment_id, count in leaders
+        ]}, 200
+
+
+def init_leaderboards(app):
+    """Build the boards in the background, so the first page view does not wait for it."""
+    def warm():
+        with app.app_context():
+            try:
+                leaderboards.refresh()
+            except Exception:
+                logger.exception('Building the leaderboards failed')
+
+    if app.config.get('LEADERBOARDS_WARM', True):
+        app.extensions.setdefault('workers', []).append(threading.Thread(target=warm, name='leaderboards-warm', daemon=True))
+
+def initialize_leaderboard_routes(api):
+    api.add_resource(TopDonorsResource, '/leaderboards/donors')
+    api.add_resource(TopJobsResource, '/leaderboards/jobs')
@@ -0,0 +1,160 @@
+"""Structured logging: JSON lines written off the request thread.
+
+Modules log through the standard library as before:
+
+    logger = logging.getLogger(__name__)
+    logger.info('Login succeeded', extra={'user_id': user.id})
+
+init_logging puts a QueueHandler on the root logger. A request thread
+only copies the record onto a bounded queue; a listener thread formats
+it as one JSON object per line and writes it to stdout:
+
+    {"time": "2026-10-19T12:00:00.123Z", "level": "INFO", "logger": "auth", "message": "Login succeeded",
+     "request_id": "3f9c...", "user_id": 7}
+
+When the queue is full, records are dropped and counted instead of making
+the request wait for stdout.
+
+Every request gets an id, taken from the X-Request-Id header when the
+client or proxy sent a sane one and generated otherwise. It is stamped on
+every record logged while the request runs and sent back in the
+X-Request-Id response header. LOG_LEVELS sets levels per logger
+("payments=DEBUG,werkzeug=WARNING"). LOG_SAMPLE keeps only a fraction of
+the requests to noisy routes ("/is_logged_in=0.01"): a request is kept or
+dropped as a whole, so its records stay together. Warnings and errors are
+always kept. LOG_ACCESS adds one access record per request, with its
+status and duration.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+HEADER = 'X-Request-Id'
+_VALID_ID = re.compile(r'[A-Za-z0-9._-]{1,64}').fullmatch
+
+# Attributes every LogRecord has; anything else was passed in extra=
+_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+access_logger = logging.getLogger('access')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestFilter(logging.Filter):
+    """Stamps the request id on records, and drops those of unsampled requests."""
+
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        record.request_id = g.get('request_id')
+        return g.get('log_sampled', True) or record.levelno >= logging.WARNING
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; drops them when it falls behind."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only what cannot wait for the listener happens here: merging the
+        # arguments and rendering a traceback, whose frames will not last.
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _install(app):
+    """Route the root logger through the queue, once per process."""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            return handler
+    handler = NonBlockingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+    handler.addFilter(RequestFilter())
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)  # flush what is queued on shutdown
+    root.handlers = [handler]
+    return handler
+
+def init_logging(app):
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_LEVELS', {})
+    app.config.setdefault('LOG_SAMPLE', {})
+    app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+    app.config.setdefault('LOG_ACCESS', True)
+
+    handler = _install(app)
+    app.extensions['log_handler'] = handler
+    logging.getLogger().setLevel(app.config['LOG_LEVEL'])
+    for name, level in app.config['LOG_LEVELS'].items():
+        logging.getLogger(name).setLevel(level)
+
+    rates = app.config['LOG_SAMPLE']
+
+    @app.before_request
+    def start_request():
+        request_id = request.headers.get(HEADER)
+        g.request_id = request_id if request_id and _VALID_ID(request_id) else os.urandom(16).hex()
+        g.request_started = time.perf_counter()
+        rate = rates.get(request.url_rule.rule if request.url_rule else request.path)
+        if rate is not None:
+            g.log_sampled = random.random() < rate
+
+    @app.after_request
+    def finish_request(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[HEADER] = request_id
+        # An unsampled request would have its record dropped anyway; do not build it
+        if app.config['LOG_ACCESS'] and g.get('log_sampled', True) and access_logger.isEnabledFor(logging.INFO):
+            access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.get('request_started', time.perf_counter())) * 1000, 2),
+            })
+        return response
+
+    return handler
@@ -0,0 +1,82 @@
+"""move large text to side tables and intern employment locations
+
+Revision ID: 2c6f8e0b5a17
+Revises: 9d41b7e2a6f3
+Create Date: 2026-10-19 17:20:05.114583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c6f8e0b5a17'
+down_revision = '9d41b7e2a6f3'
+branch_labels = None
+depends_on = None
+
+# owner table -> (side table, key column, moved columns, keep rows with no text)
+SIDE_TABLES = {
+    'employment': ('employment_text', 'employment_id', ('description', 'requirements'), True),
+    'application': ('application_text', 'application_id', ('cover_letter',), True),
+    'funding_application': ('funding_application_text', 'funding_application_id', ('reason_for_aid', 'business_profile'), False),
+}
+NOT_NULL = {'description', 'cover_letter'}
+
+
+def upgrade():
+    op.create_table('location',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+        sqlite_autoincrement=True
+    )
+    op.execute('INSERT INTO location (name) SELECT DISTINCT location FROM employment WHERE location IS NOT NULL ORDER BY location')
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('location_id', sa.Integer(), nullable=True))
+    op.execute('UPDATE employment SET location_id = (SELECT id FROM location WHERE location.name = employment.location)')
+
+    for owner, (side, key, columns, keep_empty) in SIDE_TABLES.items():
+        op.create_table(side,
+            sa.Column(key, sa.Integer(), nullable=False),
+            *[sa.Column(column, sa.Text(), nullable=column not in NOT_NULL) for column in columns],
+            sa.ForeignKeyConstraint([key], [f'{owner}.id'], ),
+            sa.PrimaryKeyConstraint(key)
+        )
+        where = '' if keep_empty else ' WHERE ' + ' OR '.join(f'{column} IS NOT NULL' for column in columns)
+        op.execute(f"INSERT INTO {side} ({key}, {', '.join(columns)}) SELECT id, {', '.join(columns)} FROM {owner}{where}")
+
+    # Rebuilding the tables without the moved columns also packs the hot rows
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.drop_index('ix_employment_location')
+        batch_op.drop_column('location')
+        batch_op.drop_column('description')
+        batch_op.drop_column('requirements')
+        batch_op.create_index(batch_op.f('ix_employment_location_id'), ['location_id'], unique=False)
+        batch_op.create_foreign_key('fk_employment_location_id_location', 'location', ['location_id'], ['id'])
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.drop_column('cover_letter')
+    with op.batch_alter_table('funding_application', schema=None) as batch_op:
+        batch_op.drop_column('reason_for_aid')
+        batch_op.drop_column('business_profile')
+
+
+def downgrade():
+    for owner, (side, key, columns, _) in SIDE_TABLES.items():
+        with op.batch_alter_table(owner, schema=None) as batch_op:
+            for column in columns:
+                batch_op.add_column(sa.Column(column, sa.Text(), nullable=True))
+        for column in columns:
+            op.execute(f'UPDATE {owner} SET {column} = (SELECT {column} FROM {side} WHERE {side}.{key} = {owner}.id)')
+        op.drop_table(side)
+
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('location', sa.String(), nullable=True))
+    op.execute('UPDATE employment SET location = (SELECT name FROM location WHERE location.id = employment.location_id)')
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_employment_location_id_location', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_employment_location_id'))
+        batch_op.drop_column('location_id')
+        batch_op.create_index(batch_op.f('ix_employment_location'), ['location'], unique=False)
+    op.drop_table('location')
@@ -0,0 +1,39 @@
+"""add change log and webhook cursors
+
+Revision ID: 3f1a9c2d7b64
+Revises: eca7926da8be
+Create Date: 2026-10-19 09:12:41.508113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2d7b64'
+down_revision = 'eca7926da8be'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_log',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=6), nullable=False),
+    sa.Column('changes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_table('webhook_cursor',
+    sa.Column('endpoint', sa.String(), nullable=False),
+    sa.Column('last_seq', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('endpoint')
+    )
+
+
+def downgrade():
+    op.drop_table('webhook_cursor')
+    op.drop_table('change_log')
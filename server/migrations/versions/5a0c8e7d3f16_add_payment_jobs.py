@@ -0,0 +1,51 @@
+"""add payment status and payment jobs
+
+Revision ID: 5a0c8e7d3f16
+Revises: 3d9b6f0e2a71
+Create Date: 2026-10-19 23:41:37.205914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a0c8e7d3f16'
+down_revision = '3d9b6f0e2a71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Donations made before payments were processed count as settled
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payment_status', sa.Enum('PENDING', 'SETTLED', 'FAILED', name='paymentstatus'),
+                                      nullable=False, server_default='SETTLED'))
+        batch_op.add_column(sa.Column('payment_reference', sa.String(), nullable=True))
+
+    op.create_table('payment_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('donation_id', sa.Integer(), nullable=False),
+    sa.Column('gateway', sa.String(), nullable=False),
+    sa.Column('status', sa.String(length=9), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['donation_id'], ['donation.donation_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('donation_id')
+    )
+    with op.batch_alter_table('payment_job', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_job_status_next_attempt_at', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_job_status_next_attempt_at')
+    op.drop_table('payment_job')
+
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.drop_column('payment_reference')
+        batch_op.drop_column('payment_status')
@@ -0,0 +1,36 @@
+"""add indexes backing list filters
+
+Revision ID: 5e08a3b9d4c2
+Revises: c74d0e9a2f18
+Create Date: 2026-10-19 15:02:17.640298
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e08a3b9d4c2'
+down_revision = 'c74d0e9a2f18'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'employment': ['user_id', 'category_id', 'location', 'salary_range'],
+    'funding_application': ['user_id', 'funding_id', 'status', 'application_type'],
+    'donation': ['user_id', 'donation_type', 'amount', 'payment_method', 'donation_date'],
+}
+
+
+def upgrade():
+    for table, columns in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.create_index(batch_op.f(f'ix_{table}_{column}'), [column], unique=False)
+
+
+def downgrade():
+    for table, columns in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.drop_index(batch_op.f(f'ix_{table}_{column}'))
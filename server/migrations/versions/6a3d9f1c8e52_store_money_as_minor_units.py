@@ -0,0 +1,89 @@
+"""store money as integer minor units with a currency code
+
+Revision ID: 6a3d9f1c8e52
+Revises: 2c6f8e0b5a17
+Create Date: 2026-10-19 18:05:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a3d9f1c8e52'
+down_revision = '2c6f8e0b5a17'
+branch_labels = None
+depends_on = None
+
+# Everything recorded so far was in Kenyan shillings
+CURRENCY = 'KES'
+
+
+def upgrade():
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount_minor', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=True))
+    # Donation amounts were floats; round away the representation error
+    op.execute(f"UPDATE donation SET amount_minor = CAST(ROUND(amount * 100) AS INTEGER), currency = '{CURRENCY}'")
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.drop_index('ix_donation_amount')
+        batch_op.drop_column('amount')
+        batch_op.alter_column('amount_minor', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.alter_column('currency', existing_type=sa.String(length=3), nullable=False)
+        batch_op.create_index(batch_op.f('ix_donation_amount_minor'), ['amount_minor'], unique=False)
+        batch_op.create_index('ix_donation_currency_date_amount', ['currency', 'donation_date', 'amount_minor'], unique=False)
+        # Replaces the single column index, which it still serves as
+        batch_op.drop_index('ix_donation_payment_method')
+        batch_op.create_index('ix_donation_method_currency_amount', ['payment_method', 'currency', 'amount_minor'], unique=False)
+
+    with op.batch_alter_table('funding', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount_minor', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=True))
+    op.execute(f"UPDATE funding SET amount_minor = amount * 100, currency = '{CURRENCY}'")
+    with op.batch_alter_table('funding', schema=None) as batch_op:
+        batch_op.drop_column('amount')
+        batch_op.alter_column('amount_minor', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.alter_column('currency', existing_type=sa.String(length=3), nullable=False)
+
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('salary_minor', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('salary_currency', sa.String(length=3), nullable=True))
+    op.execute(f"UPDATE employment SET salary_minor = salary_range * 100, salary_currency = '{CURRENCY}'")
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.drop_index('ix_employment_salary_range')
+        batch_op.drop_column('salary_range')
+        batch_op.alter_column('salary_currency', existing_type=sa.String(length=3), nullable=False)
+        batch_op.create_index(batch_op.f('ix_employment_salary_minor'), ['salary_minor'], unique=False)
+
+
+def downgrade():
+    # Assumes two decimal currencies, like everything before this revision
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('salary_range', sa.Integer(), nullable=True))
+    op.execute('UPDATE employment SET salary_range = salary_minor / 100')
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_employment_salary_minor'))
+        batch_op.drop_column('salary_currency')
+        batch_op.drop_column('salary_minor')
+        batch_op.create_index(batch_op.f('ix_employment_salary_range'), ['salary_range'], unique=False)
+
+    with op.batch_alter_table('funding', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount', sa.Integer(), nullable=True))
+    op.execute('UPDATE funding SET amount = amount_minor / 100')
+    with op.batch_alter_table('funding', schema=None) as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('currency')
+        batch_op.drop_column('amount_minor')
+
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+    op.execute('UPDATE donation SET amount = amount_minor / 100.0')
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Float(), nullable=False)
+        batch_op.drop_index('ix_donation_method_currency_amount')
+        batch_op.create_index(batch_op.f('ix_donation_payment_method'), ['payment_method'], unique=False)
+        batch_op.drop_index('ix_donation_currency_date_amount')
+        batch_op.drop_index(batch_op.f('ix_donation_amount_minor'))
+        batch_op.drop_column('currency')
+        batch_op.drop_column('amount_minor')
+        batch_op.create_index(batch_op.f('ix_donation_amount'), ['amount'], unique=False)
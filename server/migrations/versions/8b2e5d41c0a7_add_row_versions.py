@@ -0,0 +1,41 @@
+"""add updated_at and row version columns
+
+Revision ID: 8b2e5d41c0a7
+Revises: 3f1a9c2d7b64
+Create Date: 2026-10-19 11:40:05.227519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e5d41c0a7'
+down_revision = '3f1a9c2d7b64'
+branch_labels = None
+depends_on = None
+
+TABLES = ['user', 'category', 'employment', 'socialintegration', 'application', 'funding', 'funding_application', 'donation']
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+        # SQLite cannot add a column with a non-constant default, so backfill
+        # existing rows before tightening the constraint.
+        op.execute(f'UPDATE "{table}" SET updated_at = CURRENT_TIMESTAMP')
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+            batch_op.create_index(batch_op.f(f'ix_{table}_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_updated_at'))
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('version')
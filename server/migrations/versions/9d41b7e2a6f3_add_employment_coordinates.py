@@ -0,0 +1,88 @@
+"""add geocoded coordinates to employment
+
+Revision ID: 9d41b7e2a6f3
+Revises: 5e08a3b9d4c2
+Create Date: 2026-10-19 16:11:42.318907
+
+"""
+import csv
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d41b7e2a6f3'
+down_revision = '5e08a3b9d4c2'
+branch_labels = None
+depends_on = None
+
+# Geocoding as geo.py did it when this revision was written, so later
+# changes to geo.py cannot change what this migration does
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'gazetteer.csv')
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def _gazetteer():
+    places = {}
+    if os.path.exists(GAZETTEER_PATH):
+        with open(GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                places[row['name'].lower()] = (float(row['latitude']), float(row['longitude']))
+    return places
+
+def _geohash(latitude, longitude):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < GEOHASH_PRECISION:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+def _location_columns(places, location):
+    key = location.strip().lower() if location else ''
+    point = places.get(key) or places.get(key.split(',')[0].strip())
+    if point is None:
+        return None
+    latitude, longitude = point
+    return {'latitude': latitude, 'longitude': longitude, 'geohash': _geohash(latitude, longitude)}
+
+
+def upgrade():
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f('ix_employment_geohash'), ['geohash'], unique=False)
+
+    # Geocode existing postings once per distinct location
+    connection = op.get_bind()
+    employment = sa.table('employment', sa.column('location'), sa.column('latitude'),
+                          sa.column('longitude'), sa.column('geohash'))
+    locations = connection.execute(sa.select(employment.c.location).distinct()).scalars().all()
+    places = _gazetteer()
+    for location in locations:
+        columns = _location_columns(places, location)
+        if columns:
+            connection.execute(employment.update().where(employment.c.location == location).values(**columns))
+
+
+def downgrade():
+    with op.batch_alter_table('employment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_employment_geohash'))
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
@@ -0,0 +1,52 @@
+"""add review leases and review events
+
+Revision ID: 9f4d2b7c6e58
+Revises: 5a0c8e7d3f16
+Create Date: 2026-10-19 23:58:12.418730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4d2b7c6e58'
+down_revision = '5a0c8e7d3f16'
+branch_labels = None
+depends_on = None
+
+# Must read exactly like models.REVIEW_QUEUE for SQLite to use the index
+REVIEW_QUEUE = "status IN ('APPLIED', 'IN_REVIEW') AND deleted_at IS NULL"
+
+
+def upgrade():
+    with op.batch_alter_table('funding_application', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reviewer_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_funding_application_review_queue', ['lease_expires_at', 'id'], unique=False,
+                              sqlite_where=sa.text(REVIEW_QUEUE))
+
+    op.create_table('review_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('funding_application_id', sa.Integer(), nullable=False),
+    sa.Column('reviewer_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('from_status', sa.Enum('APPLIED', 'IN_REVIEW', 'APPROVED', 'DENIED', name='applicationstatus'), nullable=True),
+    sa.Column('to_status', sa.Enum('APPLIED', 'IN_REVIEW', 'APPROVED', 'DENIED', name='applicationstatus'), nullable=True),
+    sa.Column('note', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('review_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_review_event_funding_application_id'), ['funding_application_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('review_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_review_event_funding_application_id'))
+    op.drop_table('review_event')
+
+    with op.batch_alter_table('funding_application', schema=None) as batch_op:
+        batch_op.drop_index('ix_funding_application_review_queue')
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('reviewer_id')
@@ -0,0 +1,34 @@
+"""index donation totals by payment status
+
+Revision ID: a3c5e1f70b29
+Revises: 9f4d2b7c6e58
+Create Date: 2026-10-20 10:12:48.305217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e1f70b29'
+down_revision = '9f4d2b7c6e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Totals only count settled donations; with payment_status leading, the
+    # indexes still cover them
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.drop_index('ix_donation_currency_date_amount')
+        batch_op.drop_index('ix_donation_method_currency_amount')
+        batch_op.create_index('ix_donation_status_currency_date_amount', ['payment_status', 'currency', 'donation_date', 'amount_minor'], unique=False)
+        batch_op.create_index('ix_donation_status_method_currency_amount', ['payment_status', 'payment_method', 'currency', 'amount_minor'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.drop_index('ix_donation_status_method_currency_amount')
+        batch_op.drop_index('ix_donation_status_currency_date_amount')
+        batch_op.create_index('ix_donation_method_currency_amount', ['payment_method', 'currency', 'amount_minor'], unique=False)
+        batch_op.create_index('ix_donation_currency_date_amount', ['currency', 'donation_date', 'amount_minor'], unique=False)
@@ -0,0 +1,42 @@
+"""add soft delete flags
+
+Revision ID: b5e1c7a04d93
+Revises: 6a3d9f1c8e52
+Create Date: 2026-10-19 20:41:12.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1c7a04d93'
+down_revision = '6a3d9f1c8e52'
+branch_labels = None
+depends_on = None
+
+TABLES = ('employment', 'application', 'funding_application')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+            batch_op.create_index(batch_op.f(f'ix_{table}_deleted_at'), ['deleted_at'], unique=False)
+
+    # The archival job looks up the applications to each archived posting
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_application_employment_id'), ['employment_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_application_employment_id'))
+
+    # Rows flagged deleted were meant to be gone
+    for table in TABLES:
+        op.execute(f'DELETE FROM {table}_text WHERE {table}_id IN (SELECT id FROM {table} WHERE deleted_at IS NOT NULL)')
+        op.execute(f'DELETE FROM {table} WHERE deleted_at IS NOT NULL')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_deleted_at'))
+            batch_op.drop_column('deleted_at')
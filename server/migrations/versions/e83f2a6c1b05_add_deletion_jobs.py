@@ -0,0 +1,59 @@
+"""add deletion jobs and foreign key indexes
+
+Revision ID: e83f2a6c1b05
+Revises: b5e1c7a04d93
+Create Date: 2026-10-19 22:16:48.731950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e83f2a6c1b05'
+down_revision = 'b5e1c7a04d93'
+branch_labels = None
+depends_on = None
+
+# Foreign keys the deletion closure of a user or category is found by
+INDEXES = {
+    'category': ['user_id'],
+    'socialintegration': ['user_id', 'category_id'],
+    'application': ['user_id'],
+    'funding': ['category_id'],
+    'refresh_token': ['user_id'],
+}
+
+
+def upgrade():
+    op.create_table('deletion_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=8), nullable=False),
+    sa.Column('planned', sa.Text(), nullable=True),
+    sa.Column('deleted', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('deletion_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_deletion_job_status'), ['status'], unique=False)
+
+    for table, columns in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.create_index(batch_op.f(f'ix_{table}_{column}'), [column], unique=False)
+
+
+def downgrade():
+    for table, columns in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.drop_index(batch_op.f(f'ix_{table}_{column}'))
+
+    with op.batch_alter_table('deletion_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_deletion_job_status'))
+    op.drop_table('deletion_job')
@@ -1,13 +1,144 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Enum, Float, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Enum, Float, DateTime, event, select, insert
+from sqlalchemy.orm import relationship, declared_attr, with_loader_criteria
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.hybrid import hybrid_property, Comparator
+from sqlalchemy.sql import operators
 from flask_login import UserMixin
 from enum import Enum as PyEnum
 from datetime import datetime
 
 db = SQLAlchemy()
 
-class User(db.Model, UserMixin):
+class RowVersionMixin:
+    # Maintained on every ORM update; used for ETags and delta sync
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {'version_id_col': cls.version}
+
+class SoftDeleteMixin:
+    """Rows are flagged deleted instead of removed, and later moved to the
+    archive by the archival job (see archive.py).
+
+    ORM queries never see flagged rows, including relationship loads; pass
+    execution_options(include_deleted=True) to see them anyway. Core
+    statements have to filter on deleted_at themselves.
+    """
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def soft_delete(self):
+        self.deleted_at = datetime.utcnow()
+
+def _hide_deleted(execute_state):
+    if (execute_state.is_select and not execute_state.is_column_load and not execute_state.is_relationship_load
+            and not execute_state.execution_options.get('include_deleted', False)):
+        execute_state.statement = execute_state.statement.options(with_loader_criteria(
+            SoftDeleteMixin, lambda cls: cls.deleted_at.is_(None), include_aliases=True
+        ))
+
+event.listen(db.session, 'do_orm_execute', _hide_deleted)
+
+class TextSideTable:
+    """Large text kept out of its owner's row.
+
+    Scans of the owner table then only read the hot columns. Owners list the
+    moved columns in TEXT_FIELDS and proxy them through a `text` relationship
+    that is loaded on first access.
+    """
+
+def text_field(name, side_class):
+    return association_proxy('text', name, creator=lambda value: side_class(**{name: value}))
+
+def _touch_text_owners(session, flush_context, instances):
+    # Editing only the side row must still bump the owner's version, or
+    # ETags and delta sync would miss the change.
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, TextSideTable) and obj.owner is not None and obj.owner not in session.new:
+            if session.is_modified(obj):
+                obj.owner.updated_at = datetime.utcnow()
+
+event.listen(db.session, 'before_flush', _touch_text_owners)
+
+
+class Location(db.Model):
+    __tablename__ = 'location'
+    __table_args__ = {'sqlite_autoincrement': True}  # ids are cached, never reuse one
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True, nullable=False)
+
+# Location names are immutable, so both directions are cached for the life of
+# the process. Ids inserted by a transaction only reach the shared cache once
+# it commits; until then they live in session.info.
+_location_ids = {}
+_location_names = {}
+
+def _pending_locations():
+    return db.session.info.setdefault('new_locations', {})
+
+def intern_location(name):
+    """Return the lookup id for a location name, adding it if new."""
+    if name is None:
+        return None
+    location_id = _location_ids.get(name) or _pending_locations().get(name)
+    if location_id is not None:
+        return location_id
+    location_id = db.session.execute(select(Location.id).where(Location.name == name)).scalar()
+    if location_id is not None:
+        _location_ids[name] = location_id
+        _location_names[location_id] = name
+        return location_id
+    location_id = db.session.execute(insert(Location).values(name=name).returning(Location.id)).scalar()
+    _pending_locations()[name] = location_id
+    return location_id
+
+def location_name(location_id):
+    if location_id is None:
+        return None
+    name = _location_names.get(location_id)
+    if name is not None:
+        return name
+    for pending_name, pending_id in _pending_locations().items():
+        if pending_id == location_id:
+            return pending_name
+    name = db.session.execute(select(Location.name).where(Location.id == location_id)).scalar()
+    if name is not None:
+        _location_names[location_id] = name
+        _location_ids[name] = location_id
+    return name
+
+def _publish_locations(session):
+    for name, location_id in session.info.pop('new_locations', {}).items():
+        _location_ids[name] = location_id
+        _location_names[location_id] = name
+
+def _forget_locations(session):
+    session.info.pop('new_locations', None)
+
+event.listen(db.session, 'after_commit', _publish_locations)
+event.listen(db.session, 'after_rollback', _forget_locations)
+
+class LocationComparator(Comparator):
+    """Compares Employment.location by name, through the location_id index."""
+    key = 'location'
+    type = String()
+
+    def __init__(self, location_id):
+        self.location_id = location_id
+
+    def __clause_element__(self):
+        return select(Location.name).where(Location.id == self.location_id).scalar_subquery()
+
+    def operate(self, op, *other, **kwargs):
+        if op in (operators.asc_op, operators.desc_op):
+            return op(self.__clause_element__())
+        return self.location_id.in_(select(Location.id).where(op(Location.name, *other, **kwargs)))
+
+
+class User(db.Model, UserMixin, RowVersionMixin):
     __tablename__ = 'user'  # Corrected from 'tablename' to '__tablename__'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -38,25 +169,56 @@ class User(db.Model, UserMixin):
     def is_anonymous(self):
         return False  
 
-class Employment(db.Model):
+class EmploymentText(db.Model, TextSideTable):
+    __tablename__ = 'employment_text'
+
+    employment_id = db.Column(db.Integer, db.ForeignKey('employment.id'), primary_key=True)
+    description = db.Column(db.Text, nullable=False)
+    requirements = db.Column(db.Text)
+
+    owner = db.relationship('Employment', back_populates='text')
+
+class Employment(db.Model, RowVersionMixin, SoftDeleteMixin):
     __tablename__ = 'employment'  # Corrected from 'tablename' to '__tablename__'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False, index=True)
     title = db.Column(db.String, nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    requirements = db.Column(db.Text)
-    location = db.Column(db.String)
-    salary_range = db.Column(db.Integer)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), index=True)
+    # Money is integer minor units plus currency; see money.py
+    salary_minor = db.Column(db.BigInteger, index=True)
+    salary_currency = db.Column(db.String(3), nullable=False, default='KES')
+    # Geocoded from location on write (see geo.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
 
     # Relationships
     user = db.relationship('User', back_populates='employments')
     category = db.relationship('Category', back_populates='employments', lazy=True)
     applications = db.relationship('Application', back_populates='employment', lazy=True)
+    text = db.relationship('EmploymentText', back_populates='owner', uselist=False, cascade='all, delete-orphan')
+
+    TEXT_FIELDS = ('description', 'requirements')
+    description = text_field('description', EmploymentText)
+    requirements = text_field('requirements', EmploymentText)
+
+    @hybrid_property
+    def location(self):
+        return location_name(self.location_id)
+
+    @location.inplace.setter
+    def _location_setter(self, name):
+        self.location_id = intern_location(name)
+
+    @location.inplace.comparator
+    @classmethod
+    def _location_comparator(cls):
+        return LocationComparator(cls.location_id)
 
     @staticmethod
-    def create(user_id, category_id, title, description, requirements=None, location=None, salary_range=None):
+    def create(user_id, category_id, title, description, requirements=None, location=None, salary_minor=None, salary_currency='KES'):
         employment = Employment(
             user_id=user_id,
             category_id=category_id,
@@ -64,7 +226,8 @@ class Employment(db.Model):
             description=description,
             requirements=requirements,
             location=location,
-            salary_range=salary_range
+            salary_minor=salary_minor,
+            salary_currency=salary_currency
         )
         db.session.add(employment)
         db.session.commit()
@@ -84,16 +247,16 @@ class Employment(db.Model):
         db.session.commit()
 
     def delete(self):
-        db.session.delete(self)
+        self.soft_delete()
         db.session.commit()
 
-class Category(db.Model):
+class Category(db.Model, RowVersionMixin):
     __tablename__ = 'category'  # Corrected from 'tablename' to '__tablename__'
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     description = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
 
     # Relationships
     employments = db.relationship('Employment', back_populates='category', lazy=True)
@@ -101,12 +264,12 @@ class Category(db.Model):
     fundings = db.relationship('Funding', backref='source_category', lazy=True) # Changed backref name
     creator = db.relationship('User', back_populates='categories', lazy=True)
 
-class SocialIntegration(db.Model):
+class SocialIntegration(db.Model, RowVersionMixin):
     __tablename__ = 'socialintegration'  # Corrected from 'tablename' to '__tablename__'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False, index=True)
     association_name = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=False)
 
@@ -114,16 +277,23 @@ class SocialIntegration(db.Model):
     user = db.relationship('User', back_populates='social_integrations', lazy=True)
     category = db.relationship('Category', back_populates='social_integrations', lazy=True)
 
-class Application(db.Model):
+class ApplicationText(db.Model, TextSideTable):
+    __tablename__ = 'application_text'
+
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), primary_key=True)
+    cover_letter = db.Column(db.Text, nullable=False)
+
+    owner = db.relationship('Application', back_populates='text')
+
+class Application(db.Model, RowVersionMixin, SoftDeleteMixin):
     __tablename__ = 'application'  # Corrected from 'tablename' to '__tablename__'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    employment_id = db.Column(db.Integer, db.ForeignKey('employment.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    employment_id = db.Column(db.Integer, db.ForeignKey('employment.id'), nullable=False, index=True)
     name = db.Column(db.String, nullable=False)
     phone_number = db.Column(db.String, nullable=False)
     email = db.Column(db.String, nullable=False)
-    cover_letter = db.Column(db.Text, nullable=False)
     resume = db.Column(db.String, nullable=True) # URL or File path
     linkedin = db.Column(db.String, nullable=True) # URL or File Path
     portfolio = db.Column(db.String, nullable=True) # URL or File Path
@@ -131,19 +301,24 @@ class Application(db.Model):
     # Relationships
     user = db.relationship('User', back_populates='applications', lazy=True)
     employment = db.relationship('Employment', back_populates='applications', lazy=True)
+    text = db.relationship('ApplicationText', back_populates='owner', uselist=False, cascade='all, delete-orphan')
+
+    TEXT_FIELDS = ('cover_letter',)
+    cover_letter = text_field('cover_letter', ApplicationText)
 
 class GrantType(PyEnum):
     SOCIAL_AID = 'Social Aid'
     BUSINESS = 'Business'
 
-class Funding(db.Model):
+class Funding(db.Model, RowVersionMixin):
     __tablename__ = 'funding'
 
     id = db.Column(db.Integer, primary_key=True)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False, index=True)
     grant_name = db.Column(db.String(120), nullable=False)
     grant_type = db.Column(db.Enum(GrantType), nullable=False)
-    amount = db.Column(db.Integer, nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default='KES')
     description = db.Column(db.Text)
     eligibility_criteria = Column(Text, nullable=True)
     
@@ -161,28 +336,55 @@ class ApplicationType(PyEnum):
     SOCIAL_AID = 'SocialAid'
     BUSINESS = 'Business'
 
-class FundingApplication(db.Model):
+class FundingApplicationText(db.Model, TextSideTable):
+    __tablename__ = 'funding_application_text'
+
+    funding_application_id = db.Column(db.Integer, db.ForeignKey('funding_application.id'), primary_key=True)
+    reason_for_aid = db.Column(db.Text, nullable=True)
+    business_profile = db.Column(db.Text, nullable=True)
+
+    owner = db.relationship('FundingApplication', back_populates='text')
+
+# Spelled out so the review queue query matches the partial index word for word
+REVIEW_QUEUE = "status IN ('APPLIED', 'IN_REVIEW') AND deleted_at IS NULL"
+
+class FundingApplication(db.Model, RowVersionMixin, SoftDeleteMixin):
     __tablename__ = 'funding_application'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    funding_id = db.Column(db.Integer, db.ForeignKey('funding.id'), nullable=False)
-    status = db.Column(db.Enum(ApplicationStatus), nullable=False)
-    application_type = db.Column(db.Enum(ApplicationType), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    funding_id = db.Column(db.Integer, db.ForeignKey('funding.id'), nullable=False, index=True)
+    status = db.Column(db.Enum(ApplicationStatus), nullable=False, index=True)
+    application_type = db.Column(db.Enum(ApplicationType), nullable=False, index=True)
     supporting_documents = db.Column(db.Text, nullable=True)  # URL or File Path
 
     # Social Aid Specific Fields
     household_income = db.Column(db.Integer, nullable=True)
     number_of_dependents = db.Column(db.Integer, nullable=True)
-    reason_for_aid = db.Column(db.Text, nullable=True)
 
     # Business Specific Fields
     concept_note = db.Column(db.String, nullable=True) # URL or File Path
-    business_profile = db.Column(db.Text, nullable=True)
+
+    # Review lease, see review.py. Not a foreign key: leases are short lived
+    # and never keep a user from being deleted.
+    reviewer_id = db.Column(db.Integer, nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # The review queue: open applications without a lease first, then by
+        # when their lease ran out
+        db.Index('ix_funding_application_review_queue', 'lease_expires_at', 'id', sqlite_where=db.text(REVIEW_QUEUE)),
+    )
 
     #Relationships
     user = db.relationship('User', back_populates='funding_applications', overlaps="applicant")
     funding = db.relationship('Funding', back_populates='funding_applications', lazy=True)
+    text = db.relationship('FundingApplicationText', back_populates='owner', uselist=False, cascade='all, delete-orphan')
+
+    # reason_for_aid is social aid specific, business_profile business specific
+    TEXT_FIELDS = ('reason_for_aid', 'business_profile')
+    reason_for_aid = text_field('reason_for_aid', FundingApplicationText)
+    business_profile = text_field('business_profile', FundingApplicationText)
 
 class DonationType(PyEnum):
     INDIVIDUAL = 'Individual'
@@ -193,17 +395,124 @@ class PaymentMethod(PyEnum):
     PAYPAL = 'PayPal'
     MPESA = 'MPESA'
 
-class Donation(db.Model):
+class PaymentStatus(PyEnum):
+    PENDING = 'pending'
+    SETTLED = 'settled'
+    FAILED = 'failed'
+
+class Donation(db.Model, RowVersionMixin):
     __tablename__ = 'donation'
 
     donation_id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    donation_type = db.Column(db.Enum(DonationType), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    donation_type = db.Column(db.Enum(DonationType), nullable=False, index=True)
     name = db.Column(db.String, nullable=True) #individual specific field
     organisation_name = db.Column(db.String, nullable=True) #organisation specific field
-    amount = db.Column(db.Float, nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False, index=True)
+    currency = db.Column(db.String(3), nullable=False, default='KES')
     payment_method = db.Column(db.Enum(PaymentMethod), nullable=False)
-    donation_date = db.Column(db.DateTime, default=datetime.utcnow)
+    donation_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    payment_status = db.Column(db.Enum(PaymentStatus), nullable=False, default=PaymentStatus.PENDING) # see payments.py
+    payment_reference = db.Column(db.String, nullable=True) # the gateway's id for the charge
+
+    # Cover per-currency totals of settled donations over a date range, and
+    # per payment method, without touching the table
+    __table_args__ = (
+        db.Index('ix_donation_status_currency_date_amount', 'payment_status', 'currency', 'donation_date', 'amount_minor'),
+        db.Index('ix_donation_status_method_currency_amount', 'payment_status', 'payment_method', 'currency', 'amount_minor'),
+    )
 
     # Relationships
-    user = db.relationship('User', back_populates='donations', lazy=True)
\ No newline at end of file
+    user = db.relationship('User', back_populates='donations', lazy=True)
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String, nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(6), nullable=False) # insert, update or delete
+    changes = db.Column(db.Text, nullable=True) # JSON payload, see changes.py
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class DeletionJob(db.Model):
+    __tablename__ = 'deletion_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String, nullable=False) # user or category
+    row_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(8), nullable=False, default='pending', index=True) # pending, running, done or failed
+    planned = db.Column(db.Text, nullable=True) # JSON, rows to delete per table when the job started
+    deleted = db.Column(db.Text, nullable=True) # JSON, rows deleted so far per table
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) # doubles as the worker's heartbeat
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class PaymentJob(db.Model):
+    __tablename__ = 'payment_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    donation_id = db.Column(db.Integer, db.ForeignKey('donation.donation_id'), nullable=False, unique=True)
+    gateway = db.Column(db.String, nullable=False)
+    status = db.Column(db.String(9), nullable=False, default='pending') # pending, running, submitted, done or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    error = db.Column(db.Text, nullable=True) # of the last attempt
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) # doubles as the worker's heartbeat
+
+    donation = db.relationship('Donation', lazy=True)
+
+    __table_args__ = (
+        # Due jobs are found by status and time
+        db.Index('ix_payment_job_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+class ReviewEvent(db.Model):
+    __tablename__ = 'review_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Plain ids, so the trail outlives archived applications and deleted users
+    funding_application_id = db.Column(db.Integer, nullable=False, index=True)
+    reviewer_id = db.Column(db.Integer, nullable=True)
+    action = db.Column(db.String(10), nullable=False) # lease, release or transition
+    from_status = db.Column(db.Enum(ApplicationStatus), nullable=True)
+    to_status = db.Column(db.Enum(ApplicationStatus), nullable=True)
+    note = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class WebhookCursor(db.Model):
+    __tablename__ = 'webhook_cursor'
+
+    endpoint = db.Column(db.String, primary_key=True)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class RefreshToken(db.Model):
+    __tablename__ = 'refresh_token'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False) # sha256 of the opaque token
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    family_id = db.Column(db.String(32), nullable=False, index=True) # shared by all rotations of one login
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_token'
+
+    id = db.Column(db.Integer, primary_key=True)
+    family_id = db.Column(db.String(32), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True) # when the last access token of the family expires
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+
+    key = db.Column(db.String(64), primary_key=True) # sha256 of caller, endpoint and Idempotency-Key header
+    request_hash = db.Column(db.String(64), nullable=False) # sha256 of the request body
+    status = db.Column(db.Integer, nullable=True) # NULL while the first request is still running
+    body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False) # when the current holder claimed the key
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,196 @@
+"""Money amounts: exact integer minor units plus an ISO 4217 currency code.
+
+Amounts are stored as integers in the currency's minor unit (cents for KES,
+whole shillings for UGX) next to the currency code, and converted to and
+from major units only where requests are parsed and responses serialized.
+Sums stay exact because they never pass through a float.
+
+    GET /donations/totals?group_by=payment_method&since=2026-01-01
+    GET /fundings/totals?group_by=grant_type
+    GET /employments/salary_stats?group_by=category_id
+
+The totals endpoints aggregate in SQL and only ever read result rows, one
+per currency and group. Amounts in different currencies are never added up
+together. Donation totals count settled donations, like the leaderboards;
+?payment_status=pending or failed totals the others.
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import request
+from flask_restful import Resource
+from sqlalchemy import select, func
+from models import Donation, Funding, Employment, PaymentStatus, db
+
+DEFAULT_CURRENCY = 'KES'
+
+# Minor unit exponents (ISO 4217) of the currencies we accept
+CURRENCY_EXPONENTS = {
+    'KES': 2, 'UGX': 0, 'TZS': 2, 'RWF': 0, 'ETB': 2, 'SOS': 2, 'NGN': 2,
+    'GHS': 2, 'ZAR': 2, 'USD': 2, 'EUR': 2, 'GBP': 2,
+}
+# Minor unit columns are signed 64-bit integers
+MAX_MINOR = 2 ** 63 - 1
+
+
+class MoneyError(ValueError):
+    pass
+
+
+def parse_currency(code):
+    """Validate a currency code; missing means DEFAULT_CURRENCY."""
+    code = (code or DEFAULT_CURRENCY).upper()
+    if code not in CURRENCY_EXPONENTS:
+        raise MoneyError(f'Unsupported currency {code!r}!')
+    return code
+
+def to_minor(amount, currency):
+    """Exact minor units of an amount given in major units: 12.5 KES -> 1250."""
+    if isinstance(amount, bool):
+        raise MoneyError('Amount must be a number!')
+    try:
+        # str() first, so 0.1 means one tenth and not the float nearest to it
+        value = Decimal(str(amount))
+    except InvalidOperation:
+        raise MoneyError(f'Invalid amount {amount!r}!')
+    if not value.is_finite():
+        raise MoneyError(f'Invalid amount {amount!r}!')
+    # Checked before scaling too, so a huge exponent is never expanded
+    if value.copy_abs() > MAX_MINOR:
+        raise MoneyError(f'{amount} is too large!')
+    minor = value.scaleb(CURRENCY_EXPONENTS[currency])
+    if minor != minor.to_integral_value():
+        raise MoneyError(f'{amount} has more decimals than {currency} allows!')
+    if minor.copy_abs() > MAX_MINOR:
+        raise MoneyError(f'{amount} is too large!')
+    return int(minor)
+
+def from_minor(minor, currency):
+    return Decimal(minor).scaleb(-CURRENCY_EXPONENTS[currency])
+
+def to_json(minor, currency):
+    """Major units as a JSON number, or None."""
+    if minor is None:
+        return None
+    value = from_minor(minor, currency)
+    # A whole amount stays an int; otherwise the shortest float repr of a
+    # two decimal amount is exactly that amount.
+    return int(value) if value == value.to_integral_value() else float(value)
+
+def parse_money(data, amount_key, currency_key='currency'):
+    """Read an amount and its currency from a request body.
+
+    Returns (minor, currency). The currency defaults to DEFAULT_CURRENCY and
+    is always written together with the amount, which must be positive.
+    """
+    currency = parse_currency(data.get(currency_key))
+    amount = data.get(amount_key)
+    if amount is None:
+        return None, currency
+    minor = to_minor(amount, currency)
+    if minor <= 0:
+        raise MoneyError(f'{amount_key} must be positive!')
+    return minor, currency
+
+
+# Aggregates
+
+def _parse_date(name):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        raise MoneyError(f'{name} must be an ISO 8601 timestamp!')
+
+def aggregate(amount, currency, groups, where=()):
+    """Count, sum, min, max and mean of amount per currency and group.
+
+    Means are computed from the exact sum and count, and rounded to the
+    currency's minor unit, instead of using SQL AVG, which returns a float.
+    """
+    columns = [currency] + list(groups)
+    statement = select(
+        *columns, func.count(amount), func.sum(amount), func.min(amount), func.max(amount)
+    ).where(amount.is_not(None), *where).group_by(*columns).order_by(*columns)
+
+    results = []
+    for row in db.session.execute(statement):
+        code, keys, (count, total, low, high) = row[0], row[1:len(columns)], row[len(columns):]
+        average = int((Decimal(total) / count).to_integral_value())
+        result = {'currency': code}
+        result.update({group.key: getattr(key, 'value', key) for group, key in zip(groups, keys)})
+        result.update({
+            'count': count,
+            'total': to_json(total, code),
+            'total_minor': total,
+            'average': to_json(average, code),
+            'min': to_json(low, code),
+            'max': to_json(high, code),
+        })
+        results.append(result)
+    return results
+
+def _payment_status():
+    raw = request.args.get('payment_status', PaymentStatus.SETTLED.value)
+    try:
+        return PaymentStatus(raw.lower())
+    except ValueError:
+        raise MoneyError(f"payment_status must be one of {', '.join(status.value for status in PaymentStatus)}.")
+
+def _group_by(allowed):
+    names = [name for name in request.args.get('group_by', '').split(',') if name]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise MoneyError(f"Cannot group by {', '.join(unknown)}; allowed are {', '.join(allowed)}.")
+    return [allowed[name] for name in names]
+
+
+class DonationTotalsResource(Resource):
+    GROUPS = {
+        'payment_method': Donation.payment_method,
+        'donation_type': Donation.donation_type,
+        'user_id': Donation.user_id,
+    }
+
+    def get(self):
+        try:
+            groups = _group_by(self.GROUPS)
+            where = [Donation.payment_status == _payment_status()]
+            since, until = _parse_date('since'), _parse_date('until')
+            if since:
+                where.append(Donation.donation_date >= since)
+            if until:
+                where.append(Donation.donation_date < until)
+            if request.args.get('currency'):
+                where.append(Donation.currency == parse_currency(request.args['currency']))
+        except MoneyError as e:
+            return {'message': str(e)}, 400
+        return aggregate(Donation.amount_minor, Donation.currency, groups, where), 200
+
+class FundingTotalsResource(Resource):
+    GROUPS = {'grant_type': Funding.grant_type, 'category_id': Funding.category_id}
+
+    def get(self):
+        try:
+            groups = _group_by(self.GROUPS)
+        except MoneyError as e:
+            return {'message': str(e)}, 400
+        return aggregate(Funding.amount_minor, Funding.currency, groups), 200
+
+class SalaryStatsResource(Resource):
+    GROUPS = {'category_id': Employment.category_id, 'user_id': Employment.user_id}
+
+    def get(self):
+        try:
+            groups = _group_by(self.GROUPS)
+        except MoneyError as e:
+            return {'message': str(e)}, 400
+        return aggregate(Employment.salary_minor, Employment.salary_currency, groups), 200
+
+
+def initialize_money_routes(api):
+    api.add_resource(DonationTotalsResource, '/donations/totals')
+    api.add_resource(FundingTotalsResource, '/fundings/totals')
+    api.add_resource(SalaryStatsResource, '/employments/salary_stats')
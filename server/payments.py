@@ -0,0 +1,464 @@
+"""Charging donations through payment gateways, off the request thread.
+
+create_donation only records the donation as pending together with a
+payment_job row and answers straight away. A dispatcher thread in every
+serving process (see app.start_workers) claims due jobs with a conditional
+UPDATE and hands them to a pool of PAYMENT_WORKERS threads, which call the
+gateway adapter configured for the donation's payment method
+(PAYMENT_GATEWAYS) with a PAYMENT_TIMEOUT:
+
+- the gateway settles or declines the charge at once: the donation's
+  payment_status becomes settled or failed
+- the gateway accepts it for later (e.g. an M-Pesa STK push waiting for
+  the donor's PIN): the job waits for the gateway to call
+  POST /payments/callback/<gateway>, which settles the donation
+- the gateway times out or errors: the job is retried with exponential
+  backoff, up to PAYMENT_MAX_ATTEMPTS, then the donation fails
+
+Every attempt for a donation carries the same idempotency key, so a retry
+after a timeout never charges twice. A running job whose worker died is
+picked up again once its heartbeat is older than STALE_AFTER. Settling is
+a conditional UPDATE on the pending donation, so duplicate or late
+callbacks change nothing.
+
+Adapters for real gateways subclass Gateway and are added with
+register_gateway(). Every payment method needs one in PAYMENT_GATEWAYS.
+Building the app only warns about the ones without, so `flask db` and the
+other commands work unconfigured, and donations paid that way are refused
+with a 503; the dispatcher refuses to start until all are set. The bundled "mock" gateway simulates
+latency, timeouts, declines, errors and asynchronous callbacks
+(PAYMENT_MOCK_* settings), for load tests without a real gateway. It is
+only used, and its callback only answered, when PAYMENT_MOCK_ENABLED is
+set (or the app is TESTING); it then covers the methods left without a
+gateway. Its callbacks are signed with PAYMENT_MOCK_SECRET, random per
+process unless set.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+from flask_restful import Resource
+from sqlalchemy import select, update, or_
+from models import db, Donation, PaymentJob, PaymentStatus, PaymentMethod
+from changes import record_update
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF = 2.0  # seconds before the first retry, doubled for every further one
+# A running job not heard from for this long is taken over by another worker
+STALE_AFTER = timedelta(seconds=120)
+# Job statuses of a charge that may still go through
+UNFINISHED = ('pending', 'running', 'submitted')
+
+
+class GatewayError(Exception):
+    """The attempt failed but may succeed if retried (network, 5xx, ...)."""
+
+class GatewayTimeout(GatewayError):
+    pass
+
+class Declined(Exception):
+    """The gateway refused the charge; retrying will not help."""
+
+class PaymentUnavailable(Exception):
+    """No usable gateway is configured for the payment method."""
+
+
+class Charge:
+    """What a gateway is asked to collect."""
+
+    def __init__(self, donation_id, amount_minor, currency, payment_method, idempotency_key):
+        self.donation_id = donation_id
+        self.amount_minor = amount_minor
+        self.currency = currency
+        self.payment_method = payment_method
+        self.idempotency_key = idempotency_key
+
+
+class Gateway:
+    """Adapter to one payment provider.
+
+    charge() returns (settled, reference): settled is True when the money
+    was collected, False when the provider will report the outcome through
+    a callback. It raises Declined or GatewayError otherwise and must give
+    up after timeout seconds. parse_callback() verifies a callback request
+    and returns (idempotency_key, reference, succeeded, error).
+    """
+
+    name = None
+
+    def charge(self, charge, timeout):
+        raise NotImplementedError
+
+    def parse_callback(self, headers, body):
+        raise NotImplementedError
+
+
+class MockGateway(Gateway):
+    """Pretends to be a provider, with configurable latency and failure rates."""
+
+    name = 'mock'
+
+    def __init__(self, app, latency=(0.05, 0.5), timeout_rate=0.02, error_rate=0.05, decline_rate=0.05,
+                 async_rate=0.3, callback_delay=(0.5, 3.0), secret=None):
+        self.app = app
+        self.latency = latency
+        self.timeout_rate = timeout_rate
+        self.error_rate = error_rate
+        self.decline_rate = decline_rate
+        self.async_rate = async_rate
+        self.callback_delay = callback_delay
+        self.secret = secret or os.urandom(32).hex()
+        self._charges = {}  # idempotency key -> (settled, reference), like a provider's own dedup
+        self._lock = threading.Lock()
+
+    def charge(self, charge, timeout):
+        with self._lock:
+            if charge.idempotency_key in self._charges:
+                return self._charges[charge.idempotency_key]
+        roll = random.random()
+        if roll < self.timeout_rate:
+            time.sleep(timeout)
+            raise GatewayTimeout(f'No answer within {timeout}s')
+        time.sleep(min(random.uniform(*self.latency), timeout))
+        roll -= self.timeout_rate
+        if roll < self.error_rate:
+            raise GatewayError('Mock gateway error')
+        roll -= self.error_rate
+        if roll < self.decline_rate:
+            raise Declined('Mock card declined')
+        roll -= self.decline_rate
+        reference = f'mock_{uuid.uuid4().hex[:16]}'
+        settled = roll >= self.async_rate
+        with self._lock:
+            self._charges[charge.idempotency_key] = (settled, reference)
+        if not settled:
+            timer = threading.Timer(random.uniform(*self.callback_delay), self._call_back,
+                                    (charge.idempotency_key, reference))
+            timer.daemon = True
+            timer.start()
+        return settled, reference
+
+    def _sign(self, body):
+        return hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def _call_back(self, idempotency_key, reference):
+        # Most asynchronous charges go through in the end
+        succeeded = random.random() >= self.decline_rate
+        body = json.dumps({'merchant_reference': idempotency_key, 'reference': reference,
+                           'status': 'succeeded' if succeeded else 'failed'}).encode()
+        headers = {'Content-Type': 'application/json', 'X-Mock-Signature': self._sign(body)}
+        url = self.app.config.get('PAYMENT_MOCK_CALLBACK_URL')
+        try:
+            if url:
+                import requests
+                requests.post(url, data=body, headers=headers, timeout=5)
+            else:
+                self.app.test_client().post(f'/payments/callback/{self.name}', data=body, headers=headers)
+        except Exception:
+            logger.exception('Mock gateway callback for %s failed', reference)
+
+    def parse_callback(self, headers, body):
+        if not hmac.compare_digest(self._sign(body), headers.get('X-Mock-Signature', '')):
+            raise GatewayError('Bad callback signature')
+        data = json.loads(body)
+        succeeded = data['status'] == 'succeeded'
+        return data['merchant_reference'], data['reference'], succeeded, None if succeeded else 'Declined by donor'
+
+
+# Gateway name -> factory taking the app
+GATEWAY_FACTORIES = {
+    'mock': lambda app: MockGateway(
+        app,
+        latency=app.config.get('PAYMENT_MOCK_LATENCY', (0.05, 0.5)),
+        timeout_rate=app.config.get('PAYMENT_MOCK_TIMEOUT_RATE', 0.02),
+        error_rate=app.config.get('PAYMENT_MOCK_ERROR_RATE', 0.05),
+        decline_rate=app.config.get('PAYMENT_MOCK_DECLINE_RATE', 0.05),
+        async_rate=app.config.get('PAYMENT_MOCK_ASYNC_RATE', 0.3),
+        callback_delay=app.config.get('PAYMENT_MOCK_CALLBACK_DELAY', (0.5, 3.0)),
+        secret=app.config.get('PAYMENT_MOCK_SECRET'),
+    ),
+}
+
+def register_gateway(name, factory):
+    GATEWAY_FACTORIES[name] = factory
+
+def _gateways():
+    return current_app.extensions['payment_gateways']
+
+def _mock_enabled(app):
+    return bool(app.config.get('PAYMENT_MOCK_ENABLED') or app.config.get('TESTING'))
+
+def _gateway_names(app):
+    """Payment method name -> usable gateway name, and what is wrong with the rest.
+
+    The mock fills in for missing gateways when it is enabled.
+    """
+    configured = dict(app.config['PAYMENT_GATEWAYS'])
+    if _mock_enabled(app):
+        configured = {method.name: configured.get(method.name, MockGateway.name) for method in PaymentMethod}
+    names, problems = {}, []
+    for method in PaymentMethod:
+        name = configured.get(method.name)
+        if name is None:
+            problems.append(f'No payment gateway for {method.name}: set PAYMENT_GATEWAYS, '
+                            'or PAYMENT_MOCK_ENABLED=1 outside production')
+        elif name == MockGateway.name and not _mock_enabled(app):
+            problems.append(f'{method.name} uses the mock payment gateway, which needs PAYMENT_MOCK_ENABLED=1')
+        elif name not in GATEWAY_FACTORIES:
+            problems.append(f'Unknown payment gateway {name!r} for {method.name}')
+        else:
+            names[method.name] = name
+    return names, problems
+
+def gateway_for(payment_method):
+    name = current_app.extensions['payment_gateway_names'].get(payment_method.name)
+    if name is None:
+        raise PaymentUnavailable(f'Payments by {payment_method.value} are not available')
+    return name
+
+def idempotency_key(donation_id):
+    return f'donation-{donation_id}'
+
+def _donation_id(key):
+    prefix, _, donation_id = key.partition('-')
+    return int(donation_id) if prefix == 'donation' and donation_id.isdigit() else None
+
+
+# Settling
+
+def settle(donation_id, succeeded, reference=None, error=None):
+    """Record the outcome of a pending donation's payment; False if it was already settled."""
+    status = PaymentStatus.SETTLED if succeeded else PaymentStatus.FAILED
+    donation = Donation.__table__
+    values = {'payment_status': status}
+    if reference:
+        values['payment_reference'] = reference
+    settled = db.session.execute(
+        update(donation)
+        .where(donation.c.donation_id == donation_id, donation.c.payment_status == PaymentStatus.PENDING)
+        .values(version=donation.c.version + 1, **values)
+    ).rowcount
+    if settled:
+        record_update(db.session, Donation, donation_id, values)
+    job = PaymentJob.__table__
+    db.session.execute(
+        update(job).where(job.c.donation_id == donation_id, job.c.status.in_(UNFINISHED))
+        .values(status='done' if succeeded else 'failed', error=error, updated_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return bool(settled)
+
+def _retry_or_fail(job_id, donation_id, attempts, error):
+    max_attempts = current_app.config['PAYMENT_MAX_ATTEMPTS']
+    if attempts >= max_attempts:
+        logger.warning('Payment for donation %s failed after %s attempts: %s', donation_id, attempts, error)
+        settle(donation_id, False, error=error)
+        return
+    # Jittered, so a gateway outage does not end in a synchronized stampede
+    delay = current_app.config['PAYMENT_RETRY_BACKOFF'] * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+    job = PaymentJob.__table__
+    with db.engine.begin() as connection:
+        connection.execute(update(job).where(job.c.id == job_id, job.c.status == 'running').values(
+            status='pending', error=error, next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+            updated_at=datetime.utcnow()
+        ))
+
+def attempt(job_id):
+    """One attempt at a claimed job."""
+    job = PaymentJob.__table__
+    donation = Donation.__table__
+    with db.engine.connect() as connection:
+        row = connection.execute(
+            select(job.c.donation_id, job.c.gateway, job.c.attempts, donation.c.amount_minor, donation.c.currency,
+                   donation.c.payment_method)
+            .join_from(job, donation, job.c.donation_id == donation.c.donation_id)
+            .where(job.c.id == job_id)
+        ).first()
+    if row is None:
+        return
+    gateway = _gateways().get(row.gateway)
+    if gateway is None:
+        settle(row.donation_id, False, error=f'No gateway named {row.gateway}')
+        return
+
+    charge = Charge(row.donation_id, row.amount_minor, row.currency, row.payment_method, idempotency_key(row.donation_id))
+    try:
+        settled, reference = gateway.charge(charge, current_app.config['PAYMENT_TIMEOUT'])
+    except Declined as e:
+        settle(row.donation_id, False, error=str(e))
+    except GatewayError as e:
+        _retry_or_fail(job_id, row.donation_id, row.attempts, str(e))
+    except Exception as e:
+        logger.exception('Gateway %s raised on donation %s', row.gateway, row.donation_id)
+        _retry_or_fail(job_id, row.donation_id, row.attempts, repr(e))
+    else:
+        if settled:
+            settle(row.donation_id, True, reference)
+            return
+        # The callback may have beaten us here; it only leaves running
+        # or submitted jobs behind as done or failed.
+        with db.engine.begin() as connection:
+            connection.execute(update(job).where(job.c.id == job_id, job.c.status == 'running')
+                               .values(status='submitted', updated_at=datetime.utcnow()))
+            connection.execute(update(donation).where(
+                donation.c.donation_id == row.donation_id, donation.c.payment_reference.is_(None)
+            ).values(payment_reference=reference))
+
+
+class PaymentDispatcher:
+    """Claims due payment jobs and runs them on a pool of worker threads.
+
+    Only claims as many jobs as there are idle workers, so a claimed job
+    never sits in a queue while its heartbeat goes stale. Polls every
+    poll_interval seconds and is woken straight away for donations made in
+    this process.
+    """
+
+    def __init__(self, app, workers=DEFAULT_WORKERS, poll_interval=1.0):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._idle = threading.Semaphore(workers)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        problems = _gateway_names(self.app)[1]
+        if problems:
+            raise ValueError('; '.join(problems))
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='payment-worker')
+            self._thread = threading.Thread(target=self._run, name='payment-dispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self._executor.shutdown(wait=True)
+
+    def wake(self):
+        self._wake.set()
+
+    def _claim(self, limit):
+        """Mark up to limit due jobs running; returns their ids."""
+        job = PaymentJob.__table__
+        now = datetime.utcnow()
+        due = or_(
+            (job.c.status == 'pending') & (job.c.next_attempt_at <= now),
+            (job.c.status == 'running') & (job.c.updated_at < now - STALE_AFTER),
+        )
+        claimed = []
+        with db.engine.connect() as connection:
+            candidates = connection.execute(
+                select(job.c.id, job.c.status, job.c.updated_at).where(due).order_by(job.c.next_attempt_at).limit(limit)
+            ).all()
+        for candidate in candidates:
+            # Conditional on what we saw, so two processes cannot both win
+            with db.engine.begin() as connection:
+                won = connection.execute(update(job).where(
+                    job.c.id == candidate.id, job.c.status == candidate.status, job.c.updated_at == candidate.updated_at
+                ).values(status='running', attempts=job.c.attempts + 1, updated_at=now)).rowcount
+            if won:
+                claimed.append(candidate.id)
+        return claimed
+
+    def _attempt(self, job_id):
+        try:
+            with self.app.app_context():
+                try:
+                    attempt(job_id)
+                except Exception:
+                    logger.exception('Payment job %s failed', job_id)
+        finally:
+            self._idle.release()
+            self._wake.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                # Cleared first, so a wake during the claim is not lost
+                self._wake.clear()
+                idle = 0
+                while self._idle.acquire(blocking=False):
+                    idle += 1
+                try:
+                    claimed = self._claim(idle) if idle else []
+                except Exception:
+                    logger.exception('Claiming payment jobs failed')
+                    claimed = []
+                for _ in range(idle - len(claimed)):
+                    self._idle.release()
+                for job_id in claimed:
+                    self._executor.submit(self._attempt, job_id)
+                # Woken by new donations and by workers freeing up
+                self._wake.wait(self.poll_interval)
+
+
+def start_payment(donation):
+    """Queue the payment of a donation added to the session; commit, then call wake_dispatcher()."""
+    db.session.add(PaymentJob(donation=donation, gateway=gateway_for(donation.payment_method)))
+
+def wake_dispatcher():
+    dispatcher = current_app.extensions.get('payment_dispatcher')
+    if dispatcher is not None:
+        dispatcher.wake()
+
+
+class PaymentCallbackResource(Resource):
+    def post(self, gateway):
+        adapter = _gateways().get(gateway)
+        if adapter is None:
+            return {'message': 'Unknown gateway'}, 404
+        try:
+            key, reference, succeeded, error = adapter.parse_callback(request.headers, request.get_data())
+        except (GatewayError, ValueError, KeyError) as e:
+            return {'message': f'Invalid callback: {e}'}, 400
+        donation_id = _donation_id(key)
+        if donation_id is None or not db.session.get(Donation, donation_id):
+            return {'message': 'Donation not found!'}, 404
+        settled = settle(donation_id, succeeded, reference, error)
+        # 200 either way, so the gateway stops redelivering
+        return {'message': 'Payment settled' if settled else 'Payment was already settled'}, 200
+
+
+def init_payments(app):
+    app.config.setdefault('PAYMENT_GATEWAYS', {})  # payment method name -> gateway name
+    app.config.setdefault('PAYMENT_MOCK_ENABLED', False)
+    app.config.setdefault('PAYMENT_WORKERS', DEFAULT_WORKERS)
+    app.config.setdefault('PAYMENT_TIMEOUT', DEFAULT_TIMEOUT)
+    app.config.setdefault('PAYMENT_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    app.config.setdefault('PAYMENT_RETRY_BACKOFF', DEFAULT_BACKOFF)
+
+    gateway_names, problems = _gateway_names(app)
+    for problem in problems:
+        logger.warning('%s; donations paid that way are refused', problem)
+    app.extensions['payment_gateway_names'] = gateway_names
+    # Only configured gateways are built, so the callback route answers no others
+    app.extensions['payment_gateways'] = {name: GATEWAY_FACTORIES[name](app) for name in set(gateway_names.values())}
+
+    dispatcher = PaymentDispatcher(app, app.config['PAYMENT_WORKERS'], app.config.get('PAYMENT_POLL_INTERVAL', 1.0))
+    app.extensions['payment_dispatcher'] = dispatcher
+    if app.config['PAYMENT_WORKERS'] > 0:
+        app.extensions.setdefault('workers', []).append(dispatcher)
+    return dispatcher
+
+def initialize_payment_routes(api):
+    api.add_resource(PaymentCallbackResource, '/payments/callback/<string:gateway>')
@@ -0,0 +1,86 @@
+"""A user with everything they posted, applied for and gave."""
+from flask import Blueprint, jsonify
+from sqlalchemy.orm import selectinload
+from models import User, Employment, Application, FundingApplication
+from money import to_json
+
+bp = Blueprint('profiles', __name__)
+
+@bp.route('/profile/<int:user_id>', methods=['GET'])
+def get_user_profile(user_id):
+    user = User.query.options(
+        selectinload(User.employments).selectinload(Employment.text),
+        selectinload(User.applications).selectinload(Application.text),
+        selectinload(User.funding_applications).selectinload(FundingApplication.text),
+    ).get(user_id)
+    
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+
+    user_profile = {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'profile_picture': user.profile_picture,
+        'employments': [
+            {
+                'id': emp.id,
+                'title': emp.title,
+                'description': emp.description,
+                'location': emp.location,
+                'salary_range': to_json(emp.salary_minor, emp.salary_currency),
+                'salary_currency': emp.salary_currency,
+            } for emp in user.employments
+        ] or "N/A",
+        'applications': [
+            {
+                'id': app.id,
+                'employment_id': app.employment_id,
+                'status': app.status.value,
+                'name': app.name,
+                'phone_number': app.phone_number,
+                'email': app.email,
+                'cover_letter': app.cover_letter,
+                'resume': app.resume,
+                'linkedin': app.linkedin,
+                'portfolio': app.portfolio,
+            } for app in user.applications
+        ] or "N/A",
+        'social_integrations': [
+            {
+                'id': si.id,
+                'association_name': si.association_name,
+                'description': si.description,
+            } for si in user.social_integrations
+        ] or "N/A",
+        'funding_applications': [
+            {
+                'id': fa.id,
+                'funding_id': fa.funding_id,
+                'status': fa.status.value,
+                'application_type': fa.application_type.value,
+                'supporting_documents': fa.supporting_documents,
+                'household_income': fa.household_income,
+                'number_of_dependents': fa.number_of_dependents,
+                'reason_for_aid': fa.reason_for_aid,
+                'concept_note': fa.concept_note,
+                'business_profile': fa.business_profile,
+            } for fa in user.funding_applications
+        ] or "N/A",
+        'donations': [
+            {
+                'donation_id': don.donation_id,
+                'donation_type': don.donation_type.value,
+                'name': don.name,
+                'organisation_name': don.organisation_name,
+                'amount': to_json(don.amount_minor, don.currency),
+                'currency': don.currency,
+                'payment_method': don.payment_method.value,
+                'donation_date': don.donation_date.strftime('%Y-%m-%d %H:%M:%S'),
+            } for don in user.donations
+        ] or "N/A"
+    }
+
+    return jsonify(user_profile)
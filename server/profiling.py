@@ -0,0 +1,322 @@
+"""Opt-in sampling profiler and request tracing.
+
+    POST /admin/profiler          {"seconds": 30, "interval": 0.01}   -> sample every thread's stack
+    GET /admin/profiler                                               -> folded stacks so far
+    DELETE /admin/profiler                                            -> stop and discard them
+
+The profiler is a daemon thread that wakes every interval seconds, reads
+the stack of every other thread from sys._current_frames() and counts it.
+Nothing is sampled until an admin starts it, and it stops by itself after
+the given seconds. GET answers in the folded format of flamegraph.pl and
+speedscope, one "thread;outermost;...;innermost count" line per stack:
+
+    curl -b session /admin/profiler > stacks.folded && flamegraph.pl stacks.folded > flame.svg
+
+Single requests are profiled by admins with the X-Profile: 1 header:
+every call the request's thread makes is timed (see CallProfile), and the
+folded stacks, weighted in microseconds, are kept under the request's
+X-Request-Id for GET /admin/profiler/requests/<request_id>. The last
+MAX_REQUEST_PROFILES are kept.
+
+A profiled request is also traced (see tracing.py). So is a request an
+admin sends with X-Trace: 1, and a TRACE_SAMPLE share of all requests.
+Traces go to TRACE_EXPORT: a file of JSON lines, or an http(s) collector.
+Neither header does anything for other callers.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from flask import current_app, g, request, Response
+from flask.json.provider import DefaultJSONProvider
+from flask_login import current_user
+from flask_restful import Resource
+from models import db
+from auth import admin_required
+from tracing import span, start_trace, end_trace, trace_queries, exporter_for
+
+PROFILE_HEADER = 'X-Profile'
+TRACE_HEADER = 'X-Trace'
+MAX_SECONDS = 600
+MIN_INTERVAL = 0.001
+MAX_REQUEST_PROFILES = 100
+
+
+class Sampler:
+    """Counts the stacks of every other thread, or of one, every interval seconds."""
+
+    def __init__(self, interval, thread_id=None, seconds=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = datetime.utcnow()
+        self._labels = {}  # code object -> frame label, so a sample does not format strings
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+        return label
+
+    def _sample(self, thread_id, frame, names):
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.append(names.get(thread_id, str(thread_id)))
+        stack.reverse()
+        self.stacks[';'.join(stack)] += 1
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                return
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is not None:
+                    self._sample(self.thread_id, frame, names)
+            else:
+                for thread_id, frame in frames.items():
+                    if thread_id != own:
+                        self._sample(thread_id, frame, names)
+            self.samples += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class CallProfile:
+    """Folded stacks of the calling thread, weighted by microseconds spent in each.
+
+    Follows every call and return through sys.setprofile, which only hooks
+    the thread that sets it. A sampler would catch a request of a few
+    milliseconds a handful of times at best; this sees all of it, at
+    several times its normal cost.
+    """
+
+    def __init__(self):
+        self.stacks = Counter()
+        self._paths = []
+        self._labels = {}
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+        sys.setprofile(self._event)
+
+    def stop(self):
+        sys.setprofile(None)
+
+    def _label(self, event, frame, arg):
+        key = frame.f_code if event == 'call' else arg
+        label = self._labels.get(key)
+        if label is None:
+            if event == 'call':
+                label = f'{key.co_name} ({os.path.basename(key.co_filename)}:{key.co_firstlineno})'
+            else:
+                label = getattr(key, '__qualname__', None) or getattr(key, '__name__', repr(key))
+            self._labels[key] = label
+        return label
+
+    def _event(self, frame, event, arg):
+        now = time.perf_counter()
+        if self._paths:
+            self.stacks[self._paths[-1]] += now - self._last
+        if event == 'call' or event == 'c_call':
+            parent = self._paths[-1] if self._paths else 'request'
+            self._paths.append(f'{parent};{self._label(event, frame, arg)}')
+        elif self._paths:
+            # Returns from the frames the profile started in have nothing to pop
+            self._paths.pop()
+        self._last = time.perf_counter()
+
+    def folded(self):
+        weights = ((stack, round(seconds * 1e6)) for stack, seconds in self.stacks.most_common())
+        return ''.join(f'{stack} {weight}\n' for stack, weight in weights if weight)
+
+
+class Profiler:
+    """The process-wide sampler and the folded stacks of recently profiled requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sampler = None
+        self.requests = OrderedDict()  # request id -> folded stacks
+
+    def start(self, interval, seconds):
+        with self._lock:
+            if self.sampler is not None and self.sampler.running:
+                return None
+            self.sampler = Sampler(interval, seconds=seconds)
+            self.sampler.start()
+            return self.sampler
+
+    def stop(self):
+        with self._lock:
+            sampler, self.sampler = self.sampler, None
+        if sampler is not None:
+            sampler.stop()
+        return sampler
+
+    def keep_request(self, request_id, call_profile):
+        with self._lock:
+            self.requests[request_id] = call_profile.folded()
+            while len(self.requests) > MAX_REQUEST_PROFILES:
+                self.requests.popitem(last=False)
+
+
+profiler = Profiler()
+
+
+def _folded_response(folded, **headers):
+    response = Response(folded, mimetype='text/plain')
+    response.headers.update(headers)
+    return response
+
+class ProfilerResource(Resource):
+    method_decorators = [admin_required]
+
+    def get(self):
+        sampler = profiler.sampler
+        if sampler is None:
+            return {'message': 'The profiler is not running'}, 404
+        return _folded_response(sampler.folded(), **{'X-Profile-Samples': str(sampler.samples)})
+
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        try:
+            seconds = float(data.get('seconds', 30))
+            interval = float(data.get('interval', 0.01))
+        except (TypeError, ValueError):
+            return {'message': 'seconds and interval must be numbers'}, 400
+        if not 0 < seconds <= MAX_SECONDS or interval < MIN_INTERVAL:
+            return {'message': f'seconds must be up to {MAX_SECONDS} and interval at least {MIN_INTERVAL}'}, 400
+        sampler = profiler.start(interval, seconds)
+        if sampler is None:
+            return {'message': 'The profiler is already running'}, 409
+        return {'message': 'Profiler started', 'interval': interval, 'seconds': seconds,
+                'started_at': sampler.started_at.isoformat()}, 202
+
+    def delete(self):
+        sampler = profiler.stop()
+        if sampler is None:
+            return {'message': 'The profiler is not running'}, 404
+        return {'message': 'Profiler stopped', 'samples': sampler.samples}, 200
+
+class RequestProfileResource(Resource):
+    method_decorators = [admin_required]
+
+    def get(self, request_id):
+        folded = profiler.requests.get(request_id)
+        if folded is None:
+            return {'message': 'No profile for this request'}, 404
+        return _folded_response(folded, **{'X-Profile-Unit': 'microseconds'})
+
+
+class TracingJSONProvider(DefaultJSONProvider):
+    """jsonify() with its serialization as a span of the request's trace."""
+
+    def response(self, *args, **kwargs):
+        with span('serialize'):
+            return super().response(*args, **kwargs)
+
+
+def _is_admin():
+    return current_user.is_authenticated and int(current_user.id) in current_app.config.get('ADMIN_USER_IDS', ())
+
+def init_profiling(app):
+    app.config.setdefault('PROFILING_ENABLED', True)
+    app.config.setdefault('TRACE_SAMPLE', 0.0)
+    app.config.setdefault('TRACE_EXPORT', os.path.join(app.instance_path, 'traces.jsonl'))
+    if not app.config['PROFILING_ENABLED']:
+        return None
+
+    exporter = exporter_for(app.config['TRACE_EXPORT'])
+    app.extensions['trace_exporter'] = exporter
+    app.json = TracingJSONProvider(app)
+    with app.app_context():
+        trace_queries(db.engine)
+    rate = app.config['TRACE_SAMPLE']
+
+    @app.before_request
+    def start_tracing():
+        headers = request.headers
+        requested = headers.get(PROFILE_HEADER) == '1' or headers.get(TRACE_HEADER) == '1'
+        sampled = rate and random.random() < rate
+        if not requested and not sampled:
+            return
+        start_trace()  # first, so loading the user below is a span of it
+        if requested and _is_admin():
+            if headers.get(PROFILE_HEADER) == '1':
+                g.call_profile = CallProfile()
+                g.call_profile.start()
+        elif not sampled:
+            end_trace()
+            return
+        exporter.start()
+
+    @app.after_request
+    def finish_tracing(response):
+        call_profile = g.pop('call_profile', None)
+        if call_profile is not None:
+            call_profile.stop()
+            profiler.keep_request(g.get('request_id'), call_profile)
+            response.headers['X-Profile-Id'] = g.get('request_id')
+        trace = end_trace()
+        if trace is not None:
+            exporter.submit({
+                'trace_id': g.get('request_id'),
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'started_at': datetime.utcnow().isoformat(),
+                'duration_ms': round((time.perf_counter() - trace.started) * 1000, 3),
+                'spans': trace.spans,
+            })
+        return response
+
+    @app.teardown_request
+    def drop_trace(exception):
+        # after_request is skipped when the view raises
+        call_profile = g.pop('call_profile', None)
+        if call_profile is not None:
+            call_profile.stop()
+        end_trace()
+
+    return exporter
+
+def initialize_profiling_routes(api):
+    api.add_resource(ProfilerResource, '/admin/profiler')
+    api.add_resource(RequestProfileResource, '/admin/profiler/requests/<string:request_id>')
+    # Flask-RESTful resources serialize through the Api, not app.json
+    output = api.representations['application/json']
+
+    def traced_output(data, code, headers=None):
+        with span('serialize'):
+            return output(data, code, headers)
+    api.representations['application/json'] = traced_output
@@ -0,0 +1,244 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, g, jsonify
+from tokens import caller_identity
+
+# Relative price of each endpoint in bucket tokens. Endpoints that dump a
+# whole table cost more than single-row lookups; anything unlisted costs 1.
+ROUTE_COSTS = {
+    'users.get_users': 10,
+    'categories.get_categories': 10,
+    'employments.get_employments': 10,
+    'social_integrations.get_social_integrations': 10,
+    'applications.get_all_applications': 10,
+    'fundings.get_fundings': 10,
+    'fundings.get_funding_applications': 10,
+    'donations.get_donations': 10,
+    'profiles.get_user_profile': 5,
+    'donationtotalsresource': 10,
+    'fundingtotalsresource': 10,
+    'salarystatsresource': 10,
+    'nearbyemploymentsresource': 5,
+    'archivedemploymentsresource': 5,
+    'archivedapplicationsresource': 5,
+    'archivedfundingapplicationsresource': 5,
+    'backupsresource': 5,
+    'batchresource': 5,
+    'loginresource': 5,
+    'signupresource': 5,
+    'tokenresource': 5,
+}
+
+# Long-lived endpoints that mostly sleep; they must not hold a worker slot.
+SHED_EXEMPT = {'changesresource', 'changestreamresource'}
+
+
+def _take(tokens, updated, now, cost, rate, capacity):
+    """Refill a bucket and try to spend cost; returns (allowed, tokens, retry_after)."""
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process, bounded to max_keys entries."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            allowed, tokens, retry_after = _take(tokens, updated, now, cost, rate, capacity)
+            self._buckets[key] = (tokens, now)
+            # Least recently used keys go first; a forgotten key simply
+            # starts again with a full bucket.
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+
+class SQLiteBucketStore:
+    """Token buckets shared by every worker on the host through one SQLite file.
+
+    Any object with the same take() signature can be plugged in instead,
+    e.g. one backed by a network store when workers span several hosts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, cost, rate, capacity):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            allowed, tokens, retry_after = _take(tokens, updated, now, cost, rate, capacity)
+            connection.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, tokens, retry_after
+
+
+class LoadShedder:
+    """Bounded worker slots with CoDel-style shedding on queue time.
+
+    Queue time is the time spent upstream (X-Request-Start, set by the proxy)
+    plus the time spent here waiting for a slot. While queue time has stayed
+    above target for a whole interval the process is overloaded, and requests
+    that queued longer than target are turned away with 503 instead of adding
+    to everyone's latency. Nothing waits longer than max_wait.
+    """
+
+    def __init__(self, max_concurrency=16, target=0.05, interval=0.5, max_wait=1.0):
+        self.target = target
+        self.interval = interval
+        self.max_wait = max_wait
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._above_since = None
+
+    def _overloaded(self, delay, now):
+        with self._lock:
+            if delay < self.target:
+                self._above_since = None
+                return False
+            if self._above_since is None:
+                self._above_since = now
+            return now - self._above_since >= self.interval
+
+    def admit(self, upstream_delay=0.0):
+        """Return True once a slot is held; the caller must release() it."""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=max(self.max_wait - upstream_delay, 0)):
+            return False
+        now = time.monotonic()
+        delay = upstream_delay + (now - start)
+        if self._overloaded(delay, now) and delay > self.target:
+            self._slots.release()
+            return False
+        return True
+
+    def release(self):
+        self._slots.release()
+
+
+def _upstream_delay():
+    # Accepts the nginx/Heroku style "t=<seconds|ms|us since epoch>"
+    value = request.headers.get('X-Request-Start', '').lstrip('t=')
+    try:
+        started = float(value)
+    except ValueError:
+        return 0.0
+    while started > 1e11:
+        started /= 1000.0
+    return max(time.time() - started, 0.0)
+
+def _too_many(retry_after):
+    response = jsonify({'message': 'Too many requests, slow down!'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+def _overloaded_response(retry_after):
+    response = jsonify({'message': 'Server is busy, retry shortly!'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_rate_limiting(app):
+    app.config.setdefault('RATELIMIT_ENABLED', True)
+    app.config.setdefault('RATELIMIT_RATE', 10.0)  # tokens per second
+    app.config.setdefault('RATELIMIT_BURST', 50)
+    app.config.setdefault('RATELIMIT_STORE', None)  # None, a sqlite file path or a store object
+    app.config.setdefault('RATELIMIT_ROUTE_COSTS', {})
+    app.config.setdefault('SHED_MAX_CONCURRENCY', 16)
+    app.config.setdefault('SHED_TARGET_QUEUE_TIME', 0.05)
+    app.config.setdefault('SHED_INTERVAL', 0.5)
+    app.config.setdefault('SHED_MAX_QUEUE_TIME', 1.0)
+    app.config.setdefault('SHED_RETRY_AFTER', 1)
+    app.config.setdefault('WORKER_POOLS', {})  # blueprint or endpoint name -> slots of its own
+
+    if not app.config['RATELIMIT_ENABLED']:
+        return
+
+    store = app.config['RATELIMIT_STORE']
+    if store is None:
+        store = MemoryBucketStore()
+    elif isinstance(store, str):
+        store = SQLiteBucketStore(store)
+    costs = dict(ROUTE_COSTS, **app.config['RATELIMIT_ROUTE_COSTS'])
+    rate = app.config['RATELIMIT_RATE']
+    burst = app.config['RATELIMIT_BURST']
+
+    def make_shedder(max_concurrency):
+        return LoadShedder(
+            max_concurrency=max_concurrency,
+            target=app.config['SHED_TARGET_QUEUE_TIME'],
+            interval=app.config['SHED_INTERVAL'],
+            max_wait=app.config['SHED_MAX_QUEUE_TIME'],
+        )
+
+    shedder = make_shedder(app.config['SHED_MAX_CONCURRENCY'])
+    # Bulkheads: routes in a pool queue for, and are shed from, their own
+    # slots, so a slow report cannot take the slots login needs.
+    pools = {name: make_shedder(slots) for name, slots in app.config['WORKER_POOLS'].items()}
+    app.extensions['rate_limiter'] = store
+    app.extensions['load_shedder'] = shedder
+    app.extensions['worker_pools'] = pools
+
+    @app.before_request
+    def limit_request():
+        if request.method == 'OPTIONS' or request.endpoint is None:
+            return None
+
+        cost = costs.get(request.endpoint, 1)
+        allowed, remaining, retry_after = store.take(caller_identity(), cost, rate, burst)
+        if not allowed:
+            return _too_many(retry_after)
+        g.ratelimit_remaining = int(remaining)
+
+        if request.endpoint in SHED_EXEMPT:
+            return None
+        pool = pools.get(request.endpoint) or pools.get(request.blueprint) or shedder
+        if not pool.admit(_upstream_delay()):
+            return _overloaded_response(app.config['SHED_RETRY_AFTER'])
+        g.worker_pool = pool
+        return None
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        if 'ratelimit_remaining' in g:
+            response.headers['X-RateLimit-Limit'] = str(burst)
+            response.headers['X-RateLimit-Remaining'] = str(g.ratelimit_remaining)
+        return response
+
+    @app.teardown_request
+    def release_worker_slot(exc):
+        pool = g.pop('worker_pool', None)
+        if pool is not None:
+            pool.release()
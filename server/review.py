@@ -0,0 +1,217 @@
+"""Work queue for the reviewers of funding applications.
+
+    POST /review/next                  -> 200 the next application and its lease, 204 when none is open
+    POST /review/<id>/lease            -> renew a lease you hold
+    DELETE /review/<id>/lease          -> give the application back to the queue
+    POST /review/transitions           -> {"ids": [3, 4], "status": "Approved", "note": "..."}
+    GET /review/<id>/events            -> its audit trail
+
+Leasing is one conditional UPDATE: the subquery picks the first open
+application (Applied or In Review) whose lease is free or ran out, walking
+a partial index in queue order, and the write lock SQLite holds for the
+statement guarantees no two reviewers get the same row. Leases last
+REVIEW_LEASE_SECONDS unless renewed; an expired one simply comes up again.
+Leasing does not touch the row version, so applicants' If-Match updates
+are not disturbed.
+
+Status transitions take a batch of ids and run one UPDATE per status they
+may come from, skipping rows leased by someone else. Every lease, release
+and transition is written to review_event in the same transaction.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+from flask_login import current_user
+from flask_restful import Resource
+from sqlalchemy import select, update, insert, or_, text, bindparam, DateTime
+from sqlalchemy.orm import selectinload
+from models import db, FundingApplication, ApplicationStatus, ReviewEvent, REVIEW_QUEUE
+from auth import reviewer_required
+from changes import record_update
+from fundings import serialize_funding_application
+from validation import Schema, List, Integer, Enum, String, TEXT_LENGTH, ValidationError
+
+DEFAULT_LEASE_SECONDS = 15 * 60
+MAX_IDS = 500
+
+# Status -> statuses a reviewer may move it to
+TRANSITIONS = {
+    ApplicationStatus.APPLIED: (ApplicationStatus.IN_REVIEW, ApplicationStatus.APPROVED, ApplicationStatus.DENIED),
+    ApplicationStatus.IN_REVIEW: (ApplicationStatus.APPLIED, ApplicationStatus.APPROVED, ApplicationStatus.DENIED),
+}
+
+_table = FundingApplication.__table__
+
+
+# Without statistics SQLite prefers the deleted_at index and sorts every
+# open application; INDEXED BY keeps it on the queue index, where the
+# first free row is the answer. Core has no way to spell INDEXED BY.
+_NEXT = text(
+    f'SELECT id FROM funding_application INDEXED BY ix_funding_application_review_queue '
+    f'WHERE {REVIEW_QUEUE} AND (lease_expires_at IS NULL OR lease_expires_at < :now) '
+    f'ORDER BY lease_expires_at, id LIMIT 1'
+).bindparams(bindparam('now', type_=DateTime)).columns(_table.c.id)
+
+# Reviewers in one process queue here for the SQLite write lock in turn,
+# instead of all polling it from the busy handler
+_write_lock = threading.Lock()
+
+
+def _lease_free(now):
+    return or_(_table.c.lease_expires_at.is_(None), _table.c.lease_expires_at < now)
+
+def _events(rows):
+    if rows:
+        db.session.execute(insert(ReviewEvent.__table__), [dict(row, created_at=datetime.utcnow()) for row in rows])
+
+def lease_next(reviewer_id):
+    """Lease the next open application to reviewer_id; returns (id, status, expiry) or None."""
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=current_app.config['REVIEW_LEASE_SECONDS'])
+    with _write_lock:
+        leased = db.session.execute(
+            update(_table).where(_table.c.id == _NEXT.scalar_subquery(), _lease_free(now))
+            .values(reviewer_id=reviewer_id, lease_expires_at=expires)
+            .returning(_table.c.id, _table.c.status),
+            {'now': now},
+        ).first()
+        if leased is None:
+            db.session.rollback()
+            return None
+        _events([{'funding_application_id': leased.id, 'reviewer_id': reviewer_id, 'action': 'lease',
+                  'from_status': leased.status, 'to_status': leased.status}])
+        db.session.commit()
+    return leased.id, leased.status, expires
+
+def renew_lease(application_id, reviewer_id):
+    """Extend a lease reviewer_id still holds; returns the new expiry or None."""
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=current_app.config['REVIEW_LEASE_SECONDS'])
+    with _write_lock:
+        renewed = db.session.execute(
+            update(_table).where(_table.c.id == application_id, _table.c.reviewer_id == reviewer_id,
+                                 _table.c.lease_expires_at >= now)
+            .values(lease_expires_at=expires)
+        ).rowcount
+        db.session.commit()
+    return expires if renewed else None
+
+def release_lease(application_id, reviewer_id):
+    with _write_lock:
+        released = db.session.execute(
+            update(_table).where(_table.c.id == application_id, _table.c.reviewer_id == reviewer_id,
+                                 _table.c.lease_expires_at >= datetime.utcnow())
+            .values(reviewer_id=None, lease_expires_at=None)
+            .returning(_table.c.status)
+        ).first()
+        if released is not None:
+            _events([{'funding_application_id': application_id, 'reviewer_id': reviewer_id, 'action': 'release',
+                      'from_status': released.status, 'to_status': released.status}])
+        db.session.commit()
+    return released is not None
+
+def transition(ids, status, reviewer_id, note=None):
+    """Move the applications in ids to status; returns the ids that moved.
+
+    Rows already in status, leased by another reviewer, deleted, or in a
+    status that cannot move to status are left alone.
+    """
+    now = datetime.utcnow()
+    # The lease stays with the reviewer while the application is in review
+    lease = {} if status == ApplicationStatus.IN_REVIEW else {'reviewer_id': None, 'lease_expires_at': None}
+    moved = []
+    events = []
+    with _write_lock:
+        for source, targets in TRANSITIONS.items():
+            if status not in targets:
+                continue
+            rows = db.session.execute(
+                update(_table).where(
+                    _table.c.id.in_(ids),
+                    _table.c.status == source,
+                    _table.c.deleted_at.is_(None),
+                    or_(_table.c.reviewer_id == reviewer_id, _lease_free(now)),
+                )
+                .values(status=status, version=_table.c.version + 1, **lease)
+                .returning(_table.c.id)
+            ).scalars().all()
+            for application_id in rows:
+                record_update(db.session, FundingApplication, application_id, {'status': status})
+                events.append({'funding_application_id': application_id, 'reviewer_id': reviewer_id,
+                               'action': 'transition', 'from_status': source, 'to_status': status, 'note': note})
+            moved.extend(rows)
+        _events(events)
+        db.session.commit()
+    return sorted(moved)
+
+
+def _lease_body(application_id, expires):
+    application = FundingApplication.query.options(selectinload(FundingApplication.text)).get(application_id)
+    return {'funding_application': serialize_funding_application(application), 'lease_expires_at': expires.isoformat()}
+
+class ReviewNextResource(Resource):
+    @reviewer_required
+    def post(self):
+        leased = lease_next(int(current_user.id))
+        if leased is None:
+            return '', 204
+        application_id, _, expires = leased
+        return _lease_body(application_id, expires), 200
+
+class ReviewLeaseResource(Resource):
+    @reviewer_required
+    def post(self, id):
+        expires = renew_lease(id, int(current_user.id))
+        if expires is None:
+            return {'message': 'You do not hold a lease on this application'}, 409
+        return {'id': id, 'lease_expires_at': expires.isoformat()}, 200
+
+    @reviewer_required
+    def delete(self, id):
+        if not release_lease(id, int(current_user.id)):
+            return {'message': 'You do not hold a lease on this application'}, 409
+        return {'message': 'Lease released'}, 200
+
+TRANSITION = Schema(
+    ids=List(Integer(min=1), required=True, min_items=1, max_items=MAX_IDS),
+    status=Enum(ApplicationStatus, required=True),
+    note=String(max_length=TEXT_LENGTH),
+)
+
+class ReviewTransitionsResource(Resource):
+    @reviewer_required
+    def post(self):
+        try:
+            data = TRANSITION.validate(request.get_json(silent=True))
+        except ValidationError as e:
+            return {'message': str(e), 'errors': e.errors}, 400
+
+        ids, status = data['ids'], data['status']
+        moved = transition(ids, status, int(current_user.id), data.get('note'))
+        return {'status': status.value, 'moved': moved, 'skipped': sorted(set(ids) - set(moved))}, 200
+
+class ReviewEventsResource(Resource):
+    @reviewer_required
+    def get(self, id):
+        events = db.session.execute(
+            select(ReviewEvent).where(ReviewEvent.funding_application_id == id).order_by(ReviewEvent.id)
+        ).scalars()
+        return {'events': [{
+            'reviewer_id': event.reviewer_id,
+            'action': event.action,
+            'from_status': event.from_status.value if event.from_status else None,
+            'to_status': event.to_status.value if event.to_status else None,
+            'note': event.note,
+            'created_at': event.created_at.isoformat(),
+        } for event in events]}, 200
+
+
+def init_review(app):
+    app.config.setdefault('REVIEW_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+
+def initialize_review_routes(api):
+    api.add_resource(ReviewNextResource, '/review/next')
+    api.add_resource(ReviewLeaseResource, '/review/<int:id>/lease')
+    api.add_resource(ReviewTransitionsResource, '/review/transitions')
+    api.add_resource(ReviewEventsResource, '/review/<int:id>/events')
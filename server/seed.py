@@ -1,8 +1,8 @@
 from faker import Faker
-from models import db, User, Employment, Category, Application, SocialIntegration, Funding, FundingApplication, ApplicationStatus, ApplicationType, GrantType, Donation, DonationType, PaymentMethod
+from models import db, User, Employment, Category, Application, SocialIntegration, Funding, FundingApplication, ApplicationStatus, ApplicationType, GrantType, Donation, DonationType, PaymentMethod, PaymentStatus
 from app import create_app
+from geo import place_names
 import random
-import requests
 
 # Initialize Faker
 fake = Faker()
@@ -15,6 +15,7 @@ app.app_context().push()
 db.create_all()
 
 def fetch_profile_picture():
+    import requests  # slow to import; only needed here
     try:
         response = requests.get("https://randomuser.me/api/")
         if response.status_code == 200:
@@ -118,8 +119,9 @@ def seed_employments(users, categories, n=100):
             title=fake.job(),
             description=fake.text(),
             requirements=fake.text(),
-            location=fake.city(),
-            salary_range=random.randint(30000, 120000)
+            location=random.choice(place_names()),  # geocodable, unlike fake.city()
+            salary_minor=random.randint(30000, 120000) * 100,  # KES cents
+            salary_currency='KES'
         )
         employments.append(employment)
     db.session.add_all(employments)
@@ -215,7 +217,8 @@ def seed_fundings(categories):
         funding = Funding(
         category_id=random.choice(categories).id,
         grant_name=grant_names[i],
-        amount=random.randint(5000, 100000),  # Random grant amount
+        amount_minor=random.randint(5000, 100000) * 100,  # Random grant amount, in cents
+        currency='KES',
         description=descriptions[i],
         eligibility_criteria=eligibility_criteria[i],
         grant_type=random.choice([GrantType.SOCIAL_AID, GrantType.BUSINESS])  # Randomly assign a grant type
@@ -263,9 +266,11 @@ def seed_donations(users, n=100):
             donation_type=random.choice(list(DonationType)),
             name=fake.name(),
             organisation_name=fake.company(),
-            amount=random.randint(10, 5000),
+            amount_minor=random.randint(1000, 500000),  # 10.00 to 5000.00 KES
+            currency='KES',
             payment_method=random.choice(list(PaymentMethod)),
-            donation_date=fake.date_this_year()
+            donation_date=fake.date_this_year(),
+            payment_status=PaymentStatus.SETTLED  # history, nothing left to charge
         )
         donations.append(donation)
     db.session.add_all(donations)
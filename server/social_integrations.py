@@ -0,0 +1,92 @@
+"""Community associations users join or save."""
+from flask import Blueprint, request, jsonify
+from models import db, SocialIntegration
+from filters import FilterError, filter_ids
+from batch import register_loader
+from idempotency import idempotent
+from validation import Schema, String, Integer, validated
+
+bp = Blueprint('social_integrations', __name__)
+
+def serialize_social_integration(social_integration):
+    return {
+        'id': social_integration.id,
+        'user_id': social_integration.user_id,
+        'category_id': social_integration.category_id,
+        'association_name': social_integration.association_name,
+        'description': social_integration.description
+    }
+
+SOCIAL_INTEGRATION = Schema(
+    user_id=Integer(required=True, min=1),
+    category_id=Integer(required=True, min=1),
+    association_name=String(required=True, min_length=1),
+    description=String(required=True),
+)
+SOCIAL_INTEGRATION_UPDATE = SOCIAL_INTEGRATION.partial()
+
+# Create a Social Integration
+@bp.route('/social_integrations', methods=['POST'])
+@validated(SOCIAL_INTEGRATION)
+@idempotent
+def create_social_integration(data):
+    new_social_integration = SocialIntegration(
+        user_id=data['user_id'],
+        category_id=data['category_id'],
+        association_name=data['association_name'],
+        description=data['description']
+    )
+    db.session.add(new_social_integration)
+    db.session.commit()
+    return jsonify({'message': 'Social Integration created successfully!', 'id': new_social_integration.id}), 201
+
+# Get All Social Integrations
+@bp.route('/social_integrations', methods=['GET'])
+def get_social_integrations():
+    try:
+        social_integrations = filter_ids(SocialIntegration.query, SocialIntegration, request.args).all()
+    except FilterError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify([serialize_social_integration(social_integration) for social_integration in social_integrations]), 200
+
+# Get a Single Social Integration by ID
+@bp.route('/social_integrations/<int:id>', methods=['GET'])
+def get_social_integration(id):
+    social_integration = SocialIntegration.query.get(id)
+    if social_integration:
+        return jsonify(serialize_social_integration(social_integration)), 200
+    return jsonify({'message': 'Social Integration not found!'}), 404
+
+register_loader('social_integrations.get_social_integration', SocialIntegration, serialize_social_integration,
+                'Social Integration not found!')
+
+# Update a Social Integration
+@bp.route('/social_integrations/<int:id>', methods=['PUT'])
+@validated(SOCIAL_INTEGRATION_UPDATE)
+def update_social_integration(id, data):
+    social_integration = SocialIntegration.query.get(id)
+    if not social_integration:
+        return jsonify({'message': 'Social Integration not found!'}), 404
+
+    if 'user_id' in data:
+        social_integration.user_id = data['user_id']
+    if 'category_id' in data:
+        social_integration.category_id = data['category_id']
+    if 'association_name' in data:
+        social_integration.association_name = data['association_name']
+    if 'description' in data:
+        social_integration.description = data['description']
+
+    db.session.commit()
+    return jsonify({'message': 'Social Integration updated successfully!'}), 200
+
+
+# Delete a Social Integration
+@bp.route('/social_integrations/<int:id>', methods=['DELETE'])
+def delete_social_integration(id):
+    social_integration = SocialIntegration.query.get(id)
+    if social_integration:
+        db.session.delete(social_integration)
+        db.session.commit()
+        return jsonify({'message': 'Social Integration deleted successfully!'}), 200
+    return jsonify({'message': 'Social Integration not found!'}), 404
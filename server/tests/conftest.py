@@ -0,0 +1,138 @@
+"""Fixtures shared by the request-level tests.
+
+Every test gets an app of its own on a fresh SQLite file, built the way
+wsgi.py builds it but without start_workers(): background work is driven
+by the tests themselves. make_app(**env) builds one with other settings.
+"""
+import pytest
+from werkzeug.security import generate_password_hash
+
+import models
+from facets import facet_index
+from leaderboards import leaderboards
+from models import (db, User, Category, Application, Funding, FundingApplication, GrantType,
+                    ApplicationStatus, ApplicationType)
+
+# Settings every test app starts from; a test overrides them through make_app
+ENVIRONMENT = {
+    'SECRET_KEY': 'test-secret',
+    'RATELIMIT_ENABLED': '0',
+    'PAYMENT_MOCK_ENABLED': '1',
+    'PAYMENT_WORKERS': '0',
+    'LOG_ACCESS': '0',
+    'LOG_SAMPLE': '',
+}
+
+
+def _forget_process_state():
+    # These live for the whole process in production, so they would carry
+    # one test's rows into the next
+    models._location_ids.clear()
+    models._location_names.clear()
+    for index in (facet_index, leaderboards):
+        with index._lock:
+            index._reset()
+            index.loaded = False
+            index.last_seq = 0
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    def make_app(**env):
+        from app import create_app
+        settings = dict(ENVIRONMENT,
+                        DATABASE_URL=f"sqlite:///{tmp_path / 'test.db'}",
+                        ARCHIVE_DATABASE=str(tmp_path / 'archive.db'),
+                        BACKUP_DIR=str(tmp_path / 'backups'),
+                        EXPORT_DIR=str(tmp_path / 'exports'))
+        settings.update(env)
+        for name, value in settings.items():
+            if value is None:
+                monkeypatch.delenv(name, raising=False)
+            else:
+                monkeypatch.setenv(name, value)
+        _forget_process_state()
+        app = create_app()
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+        return app
+    yield make_app
+    _forget_process_state()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, user_id):
+    """Log the test client in as user_id, as a session cookie would."""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['user_id'] = user_id
+
+
+def add_user(email='jane@example.com', password='secret', username=None):
+    user = User(username=username or email.split('@')[0], email=email,
+                password=generate_password_hash(password), first_name='Jane', last_name='Doe')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def add_category(user_id, name='Farming'):
+    category = Category(name=name, description=f'{name} jobs', user_id=user_id)
+    db.session.add(category)
+    db.session.commit()
+    return category.id
+
+
+def add_application(user_id, employment_id, name='Jane Doe'):
+    application = Application(user_id=user_id, employment_id=employment_id, name=name, phone_number='0700000000',
+                              email='jane@example.com', cover_letter='I can drive', resume='cv.pdf')
+    db.session.add(application)
+    db.session.commit()
+    return application.id
+
+
+def add_funding(category_id, amount_minor=100000):
+    funding = Funding(category_id=category_id, grant_name='Seed', grant_type=GrantType.BUSINESS,
+                      amount_minor=amount_minor, currency='KES')
+    db.session.add(funding)
+    db.session.commit()
+    return funding.id
+
+
+def add_funding_application(user_id, funding_id, status=ApplicationStatus.APPLIED):
+    funding_application = FundingApplication(user_id=user_id, funding_id=funding_id, status=status,
+                                             application_type=ApplicationType.BUSINESS, reason_for_aid='A harvest')
+    db.session.add(funding_application)
+    db.session.commit()
+    return funding_application.id
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        return add_user()
+
+
+@pytest.fixture
+def category_id(app, user_id):
+    with app.app_context():
+        return add_category(user_id)
+
+
+def employment(user_id, category_id, **fields):
+    """Body of a POST /employments."""
+    body = {'user_id': user_id, 'category_id': category_id, 'title': 'Tractor driver',
+            'description': 'Drive the tractor', 'location': 'Nakuru',
+            'salary_range': '25000.50', 'salary_currency': 'KES'}
+    body.update(fields)
+    return body
@@ -0,0 +1,111 @@
+"""Archival of deleted and decided rows to the cold tier."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from archive import run_archival
+from conftest import add_application, add_funding, add_funding_application, employment
+from models import db, ApplicationStatus, ChangeLog, Employment, FundingApplication
+
+LONG_AGO = datetime.utcnow() - timedelta(days=365 * 2)
+
+
+def age(app, model, row_id):
+    with app.app_context():
+        db.session.execute(update(model.__table__).where(model.__table__.c.id == row_id).values(updated_at=LONG_AGO))
+        db.session.commit()
+
+
+def archive(app, **kwargs):
+    with app.app_context():
+        return run_archival(**kwargs)
+
+
+@pytest.fixture
+def posting(client, user_id, category_id):
+    return client.post('/employments', json=employment(user_id, category_id, requirements='A licence')).get_json()['employment_id']
+
+
+def test_deleted_postings_move_with_their_applications(app, client, user_id, posting):
+    with app.app_context():
+        application_id = add_application(user_id, posting)
+    client.delete(f'/employments/{posting}')
+
+    moved = archive(app)
+
+    assert moved == {'employment': 1, 'application': 1, 'funding_application': 0}
+    archived = client.get(f'/archive/employments/{posting}').get_json()
+    assert (archived['title'], archived['location'], archived['requirements']) == ('Tractor driver', 'Nakuru', 'A licence')
+    assert archived['salary_range'] == 25000.5
+    assert [row['id'] for row in client.get(f'/archive/applications?employment_id={posting}').get_json()] == [application_id]
+    assert client.get(f'/applications/{application_id}').status_code == 404
+
+
+def test_live_postings_stay_however_old(app, client, user_id, posting):
+    with app.app_context():
+        add_application(user_id, posting)
+    age(app, Employment, posting)
+
+    moved = archive(app, after_days=0)
+
+    assert moved == {'employment': 0, 'application': 0, 'funding_application': 0}
+    assert client.get(f'/employments/{posting}').status_code == 200
+    assert client.get(f'/archive/employments/{posting}').status_code == 404
+
+
+def test_decided_funding_applications_move_once_cold(app, client, user_id, category_id):
+    with app.app_context():
+        funding_id = add_funding(category_id)
+        cold = add_funding_application(user_id, funding_id, ApplicationStatus.APPROVED)
+        recent = add_funding_application(user_id, funding_id, ApplicationStatus.DENIED)
+        undecided = add_funding_application(user_id, funding_id, ApplicationStatus.IN_REVIEW)
+    age(app, FundingApplication, cold)
+    age(app, FundingApplication, undecided)
+
+    moved = archive(app)
+
+    assert moved['funding_application'] == 1
+    archived = client.get(f'/archive/funding_applications?funding_id={funding_id}').get_json()
+    assert [(row['id'], row['status'], row['reason_for_aid']) for row in archived] == [(cold, 'Approved', 'A harvest')]
+    assert client.get(f'/funding_applications/{recent}').status_code == 200
+    assert client.get(f'/funding_applications/{undecided}').status_code == 200
+
+
+def test_live_rows_leaving_are_published_as_deletes(app, client, user_id, posting):
+    with app.app_context():
+        application_id = add_application(user_id, posting)
+    client.delete(f'/employments/{posting}')
+
+    archive(app)
+
+    with app.app_context():
+        deletes = db.session.execute(
+            select(ChangeLog.table_name, ChangeLog.row_id).where(ChangeLog.operation == 'delete')
+        ).all()
+    # The posting's delete went out when it was flagged; its application only leaves now
+    assert sorted(deletes) == [('application', application_id), ('employment', posting)]
+
+
+def test_runs_are_repeatable(app, client, posting):
+    client.delete(f'/employments/{posting}')
+
+    archive(app, batch_size=1)
+
+    assert archive(app) == {'employment': 0, 'application': 0, 'funding_application': 0}
+    assert len(client.get('/archive/employments').get_json()) == 1
+
+
+def test_cli(app, client, posting):
+    client.delete(f'/employments/{posting}')
+
+    result = app.test_cli_runner().invoke(args=['archive', '--after-days', '30'])
+
+    assert result.exit_code == 0
+    assert result.output.strip() == '1 employment, 0 application, 0 funding_application'
+
+
+def test_archive_reads(client):
+    assert client.get('/archive/employments/1').status_code == 404
+    assert client.get('/archive/employments?limit=all').status_code == 400
+    assert client.get('/archive/applications?employment_id=one').status_code == 400
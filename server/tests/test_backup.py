@@ -0,0 +1,116 @@
+"""Snapshots, WAL shipping and point-in-time restore."""
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+from backup import list_segments, list_snapshots, restore, ship_wal, take_snapshot, verify
+from conftest import add_user, login
+
+
+def users_in(path):
+    connection = sqlite3.connect(path)
+    try:
+        return [row[0] for row in connection.execute('SELECT email FROM user ORDER BY id')]
+    finally:
+        connection.close()
+
+
+def test_snapshot_and_restore(app, tmp_path):
+    with app.app_context():
+        add_user('jane@example.com')
+        manifest = take_snapshot()
+        add_user('john@example.com')  # after the snapshot
+
+        path, snapshot, replayed = restore(str(tmp_path / 'restored'))
+
+    assert snapshot['name'] == manifest['name']
+    assert replayed == []
+    assert users_in(path) == ['jane@example.com']
+
+
+def test_point_in_time_restore_replays_shipped_wal(make_app, tmp_path):
+    app = make_app(BACKUP_WAL_INTERVAL='60')
+    with app.app_context():
+        add_user('jane@example.com')
+        take_snapshot()
+        add_user('john@example.com')
+        ship_wal()
+        time.sleep(0.01)
+        between = datetime.utcnow()
+        time.sleep(0.01)
+        add_user('joan@example.com')
+        ship_wal()
+
+        assert len(list_segments()) >= 2
+        earlier, _, _ = restore(str(tmp_path / 'earlier'), at=between)
+        latest, _, _ = restore(str(tmp_path / 'latest'))
+
+    assert users_in(earlier) == ['jane@example.com', 'john@example.com']
+    assert users_in(latest) == ['jane@example.com', 'john@example.com', 'joan@example.com']
+
+
+def test_damaged_snapshots_are_refused(app, tmp_path):
+    with app.app_context():
+        manifest = take_snapshot()
+        with open(os.path.join(app.config['BACKUP_DIR'], 'snapshots', manifest['file']), 'ab') as f:
+            f.write(b'rot')
+
+        with pytest.raises(ValueError, match='Checksum mismatch'):
+            restore(str(tmp_path / 'restored'))
+
+
+def test_nothing_to_restore_from(app, tmp_path):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            restore(str(tmp_path / 'restored'))
+        take_snapshot()
+        with pytest.raises(ValueError):
+            restore(str(tmp_path / 'restored'), at=datetime(2000, 1, 1))
+
+
+def test_verify(app):
+    with app.app_context():
+        add_user()
+        take_snapshot()
+
+        report = verify()
+
+    assert report['ok']
+    assert report['row_counts']['user'] == 1
+    assert report['foreign_key_violations'] == 0
+
+
+def test_cli(app, tmp_path):
+    runner = app.test_cli_runner()
+
+    assert runner.invoke(args=['backup', 'snapshot']).exit_code == 0
+    assert runner.invoke(args=['backup', 'list']).output.count('\n') == 1
+    result = runner.invoke(args=['backup', 'restore', str(tmp_path / 'restored')])
+    assert result.exit_code == 0
+    assert os.path.exists(tmp_path / 'restored' / 'test.db')
+
+
+def test_admin_endpoint(make_app):
+    app = make_app(ADMIN_USER_IDS='1')
+    with app.app_context():
+        admin, other = add_user('admin@example.com'), add_user('jane@example.com')
+    client = app.test_client()
+
+    assert client.get('/admin/backups').status_code == 401
+    login(client, other)
+    assert client.get('/admin/backups').status_code == 403
+
+    login(client, admin)
+    assert client.post('/admin/backups').status_code == 202
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        state = client.get('/admin/backups').get_json()
+        if state['snapshots'] and not state['running']:
+            break
+        time.sleep(0.05)
+    assert len(state['snapshots']) == 1
+    with app.app_context():
+        assert len(list_snapshots()) == 1
@@ -0,0 +1,94 @@
+"""Many single row lookups in one POST /batch."""
+import pytest
+from sqlalchemy import event
+
+from batch import MAX_REQUESTS
+from conftest import add_category, employment, login
+from models import db
+
+
+def batch(client, *paths):
+    response = client.post('/batch', json={'requests': list(paths)})
+    assert response.status_code == 200
+    return [(entry['path'], entry['status'], entry['body']) for entry in response.get_json()['responses']]
+
+
+def test_bodies_match_the_single_row_endpoints(client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+
+    (_, status, body), = batch(client, f'/employments/{employment_id}')
+
+    assert status == 200
+    assert body == client.get(f'/employments/{employment_id}').get_json()
+
+
+def test_answers_come_in_request_order_with_duplicates(client, app, user_id, category_id):
+    with app.app_context():
+        other = add_category(user_id, 'Nursing')
+
+    answers = batch(client, f'/categories/{other}', '/categories/999', f'/categories/{category_id}', f'/categories/{other}')
+
+    assert [(status, body.get('name')) for _, status, body in answers] == [
+        (200, 'Nursing'), (404, None), (200, 'Farming'), (200, 'Nursing')]
+    assert answers[1][2] == {'message': 'Category not found'}
+
+
+def test_one_query_per_model(app, client, user_id, category_id):
+    with app.app_context():
+        categories = [add_category(user_id, f'Category {number}') for number in range(5)]
+    paths = [f'/categories/{category}' for category in categories] + [f'/fundings/{number}' for number in range(1, 4)]
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            answers = batch(client, *paths)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert [status for _, status, _ in answers] == [200] * 5 + [404] * 3
+    assert len([sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]) == 2
+
+
+def test_login_is_required_where_the_endpoint_requires_it(client, user_id):
+    (_, status, _), = batch(client, f'/users/{user_id}')
+    assert status == 401
+
+    login(client, user_id)
+
+    (_, status, body), = batch(client, f'/users/{user_id}')
+    assert (status, body['email']) == (200, 'jane@example.com')
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/nothing/1', 404),
+    ('/employments', 400),          # lists are filtered with ?ids= instead
+    ('/employments/1?expand=user', 400),
+    ('employments/1', 400),
+])
+def test_paths_that_cannot_be_batched(client, path, status):
+    (_, answered, body), = batch(client, path)
+
+    assert answered == status
+    assert body['message']
+
+
+@pytest.mark.parametrize('body', [
+    ['/categories/1'],
+    'requests',
+    {'requests': '/categories/1'},
+    {'requests': []},
+    {'requests': [1, 2]},
+    {'requests': [{'path': '/categories/1'}]},
+    {'requests': ['/categories/1'] * (MAX_REQUESTS + 1)},
+])
+def test_malformed_bodies_are_refused(client, body):
+    response = client.post('/batch', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()['message']
+
+
+def test_body_that_is_not_json(client):
+    assert client.post('/batch', data='requests', content_type='text/plain').status_code == 400
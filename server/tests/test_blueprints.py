@@ -0,0 +1,38 @@
+"""Mounting a subset of the blueprints, and worker pools of their own."""
+import pytest
+
+
+def test_unknown_blueprints_are_refused(make_app):
+    with pytest.raises(ValueError, match='nope'):
+        make_app(APP_BLUEPRINTS='employments,nope')
+
+
+def test_only_the_mounted_blueprints_are_served(make_app):
+    client = make_app(APP_BLUEPRINTS='employments,categories').test_client()
+
+    assert client.get('/employments').status_code == 200
+    assert client.get('/categories').status_code == 200
+    assert client.get('/donations').status_code == 404
+
+
+def test_pool_sizes_are_parsed(make_app):
+    app = make_app(RATELIMIT_ENABLED='1', WORKER_POOLS='fundings=4,profiles=2')
+
+    assert app.config['WORKER_POOLS'] == {'fundings': 4, 'profiles': 2}
+    assert set(app.extensions['worker_pools']) == {'fundings', 'profiles'}
+
+
+def test_a_busy_pool_only_turns_away_its_own_routes(make_app):
+    app = make_app(RATELIMIT_ENABLED='1', WORKER_POOLS='categories=1')
+    pool = app.extensions['worker_pools']['categories']
+    pool.max_wait = 0.01
+    client = app.test_client()
+    assert pool.admit()  # a slow request holds the only slot
+
+    try:
+        assert client.get('/categories').status_code == 503
+        assert client.get('/employments').status_code == 200
+    finally:
+        pool.release()
+
+    assert client.get('/categories').status_code == 200
@@ -0,0 +1,68 @@
+"""Validators on single rows and ?updated_since= delta sync."""
+import time
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.http import http_date
+
+from conftest import employment
+
+
+def test_rows_are_sent_with_validators(client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+
+    response = client.get(f'/employments/{employment_id}')
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"employment-{employment_id}-1"'
+    assert response.last_modified is not None
+
+
+def test_current_etag_is_not_modified(client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    etag = client.get(f'/employments/{employment_id}').headers['ETag']
+
+    response = client.get(f'/employments/{employment_id}', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_stale_etag_gets_the_new_representation(client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    etag = client.get(f'/employments/{employment_id}').headers['ETag']
+    client.put(f'/employments/{employment_id}', json={'title': 'Combine driver'})
+
+    response = client.get(f'/employments/{employment_id}', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.get_json()['title'] == 'Combine driver'
+    assert response.headers['ETag'] != etag
+
+
+def test_if_modified_since(client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    last_modified = client.get(f'/employments/{employment_id}').last_modified
+    earlier = last_modified - timedelta(seconds=1)
+
+    assert client.get(f'/employments/{employment_id}', headers={'If-Modified-Since': http_date(last_modified)}).status_code == 304
+    assert client.get(f'/employments/{employment_id}', headers={'If-Modified-Since': http_date(earlier)}).status_code == 200
+
+
+def test_updated_since_lists_only_what_changed(client, user_id, category_id):
+    first = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    client.post('/employments', json=employment(user_id, category_id, title='Milker'))
+    time.sleep(0.01)
+    watermark = datetime.now(timezone.utc).isoformat()
+    client.put(f'/employments/{first}', json={'title': 'Combine driver'})
+
+    response = client.get('/employments', query_string={'updated_since': watermark})
+
+    assert response.status_code == 200
+    assert [row['id'] for row in response.get_json()] == [first]
+
+
+def test_bad_watermark_is_refused(client):
+    response = client.get('/employments?updated_since=last-tuesday')
+
+    assert response.status_code == 400
@@ -0,0 +1,73 @@
+"""Optimistic concurrency: PUT with If-Match."""
+from conftest import employment, login
+
+
+def create(client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    return employment_id, client.get(f'/employments/{employment_id}').headers['ETag']
+
+
+def test_matching_etag_updates_and_returns_the_new_one(client, user_id, category_id):
+    employment_id, etag = create(client, user_id, category_id)
+
+    response = client.put(f'/employments/{employment_id}', json={'title': 'Combine driver'}, headers={'If-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"employment-{employment_id}-2"'
+    assert client.get(f'/employments/{employment_id}').get_json()['title'] == 'Combine driver'
+
+
+def test_stale_etag_loses(client, user_id, category_id):
+    employment_id, etag = create(client, user_id, category_id)
+    client.put(f'/employments/{employment_id}', json={'title': 'Combine driver'}, headers={'If-Match': etag})
+
+    response = client.put(f'/employments/{employment_id}', json={'title': 'Milker'}, headers={'If-Match': etag})
+
+    assert response.status_code == 412
+    assert client.get(f'/employments/{employment_id}').get_json()['title'] == 'Combine driver'
+
+
+def test_etag_of_another_row_never_matches(client, user_id, category_id):
+    employment_id, _ = create(client, user_id, category_id)
+    _, other_etag = create(client, user_id, category_id)
+
+    response = client.put(f'/employments/{employment_id}', json={'title': 'Milker'}, headers={'If-Match': other_etag})
+
+    assert response.status_code == 412
+
+
+def test_unconditional_and_wildcard_updates(client, user_id, category_id):
+    employment_id, _ = create(client, user_id, category_id)
+
+    assert client.put(f'/employments/{employment_id}', json={'title': 'Milker'}).status_code == 200
+    assert client.put(f'/employments/{employment_id}', json={'title': 'Herder'}, headers={'If-Match': '*'}).status_code == 200
+
+
+def test_missing_and_deleted_rows_are_not_found(client, user_id, category_id):
+    employment_id, etag = create(client, user_id, category_id)
+    client.delete(f'/employments/{employment_id}')
+
+    assert client.put(f'/employments/{employment_id}', json={'title': 'Milker'}, headers={'If-Match': etag}).status_code == 404
+    assert client.put('/employments/999', json={'title': 'Milker'}).status_code == 404
+
+
+def test_users_are_sent_with_validators(client, user_id):
+    login(client, user_id)
+
+    response = client.get(f'/users/{user_id}')
+    etag = response.headers['ETag']
+
+    assert response.status_code == 200
+    assert etag == f'"user-{user_id}-1"'
+    assert client.get(f'/users/{user_id}', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_user_updates_are_conditional(client, user_id):
+    login(client, user_id)
+    etag = client.get(f'/users/{user_id}').headers['ETag']
+    client.put(f'/users/{user_id}', json={'first_name': 'Janet'}, headers={'If-Match': etag})
+
+    response = client.put(f'/users/{user_id}', json={'first_name': 'Joan'}, headers={'If-Match': etag})
+
+    assert response.status_code == 412
+    assert client.get(f'/users/{user_id}').get_json()['first_name'] == 'Janet'
@@ -0,0 +1,116 @@
+"""Deleting users and categories with everything that depends on them."""
+import pytest
+from sqlalchemy import func, select
+
+from archive import run_archival
+from conftest import add_application, add_category, add_funding, add_funding_application, add_user, employment, login
+from deletion import claim, run_deletion
+from models import db, Application, Category, Donation, Employment, EmploymentText, Funding, FundingApplication, User
+
+
+def count(model):
+    return db.session.scalar(select(func.count()).select_from(model.__table__))
+
+
+@pytest.fixture
+def closure(app, client, user_id, category_id):
+    """A user with a posting that someone else applied to, and a donation."""
+    posting = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    with app.app_context():
+        applicant = add_user('john@example.com')
+        add_application(applicant, posting)
+        funding_id = add_funding(category_id)
+        add_funding_application(user_id, funding_id)
+    client.post('/donations', json={'donation_type': 'INDIVIDUAL', 'name': 'Jane', 'amount': 10,
+                                    'payment_method': 'MPESA', 'user_id': user_id})
+    return {'posting': posting, 'applicant': applicant, 'funding': funding_id}
+
+
+def test_small_closures_are_deleted_in_the_request(app, client, user_id, category_id, closure):
+    response = client.delete(f'/users/{user_id}')
+
+    assert response.status_code == 200
+    assert response.get_json()['deleted'] == {
+        'application_text': 1, 'application': 1, 'employment_text': 1, 'employment': 1,
+        'funding_application_text': 1, 'funding_application': 1, 'donation': 1, 'category': 1, 'user': 1,
+    }
+    with app.app_context():
+        assert [count(model) for model in (Employment, EmploymentText, Application, FundingApplication)] == [0, 0, 0, 0]
+        assert db.session.scalar(select(Donation.user_id)) is None  # the money stays, unattributed
+        assert db.session.get(Category, category_id).user_id is None
+        assert db.session.get(User, closure['applicant']) is not None
+
+
+def test_deleted_users_lose_their_tokens_at_once(client, user_id, closure):
+    tokens = client.post('/token', json={'email': 'jane@example.com', 'password': 'secret'}).get_json()
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+
+    client.delete(f'/users/{user_id}')
+
+    assert client.get(f"/users/{closure['applicant']}", headers=headers).status_code == 401
+
+
+def test_deletions_are_published(client, user_id, closure):
+    since = client.get('/changes?limit=1000').get_json()['last_seq']
+
+    client.delete(f'/users/{user_id}')
+
+    changes = client.get(f'/changes?since={since}').get_json()['changes']
+    operations = {(change['table'], change['operation']) for change in changes}
+    assert {('user', 'delete'), ('employment', 'delete'), ('application', 'delete'), ('donation', 'update')} <= operations
+
+
+def test_categories_take_their_fundings_along(app, client, user_id, category_id, closure):
+    with app.app_context():
+        other = add_category(user_id, 'Nursing')
+
+    assert client.delete(f'/categories/{category_id}').status_code == 200
+
+    with app.app_context():
+        assert [count(model) for model in (Employment, Application, Funding, FundingApplication)] == [0, 0, 0, 0]
+        assert db.session.get(Category, other) is not None
+
+
+def test_archived_rows_are_deleted_too(app, client, user_id, closure):
+    client.delete(f"/employments/{closure['posting']}")
+    with app.app_context():
+        run_archival()
+    assert client.get(f"/archive/employments/{closure['posting']}").status_code == 200
+
+    client.delete(f'/users/{user_id}')
+
+    assert client.get(f"/archive/employments/{closure['posting']}").status_code == 404
+    assert client.get(f"/archive/applications?employment_id={closure['posting']}").get_json() == []
+
+
+def test_large_closures_become_background_jobs(app, client, user_id, closure):
+    app.config.update(DELETION_INLINE_LIMIT=0, DELETION_BATCH_SIZE=1, DELETION_PAUSE=0)
+
+    response = client.delete(f'/users/{user_id}')
+
+    assert response.status_code == 202
+    job = response.get_json()['job']
+    assert response.headers['Location'].endswith(f"/deletions/{job['id']}")
+    assert (job['status'], job['progress']) == ('pending', 0.0)
+    assert sum(job['planned'].values()) == 8
+    # Asking again does not start a second job
+    assert client.delete(f'/users/{user_id}').get_json()['job']['id'] == job['id']
+
+    with app.app_context():
+        assert claim(job['id'])
+        assert not claim(job['id'])
+        run_deletion(job['id'])
+
+    finished = client.get(f"/deletions/{job['id']}").get_json()
+    assert (finished['status'], finished['progress']) == ('done', 1.0)
+    assert finished['deleted']['user'] == 1
+    with app.app_context():
+        assert db.session.get(User, user_id) is None
+
+
+def test_unknown_rows_and_jobs(client, user_id):
+    login(client, user_id)
+
+    assert client.delete('/users/999').status_code == 404
+    assert client.delete('/categories/999').status_code == 404
+    assert client.get('/deletions/999').status_code == 404
@@ -0,0 +1,56 @@
+"""Related rows embedded in listings with ?expand=."""
+import pytest
+from sqlalchemy import event
+
+from conftest import add_application, add_user, employment
+from models import db
+
+
+@pytest.fixture
+def applications(app, client, user_id, category_id):
+    postings = [client.post('/employments', json=employment(user_id, category_id, title=title)).get_json()['employment_id']
+                for title in ('Tractor driver', 'Milker')]
+    with app.app_context():
+        applicant = add_user('john@example.com')
+        ids = [add_application(applicant, posting) for posting in postings + postings[:1]]
+    return {'postings': postings, 'applicant': applicant, 'ids': ids}
+
+
+def test_applications_embed_their_posting_and_applicant(client, applications):
+    rows = client.get('/applications?expand=employment,user').get_json()
+
+    assert [row['employment']['title'] for row in rows] == ['Tractor driver', 'Milker', 'Tractor driver']
+    assert rows[0]['employment'] == {'id': applications['postings'][0], 'title': 'Tractor driver', 'location': 'Nakuru'}
+    # Compact users carry no contact details
+    assert rows[0]['user'] == {'id': applications['applicant'], 'username': 'john', 'first_name': 'Jane', 'last_name': 'Doe'}
+
+
+def test_one_query_per_expansion(app, client, applications):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            plain = client.get('/applications')
+            baseline = len(statements)
+            expanded = client.get('/applications?expand=employment,user')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert plain.status_code == expanded.status_code == 200
+    assert len(statements) - baseline == baseline + 2
+
+
+def test_deleted_rows_are_not_embedded(client, applications):
+    client.delete(f"/employments/{applications['postings'][1]}")
+
+    rows = client.get(f"/applications?ids={applications['ids'][1]}&expand=employment").get_json()
+
+    assert rows[0]['employment'] is None
+
+
+def test_unknown_expansions_are_refused(client):
+    response = client.get('/applications?expand=employment,cover_letter')
+
+    assert response.status_code == 400
+    assert 'cover_letter' in response.get_json()['message']
@@ -0,0 +1,178 @@
+"""Columnar exports: export_table, `flask export` and /admin/exports."""
+import sys
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq  # noqa: E402
+
+import export  # noqa: E402
+from conftest import add_user, add_category, employment, login  # noqa: E402
+from export import EXPORTS, export_table, read_state  # noqa: E402
+from models import db, Donation, DonationType, PaymentMethod, PaymentStatus  # noqa: E402
+
+
+@pytest.fixture
+def app(make_app, monkeypatch):
+    # Rows are exported once settled; these were all written a moment ago
+    monkeypatch.setattr(export, 'SETTLE_SECONDS', 0)
+    return make_app(ADMIN_USER_IDS='1')
+
+
+@pytest.fixture
+def admin(client, user_id):
+    login(client, user_id)
+    return client
+
+
+def run(app, name, **options):
+    with app.app_context():
+        return export_table(name, **options)
+
+
+def test_runs_export_what_changed_since_the_last(app, client, user_id, category_id):
+    with app.app_context():
+        add_category(user_id, 'Nursing')
+
+    path, rows = run(app, 'category')
+    assert (path.endswith('category/000001.parquet'), rows) == (True, 2)
+    assert pq.read_table(path).column('name').to_pylist() == ['Farming', 'Nursing']
+    assert run(app, 'category') == (None, 0)
+
+    client.put(f'/categories/{category_id}', json={'name': 'Fishing'})
+    path, rows = run(app, 'category')
+
+    assert path.endswith('000002.parquet')
+    assert pq.read_table(path).column('name').to_pylist() == ['Fishing']
+    assert run(app, 'category', full=True)[1] == 2
+    with app.app_context():
+        assert read_state()['category']['files'] == 3
+
+
+def test_recent_rows_wait_for_the_next_run(app, monkeypatch, category_id):
+    monkeypatch.setattr(export, 'SETTLE_SECONDS', 60)
+
+    assert run(app, 'category') == (None, 0)
+
+
+def test_tables_without_updated_at_go_by_key(app, client, user_id, category_id):
+    client.post('/employments', json=employment(user_id, category_id))
+    path, rows = run(app, 'location')
+    assert pq.read_table(path).column('name').to_pylist() == ['Nakuru']
+
+    client.post('/employments', json=employment(user_id, category_id, location='Eldoret'))
+
+    path, rows = run(app, 'location')
+    assert pq.read_table(path).column('name').to_pylist() == ['Eldoret']
+
+
+def test_exports_join_text_and_leave_out_passwords(app, client, user_id, category_id):
+    client.post('/employments', json=employment(user_id, category_id))
+
+    employments = pq.read_table(run(app, 'employment')[0])
+    users = pq.read_table(run(app, 'user')[0])
+
+    assert employments.column('description').to_pylist() == ['Drive the tractor']
+    assert employments.schema.field('description').type == pa.large_string()
+    assert 'password' not in users.column_names
+    assert users.column('email').to_pylist() == ['jane@example.com']
+
+
+def test_enums_and_times_are_typed(app):
+    with app.app_context():
+        db.session.add(Donation(donation_type=DonationType.INDIVIDUAL, amount_minor=100, currency='KES',
+                                payment_method=PaymentMethod.PAYPAL, payment_status=PaymentStatus.SETTLED))
+        db.session.commit()
+
+    donations = pq.read_table(run(app, 'donation')[0])
+
+    assert donations.column('payment_method').to_pylist() == ['PayPal']
+    assert pa.types.is_dictionary(donations.schema.field('payment_method').type)
+    assert donations.schema.field('updated_at').type == pa.timestamp('us')
+
+
+def test_batches_become_row_groups(app, user_id):
+    with app.app_context():
+        for name in ('Nursing', 'Fishing', 'Mining'):
+            add_category(user_id, name)
+
+    path, rows = run(app, 'category', batch_size=2)
+
+    assert rows == 3
+    assert pq.ParquetFile(path).num_row_groups == 2
+
+
+def test_arrow_files(app, category_id):
+    path, _ = run(app, 'category', format='arrow')
+
+    assert path.endswith('.arrow')
+    assert pa.ipc.open_file(path).read_all().column('name').to_pylist() == ['Farming']
+
+
+def test_the_command_exports_the_named_tables(app, category_id):
+    result = app.test_cli_runner().invoke(args=['export', 'category', 'location'])
+
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].startswith('category: 1 rows -> ')
+    assert lines[1] == 'location: 0 rows'
+    assert app.test_cli_runner().invoke(args=['export', 'payroll']).exit_code == 2
+
+
+def test_admins_stream_exports(admin, category_id):
+    response = admin.get('/admin/exports/category')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.apache.parquet'
+    assert pq.read_table(pa.BufferReader(response.data)).column('name').to_pylist() == ['Farming']
+
+    later = admin.get('/admin/exports/category', query_string={'after': response.headers['X-Export-Until'],
+                                                               'format': 'arrow'})
+    assert pa.ipc.open_stream(later.data).read_all().num_rows == 0
+
+
+def test_admins_stream_tables_by_key(admin, user_id, category_id):
+    admin.post('/employments', json=employment(user_id, category_id))
+    admin.post('/employments', json=employment(user_id, category_id, location='Eldoret'))
+
+    response = admin.get('/admin/exports/location?format=arrow&after_id=1')
+
+    assert response.headers['X-Export-Until-Id'] == '2'
+    assert pa.ipc.open_stream(response.data).read_all().column('name').to_pylist() == ['Eldoret']
+
+
+def test_admins_see_the_tables_and_cursors(app, admin, category_id):
+    run(app, 'category')
+
+    tables = {table['name']: table for table in admin.get('/admin/exports').get_json()['tables']}
+
+    assert set(tables) == set(EXPORTS)
+    assert tables['category']['cli_cursor']['files'] == 1
+    assert tables['location']['incremental_by'] == 'id'
+    assert tables['donation']['cli_cursor'] is None
+
+
+@pytest.mark.parametrize('url, status', [('/admin/exports/payroll', 404), ('/admin/exports/category?format=csv', 400),
+                                         ('/admin/exports/category?after=yesterday', 400),
+                                         ('/admin/exports/location?after_id=x', 400)])
+def test_bad_export_requests_are_refused(admin, url, status):
+    assert admin.get(url).status_code == status
+
+
+def test_exports_are_for_admins_only(app, client, user_id):
+    assert client.get('/admin/exports').status_code == 401
+    with app.app_context():
+        login(client, add_user('john@example.com', username='john'))
+
+    assert client.get('/admin/exports').status_code == 403
+    assert client.get('/admin/exports/category').status_code == 403
+
+
+def test_without_pyarrow_exports_say_so(app, admin, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    monkeypatch.setattr(EXPORTS['category'], '_arrow', None)
+
+    assert admin.get('/admin/exports/category').status_code == 501
+    result = app.test_cli_runner().invoke(args=['export'])
+    assert result.exit_code == 1
+    assert 'pyarrow' in result.output
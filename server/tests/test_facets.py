@@ -0,0 +1,104 @@
+"""Faceted counts for the job board."""
+import pytest
+from sqlalchemy import event
+
+import models
+from conftest import add_category, employment
+from facets import facet_index
+from models import db
+
+
+@pytest.fixture
+def board(app, client, user_id, category_id):
+    with app.app_context():
+        other_category = add_category(user_id, 'Nursing')
+    ids = {}
+    for title, category, location, salary in [
+        ('Tractor driver', category_id, 'Nakuru', 25000),
+        ('Night nurse', other_category, 'Nakuru', 60000),
+        ('Day nurse', other_category, 'Eldoret', 55000),
+        ('Milker', category_id, 'Eldoret', None),
+    ]:
+        body = employment(user_id, category, title=title, location=location, salary_range=salary)
+        ids[title] = client.post('/employments', json=body).get_json()['employment_id']
+    return {'ids': ids, 'farming': category_id, 'nursing': other_category}
+
+
+def facets(client, **args):
+    response = client.get('/employments/facets', query_string=args)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def counts(result, dimension, key):
+    return {entry[key]: entry['count'] for entry in result['facets'][dimension]}
+
+
+def test_counts_every_dimension(client, board):
+    result = facets(client)
+
+    assert result['total'] == 4
+    assert counts(result, 'category', 'name') == {'Farming': 2, 'Nursing': 2}
+    assert counts(result, 'location', 'value') == {'Nakuru': 2, 'Eldoret': 2}
+    assert counts(result, 'salary', 'bucket') == {'0-29999': 1, '50000-74999': 2}
+
+
+def test_words_of_the_title_narrow_everything(client, board):
+    result = facets(client, q='nurse')
+
+    assert result['total'] == 2
+    assert counts(result, 'location', 'value') == {'Nakuru': 1, 'Eldoret': 1}
+
+
+def test_a_dimension_ignores_its_own_selection(client, board):
+    result = facets(client, location='Nakuru')
+
+    assert result['total'] == 2
+    # Eldoret is still offered, with what picking it as well would add
+    assert counts(result, 'location', 'value') == {'Nakuru': 2, 'Eldoret': 2}
+    assert counts(result, 'category', 'name') == {'Farming': 1, 'Nursing': 1}
+
+
+def test_selections_combine_across_dimensions(client, board):
+    result = facets(client, category_id=str(board['nursing']), salary_bucket='50000-74999', location='Eldoret')
+
+    assert result['total'] == 1
+
+
+def test_unknown_location_selects_nothing(client, board):
+    assert facets(client, location='Atlantis')['total'] == 0
+
+
+def test_writes_reach_the_index(client, board):
+    facets(client)
+    client.put(f"/employments/{board['ids']['Milker']}", json={'title': 'Night milker', 'salary_range': 31000})
+    client.delete(f"/employments/{board['ids']['Tractor driver']}")
+
+    result = facets(client, q='night')
+
+    assert result['total'] == 2
+    assert counts(result, 'salary', 'bucket') == {'30000-49999': 1, '50000-74999': 1}
+    assert facets(client)['total'] == 3
+
+
+def test_rebuild_reads_without_a_session(app, board):
+    # A session opened while the postings stream in would hold SQLite's
+    # read lock against every writer until the build is done
+    models._location_names.clear()
+    statements = []
+    listener = lambda state: statements.append(state.statement)
+
+    with app.app_context():
+        event.listen(db.session, 'do_orm_execute', listener)
+        try:
+            facet_index.rebuild()
+        finally:
+            event.remove(db.session, 'do_orm_execute', listener)
+
+    assert statements == []
+    assert len(facet_index.live) == 4
+
+
+@pytest.mark.parametrize('query', ['category_id=farming', 'salary_bucket=1-2'])
+def test_bad_selections_are_refused(client, query):
+    assert client.get(f'/employments/facets?{query}').status_code == 400
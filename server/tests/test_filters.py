@@ -0,0 +1,93 @@
+"""Query-string filters, ordering and expansion on list endpoints."""
+import pytest
+
+from conftest import employment
+
+
+@pytest.fixture
+def postings(client, user_id, category_id):
+    ids = {}
+    for title, location, salary, currency in [
+        ('Tractor driver', 'Nakuru', '25000.50', 'KES'),
+        ('Milker', 'Eldoret', '18000', 'KES'),
+        ('Herder', 'Nakuru', '90000', 'UGX'),
+    ]:
+        body = employment(user_id, category_id, title=title, location=location,
+                          salary_range=salary, salary_currency=currency)
+        ids[title] = client.post('/employments', json=body).get_json()['employment_id']
+    return ids
+
+
+def titles(response):
+    assert response.status_code == 200, response.get_json()
+    return sorted(row['title'] for row in response.get_json())
+
+
+def test_equality_on_an_interned_column(client, postings):
+    assert titles(client.get('/employments?location=Nakuru')) == ['Herder', 'Tractor driver']
+
+
+def test_in_operator(client, postings):
+    assert titles(client.get('/employments?location__in=Eldoret,Kisumu')) == ['Milker']
+
+
+def test_money_ranges_are_in_major_units_of_one_currency(client, postings):
+    assert titles(client.get('/employments?salary_range__gte=20000')) == ['Tractor driver']
+    assert titles(client.get('/employments?salary_range__gte=20000&salary_currency=UGX')) == ['Herder']
+    assert titles(client.get('/employments?salary_range=25000.5')) == ['Tractor driver']
+
+
+def test_money_filters_reject_what_the_currency_cannot_hold(client, postings):
+    assert client.get('/employments?salary_range=1.5&salary_currency=UGX').status_code == 400
+    assert client.get('/employments?salary_range__gte=lots').status_code == 400
+    assert client.get('/employments?salary_range__gte=1&salary_currency=XXX').status_code == 400
+
+
+def test_order_and_limit(client, postings):
+    response = client.get('/employments?salary_range__gt=0&order=-salary_range&limit=1')
+
+    assert [row['title'] for row in response.get_json()] == ['Tractor driver']
+
+
+def test_ids(client, postings):
+    ids = f"{postings['Milker']},{postings['Herder']}"
+
+    assert titles(client.get(f'/employments?ids={ids}')) == ['Herder', 'Milker']
+    assert client.get('/employments?ids=one,two').status_code == 400
+
+
+def test_expand_embeds_compact_rows(client, postings, category_id):
+    response = client.get('/employments?expand=category,user&limit=1')
+
+    row, = response.get_json()
+    assert row['category'] == {'id': category_id, 'name': 'Farming'}
+    assert set(row['user']) == {'id', 'username', 'first_name', 'last_name'}
+    assert client.get('/employments?expand=password').status_code == 400
+
+
+@pytest.mark.parametrize('query', [
+    'title=Milker',                  # not indexed
+    'location__contains=kur',        # cannot use an index
+    'location__ne=Nakuru',
+    'location__near=Nakuru',         # no such operator
+    'order=description',
+    'limit=many',
+    'updated_at__gte=yesterday',
+])
+def test_refused_filters(client, postings, query):
+    response = client.get(f'/employments?{query}')
+
+    assert response.status_code == 400
+    assert response.get_json()['message']
+
+
+def test_enums_by_name_or_value(client, user_id):
+    for method in ('MPESA', 'PAYPAL'):
+        client.post('/donations', json={'donation_type': 'INDIVIDUAL', 'name': 'Jane', 'amount': 100,
+                                        'payment_method': method, 'user_id': user_id})
+
+    by_name = client.get('/donations?payment_method=MPESA').get_json()
+    by_value = client.get('/donations?payment_method__in=MPESA,PAYPAL').get_json()
+
+    assert [row['payment_method'] for row in by_name] == ['MPESA']
+    assert len(by_value) == 2
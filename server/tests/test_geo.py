@@ -0,0 +1,66 @@
+"""Jobs near a point."""
+import pytest
+
+from conftest import employment
+from geo import geocode, geohash_decode, geohash_encode, haversine_km
+
+NAKURU = {'lat': -0.3031, 'lon': 36.08}
+
+
+@pytest.fixture
+def postings(client, user_id, category_id):
+    ids = {}
+    for title, location in [('Tractor driver', 'Nakuru'), ('Fisher', 'Naivasha'),
+                            ('Clerk', 'Nairobi, Kenya'), ('Herder', 'Nowhere in particular')]:
+        ids[title] = client.post('/employments', json=employment(user_id, category_id, title=title, location=location)).get_json()['employment_id']
+    return ids
+
+
+def nearby(client, **args):
+    response = client.get('/employments/nearby', query_string=args)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_postings_within_the_radius_nearest_first(client, postings):
+    rows = nearby(client, radius_km=100, **NAKURU)
+
+    assert [row['title'] for row in rows] == ['Tractor driver', 'Fisher']
+    assert rows[0]['distance_km'] == 0
+    assert rows[0]['location'] == 'Nakuru'
+    assert 40 < rows[1]['distance_km'] < 100
+
+
+def test_radius_and_limit(client, postings):
+    assert [row['title'] for row in nearby(client, radius_km=25, **NAKURU)] == ['Tractor driver']
+    assert len(nearby(client, radius_km=500, limit=2, **NAKURU)) == 2
+    assert len(nearby(client, radius_km=500, **NAKURU)) == 3  # the unknown place has no coordinates
+
+
+def test_moved_and_deleted_postings(client, postings):
+    client.put(f"/employments/{postings['Clerk']}", json={'location': 'Nakuru'})
+    client.delete(f"/employments/{postings['Tractor driver']}")
+
+    assert [row['title'] for row in nearby(client, radius_km=25, **NAKURU)] == ['Clerk']
+
+
+@pytest.mark.parametrize('query', [
+    {'lon': 36.08},
+    {'lat': 'north', 'lon': 36.08},
+    {'lat': 91, 'lon': 36.08},
+    {'lat': 0, 'lon': 36.08, 'radius_km': 5000},
+    {'lat': 0, 'lon': 36.08, 'limit': 0},
+])
+def test_bad_points_are_refused(client, query):
+    assert client.get('/employments/nearby', query_string=query).status_code == 400
+
+
+def test_geocoding_ignores_case_and_country():
+    assert geocode('nakuru') == geocode('Nakuru, Kenya') == (-0.3031, 36.08)
+    assert geocode('Atlantis') is None
+
+
+def test_geohash_round_trip():
+    latitude, longitude = geohash_decode(geohash_encode(-1.2864, 36.8172))
+
+    assert haversine_km(latitude, longitude, -1.2864, 36.8172) < 0.01
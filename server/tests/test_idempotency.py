@@ -0,0 +1,129 @@
+"""Idempotency-Key on the create endpoints."""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, update
+
+from conftest import add_user, login
+from idempotency import _scope, purge_expired
+from models import db, Category, IdempotencyKey
+
+
+def create(client, key, name='Farming', **headers):
+    return client.post('/categories', json={'name': name}, headers={'Idempotency-Key': key, **headers})
+
+
+def categories(app):
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(Category))
+
+
+def test_retries_are_answered_with_the_first_response(app, client):
+    first = create(client, 'k1')
+    retry = create(client, 'k1')
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert categories(app) == 1
+
+
+def test_new_keys_and_no_key_create_again(app, client):
+    create(client, 'k1')
+    create(client, 'k2')
+    client.post('/categories', json={'name': 'Farming'})
+
+    assert categories(app) == 3
+
+
+def test_a_key_reused_for_another_body_is_refused(app, client):
+    create(client, 'k1')
+
+    response = create(client, 'k1', name='Nursing')
+
+    assert response.status_code == 422
+    assert categories(app) == 1
+
+
+def test_keys_are_scoped_to_caller_and_endpoint(app, client):
+    create(client, 'k1')
+    other = client.post('/fundings', json={'category_id': 1, 'grant_name': 'Seed', 'grant_type': 'BUSINESS', 'amount': 10},
+                        headers={'Idempotency-Key': 'k1'})
+    assert 'Idempotent-Replayed' not in other.headers
+    with app.app_context():
+        user_id = add_user()
+    login(client, user_id)
+
+    assert 'Idempotent-Replayed' not in create(client, 'k1').headers
+    assert categories(app) == 2
+
+
+def test_bad_keys_are_refused(client):
+    assert create(client, '').status_code == 400
+    assert create(client, 'k' * 256).status_code == 400
+
+
+def test_client_errors_are_replayed_too(client):
+    body = {'donation_type': 'INDIVIDUAL', 'amount': '0.001', 'payment_method': 'MPESA'}
+    first = client.post('/donations', json=body, headers={'Idempotency-Key': 'k1'})
+    retry = client.post('/donations', json=body, headers={'Idempotency-Key': 'k1'})
+
+    assert first.status_code == retry.status_code == 400
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_server_errors_are_not_stored(make_app):
+    client = make_app(PAYMENT_MOCK_ENABLED='0').test_client()
+    body = {'donation_type': 'INDIVIDUAL', 'amount': 10, 'payment_method': 'MPESA'}
+
+    first = client.post('/donations', json=body, headers={'Idempotency-Key': 'k1'})
+    retry = client.post('/donations', json=body, headers={'Idempotency-Key': 'k1'})
+
+    assert first.status_code == retry.status_code == 503
+    assert 'Idempotent-Replayed' not in retry.headers
+
+
+def hold(app, key, body, claimed_at):
+    """Claim key for body as a request that has not finished yet, e.g. in another process."""
+    with app.test_request_context('/categories', method='POST', environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+        scope = _scope(key)
+        db.session.execute(insert(IdempotencyKey).values(
+            key=scope, request_hash=hashlib.sha256(json.dumps(body).encode()).hexdigest(), status=None, body=None,
+            created_at=claimed_at, expires_at=claimed_at + timedelta(days=1)))
+        db.session.commit()
+
+
+def test_duplicates_of_a_running_request_wait_then_give_up(app, client):
+    app.config['IDEMPOTENCY_WAIT'] = 0.05
+    hold(app, 'k1', {'name': 'Farming'}, datetime.utcnow())
+
+    response = create(client, 'k1')
+
+    assert response.status_code == 409
+    assert 'Retry-After' in response.headers
+    assert categories(app) == 0
+
+
+def test_abandoned_claims_are_taken_over(app, client):
+    hold(app, 'k1', {'name': 'Farming'}, datetime.utcnow() - timedelta(minutes=5))
+
+    response = create(client, 'k1')
+
+    assert response.status_code == 201
+    assert categories(app) == 1
+
+
+def test_expired_keys_run_again_and_are_purged(app, client):
+    create(client, 'k1')
+    with app.app_context():
+        db.session.execute(update(IdempotencyKey).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+
+    assert 'Idempotent-Replayed' not in create(client, 'k1').headers
+    with app.app_context():
+        db.session.execute(update(IdempotencyKey).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+        assert purge_expired(batch_size=1) == 1
+        assert db.session.scalar(select(func.count()).select_from(IdempotencyKey)) == 0
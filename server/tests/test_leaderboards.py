@@ -0,0 +1,130 @@
+"""Top donors and most applied-to jobs (GET /leaderboards/...)."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_user, add_application, employment
+from leaderboards import MAX_LIMIT, TopK, leaderboards
+from models import db, Donation, DonationType, PaymentMethod, PaymentStatus
+from payments import settle
+
+
+def donate(user_id=None, amount_minor=10000, currency='KES', status=PaymentStatus.SETTLED,
+           organisation_name=None, donation_date=None):
+    donation = Donation(user_id=user_id, organisation_name=organisation_name, amount_minor=amount_minor,
+                        currency=currency, payment_status=status, payment_method=PaymentMethod.MPESA,
+                        donation_type=DonationType.ORGANISATION if organisation_name else DonationType.INDIVIDUAL,
+                        donation_date=donation_date or datetime.utcnow())
+    db.session.add(donation)
+    db.session.commit()
+    return donation.donation_id
+
+
+def donors(client, **args):
+    response = client.get('/leaderboards/donors', query_string=args)
+    assert response.status_code == 200
+    return [(leader.get('username') or leader['organisation_name'], leader['total'])
+            for leader in response.get_json()['leaders']]
+
+
+def jobs(client, **args):
+    response = client.get('/leaderboards/jobs', query_string=args)
+    assert response.status_code == 200
+    return [(leader['employment_id'], leader['applications']) for leader in response.get_json()['leaders']]
+
+
+def test_donors_are_ranked_by_settled_amount(app, client, user_id):
+    with app.app_context():
+        other = add_user('john@example.com', username='john')
+        donate(user_id, 10000)
+        donate(other, 5000)
+        donate(other, 7000)
+        donate(other, 99900, status=PaymentStatus.PENDING)
+        donate(organisation_name='Acme', amount_minor=1000)
+        donate(amount_minor=50000)  # anonymous
+
+    assert donors(client) == [('john', 120), ('jane', 100), ('Acme', 10)]
+    assert donors(client, limit=1) == [('john', 120)]
+
+
+def test_boards_are_per_currency_and_window(app, client, user_id):
+    with app.app_context():
+        donate(user_id, 10000)
+        donate(user_id, 300, currency='USD')
+        donate(user_id, 20000, donation_date=datetime.utcnow() - timedelta(days=40))
+
+    assert donors(client) == [('jane', 100)]
+    assert donors(client, window='all') == [('jane', 300)]
+    assert donors(client, currency='usd') == [('jane', 3)]
+
+
+def test_donors_follow_settlements_and_deletes(app, client, user_id):
+    assert donors(client) == []
+    with app.app_context():
+        pending = donate(user_id, 10000, status=PaymentStatus.PENDING)
+        other = donate(user_id, 2500)
+    assert donors(client) == [('jane', 25)]
+
+    with app.app_context():
+        settle(pending, True, 'ref-1')
+    assert donors(client) == [('jane', 125)]
+
+    assert client.delete(f'/donations/{other}').status_code == 200
+    assert donors(client) == [('jane', 100)]
+
+
+def test_jobs_are_ranked_by_live_applications(app, client, user_id, category_id):
+    first, second = (client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+                     for _ in range(2))
+    with app.app_context():
+        add_application(user_id, first)
+        add_application(user_id, second)
+        withdrawn = add_application(user_id, second)
+
+    assert jobs(client) == [(second, 2), (first, 1)]
+
+    client.delete(f'/applications/{withdrawn}')
+    client.delete(f'/employments/{first}')
+
+    assert jobs(client) == [(second, 1)]
+    assert client.get('/leaderboards/jobs').get_json()['leaders'][0]['title'] == 'Tractor driver'
+
+
+def test_updates_match_a_rebuild(app, client, user_id, category_id):
+    jobs(client)
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    with app.app_context():
+        for _ in range(3):
+            donate(user_id, 1000)
+            add_application(user_id, employment_id)
+    incremental = donors(client), jobs(client)
+
+    with app.app_context():
+        leaderboards.rebuild()
+
+    assert (donors(client), jobs(client)) == incremental == ([('jane', 30)], [(employment_id, 3)])
+
+
+@pytest.mark.parametrize('args', [{'window': 'week'}, {'currency': 'XYZ'}, {'limit': 0},
+                                  {'limit': MAX_LIMIT + 1}, {'limit': 'ten'}])
+def test_bad_queries_are_refused(client, args):
+    assert client.get('/leaderboards/donors', query_string=args).status_code == 400
+
+
+def test_bad_job_limit_is_refused(client):
+    assert client.get('/leaderboards/jobs?limit=-1').status_code == 400
+
+
+def test_top_k_keeps_order_through_growth_and_shrinkage():
+    board = TopK()
+    for key in range(MAX_LIMIT + 20):
+        board.add(key, key)
+    assert board.top(3) == [(MAX_LIMIT + 19, MAX_LIMIT + 19), (MAX_LIMIT + 18, MAX_LIMIT + 18), (MAX_LIMIT + 17, MAX_LIMIT + 17)]
+
+    board.add(0, 1000)  # from outside the list to the top
+    board.add(MAX_LIMIT + 19, -(MAX_LIMIT + 19))  # out altogether
+
+    assert board.top(2) == [(0, 1000), (MAX_LIMIT + 18, MAX_LIMIT + 18)]
+    assert len(board.top(MAX_LIMIT + 50)) == MAX_LIMIT
+    assert MAX_LIMIT + 19 not in board.totals
+    assert board.top(MAX_LIMIT) == sorted(board.totals.items(), key=lambda item: (-item[1], item[0]))[:MAX_LIMIT]
@@ -0,0 +1,128 @@
+"""JSON log lines, request ids and per-route sampling."""
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+from logs import JsonFormatter, NonBlockingQueueHandler, RequestFilter
+
+logger = logging.getLogger('tests.noisy')
+
+
+class Lines(logging.Handler):
+    """Formats records next to the app's queue handler, with the same filter."""
+
+    def __init__(self):
+        super().__init__()
+        self.addFilter(RequestFilter())
+        self.setFormatter(JsonFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+    def messages(self, name=None):
+        return [line['message'] for line in self.lines if name is None or line['logger'] == name]
+
+
+@pytest.fixture
+def lines():
+    handler = Lines()
+    root = logging.getLogger()
+    root.addHandler(handler)
+    yield handler
+    root.removeHandler(handler)
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(LOG_ACCESS='1', LOG_SAMPLE='/noisy=0')
+
+    def noisy():
+        logger.info('Polled')
+        logger.warning('Poll took long', extra={'seconds': 3})
+        return 'ok'
+    app.add_url_rule('/noisy', 'noisy', noisy)
+    return app
+
+
+def test_requests_get_an_id_on_their_records_and_response(client, lines):
+    response = client.get('/categories')
+
+    access, = [line for line in lines.lines if line['logger'] == 'access']
+    assert access['request_id'] == response.headers['X-Request-Id']
+    assert access['message'] == 'GET /categories 200'
+    assert access['status'] == 200
+    assert access['duration_ms'] >= 0
+    assert access['level'] == 'INFO'
+    assert access['time'].endswith('Z')
+
+
+def test_sane_request_ids_are_kept(client):
+    assert client.get('/categories', headers={'X-Request-Id': 'edge-42.a'}).headers['X-Request-Id'] == 'edge-42.a'
+    generated = client.get('/categories', headers={'X-Request-Id': 'id"><script>'}).headers['X-Request-Id']
+    assert len(generated) == 32 and 'script' not in generated
+    assert client.get('/categories', headers={'X-Request-Id': 'x' * 65}).headers['X-Request-Id'] != 'x' * 65
+
+
+def test_unsampled_requests_keep_only_warnings(client, lines):
+    response = client.get('/noisy')
+
+    assert response.status_code == 200
+    warning, = lines.lines
+    assert warning['message'] == 'Poll took long'
+    assert warning['seconds'] == 3
+    assert warning['request_id'] == response.headers['X-Request-Id']
+
+
+def test_records_outside_requests_have_no_id(app, lines):
+    logger.warning('Starting up')
+
+    assert lines.lines == [{'time': lines.lines[0]['time'], 'level': 'WARNING', 'logger': 'tests.noisy',
+                            'message': 'Starting up'}]
+
+
+def test_the_access_record_can_be_turned_off(app, client, lines):
+    app.config['LOG_ACCESS'] = False
+
+    client.get('/categories')
+
+    assert lines.messages('access') == []
+
+
+def test_log_levels_are_set_per_logger(make_app):
+    payments = logging.getLogger('payments')
+    try:
+        make_app(LOG_LEVELS='payments=debug')
+        assert payments.level == logging.DEBUG
+    finally:
+        payments.setLevel(logging.NOTSET)
+
+
+def test_tracebacks_are_rendered_before_the_queue():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = logging.getLogger('tests').makeRecord('tests', logging.ERROR, __file__, 1, 'Failed %s', ('job',),
+                                                       sys.exc_info())
+
+    prepared = handler.prepare(record)
+    line = json.loads(JsonFormatter().format(prepared))
+
+    assert (prepared.args, prepared.exc_info) == (None, None)
+    assert line['message'] == 'Failed job'
+    assert 'ValueError: boom' in line['exception']
+
+
+def test_records_are_dropped_when_the_queue_is_full():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    record = logging.LogRecord('tests', logging.INFO, __file__, 1, 'Hello', (), None)
+
+    handler.emit(record)
+    handler.emit(record)
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
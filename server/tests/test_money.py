@@ -0,0 +1,130 @@
+"""Money in integer minor units, and the totals computed from it."""
+import pytest
+from sqlalchemy import update
+
+from conftest import employment
+from models import db, Donation, PaymentStatus
+from money import MAX_MINOR, MoneyError, parse_currency, parse_money, to_json, to_minor
+
+
+@pytest.mark.parametrize('amount, currency, minor', [
+    ('12.5', 'KES', 1250),
+    (12.5, 'KES', 1250),
+    (0.1, 'KES', 10),
+    (7, 'UGX', 7),
+    ('1e3', 'KES', 100000),
+    (-3, 'KES', -300),
+])
+def test_to_minor_is_exact(amount, currency, minor):
+    assert to_minor(amount, currency) == minor
+
+
+@pytest.mark.parametrize('amount, currency', [
+    ('0.001', 'KES'),                  # more decimals than the currency has
+    ('1.5', 'UGX'),
+    ('lots', 'KES'),
+    (True, 'KES'),
+    ('NaN', 'KES'),
+    ('Infinity', 'KES'),
+    ('1e999999999', 'KES'),            # never expanded
+    (str(MAX_MINOR), 'KES'),           # fits as major units, not as cents
+    (MAX_MINOR + 1, 'UGX'),
+])
+def test_to_minor_refuses(amount, currency):
+    with pytest.raises(MoneyError):
+        to_minor(amount, currency)
+
+
+def test_largest_amount_that_fits():
+    assert to_minor(MAX_MINOR, 'UGX') == MAX_MINOR
+
+
+def test_to_json():
+    assert to_json(1250, 'KES') == 12.5
+    assert to_json(1200, 'KES') == 12
+    assert isinstance(to_json(1200, 'KES'), int)
+    assert to_json(None, 'KES') is None
+
+
+def test_currencies():
+    assert parse_currency(None) == 'KES'
+    assert parse_currency('ugx') == 'UGX'
+    with pytest.raises(MoneyError):
+        parse_currency('XXX')
+
+
+@pytest.mark.parametrize('amount', [0, -5, '-0.01'])
+def test_parse_money_wants_a_positive_amount(amount):
+    with pytest.raises(MoneyError):
+        parse_money({'amount': amount}, 'amount')
+
+
+def test_parse_money_without_an_amount():
+    assert parse_money({'currency': 'UGX'}, 'amount') == (None, 'UGX')
+
+
+def donation(amount, currency='KES', method='MPESA'):
+    return {'donation_type': 'INDIVIDUAL', 'name': 'Jane', 'amount': amount, 'currency': currency, 'payment_method': method}
+
+
+def test_amounts_round_trip_through_the_api(client):
+    donation_id = client.post('/donations', json=donation('0.1')).get_json()['donation_id']
+
+    body = client.get(f'/donations/{donation_id}').get_json()
+
+    assert (body['amount'], body['currency']) == (0.1, 'KES')
+
+
+def settle(app, *donation_ids, status=PaymentStatus.SETTLED):
+    with app.app_context():
+        db.session.execute(update(Donation).where(Donation.donation_id.in_(donation_ids)).values(payment_status=status))
+        db.session.commit()
+
+
+def test_totals_are_exact_and_per_currency(app, client):
+    ids = [client.post('/donations', json=body).get_json()['donation_id']
+           for body in (donation('0.1'), donation('0.2'), donation(500, 'UGX'))]
+    settle(app, *ids)
+
+    totals = client.get('/donations/totals').get_json()
+
+    assert [(row['currency'], row['count'], row['total'], row['total_minor']) for row in totals] == [
+        ('KES', 2, 0.3, 30), ('UGX', 1, 500, 500)]
+    assert totals[0]['average'] == 0.15
+
+
+def test_totals_count_settled_donations_only(app, client):
+    settled = client.post('/donations', json=donation(100)).get_json()['donation_id']
+    failed = client.post('/donations', json=donation(40)).get_json()['donation_id']
+    client.post('/donations', json=donation(7))
+    settle(app, settled)
+    settle(app, failed, status=PaymentStatus.FAILED)
+
+    assert client.get('/donations/totals').get_json()[0]['total'] == 100
+    assert client.get('/donations/totals?payment_status=pending').get_json()[0]['total'] == 7
+    assert client.get('/donations/totals?payment_status=failed').get_json()[0]['total'] == 40
+    assert client.get('/donations/totals?payment_status=refunded').status_code == 400
+
+
+def test_totals_by_group(app, client):
+    ids = [client.post('/donations', json=donation(amount, method=method)).get_json()['donation_id']
+           for amount, method in ((10, 'MPESA'), (20, 'MPESA'), (5, 'PAYPAL'))]
+    settle(app, *ids)
+
+    totals = client.get('/donations/totals?group_by=payment_method').get_json()
+
+    assert {row['payment_method']: row['total'] for row in totals} == {'MPESA': 30, 'PayPal': 5}
+
+
+@pytest.mark.parametrize('query', ['group_by=name', 'since=last-week', 'currency=XXX'])
+def test_bad_totals_queries_are_refused(client, query):
+    assert client.get(f'/donations/totals?{query}').status_code == 400
+
+
+def test_salary_stats(client, user_id, category_id):
+    for salary in ('100', '200.5'):
+        client.post('/employments', json=employment(user_id, category_id, salary_range=salary))
+
+    stats, = client.get('/employments/salary_stats?group_by=category_id').get_json()
+
+    assert (stats['category_id'], stats['min'], stats['max'], stats['total']) == (category_id, 100, 200.5, 300.5)
@@ -0,0 +1,207 @@
+"""Charging donations: payment jobs, the dispatcher and gateway callbacks."""
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from models import db, Donation, PaymentJob
+from payments import STALE_AFTER, Declined, GatewayError, attempt
+
+DONATION = {'donation_type': 'INDIVIDUAL', 'amount': '150.50', 'currency': 'KES', 'payment_method': 'MPESA'}
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(PAYMENT_MOCK_SECRET='mock-secret')
+
+
+class Gateway:
+    """Answers charges with the given outcomes in turn, in place of the mock's dice."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.charges = []
+
+    def __call__(self, charge, timeout):
+        self.charges.append(charge)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def gateway(app, monkeypatch):
+    def gateway(*outcomes):
+        charge = Gateway(*outcomes)
+        monkeypatch.setattr(app.extensions['payment_gateways']['mock'], 'charge', charge)
+        return charge
+    return gateway
+
+
+def run_due_jobs(app):
+    """What the dispatcher's workers do, on this thread."""
+    with app.app_context():
+        claimed = app.extensions['payment_dispatcher']._claim(10)
+        for job_id in claimed:
+            attempt(job_id)
+    return len(claimed)
+
+
+def donate(client):
+    response = client.post('/donations', json=DONATION)
+    assert response.status_code == 201
+    assert response.get_json()['payment_status'] == 'pending'
+    return response.get_json()['donation_id']
+
+
+def donation(client, donation_id):
+    return client.get(f'/donations/{donation_id}').get_json()
+
+
+def job(app, donation_id):
+    with app.app_context():
+        return db.session.scalars(db.select(PaymentJob).filter_by(donation_id=donation_id)).one()
+
+
+def test_donations_settle_in_the_background(app, client, gateway):
+    charge = gateway((True, 'ref-1'))
+    donation_id = donate(client)
+
+    assert run_due_jobs(app) == 1
+
+    assert donation(client, donation_id)['payment_status'] == 'settled'
+    assert donation(client, donation_id)['payment_reference'] == 'ref-1'
+    assert (charge.charges[0].amount_minor, charge.charges[0].currency) == (15050, 'KES')
+    assert job(app, donation_id).status == 'done'
+    assert run_due_jobs(app) == 0
+
+
+def test_declined_charges_fail_the_donation(app, client, gateway):
+    gateway(Declined('Insufficient funds'))
+    donation_id = donate(client)
+
+    run_due_jobs(app)
+
+    assert donation(client, donation_id)['payment_status'] == 'failed'
+    assert job(app, donation_id).error == 'Insufficient funds'
+
+
+def test_gateway_errors_are_retried_with_the_same_key(app, client, gateway):
+    app.config['PAYMENT_RETRY_BACKOFF'] = 0
+    charge = gateway(GatewayError('Try again'), (True, 'ref-1'))
+    donation_id = donate(client)
+
+    run_due_jobs(app)
+    assert donation(client, donation_id)['payment_status'] == 'pending'
+    assert (job(app, donation_id).status, job(app, donation_id).attempts) == ('pending', 1)
+    run_due_jobs(app)
+
+    assert donation(client, donation_id)['payment_status'] == 'settled'
+    first, second = charge.charges
+    assert first.idempotency_key == second.idempotency_key
+
+
+def test_retries_back_off(app, client, gateway):
+    gateway(GatewayError('Try again'))
+    donation_id = donate(client)
+
+    run_due_jobs(app)
+
+    assert job(app, donation_id).next_attempt_at > datetime.utcnow()
+    assert run_due_jobs(app) == 0
+
+
+def test_donations_fail_after_the_last_attempt(app, client, gateway):
+    app.config['PAYMENT_MAX_ATTEMPTS'] = 1
+    gateway(GatewayError('Gateway down'))
+    donation_id = donate(client)
+
+    run_due_jobs(app)
+
+    assert donation(client, donation_id)['payment_status'] == 'failed'
+    assert job(app, donation_id).status == 'failed'
+
+
+def test_stale_running_jobs_are_taken_over(app, client, gateway):
+    gateway((True, 'ref-1'))
+    donation_id = donate(client)
+    with app.app_context():
+        db.session.execute(update(PaymentJob).values(status='running', updated_at=datetime.utcnow() - timedelta(seconds=5)))
+        db.session.commit()
+    assert run_due_jobs(app) == 0
+
+    with app.app_context():
+        db.session.execute(update(PaymentJob).values(updated_at=datetime.utcnow() - STALE_AFTER * 2))
+        db.session.commit()
+
+    assert run_due_jobs(app) == 1
+    assert donation(client, donation_id)['payment_status'] == 'settled'
+
+
+def callback(client, donation_id, status='succeeded', secret='mock-secret'):
+    body = json.dumps({'merchant_reference': f'donation-{donation_id}', 'reference': 'ref-1', 'status': status}).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return client.post('/payments/callback/mock', data=body, headers={'X-Mock-Signature': signature})
+
+
+def test_submitted_charges_settle_on_the_callback(app, client, gateway):
+    gateway((False, 'ref-1'))
+    donation_id = donate(client)
+    run_due_jobs(app)
+    assert job(app, donation_id).status == 'submitted'
+    assert donation(client, donation_id)['payment_reference'] == 'ref-1'
+
+    response = callback(client, donation_id)
+
+    assert response.status_code == 200
+    assert donation(client, donation_id)['payment_status'] == 'settled'
+    assert job(app, donation_id).status == 'done'
+    # Redelivered or late callbacks change nothing
+    assert callback(client, donation_id, status='failed').get_json()['message'] == 'Payment was already settled'
+    assert donation(client, donation_id)['payment_status'] == 'settled'
+
+
+def test_bad_callbacks_are_refused(client, gateway):
+    gateway((False, 'ref-1'))
+    donation_id = donate(client)
+
+    assert callback(client, donation_id, secret='forged').status_code == 400
+    assert callback(client, donation_id + 1).status_code == 404
+    assert client.post('/payments/callback/stripe', data=b'{}').status_code == 404
+
+
+def test_charged_fields_are_fixed_once_charging(client):
+    donation_id = donate(client)
+
+    assert client.put(f'/donations/{donation_id}', json={'amount': 10}).status_code == 409
+    assert client.put(f'/donations/{donation_id}', json={'payment_method': 'PAYPAL'}).status_code == 409
+    assert client.put(f'/donations/{donation_id}', json={'name': 'Jane'}).status_code == 200
+    assert donation(client, donation_id)['amount'] == 150.5
+
+
+def test_donations_are_deleted_only_once_settled(app, client, gateway):
+    gateway((True, 'ref-1'))
+    donation_id = donate(client)
+
+    assert client.delete(f'/donations/{donation_id}').status_code == 409
+    run_due_jobs(app)
+
+    assert client.delete(f'/donations/{donation_id}').status_code == 200
+    with app.app_context():
+        assert db.session.get(Donation, donation_id) is None
+        assert db.session.scalars(db.select(PaymentJob)).all() == []
+
+
+def test_methods_without_a_gateway_are_refused(make_app):
+    app = make_app(PAYMENT_MOCK_ENABLED='0', PAYMENT_GATEWAYS='MPESA=mock', PAYMENT_WORKERS='1')
+    client = app.test_client()
+
+    assert client.post('/donations', json=DONATION).status_code == 503
+    assert client.get('/donations').get_json() == []
+    app.config['TESTING'] = False  # which would enable the mock
+    with pytest.raises(ValueError, match='PAYMENT_MOCK_ENABLED'):
+        app.extensions['payment_dispatcher'].start()
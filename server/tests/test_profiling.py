@@ -0,0 +1,156 @@
+"""The sampling profiler, per-request profiles and request traces."""
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import add_user, login
+from profiling import CallProfile, Sampler, profiler
+
+
+@pytest.fixture
+def traces(tmp_path):
+    return tmp_path / 'traces.jsonl'
+
+
+@pytest.fixture
+def app(make_app, traces):
+    app = make_app(ADMIN_USER_IDS='1', TRACE_EXPORT=str(traces))
+    yield app
+    profiler.stop()
+    profiler.requests.clear()
+
+
+@pytest.fixture
+def admin(client, user_id):
+    login(client, user_id)
+    return client
+
+
+def exported(traces, count=1):
+    """The traces written so far, once there are count of them."""
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        lines = traces.read_text().splitlines() if traces.exists() else []
+        if len(lines) >= count:
+            return [json.loads(line) for line in lines]
+        time.sleep(0.01)
+    return []
+
+
+def test_the_profiler_samples_until_stopped(admin):
+    assert admin.get('/admin/profiler').status_code == 404
+
+    assert admin.post('/admin/profiler', json={'seconds': 5, 'interval': 0.001}).status_code == 202
+    assert admin.post('/admin/profiler', json={}).status_code == 409
+    time.sleep(0.05)
+    response = admin.get('/admin/profiler')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert int(response.headers['X-Profile-Samples']) > 0
+    stack, count = response.get_data(as_text=True).splitlines()[0].rsplit(' ', 1)
+    assert int(count) > 0 and ';' in stack
+    assert admin.delete('/admin/profiler').get_json()['samples'] > 0
+    assert admin.delete('/admin/profiler').status_code == 404
+
+
+@pytest.mark.parametrize('body', [{'seconds': 0}, {'seconds': 601}, {'interval': 0.0001}, {'seconds': 'long'}])
+def test_bad_profiler_settings_are_refused(admin, body):
+    assert admin.post('/admin/profiler', json=body).status_code == 400
+
+
+def test_the_profiler_is_for_admins_only(app, client, user_id):
+    assert client.post('/admin/profiler', json={}).status_code == 401
+    with app.app_context():
+        login(client, add_user('john@example.com', username='john'))
+    assert client.post('/admin/profiler', json={}).status_code == 403
+    assert client.get('/admin/profiler/requests/abc').status_code == 403
+
+
+def test_admins_profile_single_requests(admin):
+    response = admin.get('/categories', headers={'X-Profile': '1'})
+    profile_id = response.headers['X-Profile-Id']
+    assert profile_id == response.headers['X-Request-Id']
+
+    profile = admin.get(f'/admin/profiler/requests/{profile_id}')
+
+    assert profile.headers['X-Profile-Unit'] == 'microseconds'
+    lines = profile.get_data(as_text=True).splitlines()
+    assert lines and all(line.startswith('request;') for line in lines)
+    assert any('get_categories' in line for line in lines)
+    assert admin.get('/admin/profiler/requests/unknown').status_code == 404
+
+
+def test_admins_trace_requests(admin, traces):
+    response = admin.get('/categories', headers={'X-Trace': '1'})
+
+    trace, = exported(traces)
+    assert trace['trace_id'] == response.headers['X-Request-Id']
+    assert (trace['method'], trace['path'], trace['status']) == ('GET', '/categories', 200)
+    names = {span['name'] for span in trace['spans']}
+    assert {'db', 'serialize'} <= names
+    assert any('FROM category' in span.get('statement', '') for span in trace['spans'])
+    assert 'X-Profile-Id' not in response.headers
+
+
+def test_the_headers_do_nothing_for_other_callers(client, traces):
+    response = client.get('/categories', headers={'X-Trace': '1', 'X-Profile': '1'})
+
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
+    time.sleep(0.05)
+    assert not traces.exists()
+
+
+def test_a_share_of_all_requests_is_traced(make_app, traces):
+    client = make_app(TRACE_SAMPLE='1', TRACE_EXPORT=str(traces)).test_client()
+
+    client.get('/categories')
+    client.get('/employments')
+
+    assert [trace['path'] for trace in exported(traces, 2)] == ['/categories', '/employments']
+
+
+def test_profiling_can_be_switched_off(make_app, traces):
+    app = make_app(PROFILING_ENABLED='0', ADMIN_USER_IDS='1', TRACE_EXPORT=str(traces))
+    client = app.test_client()
+    with app.app_context():
+        login(client, add_user())
+
+    assert 'X-Profile-Id' not in client.get('/categories', headers={'X-Profile': '1'}).headers
+    assert 'trace_exporter' not in app.extensions
+
+
+def test_samplers_can_follow_one_thread():
+    done = threading.Event()
+    worker = threading.Thread(target=done.wait, name='waiter')
+    worker.start()
+    sampler = Sampler(0.001, thread_id=worker.ident, seconds=5)
+    sampler.start()
+    time.sleep(0.05)
+    sampler.stop()
+    done.set()
+    worker.join()
+
+    assert sampler.samples > 0
+    assert all(stack.startswith('waiter;') for stack in sampler.stacks)
+
+
+def test_call_profiles_weigh_nested_calls():
+    def inner():
+        time.sleep(0.01)
+
+    def outer():
+        inner()
+
+    profile = CallProfile()
+    profile.start()
+    outer()
+    profile.stop()
+
+    folded = dict(line.rsplit(' ', 1) for line in profile.folded().splitlines())
+    slept, = [stack for stack in folded if stack.endswith(';sleep')]
+    assert 'outer' in slept.split(';')[1] and 'inner' in slept.split(';')[2]
+    assert int(folded[slept]) >= 10000
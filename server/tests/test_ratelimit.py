@@ -0,0 +1,111 @@
+"""Token bucket rate limiting and load shedding."""
+import time
+
+import pytest
+
+from conftest import login
+from ratelimit import LoadShedder, MemoryBucketStore, SQLiteBucketStore
+
+
+@pytest.fixture
+def limited(make_app):
+    return make_app(RATELIMIT_ENABLED='1').test_client()
+
+
+def test_listings_drain_the_bucket_until_429(limited):
+    # A listing costs 10 of the 50 token burst
+    statuses = [limited.get('/categories').status_code for _ in range(6)]
+
+    assert statuses == [200] * 5 + [429]
+
+
+def test_429_tells_when_to_come_back(limited):
+    for _ in range(5):
+        limited.get('/categories')
+
+    response = limited.get('/categories')
+
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_remaining_tokens_are_reported(limited):
+    response = limited.get('/is_logged_in')
+
+    assert response.headers['X-RateLimit-Limit'] == '50'
+    assert int(response.headers['X-RateLimit-Remaining']) == 49
+
+
+def test_callers_have_buckets_of_their_own(limited, app, user_id):
+    for _ in range(5):
+        limited.get('/categories')
+    assert limited.get('/categories').status_code == 429
+
+    login(limited, user_id)
+
+    assert limited.get('/categories').status_code == 200
+
+
+def test_disabled_limiter_never_refuses(client):
+    statuses = {client.get('/categories').status_code for _ in range(10)}
+
+    assert statuses == {200}
+    assert 'X-RateLimit-Remaining' not in client.get('/categories').headers
+
+
+def test_buckets_refill_at_the_rate():
+    store = MemoryBucketStore()
+    assert store.take('ip:1', 10, rate=1000.0, capacity=10)[0]
+    assert not store.take('ip:1', 10, rate=1000.0, capacity=10)[0]
+
+    time.sleep(0.02)
+
+    assert store.take('ip:1', 10, rate=1000.0, capacity=10)[0]
+
+
+def test_memory_store_forgets_the_least_recently_used():
+    store = MemoryBucketStore(max_keys=1)
+    store.take('ip:1', 10, rate=0.001, capacity=10)
+    store.take('ip:2', 10, rate=0.001, capacity=10)
+
+    # ip:1 was evicted, so it starts over with a full bucket
+    assert store.take('ip:1', 10, rate=0.001, capacity=10)[0]
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+
+    assert first.take('ip:1', 10, rate=0.001, capacity=10)[0]
+    allowed, _, retry_after = second.take('ip:1', 10, rate=0.001, capacity=10)
+
+    assert not allowed
+    assert retry_after > 0
+
+
+def test_shedder_turns_away_requests_when_no_slot_frees_up():
+    shedder = LoadShedder(max_concurrency=1, max_wait=0.01)
+    assert shedder.admit()
+
+    assert not shedder.admit()
+
+    shedder.release()
+    assert shedder.admit()
+
+
+def test_shedder_drops_requests_that_queued_too_long_while_overloaded():
+    shedder = LoadShedder(max_concurrency=4, target=0.05, interval=0.0)
+
+    assert not shedder.admit(upstream_delay=0.5)
+    assert shedder.admit(upstream_delay=0.0)
+
+
+def test_requests_that_queued_upstream_are_shed(make_app):
+    app = make_app(RATELIMIT_ENABLED='1')
+    app.extensions['load_shedder'].interval = 0.0
+    started = f't={time.time() - 2:.3f}'
+
+    response = app.test_client().get('/is_logged_in', headers={'X-Request-Start': started})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,175 @@
+"""Reviewers' work queue (/review/...) and how funding applications enter it."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from conftest import add_user, add_funding, add_funding_application, login
+from models import db, ApplicationStatus, FundingApplication
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(REVIEWER_USER_IDS='1,2')
+
+
+@pytest.fixture
+def queue(app, user_id, category_id):
+    """Three open applications, in queue order, and a second reviewer."""
+    with app.app_context():
+        funding_id = add_funding(category_id)
+        ids = [add_funding_application(user_id, funding_id) for _ in range(3)]
+        add_user('john@example.com', username='john')
+    return ids
+
+
+@pytest.fixture
+def reviewer(app, client, user_id):
+    login(client, user_id)
+    return client
+
+
+@pytest.fixture
+def other(app):
+    client = app.test_client()
+    login(client, 2)
+    return client
+
+
+def lease(client):
+    response = client.post('/review/next')
+    return response.get_json()['funding_application']['id'] if response.status_code == 200 else response.status_code
+
+
+def move(client, ids, status, **body):
+    response = client.post('/review/transitions', json={'ids': ids, 'status': status, **body})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def status(app, application_id):
+    with app.app_context():
+        return db.session.get(FundingApplication, application_id).status
+
+
+def test_reviewers_lease_applications_in_turn(queue, reviewer, other):
+    assert [lease(reviewer), lease(other), lease(reviewer)] == queue
+    assert lease(other) == 204
+
+
+def test_expired_leases_come_up_again(app, queue, reviewer, other):
+    first = lease(reviewer)
+    with app.app_context():
+        db.session.execute(update(FundingApplication).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+
+    assert lease(other) == first
+    assert reviewer.post(f'/review/{first}/lease').status_code == 409
+
+
+def test_leases_are_renewed_and_released_by_their_holder(queue, reviewer, other):
+    first = lease(reviewer)
+
+    assert reviewer.post(f'/review/{first}/lease').status_code == 200
+    assert other.post(f'/review/{first}/lease').status_code == 409
+    assert other.delete(f'/review/{first}/lease').status_code == 409
+    assert reviewer.delete(f'/review/{first}/lease').status_code == 200
+    assert lease(other) == first
+
+
+def test_leasing_leaves_the_version_alone(client, queue, reviewer):
+    etag = client.get(f'/funding_applications/{queue[0]}').headers['ETag']
+
+    lease(reviewer)
+
+    assert client.get(f'/funding_applications/{queue[0]}').headers['ETag'] == etag
+
+
+def test_transitions_move_what_they_may(app, queue, reviewer, other):
+    held = lease(other)
+
+    result = move(reviewer, queue + [999], 'APPROVED', note='Looks good')
+
+    assert result == {'status': 'Approved', 'moved': queue[1:], 'skipped': [held, 999]}
+    assert status(app, queue[1]) == ApplicationStatus.APPROVED
+    assert status(app, held) == ApplicationStatus.APPLIED
+    # Decided applications stay decided
+    assert move(reviewer, queue[1:], 'DENIED')['moved'] == []
+
+
+def test_in_review_keeps_the_lease(app, queue, reviewer, other):
+    first = lease(reviewer)
+
+    assert move(reviewer, [first], 'IN_REVIEW')['moved'] == [first]
+    assert move(other, [first], 'APPROVED')['moved'] == []
+    assert move(reviewer, [first], 'APPROVED')['moved'] == [first]
+    assert lease(other) == queue[1]
+
+
+def test_every_step_is_audited(queue, reviewer):
+    first = lease(reviewer)
+    move(reviewer, [first], 'DENIED', note='Incomplete')
+
+    events = reviewer.get(f'/review/{first}/events').get_json()['events']
+
+    assert [(event['action'], event['from_status'], event['to_status']) for event in events] == [
+        ('lease', 'Applied', 'Applied'), ('transition', 'Applied', 'Denied')]
+    assert events[1]['note'] == 'Incomplete'
+    assert events[1]['reviewer_id'] == 1
+
+
+@pytest.mark.parametrize('body', [{'ids': [], 'status': 'APPROVED'}, {'ids': [1], 'status': 'Maybe'},
+                                  {'ids': ['one'], 'status': 'APPROVED'}, {'status': 'APPROVED'}, None])
+def test_bad_transitions_are_refused(reviewer, body):
+    response = reviewer.post('/review/transitions', json=body)
+
+    assert response.status_code == 400
+
+
+def test_the_queue_is_for_reviewers_only(app, client, queue):
+    assert client.post('/review/next').status_code == 401
+    with app.app_context():
+        applicant = add_user('amy@example.com', username='amy')
+    login(client, applicant)
+
+    assert client.post('/review/next').status_code == 403
+    assert client.post('/review/transitions', json={'ids': queue, 'status': 'APPROVED'}).status_code == 403
+    assert client.get(f'/review/{queue[0]}/events').status_code == 403
+
+
+@pytest.fixture
+def applicant(app, client, user_id, category_id):
+    with app.app_context():
+        funding_id = add_funding(category_id)
+    login(client, user_id)
+    with client.session_transaction() as session:
+        session[f'funding_id_{user_id}'] = funding_id
+    return {'user_id': user_id, 'funding_id': funding_id, 'application_type': 'BUSINESS', 'reason_for_aid': 'A harvest'}
+
+
+@pytest.mark.parametrize('sent', [None, 'APPLIED', 'Applied'])
+def test_applications_are_created_as_applied(app, client, applicant, sent):
+    body = dict(applicant, status=sent) if sent else applicant
+
+    response = client.post('/funding_applications', json=body)
+
+    assert response.status_code == 201
+    assert status(app, response.get_json()['funding_application_id']) == ApplicationStatus.APPLIED
+
+
+@pytest.mark.parametrize('sent', ['APPROVED', 'Denied', 'IN_REVIEW'])
+def test_applicants_cannot_skip_the_queue(app, client, applicant, sent):
+    response = client.post('/funding_applications', json=dict(applicant, status=sent))
+
+    assert response.status_code == 400
+    assert 'status' in response.get_json()['errors']
+    assert client.get('/funding_applications').get_json() == []
+
+
+def test_status_is_not_updated_directly(app, client, applicant):
+    application_id = client.post('/funding_applications', json=applicant).get_json()['funding_application_id']
+
+    response = client.put(f'/funding_applications/{application_id}', json={'status': 'APPROVED'})
+
+    assert response.status_code == 400
+    assert status(app, application_id) == ApplicationStatus.APPLIED
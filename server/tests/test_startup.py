@@ -0,0 +1,52 @@
+"""Building the app: no import time work, no threads, no migration tooling."""
+import os
+import subprocess
+import sys
+import threading
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_create_app_loads_no_optional_tooling(tmp_path):
+    script = (
+        'import sys, app; app.create_app(); '
+        "print(sorted(name for name in ('alembic', 'flask_migrate', 'requests', 'faker') if name in sys.modules), file=sys.stderr)"
+    )
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'test.db'}", LOG_ACCESS='0')
+
+    result = subprocess.run([sys.executable, '-c', script], cwd=SERVER, env=env, capture_output=True, text=True, check=True)
+
+    assert result.stderr.strip() == '[]'
+
+
+def test_create_app_starts_no_threads(make_app):
+    make_app()  # the first app of the process starts the log writer, which every process needs
+    before = {thread.name for thread in threading.enumerate()}
+
+    app = make_app(WEBHOOK_ENDPOINTS='https://partner.example/hook', ARCHIVE_INTERVAL='3600', PAYMENT_WORKERS='1')
+
+    assert {thread.name for thread in threading.enumerate()} - before == set()
+    names = {type(worker).__name__ for worker in app.extensions['workers']}
+    assert {'RevocationList', 'DeletionWorker', 'WebhookDispatcher', 'Archiver', 'PaymentDispatcher'} <= names
+
+
+def test_start_workers_starts_what_was_registered(app):
+    from app import start_workers
+
+    started = []
+
+    class Worker:
+        def start(self):
+            started.append(self)
+
+    app.extensions['workers'] = [Worker(), Worker()]
+
+    assert start_workers(app) is app
+    assert len(started) == 2
+
+
+def test_flask_db_is_loaded_on_demand(app):
+    result = app.test_cli_runner().invoke(args=['db', '--help'])
+
+    assert result.exit_code == 0
+    assert 'upgrade' in result.output
@@ -0,0 +1,62 @@
+"""Text in side tables and interned employment locations."""
+from sqlalchemy import func, select
+
+import models
+from conftest import employment
+from models import db, intern_location, location_name, Employment, EmploymentText, Location
+
+
+def test_text_lives_in_the_side_table(app, client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id, requirements='A licence')).get_json()['employment_id']
+
+    row = client.get(f'/employments/{employment_id}').get_json()
+
+    assert (row['description'], row['requirements']) == ('Drive the tractor', 'A licence')
+    with app.app_context():
+        side = db.session.execute(select(EmploymentText).where(EmploymentText.employment_id == employment_id)).scalar_one()
+        assert side.requirements == 'A licence'
+        assert 'description' not in Employment.__table__.c
+
+
+def test_text_updates_through_the_api(client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+
+    client.put(f'/employments/{employment_id}', json={'requirements': 'Own boots'})
+
+    assert client.get(f'/employments/{employment_id}').get_json()['requirements'] == 'Own boots'
+
+
+def test_editing_only_text_bumps_the_owner_version(app, client, user_id, category_id):
+    employment_id = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    etag = client.get(f'/employments/{employment_id}').headers['ETag']
+
+    with app.app_context():
+        posting = db.session.get(Employment, employment_id)
+        posting.description = 'Drive the combine'
+        db.session.commit()
+
+    assert client.get(f'/employments/{employment_id}', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_postings_share_one_location_row(app, client, user_id, category_id):
+    first = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+    second = client.post('/employments', json=employment(user_id, category_id)).get_json()['employment_id']
+
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(Location)) == 1
+        assert db.session.get(Employment, first).location_id == db.session.get(Employment, second).location_id
+        assert db.session.scalars(select(Employment.id).where(Employment.location == 'Nakuru')).all() == [first, second]
+
+
+def test_rolled_back_locations_are_not_cached(app):
+    with app.app_context():
+        location_id = intern_location('Kisumu')
+        assert location_name(location_id) == 'Kisumu'
+        db.session.rollback()
+
+        assert 'Kisumu' not in models._location_ids
+        location_id = intern_location('Kisumu')
+        db.session.commit()
+
+        assert models._location_names[location_id] == 'Kisumu'
+        assert db.session.scalar(select(Location.name).where(Location.id == location_id)) == 'Kisumu'
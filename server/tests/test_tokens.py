@@ -0,0 +1,92 @@
+"""Bearer access tokens, refresh rotation and revocation."""
+import pytest
+
+from conftest import add_user
+
+
+@pytest.fixture
+def tokens(app, client, user_id):
+    response = client.post('/token', json={'email': 'jane@example.com', 'password': 'secret'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def bearer(tokens):
+    return {'Authorization': f"Bearer {tokens['access_token']}"}
+
+
+def test_password_grant_issues_a_working_pair(client, user_id, tokens):
+    assert tokens['token_type'] == 'Bearer'
+    assert client.get(f'/users/{user_id}', headers=bearer(tokens)).status_code == 200
+
+
+def test_wrong_password_gets_no_tokens(client, user_id):
+    response = client.post('/token', json={'email': 'jane@example.com', 'password': 'guess'})
+
+    assert response.status_code == 401
+    assert 'access_token' not in response.get_json()
+
+
+def test_unsupported_grant_is_refused(client):
+    assert client.post('/token', json={'grant_type': 'implicit'}).status_code == 400
+
+
+def test_forged_and_missing_tokens_are_unauthorized(client, user_id, tokens):
+    forged = tokens['access_token'][:-2] + ('AA' if not tokens['access_token'].endswith('AA') else 'BB')
+
+    assert client.get(f'/users/{user_id}', headers={'Authorization': f'Bearer {forged}'}).status_code == 401
+    assert client.get(f'/users/{user_id}').status_code == 401
+
+
+def test_refresh_rotates_the_pair(client, user_id, tokens):
+    response = client.post('/token', json={'grant_type': 'refresh_token', 'refresh_token': tokens['refresh_token']})
+
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert rotated['refresh_token'] != tokens['refresh_token']
+    assert client.get(f'/users/{user_id}', headers=bearer(rotated)).status_code == 200
+
+
+def test_reused_refresh_token_revokes_the_whole_login(client, user_id, tokens):
+    rotated = client.post('/token', json={'grant_type': 'refresh_token', 'refresh_token': tokens['refresh_token']}).get_json()
+
+    reused = client.post('/token', json={'grant_type': 'refresh_token', 'refresh_token': tokens['refresh_token']})
+
+    assert reused.status_code == 401
+    assert client.get(f'/users/{user_id}', headers=bearer(rotated)).status_code == 401
+    assert client.post('/token', json={'grant_type': 'refresh_token', 'refresh_token': rotated['refresh_token']}).status_code == 401
+
+
+def test_logout_revokes_the_access_token(client, user_id, tokens):
+    assert client.post('/logout', headers=bearer(tokens)).status_code == 200
+
+    assert client.get(f'/users/{user_id}', headers=bearer(tokens)).status_code == 401
+
+
+def test_revocations_reach_other_workers_on_sync(make_app, tokens, user_id, client):
+    client.post('/logout', headers=bearer(tokens))
+    other = make_app()
+
+    with other.app_context():
+        other.extensions['token_revocations'].sync()
+    assert other.test_client().get(f'/users/{user_id}', headers=bearer(tokens)).status_code == 401
+
+
+def test_tokens_are_only_valid_under_the_key_that_signed_them(make_app, tokens, user_id):
+    other = make_app(SECRET_KEY='another-secret')
+
+    assert other.test_client().get(f'/users/{user_id}', headers=bearer(tokens)).status_code == 401
+
+
+def test_no_tokens_without_a_secret_key(make_app):
+    app = make_app(SECRET_KEY=None)
+    app.config['TESTING'] = False
+    with app.app_context():
+        add_user()
+    client = app.test_client()
+
+    assert client.post('/token', json={'email': 'jane@example.com', 'password': 'secret'}).status_code == 503
+    response = client.post('/login', json={'email': 'jane@example.com', 'password': 'secret', 'issue_tokens': True})
+    assert response.status_code == 503
+    # Sessions still work, signed with a key of this process
+    assert client.post('/login', json={'email': 'jane@example.com', 'password': 'secret'}).status_code == 200
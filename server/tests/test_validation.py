@@ -0,0 +1,118 @@
+"""Request body schemas, and the amounts they let through to parse_money."""
+import pytest
+
+from conftest import employment
+from models import PaymentMethod
+from money import MAX_MINOR
+from validation import Schema, String, Integer, Amount, Enum, List, ValidationError
+
+
+def donation(amount=10, **fields):
+    body = {'donation_type': 'INDIVIDUAL', 'amount': amount, 'payment_method': 'MPESA'}
+    body.update(fields)
+    return body
+
+
+def test_bad_bodies_list_every_bad_field(client):
+    response = client.post('/donations', json={'amount': ['lots'], 'payment_method': 'Cash', 'user_id': True})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'message': 'Invalid request body!', 'errors': {
+        'user_id': 'must be an integer',
+        'donation_type': 'is required',
+        'amount': 'must be a number',
+        'payment_method': 'must be one of Credit Card, PayPal, MPESA',
+    }}
+
+
+@pytest.mark.parametrize('data', [b'not json', b'[1, 2]', b'null'])
+def test_bodies_must_be_json_objects(client, data):
+    response = client.post('/categories', data=data, content_type='application/json')
+
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {'body': 'must be a JSON object'}
+
+
+def test_invalid_bodies_do_not_claim_the_idempotency_key(client):
+    headers = {'Idempotency-Key': 'k1'}
+
+    assert client.post('/donations', json={'amount': 10}, headers=headers).status_code == 400
+    response = client.post('/donations', json=donation(), headers=headers)
+
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+
+
+def test_updates_may_leave_fields_out_but_not_null_them(client):
+    donation_id = client.post('/donations', json=donation()).get_json()['donation_id']
+
+    assert client.put(f'/donations/{donation_id}', json={'name': 'Jane'}).status_code == 200
+    response = client.put(f'/donations/{donation_id}', json={'donation_type': None})
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {'donation_type': 'must not be null'}
+
+
+@pytest.mark.parametrize('amount', [0, -5, '1e30', str(MAX_MINOR), '0.001'])
+def test_bad_donation_amounts_are_refused(client, amount):
+    response = client.post('/donations', json=donation(amount))
+
+    assert response.status_code == 400
+    assert client.get('/donations').get_json() == []
+
+
+@pytest.mark.parametrize('amount', [-1, 0, '1e30'])
+def test_bad_funding_amounts_and_salaries_are_refused(client, user_id, category_id, amount):
+    funding = {'category_id': category_id, 'grant_name': 'Seed', 'grant_type': 'BUSINESS', 'amount': amount}
+
+    assert client.post('/fundings', json=funding).status_code == 400
+    assert client.post('/employments', json=employment(user_id, category_id, salary_range=amount)).status_code == 400
+
+
+SCHEMA = Schema(
+    name=String(required=True, min_length=1, max_length=5),
+    count=Integer(min=1, max=3),
+    amount=Amount(),
+    method=Enum(PaymentMethod),
+    tags=List(String(), max_items=2),
+)
+
+
+def test_schemas_clean_what_they_declare():
+    cleaned = SCHEMA({'name': 'Jane', 'count': 2, 'amount': '1.50', 'method': 'PayPal', 'tags': ['a'], 'admin': True})
+
+    assert cleaned == {'name': 'Jane', 'count': 2, 'amount': '1.50', 'method': PaymentMethod.PAYPAL, 'tags': ['a']}
+    assert SCHEMA({'name': 'Jane', 'method': 'MPESA', 'count': None}) == {'name': 'Jane', 'method': PaymentMethod.MPESA,
+                                                                          'count': None}
+
+
+@pytest.mark.parametrize('field, value, message', [
+    ('name', '', 'must be 1 to 5 characters'),
+    ('name', 'Jane Doe', 'must be 1 to 5 characters'),
+    ('name', 5, 'must be a string'),
+    ('count', 4, 'must be between 1 and 3'),
+    ('count', True, 'must be an integer'),
+    ('count', 1.0, 'must be an integer'),
+    ('amount', float('nan'), 'must be a finite number'),
+    ('amount', [1], 'must be a number'),
+    ('amount', '1' * 33, 'must be a number'),
+    ('method', ['MPESA'], 'must be one of Credit Card, PayPal, MPESA'),
+    ('tags', ['a', 'b', 'c'], 'must hold 0 to 2 items'),
+    ('tags', ['a', 1], 'item 1 must be a string'),
+])
+def test_schemas_name_the_bad_field(field, value, message):
+    with pytest.raises(ValidationError) as raised:
+        SCHEMA(dict({'name': 'Jane'}, **{field: value}))
+
+    assert raised.value.errors == {field: message}
+
+
+def test_partial_schemas_require_nothing_and_refuse_unknown_fields():
+    update = SCHEMA.partial('name', 'count')
+
+    assert update({}) == {}
+    assert update({'amount': 1}) == {}
+    with pytest.raises(ValidationError) as raised:
+        update({'name': None})
+    assert raised.value.errors == {'name': 'must not be null'}
+    with pytest.raises(ValueError):
+        SCHEMA.partial('nickname')
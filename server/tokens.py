@@ -0,0 +1,265 @@
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, session, g, current_app
+from flask_restful import Resource
+from flask_login import UserMixin, current_user
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import select
+from werkzeug.security import check_password_hash
+from models import db, User, RefreshToken, RevokedToken
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_SALT = 'access-token'
+TOKENS_UNAVAILABLE = 'Access tokens are not available: SECRET_KEY is not set'
+
+
+class RevocationList:
+    """Revoked token families, mirrored from the revoked_token table.
+
+    Lookups are pure in-memory set membership on 16-byte ids. A background
+    thread pulls new rows by id every sync_interval seconds and forgets
+    entries once every access token of the family has expired anyway.
+    """
+
+    def __init__(self, app, sync_interval=5.0):
+        self.app = app
+        self.sync_interval = sync_interval
+        self._families = {}  # family id bytes -> expiry timestamp
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __contains__(self, family_id):
+        return bytes.fromhex(family_id) in self._families
+
+    def add(self, family_id, expires_at):
+        with self._lock:
+            self._families[bytes.fromhex(family_id)] = expires_at.timestamp()
+
+    def sync(self):
+        table = RevokedToken.__table__
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.family_id, table.c.expires_at)
+                .where(table.c.id > self._last_id, table.c.expires_at > datetime.utcnow())
+                .order_by(table.c.id)
+            ).all()
+        now = datetime.utcnow().timestamp()
+        with self._lock:
+            for row in rows:
+                self._families[bytes.fromhex(row.family_id)] = row.expires_at.timestamp()
+                self._last_id = row.id
+            for family, expires in list(self._families.items()):
+                if expires <= now:
+                    del self._families[family]
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='revocation-sync', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    self.sync()
+                except Exception:
+                    logger.exception('Revocation list sync failed')
+                if self._stop.wait(self.sync_interval):
+                    break
+
+
+class TokenUser(UserMixin):
+    # Stands in for current_user on bearer-token requests without loading the row
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt=ACCESS_TOKEN_SALT)
+
+def tokens_available():
+    # A key made up per process would sign tokens the other workers reject
+    return bool(current_app.extensions['token_key_configured'] or current_app.config.get('TESTING'))
+
+def _revocations():
+    return current_app.extensions['token_revocations']
+
+def _hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _access_ttl():
+    return current_app.config['ACCESS_TOKEN_TTL']
+
+def issue_tokens(user_id, family_id=None):
+    """Create an access/refresh pair; family_id is kept across rotations."""
+    family_id = family_id or uuid.uuid4().hex
+    refresh_token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(
+        token_hash=_hash(refresh_token),
+        user_id=user_id,
+        family_id=family_id,
+        expires_at=datetime.utcnow() + timedelta(seconds=current_app.config['REFRESH_TOKEN_TTL'])
+    ))
+    db.session.commit()
+    access_token = _serializer().dumps({'sub': user_id, 'fam': family_id})
+    return {
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+        'token_type': 'Bearer',
+        'expires_in': _access_ttl(),
+    }
+
+def revoke_family(family_id):
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=_access_ttl())
+    db.session.execute(
+        RefreshToken.__table__.update()
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    db.session.add(RevokedToken(family_id=family_id, expires_at=expires_at))
+    db.session.commit()
+    # Effective immediately in this worker, within sync_interval elsewhere
+    _revocations().add(family_id, expires_at)
+
+def revoke_refresh_token(refresh_token):
+    token = RefreshToken.query.filter_by(token_hash=_hash(refresh_token)).first()
+    if token:
+        revoke_family(token.family_id)
+
+def rotate_refresh_token(refresh_token):
+    """Swap a refresh token for a new pair, or return None if it is unusable."""
+    token = RefreshToken.query.filter_by(token_hash=_hash(refresh_token)).first()
+    if not token:
+        return None
+    if token.revoked_at is not None:
+        # A rotated token came back: someone holds a stolen copy, so the
+        # whole login is cut off.
+        logger.warning('Refresh token reuse detected for family %s', token.family_id)
+        revoke_family(token.family_id)
+        return None
+    if token.expires_at <= datetime.utcnow():
+        return None
+    # Conditional UPDATE so two concurrent refreshes cannot both win
+    rotated = db.session.execute(
+        RefreshToken.__table__.update()
+        .where(RefreshToken.id == token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    ).rowcount
+    if not rotated:
+        db.session.rollback()
+        return None
+    return issue_tokens(token.user_id, token.family_id)
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    if header[:7].lower() == 'bearer ':
+        return header[7:].strip()
+    return None
+
+def verify_access_token(token):
+    """Return the token claims, or None. Never touches the database."""
+    if not token:
+        return None
+    try:
+        claims = _serializer().loads(token, max_age=_access_ttl())
+    except (SignatureExpired, BadSignature):
+        return None
+    if claims.get('fam') in _revocations():
+        return None
+    return claims
+
+def current_token_claims():
+    if 'token_claims' not in g:
+        g.token_claims = verify_access_token(bearer_token())
+    return g.token_claims
+
+def caller_identity():
+    # Never loads the user: token claims and the Flask-Login session id are
+    # enough to tell callers apart.
+    claims = current_token_claims()
+    if claims:
+        return f"user:{claims['sub']}"
+    if session.get('_user_id'):
+        return f"user:{session['_user_id']}"
+    return f'ip:{request.remote_addr}'
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        claims = current_token_claims()
+        if claims is None:
+            return {'message': 'Missing, invalid or expired access token'}, 401
+        return f(*args, **kwargs)
+    return decorated
+
+
+class TokenResource(Resource):
+    def post(self):
+        if not tokens_available():
+            return {'message': TOKENS_UNAVAILABLE}, 503
+        data = request.get_json(silent=True) or {}
+        grant_type = data.get('grant_type', 'password')
+
+        if grant_type == 'refresh_token':
+            tokens = rotate_refresh_token(data.get('refresh_token') or '')
+            if not tokens:
+                return {'message': 'Invalid or expired refresh token'}, 401
+            return tokens, 200
+
+        if grant_type == 'session':
+            # Lets a cookie session obtained through /login pick up tokens
+            if not current_user.is_authenticated:
+                return {'message': 'Not logged in'}, 401
+            return issue_tokens(current_user.id), 200
+
+        if grant_type == 'password':
+            user = User.query.filter_by(email=data.get('email')).first()
+            if not user or not check_password_hash(user.password, data.get('password') or ''):
+                return {'message': 'Invalid email or password'}, 401
+            return issue_tokens(user.id), 200
+
+        return {'message': 'Unsupported grant_type'}, 400
+
+
+def init_tokens(app, login_manager):
+    app.config.setdefault('ACCESS_TOKEN_TTL', 15 * 60)
+    app.config.setdefault('REFRESH_TOKEN_TTL', 30 * 24 * 3600)
+    app.config.setdefault('REVOCATION_SYNC_INTERVAL', 5.0)
+
+    # Tokens and sessions are signed with SECRET_KEY. Without one, sessions get
+    # a random key of this process and no tokens are issued, outside TESTING
+    app.extensions['token_key_configured'] = bool(app.secret_key)
+    if not app.secret_key:
+        logger.warning('SECRET_KEY is not set: sessions only last as long as this process and no access tokens are issued')
+        app.secret_key = os.urandom(32).hex()
+
+    revocations = RevocationList(app, app.config['REVOCATION_SYNC_INTERVAL'])
+    app.extensions['token_revocations'] = revocations
+
+    @login_manager.request_loader
+    def load_user_from_token(request):
+        # Only consulted when there is no session user; lets existing
+        # @login_required routes accept bearer tokens without a DB lookup.
+        with span('auth.token'):
+            claims = current_token_claims()
+        return TokenUser(claims['sub']) if claims else None
+
+    app.extensions.setdefault('workers', []).append(revocations)
+
+def initialize_token_routes(api):
+    api.add_resource(TokenResource, '/token')
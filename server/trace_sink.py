@@ -0,0 +1,36 @@
+"""Local stand-in for a trace collector.
+
+    python trace_sink.py --port 9411
+
+then start the API with TRACE_EXPORT=http://localhost:9411/ and
+TRACE_SAMPLE=1 (or send X-Trace: 1 as an admin) to watch traces arrive,
+one line per request with its slowest spans.
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        for trace in json.loads(body)['traces']:
+            spans = sorted(trace['spans'], key=lambda span: span['duration_ms'], reverse=True)[:3]
+            slowest = ', '.join(f"{span['name']} {span['duration_ms']} ms" for span in spans)
+            print(f"{trace['trace_id']} {trace['method']} {trace['path']} {trace['status']} "
+                  f"{trace['duration_ms']} ms, {len(trace['spans'])} spans; slowest: {slowest}")
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print traces sent by the API.')
+    parser.add_argument('--port', type=int, default=9411)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), SinkHandler)
+    print(f'Listening on http://127.0.0.1:{args.port}/')
+    server.serve_forever()
@@ -0,0 +1,172 @@
+"""Tracing spans for single requests.
+
+A traced request records how long its phases took:
+
+    with span('auth.load_user'):
+        ...
+
+and the database queries, JSON serialization and user loading are wrapped
+already (see profiling.init_profiling). When the request ends its trace is
+handed to the exporter thread, which appends it to a JSON lines file or
+posts batches of them to a collector (trace_sink.py stands in for one):
+
+    {"trace_id": "3f9c...", "method": "GET", "path": "/employments", "status": 200, "duration_ms": 41.2,
+     "spans": [{"name": "db", "start_ms": 2.1, "duration_ms": 30.5, "statement": "SELECT ..."}, ...]}
+
+The trace id is the request id logs.py gives the request. The trace being
+recorded lives in a context variable, so a request that is not traced pays
+one lookup per span and per query and nothing else.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENT = 300  # characters of SQL kept per db span
+MAX_SPANS = 1000  # per trace; a request looping over queries stops recording after this
+
+_NO_SPAN = nullcontext()
+_current = ContextVar('trace', default=None)
+
+
+class Trace:
+    __slots__ = ('started', 'spans')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, started, ended, attributes):
+        if len(self.spans) < MAX_SPANS:
+            span = {'name': name, 'start_ms': round((started - self.started) * 1000, 3),
+                    'duration_ms': round((ended - started) * 1000, 3)}
+            span.update(attributes)
+            self.spans.append(span)
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'attributes', 'started')
+
+    def __init__(self, trace, name, attributes):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, self.started, time.perf_counter(), self.attributes)
+        return False
+
+
+current_trace = _current.get
+
+def start_trace():
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+def end_trace():
+    """The trace being recorded, if any, which stops being recorded."""
+    trace = _current.get()
+    if trace is not None:
+        _current.set(None)
+    return trace
+
+def span(name, **attributes):
+    """Time a block as a span of the current request's trace, if it is traced."""
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, attributes)
+
+
+# Database queries
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info['trace_started'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is not None:
+        started = conn.info.pop('trace_started', None)
+        if started is not None:
+            trace.add('db', started, time.perf_counter(), {'statement': statement[:MAX_STATEMENT]})
+
+def trace_queries(engine):
+    from sqlalchemy import event
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+# Export
+
+class TraceExporter:
+    """Ships finished traces from a daemon thread, in batches; drops them when it falls behind."""
+
+    def __init__(self, batch_size=100, queue_size=10000):
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+            self._thread.start()
+
+    def submit(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception('Exporting %d traces failed', len(batch))
+
+    def write(self, batch):
+        raise NotImplementedError
+
+class FileExporter(TraceExporter):
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def write(self, batch):
+        with open(self.path, 'a') as output:
+            output.writelines(json.dumps(trace, default=str) + '\n' for trace in batch)
+
+class HttpExporter(TraceExporter):
+    def __init__(self, url, timeout=5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = timeout
+
+    def write(self, batch):
+        import requests
+        requests.post(self.url, json={'traces': batch}, timeout=self.timeout).raise_for_status()
+
+def exporter_for(target):
+    """An exporter for TRACE_EXPORT: an http(s) URL, or a file path."""
+    if target.startswith(('http://', 'https://')):
+        return HttpExporter(target)
+    return FileExporter(target)
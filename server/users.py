@@ -0,0 +1,101 @@
+"""User accounts."""
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from werkzeug.security import generate_password_hash
+from models import db, User
+from conditional import not_modified, with_validators, conditional_update, failed_update, with_etag
+from deletion import start_deletion, deletion_response
+from filters import FilterError, filter_ids
+from batch import register_loader
+from idempotency import idempotent
+from validation import Schema, String, URL_LENGTH, EMAIL, validated
+
+bp = Blueprint('users', __name__)
+
+def serialize_user(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'profile_picture': user.profile_picture
+    }
+
+COMPACT_COLUMNS = (User.id, User.username, User.first_name, User.last_name)
+
+def compact_user(user):
+    # Embedded in other listings; no contact details
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }
+
+USER = Schema(
+    username=String(required=True, min_length=1),
+    email=String(required=True, pattern=EMAIL),
+    password=String(required=True, min_length=1, max_length=1024),
+    first_name=String(),
+    last_name=String(),
+    profile_picture=String(max_length=URL_LENGTH),
+)
+USER_UPDATE = USER.partial()
+
+@bp.route('/users', methods=['POST'])
+@validated(USER)
+@idempotent
+def create_user(data):
+    new_user = User(
+        username=data['username'],
+        email=data['email'],
+        password=generate_password_hash(data['password']),
+        first_name=data.get('first_name'),
+        last_name=data.get('last_name'),
+        profile_picture=data.get('profile_picture')
+    )
+    db.session.add(new_user)
+    db.session.commit()
+    return jsonify({'message': 'User created successfully!', 'user_id': new_user.id}), 201
+
+@bp.route('/users', methods=['GET'])
+@login_required
+def get_users():
+    try:
+        users = filter_ids(User.query, User, request.args).all()
+    except FilterError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify([serialize_user(user) for user in users]), 200
+
+@bp.route('/users/<int:user_id>', methods=['GET'])
+@login_required
+def get_user(user_id):
+    user = User.query.get(user_id)
+    if user:
+        cached = not_modified(user)
+        if cached:
+            return cached
+        return with_validators(jsonify(serialize_user(user)), user), 200
+    return jsonify({'message': 'User not found!'}), 404
+
+register_loader('users.get_user', User, serialize_user, 'User not found!', login=True)
+
+@bp.route('/users/<int:user_id>', methods=['PUT'])
+@validated(USER_UPDATE)
+def update_user(user_id, data):
+    values = dict(data)
+    if 'password' in values:
+        values['password'] = generate_password_hash(values['password'])
+
+    etag = conditional_update(User, user_id, values)
+    if not etag:
+        return failed_update(User, user_id, 'User not found!')
+    return with_etag(jsonify({'message': 'User updated successfully!'}), etag), 200
+
+@bp.route('/users/<int:user_id>', methods=['DELETE'])
+def delete_user(user_id):
+    user = User.query.get(user_id)
+    if user:
+        return deletion_response(start_deletion('user', user_id), 'User deleted successfully!')
+    return jsonify({'message': 'User not found!'}), 404
@@ -0,0 +1,252 @@
+"""Request body validation, before any database work.
+
+Each create endpoint declares the shape of its body once, next to the
+handler:
+
+    DONATION = Schema(
+        donation_type=Enum(DonationType, required=True),
+        amount=Amount(required=True),
+        name=String(max_length=NAME_LENGTH),
+    )
+
+    @bp.route('/donations', methods=['POST'])
+    @validated(DONATION)
+    @idempotent
+    def create_donation(data):
+        ...
+
+A Schema compiles every field into one small check function when the
+module is imported, so validating a body is a loop over prebuilt checks
+with no per-request introspection. The handler receives the cleaned body:
+only declared fields, enums converted to their members (by value, or by
+name as the enum columns store them). A body that does not fit is answered
+with a 400 listing every bad field, before an Idempotency-Key is claimed
+or a transaction begun:
+
+    {"message": "Invalid request body!", "errors": {"amount": "is required", "payment_method": "must be one of ..."}}
+
+Schemas are plain callables on dicts, so bulk paths validate each item with
+the same schema, or take a List of them. Updates take a partial schema,
+where every field may be left out but the required ones may not be null:
+
+    DONATION_UPDATE = DONATION.partial('name', 'organisation_name', 'amount', 'currency')
+"""
+import math
+import re
+from functools import wraps
+
+from flask import request, jsonify
+
+# Lengths for columns the models leave unbounded
+NAME_LENGTH = 255
+URL_LENGTH = 2048
+TEXT_LENGTH = 20000
+
+EMAIL = r'[^@\s]+@[^@\s]+'
+
+_MISSING = object()
+
+
+class ValidationError(ValueError):
+    """A body that does not fit its schema; errors maps field -> message."""
+
+    def __init__(self, errors):
+        super().__init__('Invalid request body!')
+        self.errors = errors
+
+
+class Invalid(ValueError):
+    pass
+
+
+class Field:
+    """A declared field. compile() returns the check run on every value."""
+
+    def __init__(self, required=False):
+        self.required = required
+
+    def compile(self):
+        raise NotImplementedError
+
+class String(Field):
+    def __init__(self, required=False, max_length=NAME_LENGTH, min_length=0, pattern=None):
+        super().__init__(required)
+        self.max_length = max_length
+        self.min_length = min_length
+        self.pattern = pattern
+
+    def compile(self):
+        low, high = self.min_length, self.max_length
+        match = re.compile(self.pattern).fullmatch if self.pattern else None
+
+        def check(value):
+            if type(value) is not str:
+                raise Invalid('must be a string')
+            if not low <= len(value) <= high:
+                raise Invalid(f'must be {low} to {high} characters' if low else f'must be at most {high} characters')
+            if match is not None and match(value) is None:
+                raise Invalid('is not in the expected format')
+            return value
+        return check
+
+class Integer(Field):
+    def __init__(self, required=False, min=None, max=None):
+        super().__init__(required)
+        self.min = min
+        self.max = max
+
+    def compile(self):
+        low = -math.inf if self.min is None else self.min
+        high = math.inf if self.max is None else self.max
+        if self.min is not None and self.max is not None:
+            message = f'must be between {low} and {high}'
+        else:
+            message = f'must be at least {low}' if self.min is not None else f'must be at most {high}'
+
+        def check(value):
+            if type(value) is not int:  # bool is an int subclass; refuse it
+                raise Invalid('must be an integer')
+            if not low <= value <= high:
+                raise Invalid(message)
+            return value
+        return check
+
+class Amount(Field):
+    """A money amount in major units, as a JSON number or a decimal string.
+
+    Only the type is checked here: the currency decides how many decimals
+    are allowed and what fits in the minor unit column, and
+    money.parse_money enforces that and that the amount is positive.
+    """
+
+    def compile(self):
+        def check(value):
+            kind = type(value)
+            if kind is int:
+                return value
+            if kind is float:
+                if not math.isfinite(value):
+                    raise Invalid('must be a finite number')
+                return value
+            if kind is str and len(value) <= 32:
+                return value
+            raise Invalid('must be a number')
+        return check
+
+class Enum(Field):
+    def __init__(self, enum, required=False):
+        super().__init__(required)
+        self.enum = enum
+
+    def compile(self):
+        members = {member.name: member for member in self.enum}
+        members.update({member.value: member for member in self.enum})
+        message = f"must be one of {', '.join(member.value for member in self.enum)}"
+
+        def check(value):
+            try:
+                return members[value]
+            except (KeyError, TypeError):  # TypeError: unhashable, e.g. a list
+                raise Invalid(message)
+        return check
+
+class List(Field):
+    def __init__(self, item, required=False, min_items=0, max_items=None):
+        super().__init__(required)
+        self.item = item
+        self.min_items = min_items
+        self.max_items = max_items
+
+    def compile(self):
+        item = self.item.compile()
+        low = self.min_items
+        high = math.inf if self.max_items is None else self.max_items
+
+        def check(value):
+            if type(value) is not list:
+                raise Invalid('must be a list')
+            if not low <= len(value) <= high:
+                raise Invalid(f'must hold {low} to {self.max_items} items' if self.max_items is not None
+                              else f'must hold at least {low} items')
+            cleaned = []
+            for index, entry in enumerate(value):
+                try:
+                    cleaned.append(item(entry))
+                except Invalid as e:
+                    raise Invalid(f'item {index} {e}')
+                except ValidationError as e:
+                    raise Invalid(f'item {index}: ' + '; '.join(f'{name} {message}' for name, message in e.errors.items()))
+            return cleaned
+        return check
+
+
+class Schema(Field):
+    """The fields of a JSON object body, compiled once."""
+
+    def __init__(self, required=False, **fields):
+        super().__init__(required)
+        self.fields = fields
+        # name, required, nullable, check
+        self._checks = tuple((name, field.required, not field.required, field.compile()) for name, field in fields.items())
+
+    def partial(self, *names):
+        """The named fields (all when none are named), none required; for updates."""
+        unknown = set(names) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Not in the schema: {', '.join(sorted(unknown))}")
+        partial = Schema.__new__(Schema)
+        partial.required = False
+        partial.fields = {name: field for name, field in self.fields.items() if not names or name in names}
+        partial._checks = tuple((name, False, nullable, check) for name, _, nullable, check in self._checks
+                                if name in partial.fields)
+        return partial
+
+    def compile(self):
+        return self.validate
+
+    def validate(self, data):
+        """The cleaned body; raises ValidationError listing every bad field."""
+        if type(data) is not dict:
+            raise ValidationError({'body': 'must be a JSON object'})
+        cleaned = {}
+        errors = None
+        for name, required, nullable, check in self._checks:
+            value = data.get(name, _MISSING)
+            if value is _MISSING or value is None:
+                if required:
+                    errors = errors or {}
+                    errors[name] = 'is required'
+                elif value is None:
+                    if nullable:
+                        cleaned[name] = None
+                    else:
+                        errors = errors or {}
+                        errors[name] = 'must not be null'
+                continue
+            try:
+                cleaned[name] = check(value)
+            except Invalid as e:
+                errors = errors or {}
+                errors[name] = str(e)
+        if errors:
+            raise ValidationError(errors)
+        return cleaned
+
+    __call__ = validate
+
+
+def invalid(error):
+    return jsonify({'message': str(error), 'errors': error.errors}), 400
+
+def validated(schema):
+    """Validate the JSON body against schema and pass it to the view as data."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                data = schema.validate(request.get_json(silent=True))
+            except ValidationError as e:
+                return invalid(e)
+            return f(*args, data=data, **kwargs)
+        return decorated
+    return decorator
@@ -0,0 +1,57 @@
+"""Local stand-in for a partner webhook endpoint.
+
+    python webhook_sink.py --port 9000 --fail-rate 0.3
+
+then start the API with WEBHOOK_ENDPOINTS=http://localhost:9000/ to watch
+batches arrive. --fail-rate makes a share of deliveries answer 500 so the
+dispatcher's retries can be observed.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(fail_rate, secret):
+    class SinkHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            if secret:
+                expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(expected, self.headers.get('X-Webhook-Signature', '')):
+                    print('Rejected batch with a bad signature')
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+
+            if random.random() < fail_rate:
+                print('Simulating a failure')
+                self.send_response(500)
+                self.end_headers()
+                return
+
+            batch = json.loads(body)
+            for change in batch['changes']:
+                print(f"#{change['seq']} {change['operation']} {change['table']}/{change['id']} {change['changes']}")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return SinkHandler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print webhook batches sent by the API.')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--secret', default=None)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.fail_rate, args.secret))
+    print(f'Listening on http://127.0.0.1:{args.port}/')
+    server.serve_forever()
@@ -0,0 +1,127 @@
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+from models import db, WebhookCursor
+from changes import fetch_changes
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookDispatcher:
+    """Pushes change log entries to partner endpoints in batches.
+
+    Every endpoint has its own cursor in the webhook_cursor table, so a slow
+    or failing partner never holds back the others and delivery resumes where
+    it stopped after a restart. Delivery is at-least-once: the cursor only
+    moves after the endpoint answered with a 2xx.
+    """
+
+    def __init__(self, app, endpoints, secret=None, batch_size=100, interval=1.0,
+                 max_retries=5, backoff=0.5, timeout=5.0):
+        self.app = app
+        self.endpoints = list(endpoints)
+        self.secret = secret
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='webhook-dispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                delivered = 0
+                for endpoint in self.endpoints:
+                    try:
+                        delivered += self.dispatch_once(endpoint)
+                    except Exception:
+                        logger.exception('Webhook dispatch to %s failed', endpoint)
+                # Keep draining while there is a backlog, otherwise idle.
+                if not delivered:
+                    self._stop.wait(self.interval)
+
+    def dispatch_once(self, endpoint):
+        """Deliver the next batch for one endpoint; returns the batch size."""
+        last_seq = self._load_cursor(endpoint)
+        changes = fetch_changes(last_seq, self.batch_size)
+        if not changes:
+            return 0
+        if not self._deliver(endpoint, changes):
+            return 0
+        self._save_cursor(endpoint, changes[-1]['seq'])
+        return len(changes)
+
+    def _deliver(self, endpoint, changes):
+        import requests
+
+        body = json.dumps({'changes': changes, 'last_seq': changes[-1]['seq']})
+        headers = {'Content-Type': 'application/json'}
+        if self.secret:
+            signature = hmac.new(self.secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+            headers['X-Webhook-Signature'] = f'sha256={signature}'
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = requests.post(endpoint, data=body, headers=headers, timeout=self.timeout)
+                if 200 <= response.status_code < 300:
+                    return True
+                logger.warning('Webhook %s answered %s', endpoint, response.status_code)
+            except requests.RequestException as e:
+                logger.warning('Webhook %s unreachable: %s', endpoint, e)
+            if attempt < self.max_retries and self._stop.wait(self.backoff * (2 ** attempt)):
+                break
+        return False
+
+    def _load_cursor(self, endpoint):
+        with db.engine.connect() as connection:
+            last_seq = connection.execute(
+                select(WebhookCursor.last_seq).where(WebhookCursor.endpoint == endpoint)
+            ).scalar()
+        return last_seq or 0
+
+    def _save_cursor(self, endpoint, last_seq):
+        table = WebhookCursor.__table__
+        with db.engine.begin() as connection:
+            updated = connection.execute(
+                table.update().where(table.c.endpoint == endpoint)
+                .values(last_seq=last_seq, updated_at=datetime.utcnow())
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert().values(
+                    endpoint=endpoint, last_seq=last_seq, updated_at=datetime.utcnow()
+                ))
+
+
+def init_webhooks(app):
+    endpoints = app.config.get('WEBHOOK_ENDPOINTS')
+    if not endpoints:
+        return None
+    dispatcher = WebhookDispatcher(
+        app,
+        endpoints,
+        secret=app.config.get('WEBHOOK_SECRET'),
+        batch_size=app.config.get('WEBHOOK_BATCH_SIZE', 100),
+        max_retries=app.config.get('WEBHOOK_MAX_RETRIES', 5),
+    )
+    app.extensions['webhooks'] = dispatcher
+    app.extensions.setdefault('workers', []).append(dispatcher)
+    return dispatcher
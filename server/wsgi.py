@@ -0,0 +1,4 @@
+"""Entry point for WSGI servers, e.g. `gunicorn wsgi:app`."""
+from app import create_app, start_workers
+
+app = start_workers(create_app())